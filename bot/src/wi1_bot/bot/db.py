@@ -3,7 +3,9 @@ from pathlib import Path
 
 from alembic import command
 from alembic.config import Config
-from sqlalchemy import Engine, create_engine
+from sqlalchemy import Engine
+
+from wi1_bot.common.sqlite import create_sqlite_engine
 
 _engine: Engine | None = None
 
@@ -34,7 +36,7 @@ def init_db() -> Engine:
         return _engine
 
     db_path = get_db_path()
-    _engine = create_engine(f"sqlite:///{db_path}")
+    _engine = create_sqlite_engine(db_path, "bot")
 
     bot_dir = Path(__file__).resolve().parent
     alembic_ini = bot_dir / "alembic.ini"
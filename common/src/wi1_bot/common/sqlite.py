@@ -0,0 +1,76 @@
+import time
+from typing import Any
+
+from prometheus_client import Histogram
+from sqlalchemy import Connection, Engine, create_engine, event
+from sqlalchemy.pool import QueuePool
+
+QUERY_DURATION = Histogram(
+    "wi1_bot_database_query_duration_seconds",
+    "Time spent executing SQLite statements.",
+    ["database", "operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5, 30),
+)
+
+_OPERATIONS = frozenset({"select", "insert", "update", "delete", "pragma"})
+
+# seconds a statement waits for another connection's (or process's) write to finish
+# before failing with "database is locked"
+BUSY_TIMEOUT = 30
+# bytes of the database file read through a memory map instead of read() calls
+MMAP_SIZE = 256 * 1024 * 1024
+
+
+def _operation(statement: str) -> str:
+    verb = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ""
+    return verb if verb in _OPERATIONS else "other"
+
+
+def create_sqlite_engine(
+    path: str,
+    database: str,
+    *,
+    pool_size: int = 5,
+    busy_timeout: float = BUSY_TIMEOUT,
+    mmap_size: int = MMAP_SIZE,
+) -> Engine:
+    """An engine for the SQLite database at ``path``, set up for concurrent use.
+
+    Every connection runs in WAL mode (readers, such as metric scrapes, don't block
+    the writer or each other) with ``synchronous=NORMAL`` (a commit doesn't wait
+    for an fsync; a power loss can undo the last commits but never corrupts the
+    database), reads through a memory map, and waits up to ``busy_timeout`` seconds
+    for a lock instead of failing at once. Up to ``pool_size`` connections are kept
+    open, so a session doesn't pay for opening one and re-running the PRAGMAs.
+
+    Statement durations go to :data:`QUERY_DURATION`, labelled with ``database``.
+    """
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"timeout": busy_timeout},
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=pool_size,
+    )
+
+    @event.listens_for(engine, "connect")
+    def configure(dbapi_connection: Any, _connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        cursor.close()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn: Connection, *_args: Any) -> None:
+        conn.info["query_started_at"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def observe(conn: Connection, _cursor: Any, statement: str, *_args: Any) -> None:
+        started_at = conn.info.pop("query_started_at", None)
+        if started_at is not None:
+            QUERY_DURATION.labels(database=database, operation=_operation(statement)).observe(
+                time.perf_counter() - started_at
+            )
+
+    return engine
@@ -0,0 +1,73 @@
+from pathlib import Path
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+
+from wi1_bot.common.sqlite import MMAP_SIZE, _operation, create_sqlite_engine
+
+
+def _count(database: str, operation: str) -> float:
+    value = REGISTRY.get_sample_value(
+        "wi1_bot_database_query_duration_seconds_count",
+        {"database": database, "operation": operation},
+    )
+    return value if value is not None else 0
+
+
+def test_connections_are_tuned_for_concurrent_use(tmp_path: Path) -> None:
+    engine = create_sqlite_engine(str(tmp_path / "test.db"), "test", busy_timeout=12)
+
+    with engine.connect() as connection:
+        pragma = {
+            name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+            for name in ("journal_mode", "synchronous", "mmap_size", "busy_timeout")
+        }
+    engine.dispose()
+
+    assert pragma == {
+        "journal_mode": "wal",
+        "synchronous": 1,  # NORMAL
+        "mmap_size": MMAP_SIZE,
+        "busy_timeout": 12_000,
+    }
+
+
+def test_connections_are_pooled(tmp_path: Path) -> None:
+    engine = create_sqlite_engine(str(tmp_path / "test.db"), "test")
+
+    with engine.connect() as connection:
+        first = connection.connection.dbapi_connection
+    with engine.connect() as connection:
+        second = connection.connection.dbapi_connection
+    engine.dispose()
+
+    assert first is second
+
+
+def test_statement_durations_are_observed(tmp_path: Path) -> None:
+    engine = create_sqlite_engine(str(tmp_path / "test.db"), "timed")
+    before = _count("timed", "select")
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        connection.execute(text("select 2"))
+    engine.dispose()
+
+    assert _count("timed", "select") == before + 2
+
+
+@pytest.mark.parametrize(
+    ("statement", "operation"),
+    [
+        ("SELECT id FROM t", "select"),
+        ("  UPDATE t SET a = 1 RETURNING id", "update"),
+        ("INSERT INTO t VALUES (1)", "insert"),
+        ("DELETE FROM t", "delete"),
+        ("PRAGMA journal_mode", "pragma"),
+        ("CREATE TABLE t (id INTEGER)", "other"),
+        ("", "other"),
+    ],
+)
+def test_operation_is_the_statement_verb(statement: str, operation: str) -> None:
+    assert _operation(statement) == operation
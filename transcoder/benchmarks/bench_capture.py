@@ -0,0 +1,117 @@
+"""Worker CPU spent capturing ffmpeg's output, per encode.
+
+Replays synthetic ffmpeg output for an encode of the given length through a real
+pipe (``cat``), and measures the worker process's CPU time for:
+
+- ``line-mode``: the previous capture (line-buffered text mode; every line decoded,
+  fed to the progress parser and written to the log)
+- ``chunked``: :func:`capture_output`
+
+Each case is run on the ``-progress pipe:1 -stats_period 5`` output the worker asks
+for, and on a noisy encode that also logs a warning every 0.5s.
+
+Run with ``uv run python transcoder/benchmarks/bench_capture.py [--hours 2]``.
+"""
+
+import argparse
+import statistics
+import subprocess
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from wi1_bot.transcoder.capture import capture_output
+from wi1_bot.transcoder.progress import FfmpegProgress
+
+
+def _progress_output(seconds: float, warnings: bool = False) -> bytes:
+    blocks = []
+    for i in range(int(seconds / 5)):
+        t = i * 5
+        if warnings:
+            blocks.extend(
+                f"[hevc @ 0x55d0c8a0] Could not find ref with POC {t * 10 + n}\n" for n in range(10)
+            )
+        blocks.append(
+            f"frame={t * 24}\nfps=48.00\nstream_0_0_q=28.0\nbitrate=2000.0kbits/s\n"
+            f"total_size={t * 250_000}\nout_time_us={t * 1_000_000}\n"
+            f"out_time_ms={t * 1_000_000}\nout_time=00:00:00.000000\n"
+            "dup_frames=0\ndrop_frames=0\nspeed=2.01x\nprogress=continue\n"
+        )
+    return "".join(blocks).encode()
+
+
+def _line_mode(source: Path, log_path: Path) -> None:
+    with subprocess.Popen(
+        ["cat", str(source)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1,
+    ) as proc:
+        last_output = ""
+        progress = FfmpegProgress()
+        with open(log_path, "w") as log_file:
+            assert proc.stdout is not None
+            for line in proc.stdout:
+                log_file.write(line)
+                if not progress.feed(line):
+                    last_output = line.strip()
+        proc.wait()
+    del last_output
+
+
+def _chunked(source: Path, log_path: Path) -> None:
+    with subprocess.Popen(
+        ["cat", str(source)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    ) as proc:
+        with open(log_path, "wb") as log_file:
+            assert proc.stdout is not None
+            capture_output(proc.stdout.fileno(), log_file, FfmpegProgress())
+        proc.wait()
+
+
+def _cpu_ms(run: Callable[[Path, Path], None], source: Path, log_path: Path, rounds: int) -> float:
+    samples = []
+    for _ in range(rounds):
+        started = time.process_time()
+        run(source, log_path)
+        samples.append((time.process_time() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hours", type=float, default=2, help="simulated encode length")
+    parser.add_argument("--rounds", type=int, default=5, help="runs per case (median)")
+    args = parser.parse_args()
+
+    seconds = args.hours * 3600
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        clean = tmp_dir / "clean.txt"
+        clean.write_bytes(_progress_output(seconds))
+        noisy = tmp_dir / "noisy.txt"
+        noisy.write_bytes(_progress_output(seconds, warnings=True))
+        log_path = tmp_dir / "ffmpeg.log"
+
+        cases = [
+            ("line-mode", _line_mode, clean),
+            ("chunked", _chunked, clean),
+            ("line-mode (noisy)", _line_mode, noisy),
+            ("chunked (noisy)", _chunked, noisy),
+        ]
+
+        print(f"worker CPU per {args.hours:g}h encode (median of {args.rounds})")
+        for name, run, source in cases:
+            cpu_ms = _cpu_ms(run, source, log_path, args.rounds)
+            size_kib = source.stat().st_size / 1024
+            print(f"  {name:<18} {cpu_ms:8.2f} ms  ({size_kib:,.0f} KiB of output)")
+
+
+if __name__ == "__main__":
+    main()
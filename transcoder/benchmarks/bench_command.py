@@ -0,0 +1,152 @@
+"""Cost of building the ffmpeg command for files with many streams.
+
+Feeds synthetic ffprobe results with an increasing number of audio and subtitle
+streams (up to anime BD remuxes with dozens of tracks) through:
+
+- ``build_ffmpeg_command``: stream selection and argument building, with the probe
+  result passed in so no ffprobe runs
+- ``keep_original_language``: the profile keep-list a job resolves before that,
+  listing a language per track
+
+and reports the latency (best of ``--rounds`` repeats, the least noisy estimate for
+calls this short) and the peak memory allocated per call.
+
+``--save FILE`` writes the results as a baseline; ``--baseline FILE`` compares
+against one and exits non-zero if a case got slower (or allocates more) than
+``--tolerance`` allows.
+
+Run with ``uv run python transcoder/benchmarks/bench_command.py [--baseline FILE]``.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import timeit
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, cast
+
+# the transcoder reads its config at import; nothing here depends on its values
+os.environ.setdefault("WB_CONFIG_PATH", str(Path(__file__).parents[1] / "config.yaml.template"))
+
+from wi1_bot.transcoder.ffprobe import FfprobeResult  # noqa: E402
+from wi1_bot.transcoder.languages import keep_original_language  # noqa: E402
+from wi1_bot.transcoder.transcoder import TranscodeParams, build_ffmpeg_command  # noqa: E402
+
+STREAM_COUNTS = (2, 8, 20, 32, 64, 100)
+LANGUAGES = ("eng", "jpn", "spa", "fre", "ger", "ita", "por", "rus", "chi", "kor")
+
+
+def _keep_list(tracks: int) -> str:
+    # a code per track: the common ones, then ISO 639-2's local-use range (qaa-qtz)
+    local = (f"q{a}{b}" for a in "abcdefghijklmnopqrst" for b in "abcdefghijklmnopqrstuvwxyz")
+    codes = [*LANGUAGES, *local][:tracks]
+    return ",".join(codes)
+
+
+def _probe(tracks: int) -> FfprobeResult:
+    streams: list[dict[str, Any]] = [
+        {"index": 0, "codec_type": "video", "codec_name": "h264", "height": 1080}
+    ]
+    for i in range(tracks):
+        streams.append(
+            {
+                "index": len(streams),
+                "codec_type": "audio",
+                "codec_name": "flac",
+                "channels": 6,
+                "tags": {"language": LANGUAGES[i % len(LANGUAGES)]},
+            }
+        )
+    for i in range(tracks):
+        streams.append(
+            {
+                "index": len(streams),
+                "codec_type": "subtitle",
+                "codec_name": "hdmv_pgs_subtitle",
+                "tags": {"language": LANGUAGES[i % len(LANGUAGES)]},
+            }
+        )
+    return cast(FfprobeResult, {"format": {"format_name": "matroska,webm"}, "streams": streams})
+
+
+def _cases(tracks: int) -> dict[str, Callable[[], object]]:
+    info = _probe(tracks)
+    keep = _keep_list(tracks)
+    params = TranscodeParams(
+        path="/media/Show/Show - S01E01.mkv",
+        languages="eng,jpn",
+        video_params="-c hevc_nvenc -preset p5 -b 5000k",
+        audio_params="-c aac -ac 2 -b 192k",
+        hwaccel="cuda",
+    )
+    return {
+        f"build_ffmpeg_command[{tracks}]": lambda: build_ffmpeg_command(params, "/tmp/out", info),
+        # not in the list, so every entry is checked before it's appended
+        f"keep_original_language[{tracks}]": lambda: keep_original_language(keep, "Thai"),
+    }
+
+
+def _measure(call: Callable[[], object], rounds: int) -> dict[str, float]:
+    timer = timeit.Timer(call, timer=time.perf_counter)
+    number, _ = timer.autorange()
+    latency_us = min(timer.repeat(rounds, number)) / number * 1e6
+
+    tracemalloc.start()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"latency_us": latency_us, "peak_kib": peak / 1024}
+
+
+def _regressions(
+    results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], tolerance: float
+) -> list[str]:
+    found = []
+    for case, metrics in results.items():
+        for metric, value in metrics.items():
+            before = baseline.get(case, {}).get(metric)
+            if before and value > before * (1 + tolerance):
+                found.append(f"{case} {metric}: {before:.2f} -> {value:.2f}")
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=7, help="timing repeats (best of)")
+    parser.add_argument("--save", type=Path, help="write the results as a baseline")
+    parser.add_argument("--baseline", type=Path, help="compare against a saved baseline")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="allowed slowdown vs the baseline"
+    )
+    args = parser.parse_args()
+
+    results: dict[str, dict[str, float]] = {}
+    print(f"per call (best of {args.rounds})")
+    for tracks in STREAM_COUNTS:
+        for case, call in _cases(tracks).items():
+            results[case] = _measure(call, args.rounds)
+            metrics = results[case]
+            print(
+                f"  {case:<30} {metrics['latency_us']:9.2f} us  {metrics['peak_kib']:8.2f} KiB peak"
+            )
+
+    if args.save is not None:
+        args.save.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+        print(f"baseline saved to {args.save}")
+
+    if args.baseline is not None:
+        regressions = _regressions(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import shlex
+import subprocess
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any
+
+import structlog
+
+from wi1_bot.transcoder.config import RemotePathMapping, TranscodingProfile
+
+logger = structlog.get_logger(__name__)
+
+# options that pick an encoder; profile params carry no stream specifiers, but allow them
+_CODEC_OPTIONS = {"-c", "-codec", "-vcodec", "-acodec"}
+
+
+@dataclass(frozen=True)
+class Capabilities:
+    """What this worker can run, advertised to the webhook with every claim."""
+
+    encoders: frozenset[str]  # ffmpeg encoders compiled in
+    hwaccels: frozenset[str]  # hwaccels whose device initializes on this host
+    profiles: tuple[str, ...]  # quality profiles configured here
+    runnable_profiles: tuple[str, ...]  # ...whose encoders and hwaccel are available
+    paths: tuple[str, ...] | None  # reachable Arr-native roots; None: no mappings, any
+
+    def payload(self) -> dict[str, Any]:
+        return {
+            "encoders": sorted(self.encoders),
+            "hwaccels": sorted(self.hwaccels),
+            "profiles": list(self.profiles),
+            "runnable_profiles": list(self.runnable_profiles),
+            "paths": list(self.paths) if self.paths is not None else None,
+        }
+
+
+def _ffmpeg(*args: str) -> str | None:
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-hide_banner", *args], capture_output=True, text=True, timeout=30
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        logger.warning("could not run ffmpeg to detect capabilities", args=args, exc_info=True)
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+def ffmpeg_encoders() -> frozenset[str]:
+    """The encoders this ffmpeg build has (``ffmpeg -encoders``)."""
+    output = _ffmpeg("-encoders") or ""
+    # a legend, then "------", then one "<flags> <name> <description>" line each
+    _, _, listing = output.partition("------")
+    return frozenset(line.split()[1] for line in listing.splitlines() if len(line.split()) > 1)
+
+
+def ffmpeg_hwaccels() -> frozenset[str]:
+    """The hwaccels this ffmpeg build has whose device also initializes on this host.
+
+    A build with e.g. cuda compiled in lists it on a machine without a GPU, so each one
+    is tried with ``-init_hw_device``.
+    """
+    output = _ffmpeg("-hwaccels") or ""
+    listed = [line.strip() for line in output.splitlines()[1:] if line.strip()]
+    null_encode = ["-f", "lavfi", "-i", "nullsrc", "-frames:v", "1", "-f", "null", "-"]
+    return frozenset(
+        name
+        for name in listed
+        if _ffmpeg("-loglevel", "error", "-init_hw_device", name, *null_encode) is not None
+    )
+
+
+def profile_encoders(params: str | None) -> set[str]:
+    """The encoders ffmpeg ``params`` select (``copy`` isn't one)."""
+    args = shlex.split(params or "")
+    return {
+        value
+        for option, value in zip(args, args[1:])
+        if option.split(":")[0] in _CODEC_OPTIONS and value != "copy"
+    }
+
+
+def can_run(
+    profile: TranscodingProfile, encoders: frozenset[str], hwaccels: frozenset[str]
+) -> bool:
+    """Whether a profile's primary attempt can run with ``encoders`` and ``hwaccels``."""
+    needed = profile_encoders(profile.video_params) | profile_encoders(profile.audio_params)
+    return needed <= encoders and (profile.hwaccel is None or profile.hwaccel in hwaccels)
+
+
+def reachable_roots(mappings: list[RemotePathMapping]) -> tuple[str, ...] | None:
+    """The Arr-native roots of the mappings whose local directory exists here.
+
+    ``None`` without mappings: the worker then uses job paths as they are, so it can
+    take any of them.
+    """
+    if not mappings:
+        return None
+    return tuple(str(m.remote) for m in mappings if m.local.is_dir())
+
+
+def detect_capabilities(
+    profiles: Mapping[str, TranscodingProfile], mappings: list[RemotePathMapping]
+) -> Capabilities:
+    encoders = ffmpeg_encoders()
+    hwaccels = ffmpeg_hwaccels()
+    return Capabilities(
+        encoders=encoders,
+        hwaccels=hwaccels,
+        profiles=tuple(profiles),
+        runnable_profiles=tuple(
+            name for name, profile in profiles.items() if can_run(profile, encoders, hwaccels)
+        ),
+        paths=reachable_roots(mappings),
+    )
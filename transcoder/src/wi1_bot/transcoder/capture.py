@@ -0,0 +1,62 @@
+import codecs
+import os
+from collections import deque
+from typing import IO
+
+from .progress import OTHER_LINE, FfmpegProgress
+
+# large reads keep the per-encode cost to a handful of syscalls per progress period
+CHUNK_SIZE = 64 * 1024
+# enough context to classify the outcome and to explain a failure in a notification
+TAIL_LINES = 5
+# how much of the end of a chunk is first searched for its last other lines
+_TAIL_WINDOW = 4096
+
+
+def _other_lines(text: str, count: int) -> list[str]:
+    # the last `count` lines that aren't progress, searched for in a growing window at
+    # the end of text, so noisy output is cut short and progress is searched only once
+    window = _TAIL_WINDOW
+    while window < len(text) and (cut := text.find("\n", len(text) - window)) >= 0:
+        lines = OTHER_LINE.findall(text, cut)
+        if len(lines) >= count:
+            return [line.rstrip() for line in lines[-count:]]
+        window *= 4
+    lines = OTHER_LINE.findall("\n" + text)
+    return [line.rstrip() for line in lines[-count:]]
+
+
+def capture_output(
+    fd: int,
+    log_file: IO[bytes],
+    progress: FfmpegProgress,
+    tail_lines: int = TAIL_LINES,
+) -> list[str]:
+    """Copy ffmpeg's output from ``fd`` to ``log_file`` until ffmpeg closes it.
+
+    The output is written to the log as raw chunks; each chunk is decoded once only
+    to feed its ``-progress`` lines to ``progress`` and to keep a ring buffer of the
+    last ``tail_lines`` other (non-blank) lines, which are returned. Nothing is done
+    per line in Python, and only the end of a chunk is searched for its last lines,
+    so the cost scales with reads rather than output lines.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    tail: deque[str] = deque(maxlen=tail_lines)
+    partial = ""
+
+    while chunk := os.read(fd, CHUNK_SIZE):
+        log_file.write(chunk)
+
+        text = partial + decoder.decode(chunk)
+        # ffmpeg ends status lines with \r, so a line may end with either
+        cut = max(text.rfind("\n"), text.rfind("\r")) + 1
+        text, partial = text[:cut], text[cut:]
+
+        progress.feed_text(text)
+        tail.extend(_other_lines(text, tail_lines))
+
+    partial += decoder.decode(b"", final=True)
+    if not progress.feed(partial) and (partial := partial.strip()):
+        tail.append(partial)
+
+    return list(tail)
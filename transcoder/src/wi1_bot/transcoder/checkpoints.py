@@ -0,0 +1,129 @@
+import hashlib
+import json
+import shutil
+import time
+from pathlib import Path
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+# an output nobody has written to for this long has no ffmpeg behind it; younger ones
+# may belong to another worker sharing tmp_dir
+ORPHAN_AGE = 15 * 60
+
+_PLAN = "plan.json"
+
+
+def checkpoint_dir(root: Path, source: Path, *identity: str | None) -> Path:
+    """The directory checkpointing an encode of ``source`` with ``identity`` params.
+
+    Keyed by the source's path, size and mtime as well, so a replaced file starts
+    over instead of resuming from another file's segments.
+    """
+    st = source.stat()
+    key = json.dumps([str(source), st.st_size, st.st_mtime_ns, *identity])
+    return root / hashlib.sha256(key.encode()).hexdigest()
+
+
+def checkpoint_segment(directory: Path, index: int) -> Path:
+    return directory / f"{index:05}.mkv"
+
+
+def _read_plan(directory: Path) -> tuple[str, list[tuple[float, float | None]]] | None:
+    try:
+        plan = json.loads((directory / _PLAN).read_text())
+        return plan["source"], [(start, end) for start, end in plan["segments"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def load_plan(directory: Path) -> list[tuple[float, float | None]] | None:
+    """The segments a checkpointed encode was planned with, if it was started."""
+    plan = _read_plan(directory)
+    return plan[1] if plan is not None else None
+
+
+def save_plan(directory: Path, source: Path, segments: list[tuple[float, float | None]]) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp = directory / f".{_PLAN}.tmp"
+    tmp.write_text(json.dumps({"source": str(source), "segments": segments}))
+    tmp.replace(directory / _PLAN)
+
+
+def _age(path: Path, now: float) -> float:
+    try:
+        return now - path.stat().st_mtime
+    except OSError:
+        return 0
+
+
+def _remove(path: Path) -> int:
+    try:
+        size = path.stat().st_size
+        path.unlink()
+    except OSError:
+        return 0
+    return size
+
+
+def remove_orphaned_partials(*directories: Path) -> None:
+    """Delete hidden partial outputs in ``directories`` nobody has written to lately.
+
+    With ``staging: destination`` (and when finishing copies across filesystems),
+    outputs are written as ``.<name>.partial~`` next to the media or in its mapping's
+    staging directory, where :func:`recover_tmp_dir` doesn't look; a worker that
+    stopped mid-write leaves them there. Run when a job starts writing to them.
+    """
+    now = time.time()
+    freed = 0
+    for directory in dict.fromkeys(directories):
+        for partial in directory.glob(".*.partial~"):
+            if _age(partial, now) > ORPHAN_AGE:
+                freed += _remove(partial)
+
+    if freed:
+        logger.info("reclaimed space from interrupted transcodes", freed_bytes=freed)
+
+
+def recover_tmp_dir(tmp_dir: Path, max_age: float) -> None:
+    """Clean up after a worker that stopped mid-transcode; run at startup.
+
+    Deletes orphaned partial outputs (a job always restarts its output from scratch)
+    and half-written checkpoint segments, and checkpoints untouched for ``max_age``
+    seconds (their job went elsewhere or was dropped). The remaining checkpoints are
+    resumed when their job is next claimed.
+    """
+    now = time.time()
+    freed = 0
+
+    for output in tmp_dir.glob("*-TRANSCODED.mkv"):
+        if _age(output, now) > ORPHAN_AGE:
+            freed += _remove(output)
+
+    for directory in sorted((tmp_dir / "checkpoints").glob("*")):
+        if not directory.is_dir():
+            continue
+
+        files = list(directory.iterdir())
+        if all(_age(file, now) > max_age for file in files):
+            freed += sum(_remove(file) for file in files)
+            shutil.rmtree(directory, ignore_errors=True)
+            continue
+
+        for partial in directory.glob("*.partial.mkv"):
+            if _age(partial, now) > ORPHAN_AGE:
+                freed += _remove(partial)
+
+        if (plan := _read_plan(directory)) is not None:
+            source, segments = plan
+            encoded = sum(checkpoint_segment(directory, i).exists() for i in range(len(segments)))
+            logger.info(
+                "found resumable transcode checkpoint",
+                source=source,
+                encoded_segments=encoded,
+                segments=len(segments),
+            )
+
+    if freed:
+        logger.info("reclaimed space from interrupted transcodes", freed_bytes=freed)
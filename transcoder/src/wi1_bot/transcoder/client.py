@@ -0,0 +1,78 @@
+import time
+from typing import Any, Literal
+
+import requests
+import structlog
+from requests.adapters import HTTPAdapter
+
+from wi1_bot.transcoder.metrics import WEBHOOK_REQUEST_DURATION, WEBHOOK_REQUESTS
+
+logger = structlog.get_logger(__name__)
+
+Endpoint = Literal["claim", "heartbeat", "estimate", "complete", "split", "fail"]
+
+# seconds to open a connection; the webhook is on the local network or behind a proxy
+CONNECT_TIMEOUT = 5
+# seconds to wait for the response, per endpoint; a claim adds the time it waits for a
+# job, the rest are a single SQLite write
+READ_TIMEOUTS: dict[Endpoint, float] = {
+    "claim": 30,
+    "heartbeat": 10,
+    "estimate": 10,
+    "complete": 30,
+    "split": 30,
+    "fail": 30,
+}
+
+
+class WebhookClient:
+    """The worker's connection to the webhook's job API.
+
+    Claims, heartbeats and reports share one ``requests.Session``, so they reuse
+    keep-alive connections (and TLS sessions, behind a proxy) from a pool instead of
+    connecting for every request. Each request's latency and status code is recorded
+    per endpoint.
+    """
+
+    def __init__(self, base_url: str, pool_size: int = 10) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def post(
+        self,
+        endpoint: Endpoint,
+        path: str,
+        payload: dict[str, Any],
+        wait: float = 0,
+    ) -> requests.Response:
+        """POST ``payload`` to ``path``, allowing ``wait`` extra seconds for the response.
+
+        Raises ``requests.RequestException`` if the webhook can't be reached.
+        """
+        url = f"{self.base_url}{path}"
+        started = time.perf_counter()
+        try:
+            resp = self.session.post(
+                url, json=payload, timeout=(CONNECT_TIMEOUT, READ_TIMEOUTS[endpoint] + wait)
+            )
+        except requests.RequestException:
+            WEBHOOK_REQUESTS.labels(endpoint=endpoint, status_code="error").inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            WEBHOOK_REQUEST_DURATION.labels(endpoint=endpoint).observe(elapsed)
+
+        WEBHOOK_REQUESTS.labels(endpoint=endpoint, status_code=str(resp.status_code)).inc()
+        logger.debug(
+            "webhook request finished",
+            endpoint=endpoint,
+            status_code=resp.status_code,
+            elapsed_ms=round(elapsed * 1000, 1),
+        )
+        return resp
+
+    def close(self) -> None:
+        self.session.close()
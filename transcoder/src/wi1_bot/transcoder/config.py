@@ -10,6 +10,13 @@ from wi1_bot.common.config import BaseServiceConfig
 class RemotePathMapping(BaseModel):
     remote: Path = Field(description="Remote (Arr-native) path to map from")
     local: Path = Field(description="Local path to map to")
+    staging: Path | None = Field(
+        None,
+        description=(
+            "Directory on the same filesystem as local for in-progress transcodes"
+            " (with worker.staging: destination)"
+        ),
+    )
 
 
 class GeneralConfig(BaseModel):
@@ -31,6 +38,25 @@ class TranscodingFallback(BaseModel):
     )
 
 
+class CopyRule(BaseModel):
+    codecs: list[str] = Field(
+        min_length=1, description="Source codecs (ffprobe codec_name) that already meet the target"
+    )
+    max_bit_rate: int | None = Field(None, gt=0, description="Max source bit rate, bits/s")
+    max_channels: int | None = Field(None, gt=0, description="Max source audio channels")
+    max_height: int | None = Field(None, gt=0, description="Max source video height, pixels")
+
+
+class PreflightConfig(BaseModel):
+    samples: int = Field(3, gt=0, description="Evenly spaced samples to encode")
+    sample_duration: float = Field(20, gt=0, description="Seconds per sample")
+    min_savings: float = Field(
+        0.1,
+        lt=1,
+        description="Skip the job if the output is projected to be less than this much smaller",
+    )
+
+
 class TranscodingProfile(BaseModel):
     video_params: str | None = Field(None, description="FFmpeg video parameters")
     audio_params: str | None = Field(None, description="FFmpeg audio parameters")
@@ -46,6 +72,26 @@ class TranscodingProfile(BaseModel):
     fallback: TranscodingFallback | None = Field(
         None, description="FFmpeg parameters to retry with once if a transcode fails"
     )
+    copy_video: CopyRule | None = Field(
+        None, description="Copy the main video stream instead of encoding it if it meets this"
+    )
+    copy_audio: CopyRule | None = Field(
+        None, description="Copy each audio stream instead of encoding it if it meets this"
+    )
+    slots: int = Field(
+        1,
+        ge=1,
+        description="Worker slots a job with this profile occupies (see worker.concurrency)",
+    )
+    preflight: PreflightConfig | None = Field(
+        None, description="Encode samples first to project the savings, and skip poor ones"
+    )
+    nice: int | None = Field(
+        None, ge=0, le=19, description="CPU niceness to run this profile's ffmpeg with"
+    )
+    ionice: Literal["best-effort", "idle"] | None = Field(
+        None, description="I/O scheduling class to run this profile's ffmpeg with"
+    )
 
 
 class TranscodingConfig(BaseModel):
@@ -59,6 +105,88 @@ class TranscodingConfig(BaseModel):
         return v
 
 
+class SplitConfig(BaseModel):
+    segment_dir: Path = Field(
+        description="Directory for encoded segments, at the same path on every worker"
+    )
+    min_duration: float = Field(
+        default=3600, gt=0, description="Split titles at least this many seconds long"
+    )
+    segment_duration: float = Field(
+        default=600, gt=0, description="Target seconds per segment (cut at the next keyframe)"
+    )
+
+
+class CheckpointConfig(BaseModel):
+    segment_duration: float = Field(
+        default=600,
+        gt=0,
+        description="Target seconds of video per checkpoint, cut at the next keyframe",
+    )
+    max_age: float = Field(
+        default=7 * 24 * 3600,
+        gt=0,
+        description="Seconds after which an untouched checkpoint is deleted at startup",
+    )
+
+
+class SupervisorConfig(BaseModel):
+    stall_timeout: float | None = Field(
+        default=None,
+        gt=0,
+        description="Kill ffmpeg after this many seconds without progress (default off)",
+    )
+    max_runtime_ratio: float | None = Field(
+        default=None,
+        gt=0,
+        description=(
+            "Kill ffmpeg after running this many times the media's duration, but not"
+            " before stall_timeout (default off)"
+        ),
+    )
+    size_check_after: float | None = Field(
+        default=None,
+        gt=0,
+        lt=1,
+        description=(
+            "Fraction of a transcode to encode before projecting its final size, skipping"
+            " the job if it would be larger than the source (default off)"
+        ),
+    )
+
+
+class CpuConfig(BaseModel):
+    cores: list[int] | None = Field(
+        default=None,
+        min_length=1,
+        description=(
+            "Cores to split between running jobs, e.g. this worker's share of a host"
+            " (default: every core the worker may run on)"
+        ),
+    )
+
+
+class PrefetchConfig(BaseModel):
+    max_bytes: int = Field(
+        gt=0, description="Staging budget for prefetched sources under tmp_dir, bytes"
+    )
+    rate: float | None = Field(
+        None, gt=0, description="Max bytes/s to read a source at while prefetching"
+    )
+
+
+class ClaimAheadConfig(BaseModel):
+    lease: float = Field(
+        default=120,
+        gt=0,
+        description="Seconds the webhook holds a job reserved ahead, renewed by heartbeats",
+    )
+    prefetch: PrefetchConfig | None = Field(
+        default=None,
+        description="Copy a reserved job's source to tmp_dir while it waits for a slot",
+    )
+
+
 class WorkerConfig(BaseModel):
     webhook_url: str = Field(description="Base URL of the wi1-bot-webhook job server")
     worker_name: str = Field(
@@ -68,9 +196,73 @@ class WorkerConfig(BaseModel):
     poll_interval: float = Field(
         default=3, gt=0, description="Seconds to wait between polling for jobs"
     )
+    metrics_port: int | None = Field(
+        default=None, gt=0, description="Port to serve Prometheus metrics on (default off)"
+    )
+    claim_wait: float = Field(
+        default=30,
+        ge=0,
+        description=(
+            "Seconds a job claim waits at the webhook for a job to be queued (0 polls"
+            " every poll_interval instead)"
+        ),
+    )
+    concurrency: int = Field(
+        default=1,
+        ge=1,
+        description="Transcode slots; jobs run in parallel while their profiles' slots fit",
+    )
+    cpu: CpuConfig | None = Field(
+        default=None,
+        description="Pin each job's ffmpeg to its share of the cores, with as many threads",
+    )
+    claim_ahead: ClaimAheadConfig | None = Field(
+        default=None,
+        description="Claim the next job while the slots are busy, to start it without delay",
+    )
+    drain_timeout: float = Field(
+        default=0,
+        ge=0,
+        description=(
+            "Seconds to let running transcodes finish after SIGTERM before terminating"
+            " them and handing their jobs back to the webhook"
+        ),
+    )
     tmp_dir: Path | None = Field(
         default=None, description="Directory for in-progress transcodes (default: system temp)"
     )
+    staging: Literal["tmp_dir", "destination"] = Field(
+        default="tmp_dir",
+        description=(
+            "Where transcodes are written while in progress: tmp_dir, or next to the"
+            " source (or in its mapping's staging directory) so finishing is a rename"
+        ),
+    )
+    probe_cache_size: int = Field(
+        default=0,
+        ge=0,
+        description="Max ffprobe results cached on disk under tmp_dir (0, the default, disables)",
+    )
+    failure_memory_ttl: float = Field(
+        default=0,
+        ge=0,
+        description=(
+            "Seconds to send sources a profile's primary attempt failed on (and its"
+            " fallback succeeded) straight to the fallback (0, the default, disables)"
+        ),
+    )
+    checkpoint: CheckpointConfig | None = Field(
+        default=None,
+        description="Encode in checkpointed segments under tmp_dir, so a restart resumes",
+    )
+    supervisor: SupervisorConfig = Field(
+        default_factory=SupervisorConfig,
+        description="Limits on a running ffmpeg attempt's progress, size and runtime",
+    )
+    split: SplitConfig | None = Field(
+        default=None,
+        description="Encode long titles' video in segments that any worker can claim",
+    )
 
 
 class Config(BaseServiceConfig):
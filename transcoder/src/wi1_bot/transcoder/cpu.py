@@ -0,0 +1,54 @@
+import os
+import threading
+from collections.abc import Iterable
+
+
+def available_cores() -> tuple[int, ...]:
+    """The cores this process may run on (a container's cpuset, if it has one)."""
+    if hasattr(os, "sched_getaffinity"):
+        return tuple(sorted(os.sched_getaffinity(0)))
+    return tuple(range(os.cpu_count() or 1))
+
+
+def core_list(cores: Iterable[int]) -> str:
+    """``cores`` as a taskset list, runs collapsed: ``0-3,8``."""
+    ranges: list[list[int]] = []
+    for core in sorted(cores):
+        if ranges and core == ranges[-1][1] + 1:
+            ranges[-1][1] = core
+        else:
+            ranges.append([core, core])
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+class CpuBudget:
+    """Splits the worker's cores between its running jobs, in proportion to slots.
+
+    Each slot is worth an equal share of the cores, so a job gets cores of its own
+    (and a matching ffmpeg thread count) instead of every ffmpeg starting a thread
+    per core and all of them contending for the same caches. The least used cores
+    are handed out first, lowest first, so jobs mostly get neighbouring cores; with
+    fewer cores than slots, jobs share them evenly.
+    """
+
+    def __init__(self, cores: Iterable[int], slots: int) -> None:
+        self.cores = tuple(sorted(set(cores)))
+        if not self.cores:
+            raise ValueError("a CPU budget needs at least one core")
+        self.per_slot = max(len(self.cores) // slots, 1)
+        self._users = dict.fromkeys(self.cores, 0)
+        self._lock = threading.Lock()
+
+    def acquire(self, slots: int) -> tuple[int, ...]:
+        """Cores for a job holding ``slots`` slots; give them back with :meth:`release`."""
+        count = min(self.per_slot * slots, len(self.cores))
+        with self._lock:
+            picked = sorted(self.cores, key=lambda core: (self._users[core], core))[:count]
+            for core in picked:
+                self._users[core] += 1
+        return tuple(sorted(picked))
+
+    def release(self, cores: Iterable[int]) -> None:
+        with self._lock:
+            for core in cores:
+                self._users[core] -= 1
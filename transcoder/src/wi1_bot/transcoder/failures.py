@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from .ffprobe import FfprobeResult
+
+# ffmpeg's generic last words; the cause is on a line above
+_GENERIC_LINES = {"Conversion failed!"}
+_ADDRESS = re.compile(r" @ 0x[0-9a-f]+")
+_NUMBER = re.compile(r"\b\d+\b")
+
+
+@dataclass(frozen=True)
+class SourceSignature:
+    """The kind of source a profile's primary attempt failed on."""
+
+    quality_profile: str
+    codec_name: str | None  # of the main video stream, e.g. h264
+    codec_profile: str | None  # e.g. High 10
+    pix_fmt: str | None  # e.g. yuv420p10le
+
+    @property
+    def key(self) -> str:
+        identity = json.dumps(asdict(self), sort_keys=True)
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+
+def source_signature(quality_profile: str, info: FfprobeResult) -> SourceSignature | None:
+    """The signature of ``info``'s main video stream, or ``None`` if it has none."""
+    video = next((s for s in info["streams"] if s["codec_type"] == "video"), None)
+    if video is None:
+        return None
+    return SourceSignature(
+        quality_profile=quality_profile,
+        codec_name=video.get("codec_name"),
+        codec_profile=video.get("profile"),
+        pix_fmt=video.get("pix_fmt"),
+    )
+
+
+def classify_error(last_output: str) -> str:
+    """The line that says why ffmpeg failed, without the parts that vary per file.
+
+    Context addresses (``[h264 @ 0x55d0...]``) are dropped and numbers become ``N``,
+    so the same failure on two files reads the same.
+    """
+    lines = [line for line in last_output.splitlines() if line not in _GENERIC_LINES]
+    if not lines:
+        return "unknown"
+    return _NUMBER.sub("N", _ADDRESS.sub("", lines[-1]))
+
+
+class FailureMemory:
+    """On-disk record of sources a profile's primary attempt is known to fail on.
+
+    A signature is recorded when the primary attempt failed and the fallback then
+    succeeded, so later jobs for the same kind of source go straight to the fallback.
+    Entries expire after ``ttl`` seconds, so an ffmpeg or driver upgrade gets the
+    primary attempt retried. Each entry is its own JSON file (written atomically,
+    like :class:`~wi1_bot.transcoder.ffprobe.ProbeCache`), its mtime when recorded.
+    """
+
+    def __init__(self, directory: Path, ttl: float) -> None:
+        self.directory = directory
+        self.ttl = ttl
+
+    def get(self, signature: SourceSignature) -> str | None:
+        """The error the primary attempt failed with on ``signature``, if remembered."""
+        entry = self.directory / f"{signature.key}.json"
+        try:
+            if time.time() - entry.stat().st_mtime > self.ttl:
+                entry.unlink(missing_ok=True)
+                return None
+            return json.loads(entry.read_text())["error"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, signature: SourceSignature, error: str) -> None:
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = self.directory / f".{signature.key}.{os.getpid()}.{threading.get_ident()}.tmp"
+            tmp.write_text(json.dumps({**asdict(signature), "error": error}))
+            tmp.replace(self.directory / f"{signature.key}.json")
+        except OSError:
+            return
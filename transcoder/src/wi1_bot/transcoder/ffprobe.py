@@ -1,5 +1,9 @@
+import hashlib
 import json
+import os
 import subprocess
+import threading
+from collections.abc import Sequence
 from pathlib import Path
 from typing import Literal, NotRequired, TypedDict, cast
 
@@ -126,7 +130,90 @@ class FfprobeException(Exception):
     pass
 
 
+class ProbeCache:
+    """On-disk LRU cache of ffprobe results, keyed by file identity.
+
+    The key is the file's path, size, mtime and inode, so a replaced or modified
+    file misses instead of returning stale streams. Each entry is its own JSON file
+    (written atomically, so replicas sharing ``tmp_dir`` can't read a torn entry); a
+    hit bumps the entry's mtime, and the least recently used entries are evicted
+    once there are more than ``max_entries``.
+    """
+
+    def __init__(self, directory: Path, max_entries: int) -> None:
+        self.directory = directory
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path: Path) -> str:
+        st = path.stat()
+        identity = f"{path.resolve()}\0{st.st_size}\0{st.st_mtime_ns}\0{st.st_ino}"
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+    def get(self, path: Path) -> FfprobeResult | None:
+        try:
+            entry = self.directory / f"{self._key(path)}.json"
+            result = cast(FfprobeResult, json.loads(entry.read_text()))
+            # mtime doubles as the entry's last use for LRU eviction
+            os.utime(entry)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return result
+
+    def put(self, path: Path, result: FfprobeResult) -> None:
+        try:
+            key = self._key(path)
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = self.directory / f".{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+            tmp.write_text(json.dumps(result))
+            tmp.replace(self.directory / f"{key}.json")
+        except OSError:
+            return
+
+        self._evict()
+
+    def _evict(self) -> None:
+        entries: list[tuple[int, Path]] = []
+        for entry in self.directory.glob("*.json"):
+            try:
+                entries.append((entry.stat().st_mtime_ns, entry))
+            except OSError:
+                continue
+
+        if len(entries) <= self.max_entries:
+            return
+
+        entries.sort()
+        for _, entry in entries[: len(entries) - self.max_entries]:
+            entry.unlink(missing_ok=True)
+
+
+_cache: ProbeCache | None = None
+
+
+def set_cache(cache: ProbeCache | None) -> None:
+    """Make :func:`ffprobe` consult ``cache`` first (``None`` disables caching)."""
+    global _cache
+    _cache = cache
+
+
+def get_cache() -> ProbeCache | None:
+    return _cache
+
+
 def ffprobe(path: Path | str) -> FfprobeResult:
+    cache = _cache
+    if cache is not None and (cached := cache.get(Path(path))) is not None:
+        return cached
+
     command = [
         "ffprobe",
         "-hide_banner",
@@ -144,6 +231,57 @@ def ffprobe(path: Path | str) -> FfprobeResult:
     if result.returncode != 0:
         raise FfprobeException(f"ffprobe failed: {result.stderr.strip()}")
 
-    result = json.loads(result.stdout)
+    info = cast(FfprobeResult, json.loads(result.stdout))
+
+    if cache is not None:
+        cache.put(Path(path), info)
+
+    return info
+
+
+def keyframe_times(path: Path | str, targets: Sequence[float], window: float = 30) -> list[float]:
+    """Timestamps of the first video keyframe at or after each of ``targets`` (seconds).
+
+    Only ``window`` seconds after each target are read, so a target with no keyframe
+    in its window is left out. Timestamps are the stream's, not offset by the file's
+    start time.
+    """
+    if not targets:
+        return []
+
+    command = [
+        "ffprobe",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-skip_frame",
+        "nokey",
+        "-read_intervals",
+        ",".join(f"{target}%+{window}" for target in targets),
+        "-show_entries",
+        "frame=best_effort_timestamp_time",
+        "-print_format",
+        "json",
+        str(path),
+    ]
+
+    result = subprocess.run(command, capture_output=True, text=True)
+
+    if result.returncode != 0:
+        raise FfprobeException(f"ffprobe failed: {result.stderr.strip()}")
+
+    times = sorted(
+        float(frame["best_effort_timestamp_time"])
+        for frame in json.loads(result.stdout).get("frames", [])
+        if frame.get("best_effort_timestamp_time") not in {None, "N/A"}
+    )
 
-    return cast(FfprobeResult, result)
+    keyframes = []
+    for target in targets:
+        # seeking lands on the keyframe before the target, so skip ahead to it
+        after = next((t for t in times if target <= t < target + window), None)
+        if after is not None:
+            keyframes.append(after)
+    return keyframes
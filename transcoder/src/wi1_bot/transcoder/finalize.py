@@ -0,0 +1,67 @@
+import errno
+import os
+import shutil
+from pathlib import Path
+from typing import BinaryIO, Literal
+
+# errors meaning "this kernel/filesystem pair can't do that copy", not a real failure
+_UNSUPPORTED = frozenset({errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP})
+
+
+def _copy_file_range(fsrc: BinaryIO, fdst: BinaryIO) -> None:
+    while os.copy_file_range(fsrc.fileno(), fdst.fileno(), 1 << 30):
+        pass
+
+
+def _sendfile(fsrc: BinaryIO, fdst: BinaryIO) -> None:
+    # offset=None reads from (and advances) fsrc's position, so this resumes where a
+    # failed copy_file_range left off
+    while os.sendfile(fdst.fileno(), fsrc.fileno(), None, 1 << 30):
+        pass
+
+
+def copy_file(src: Path, dst: Path) -> None:
+    """Copy ``src`` to ``dst`` without moving the data through userspace.
+
+    Tries ``copy_file_range`` (which can reflink or copy server-side on NFS/SMB),
+    then ``sendfile``, then falls back to a buffered copy. Permission bits are copied
+    too.
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        for copy in (_copy_file_range, _sendfile):
+            try:
+                copy(fsrc, fdst)
+                break
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+        else:
+            shutil.copyfileobj(fsrc, fdst, 1 << 20)
+
+    shutil.copymode(src, dst)
+
+
+def finalize_output(src: Path, dst: Path) -> Literal["rename", "copy"]:
+    """Move a finished transcode from ``src`` to ``dst``; returns how it got there.
+
+    A rename when both are on the same filesystem. Otherwise the file is copied next
+    to ``dst`` under a hidden name first, so ``dst`` only ever appears complete.
+    """
+    try:
+        os.replace(src, dst)
+        return "rename"
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    # hidden, with the suffix Radarr/Sonarr disk scans ignore
+    partial = dst.with_name(f".{dst.name}.partial~")
+    try:
+        copy_file(src, partial)
+        os.replace(partial, dst)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+
+    src.unlink()
+    return "copy"
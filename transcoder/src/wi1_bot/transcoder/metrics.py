@@ -0,0 +1,29 @@
+from prometheus_client import Counter, Histogram, Info
+
+from wi1_bot.transcoder import __version__
+
+WEBHOOK_REQUESTS = Counter(
+    "wi1_bot_transcoder_webhook_requests_total",
+    "Requests the worker made to the webhook's job API.",
+    ["endpoint", "status_code"],
+)
+WEBHOOK_REQUEST_DURATION = Histogram(
+    "wi1_bot_transcoder_webhook_request_duration_seconds",
+    "Time the webhook took to answer the worker's job API requests.",
+    ["endpoint"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+PREFETCHES = Counter(
+    "wi1_bot_transcoder_prefetches_total",
+    "Sources of reserved jobs the worker tried to copy to local staging, by outcome.",
+    ["outcome"],
+)
+ENCODE_SPEED = Histogram(
+    "wi1_bot_transcoder_encode_speed_ratio",
+    "Average speed (multiple of realtime) of a finished job's last ffmpeg run, by quality"
+    " profile and the number of cores it was pinned to (all: not pinned).",
+    ["quality_profile", "cores"],
+    buckets=(0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10, 20, 50),
+)
+BUILD = Info("wi1_bot_transcoder_build", "Transcoder build information.")
+BUILD.info({"version": __version__})
@@ -0,0 +1,163 @@
+import json
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, cast
+
+import requests
+import structlog
+
+from wi1_bot.transcoder.client import Endpoint, WebhookClient
+
+logger = structlog.get_logger(__name__)
+
+# seconds before a report is retried, doubling per failed delivery of it
+MIN_RETRY = 5.0
+MAX_RETRY = 300.0
+
+
+class Outbox:
+    """Job outcome reports, kept on disk until the webhook acknowledges them.
+
+    A finished job's report used to be dropped if the webhook couldn't be reached, and
+    the job was then transcoded again once its lease expired. Each report is now
+    written to ``directory`` before it is sent, and retried with backoff (and after
+    a restart) until the webhook answers it. Reports carry a ``report_id``, so the
+    webhook applies a replayed one only once.
+
+    Reports are delivered oldest first, each with its own backoff, so one the webhook
+    keeps failing doesn't hold up the others; a 4xx answer is final (the job is gone
+    or another worker holds it now), a 5xx or no answer is retried.
+    """
+
+    def __init__(self, directory: Path, client: WebhookClient) -> None:
+        self.directory = directory
+        self.client = client
+        # guards which reports are being delivered and their backoff, never a delivery
+        self._lock = threading.Lock()
+        self._sending: set[Path] = set()
+        self._backoff: dict[Path, tuple[float, float]] = {}  # retry at, delay
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="outbox", daemon=True)
+
+    def send(self, endpoint: Endpoint, path: str, payload: dict[str, Any]) -> bool:
+        """Persist a report, then try to deliver it; returns whether it was delivered.
+
+        An undelivered report stays in the outbox for the background retries.
+        """
+        report_id = uuid.uuid4().hex
+        entry = self.directory / f"{time.time_ns():020}-{report_id}.json"
+        report = {
+            "endpoint": endpoint,
+            "path": path,
+            "payload": {**payload, "report_id": report_id},
+        }
+        # claimed before it's visible, so a retry round doesn't deliver it as well
+        with self._lock:
+            self._sending.add(entry)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = entry.with_name(f".{entry.name}.tmp")
+            tmp.write_text(json.dumps(report))
+            tmp.replace(entry)
+        except OSError:
+            with self._lock:
+                self._sending.discard(entry)
+            logger.warning("failed to persist job report; sending it once", exc_info=True)
+            return self._deliver(endpoint, path, report["payload"])
+
+        return self._settle(entry, self._deliver_entry(entry))
+
+    def pending(self) -> list[Path]:
+        return sorted(self.directory.glob("*.json"))
+
+    def flush(self, *, due_only: bool = False) -> bool:
+        """Deliver pending reports, oldest first; returns whether none are left.
+
+        With ``due_only``, reports still backing off from a failed delivery are skipped.
+        """
+        now = time.monotonic()
+        with self._lock:
+            pending = self.pending()
+            for gone in self._backoff.keys() - set(pending):
+                del self._backoff[gone]
+            entries = [
+                entry
+                for entry in pending
+                if entry not in self._sending
+                and not (due_only and self._backoff.get(entry, (now, 0.0))[0] > now)
+            ]
+            self._sending.update(entries)
+
+        for entry in entries:
+            self._settle(entry, self._deliver_entry(entry))
+        return not self.pending()
+
+    def _deliver_entry(self, entry: Path) -> bool:
+        try:
+            report = json.loads(entry.read_text())
+        except FileNotFoundError:
+            return True  # delivered by another round
+        except (OSError, ValueError):
+            logger.warning("dropping unreadable job report", entry=entry.name, exc_info=True)
+            return True
+
+        endpoint = cast(Endpoint, report["endpoint"])
+        return self._deliver(endpoint, report["path"], report["payload"])
+
+    def _settle(self, entry: Path, delivered: bool) -> bool:
+        with self._lock:
+            self._sending.discard(entry)
+            if delivered:
+                entry.unlink(missing_ok=True)
+                self._backoff.pop(entry, None)
+            else:
+                _, delay = self._backoff.get(entry, (0.0, MIN_RETRY / 2))
+                delay = min(delay * 2, MAX_RETRY)
+                self._backoff[entry] = (time.monotonic() + delay, delay)
+        return delivered
+
+    def _deliver(self, endpoint: Endpoint, path: str, payload: dict[str, Any]) -> bool:
+        try:
+            resp = self.client.post(endpoint, path, payload)
+        except requests.RequestException:
+            logger.warning("failed to report job outcome; will retry", path=path, exc_info=True)
+            return False
+
+        if resp.status_code >= 500:
+            logger.warning(
+                "webhook failed to process job outcome; will retry",
+                path=path,
+                status_code=resp.status_code,
+            )
+            return False
+
+        if not resp.ok:
+            logger.warning(
+                "webhook rejected job outcome",
+                path=path,
+                status_code=resp.status_code,
+                response=resp.text,
+            )
+        else:
+            logger.debug("job outcome reported", path=path, status_code=resp.status_code)
+        return True
+
+    def _run(self) -> None:
+        # replays what a previous run left behind, then retries what doesn't land
+        while True:
+            self.flush(due_only=True)
+            with self._lock:
+                retry_at = min((at for at, _ in self._backoff.values()), default=None)
+            delay = MIN_RETRY if retry_at is None else max(retry_at - time.monotonic(), 0.0)
+            if self._stop.wait(delay):
+                return
+
+    def start(self) -> None:
+        if pending := self.pending():
+            logger.info("replaying unacknowledged job reports", reports=len(pending))
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
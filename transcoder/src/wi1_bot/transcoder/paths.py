@@ -37,3 +37,11 @@ def replace_remote_paths(path: Path, mappings: list[RemotePathMapping]) -> Path:
         )
 
     return path
+
+
+def staging_dir(path: Path, mappings: list[RemotePathMapping]) -> Path | None:
+    """The staging directory of the most specific mapping containing local ``path``."""
+    matching = [m for m in mappings if m.staging is not None and path.is_relative_to(m.local)]
+    if not matching:
+        return None
+    return max(matching, key=lambda m: len(m.local.parts)).staging
@@ -0,0 +1,101 @@
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import structlog
+
+from wi1_bot.transcoder.metrics import PREFETCHES
+
+logger = structlog.get_logger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def discard(copy: Path | None) -> None:
+    """Delete a prefetched copy once its job is done with it."""
+    if copy is not None:
+        shutil.rmtree(copy.parent, ignore_errors=True)
+
+
+class Prefetcher:
+    """Copies reserved jobs' sources into local staging ahead of their transcode.
+
+    Each copy lives in ``directory/<job id>/`` until its job finishes. A source that
+    doesn't fit in what's left of ``max_bytes`` (copies of running jobs included) is
+    left on the network, as is one whose job starts before its copy finishes.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, rate: float | None = None) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.rate = rate
+
+    def clear(self) -> None:
+        """Delete copies left behind by a previous run; run at startup."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def used(self) -> int:
+        """Bytes of staging the copies (and partial copies) take up."""
+        total = 0
+        for file in self.directory.glob("*/*"):
+            try:
+                total += file.stat().st_size
+            except OSError:
+                continue
+        return total
+
+    def fetch(self, job_id: int, source: Path, cancel: threading.Event) -> Path | None:
+        """Copy ``source`` for job ``job_id``; ``None`` if it wasn't (fully) copied.
+
+        Reads at most ``rate`` bytes per second, so a prefetch doesn't starve the
+        running transcodes' reads from the same storage. Gives up as soon as
+        ``cancel`` is set.
+        """
+        try:
+            size = source.stat().st_size
+        except OSError:
+            PREFETCHES.labels(outcome="failed").inc()
+            return None
+
+        if self.used() + size > self.max_bytes:
+            logger.info("not prefetching source; staging budget is full", size=size)
+            PREFETCHES.labels(outcome="over_budget").inc()
+            return None
+
+        copy = self.directory / str(job_id) / source.name
+        partial = copy.with_name(f".{copy.name}.partial")
+        started = time.monotonic()
+        try:
+            copy.parent.mkdir(parents=True, exist_ok=True)
+            with source.open("rb") as src, partial.open("wb") as dst:
+                copied = 0
+                while chunk := src.read(CHUNK_SIZE):
+                    if cancel.is_set():
+                        break
+                    dst.write(chunk)
+                    copied += len(chunk)
+                    if self.rate is not None:
+                        ahead = copied / self.rate - (time.monotonic() - started)
+                        if ahead > 0 and cancel.wait(ahead):
+                            break
+            if cancel.is_set():
+                discard(copy)
+                PREFETCHES.labels(outcome="cancelled").inc()
+                return None
+            # the copy stands in for the source, mtime included
+            shutil.copystat(source, partial)
+            partial.replace(copy)
+        except OSError:
+            logger.warning("failed to prefetch source", source=str(source), exc_info=True)
+            discard(copy)
+            PREFETCHES.labels(outcome="failed").inc()
+            return None
+
+        logger.info(
+            "prefetched source",
+            size=size,
+            elapsed_seconds=round(time.monotonic() - started, 1),
+        )
+        PREFETCHES.labels(outcome="completed").inc()
+        return copy
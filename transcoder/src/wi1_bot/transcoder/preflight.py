@@ -0,0 +1,44 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Estimate:
+    """A transcode's outcome, extrapolated from a preflight's sample encodes."""
+
+    source_size: int  # bytes
+    projected_size: int  # bytes
+    projected_seconds: float  # wall-clock time of the full encode
+
+    @property
+    def savings(self) -> float:
+        """The fraction of the source's size the transcode is projected to save."""
+        return 1 - self.projected_size / self.source_size if self.source_size else 0.0
+
+
+def sample_starts(duration: float, samples: int, sample_duration: float) -> list[float]:
+    """Where to take ``samples`` evenly spaced samples of a ``duration`` long source.
+
+    Centered in equal parts of the source, so the intro and credits (which encode
+    unlike the rest) weigh no more than anything else. Empty if the source is too
+    short to sample.
+    """
+    if duration < samples * sample_duration * 2:
+        return []
+    part = duration / samples
+    return [round(part * (i + 0.5) - sample_duration / 2, 6) for i in range(samples)]
+
+
+def extrapolate(
+    sample_sizes: list[int],
+    sample_seconds: list[float],
+    sample_duration: float,
+    duration: float,
+    source_size: int,
+) -> Estimate:
+    """The full encode's size and time, scaled up from the samples'."""
+    scale = duration / (sample_duration * len(sample_sizes))
+    return Estimate(
+        source_size=source_size,
+        projected_size=round(sum(sample_sizes) * scale),
+        projected_seconds=sum(sample_seconds) * scale,
+    )
@@ -0,0 +1,123 @@
+import re
+from dataclasses import dataclass
+from typing import cast
+
+# keys ffmpeg writes with `-progress`; per-stream keys (stream_0_0_q) share a prefix
+_PROGRESS_KEYS = frozenset(
+    {
+        "frame",
+        "fps",
+        "bitrate",
+        "total_size",
+        "out_time_us",
+        "out_time_ms",
+        "out_time",
+        "dup_frames",
+        "drop_frames",
+        "speed",
+        "progress",
+    }
+)
+
+_KEY_PATTERN = rf"(?:{'|'.join(sorted(_PROGRESS_KEYS - {'progress'}))}|stream_\w+)"
+_PROGRESS_LINE = re.compile(rf"^({_KEY_PATTERN})=([^\r\n]*)(?:\r\n|\r|\n|$)", re.MULTILINE)
+_LINE_REST = re.compile(r"[^\r\n]*(?:\r\n|\r|\n|$)")
+# a non-blank line of ffmpeg's other output, after the \n (or the \r of a status line)
+# before it; starting with a character class keeps the search itself in C
+OTHER_LINE = re.compile(rf"[\r\n][^\S\r\n]*(?!(?:{_KEY_PATTERN}|progress)=)(\S[^\r\n]*)")
+
+
+def _block_end(text: str, stop: int) -> tuple[int, int] | None:
+    # the last `progress=` line starting before stop: where it starts, and where it ends
+    start = text.rfind("progress=", 0, stop)
+    while start > 0 and text[start - 1] not in "\r\n":
+        start = text.rfind("progress=", 0, start)
+    if start < 0:
+        return None
+    return start, cast(re.Match[str], _LINE_REST.match(text, start)).end()
+
+
+@dataclass(frozen=True)
+class ProgressSnapshot:
+    """One complete ``-progress`` block of the running ffmpeg attempt."""
+
+    out_time: float  # seconds of media written so far
+    fps: float | None
+    speed: float | None  # multiple of realtime
+    total_size: int | None  # bytes written to the output so far
+    duration: float | None  # the source's duration, so the webhook can estimate an ETA
+
+
+def _float(value: str | None) -> float | None:
+    if value is None:
+        return None
+    try:
+        return float(value.strip().removesuffix("x"))
+    except ValueError:  # "N/A" before the first frame is written
+        return None
+
+
+class FfmpegProgress:
+    """Machine-readable progress of the running ffmpeg attempt.
+
+    ffmpeg writes ``key=value`` lines in blocks terminated by a ``progress=`` line.
+    Each finished block is published as :attr:`latest` in one assignment, so the
+    heartbeat thread reading it never sees a half-parsed block.
+    """
+
+    def __init__(self) -> None:
+        self.duration: float | None = None
+        self.latest: ProgressSnapshot | None = None
+        self._pending: dict[str, str] = {}
+
+    def reset(self, duration: float | None) -> None:
+        """Start tracking a new attempt of a source ``duration`` seconds long."""
+        self.duration = duration
+        self.latest = None
+        self._pending = {}
+
+    def feed(self, line: str) -> bool:
+        """Consume one line of ffmpeg output; returns whether it was a progress line."""
+        key, sep, value = line.strip().partition("=")
+        if not sep or (key not in _PROGRESS_KEYS and not key.startswith("stream_")):
+            return False
+
+        if key != "progress":
+            self._pending[key] = value
+            return True
+
+        self._publish()
+        return True
+
+    def feed_text(self, text: str) -> None:
+        """Consume the progress lines in ``text`` (whole lines).
+
+        Block ends are found from the end of ``text``, and only the newest complete
+        block (and the start of the next one) is parsed, so a chunk of output holding
+        many blocks, or much other output, costs little more than one search of it.
+        """
+        last = _block_end(text, len(text))
+        if last is None:
+            self._pending.update(_PROGRESS_LINE.findall(text))
+            return
+
+        start, end = last
+        previous = _block_end(text, start)
+        if previous is not None:
+            # blocks before the second-to-last are superseded by the newest one
+            self._pending = {}
+        self._pending.update(_PROGRESS_LINE.findall(text, previous[1] if previous else 0, start))
+        self._publish()
+        self._pending = dict(_PROGRESS_LINE.findall(text, end))
+
+    def _publish(self) -> None:
+        block, self._pending = self._pending, {}
+        out_time_us = _float(block.get("out_time_us"))
+        total_size = _float(block.get("total_size"))
+        self.latest = ProgressSnapshot(
+            out_time=max(out_time_us or 0, 0) / 1_000_000,
+            fps=_float(block.get("fps")),
+            speed=_float(block.get("speed")),
+            total_size=int(total_size) if total_size is not None else None,
+            duration=self.duration,
+        )
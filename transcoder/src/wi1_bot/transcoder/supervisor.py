@@ -0,0 +1,97 @@
+import subprocess
+import threading
+import time
+from collections.abc import Callable
+from typing import Literal
+
+from wi1_bot.transcoder.config import SupervisorConfig
+
+from .progress import FfmpegProgress
+
+Abort = Literal["stalled", "stalled_at_start", "oversized", "too_slow"]
+
+# how often the running attempt is checked; limits are minutes, so this is plenty
+CHECK_INTERVAL = 5.0
+
+
+class Supervisor:
+    """Watches a running ffmpeg attempt's progress and kills it if it goes wrong.
+
+    The heartbeat keeps a job's lease alive whatever ffmpeg is doing, so without this
+    a hung hardware decoder or an encode crawling at 0.01x holds a worker for days.
+    The attempt is killed when its output stops advancing for ``stall_timeout``, when
+    it runs ``max_runtime_ratio`` times longer than the media, or when its output is
+    projected to end up larger than ``size_limit`` bytes. :attr:`aborted` then says
+    why.
+    """
+
+    def __init__(
+        self,
+        proc: subprocess.Popen[bytes],
+        progress: FfmpegProgress,
+        limits: SupervisorConfig,
+        *,
+        size_limit: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.proc = proc
+        self.progress = progress
+        self.limits = limits
+        self.size_limit = size_limit
+        self.clock = clock
+        self.aborted: Abort | None = None
+
+        self._started = self._advanced = clock()
+        self._out_time = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+
+    def __enter__(self) -> "Supervisor":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(CHECK_INTERVAL):
+            if (aborted := self.check()) is not None:
+                # only an ffmpeg still running is killed, and reported as aborted
+                if self.proc.poll() is None:
+                    self.aborted = aborted
+                    self.proc.kill()
+                return
+
+    def check(self) -> Abort | None:
+        """Why the attempt should be killed now, if it should."""
+        now = self.clock()
+        latest = self.progress.latest
+        if latest is not None and latest.out_time > self._out_time:
+            self._out_time = latest.out_time
+            self._advanced = now
+
+        stall_timeout = self.limits.stall_timeout
+        if stall_timeout is not None and now - self._advanced > stall_timeout:
+            return "stalled" if self._out_time > 0 else "stalled_at_start"
+
+        duration = self.progress.duration
+        if not duration:
+            return None
+
+        ratio = self.limits.max_runtime_ratio
+        if ratio is not None and now - self._started > max(ratio * duration, stall_timeout or 0):
+            return "too_slow"
+
+        check_after = self.limits.size_check_after
+        if (
+            check_after is not None
+            and self.size_limit is not None
+            and latest is not None
+            and latest.total_size
+            and latest.out_time >= check_after * duration
+            and latest.total_size / latest.out_time * duration > self.size_limit
+        ):
+            return "oversized"
+
+        return None
@@ -1,9 +1,14 @@
+import dataclasses
+import functools
 import os
 import re
 import shlex
 import shutil
 import subprocess
 import tempfile
+import threading
+import time
+from collections.abc import Callable, Mapping
 from dataclasses import dataclass
 from enum import Enum, auto
 from pathlib import Path
@@ -12,11 +17,25 @@ from typing import Literal
 import structlog
 
 from wi1_bot.transcoder import __version__
-from wi1_bot.transcoder.config import config
+from wi1_bot.transcoder.config import CopyRule, PreflightConfig, TranscodingProfile, config
 from wi1_bot.transcoder.languages import keep_original_language
-from wi1_bot.transcoder.paths import replace_remote_paths
-
-from .ffprobe import FfprobeException, Stream, ffprobe
+from wi1_bot.transcoder.paths import replace_remote_paths, staging_dir
+
+from .capture import capture_output
+from .checkpoints import (
+    checkpoint_dir,
+    checkpoint_segment,
+    load_plan,
+    remove_orphaned_partials,
+    save_plan,
+)
+from .cpu import core_list
+from .failures import FailureMemory, classify_error, source_signature
+from .ffprobe import FfprobeException, FfprobeResult, Stream, ffprobe, keyframe_times
+from .finalize import finalize_output
+from .preflight import Estimate, extrapolate, sample_starts
+from .progress import FfmpegProgress
+from .supervisor import Abort, Supervisor
 
 # https://github.com/Radarr/Radarr/blob/e29be26fc9a5570bdf37a1b9504b3c0162be7715/src/NzbDrone.Core/Parser/Parser.cs#L134
 CLEAN_RELEASE_GROUP_REGEX = re.compile(
@@ -36,6 +55,27 @@ class TranscodeResult(Enum):
     FAILED = auto()  # unhandled failure, eligible for a fallback attempt
 
 
+_SHUTDOWN = "transcode interrupted by worker shutdown"
+
+_IONICE_CLASSES = {"best-effort": "2", "idle": "3"}
+
+# how an attempt the supervisor killed is handled: a stall after progress is likely
+# transient (a GPU reset, a stuck mount), one before any is the source or parameters,
+# which the fallback attempt may get past
+_ABORTS: dict[Abort, tuple[TranscodeResult, str]] = {
+    "stalled": (TranscodeResult.RETRY, "killed ffmpeg because it stopped making progress"),
+    "stalled_at_start": (
+        TranscodeResult.FAILED,
+        "killed ffmpeg because it made no progress after starting",
+    ),
+    "too_slow": (TranscodeResult.FAILED, "killed ffmpeg because it exceeded its max runtime"),
+    "oversized": (
+        TranscodeResult.SKIP,
+        "killed ffmpeg because its output is projected to be larger than the source",
+    ),
+}
+
+
 @dataclass(frozen=True)
 class TranscodeParams:
     """Concrete ffmpeg parameters for a single transcode attempt.
@@ -49,16 +89,52 @@ class TranscodeParams:
     video_params: str | None = None
     audio_params: str | None = None
     hwaccel: str | None = None
+    copy_video: CopyRule | None = None  # copy the main video stream if it meets this
+    copy_audio: CopyRule | None = None  # copy each audio stream that meets this
+    # where and how ffmpeg runs: the job's cores (and as many threads), the profile's
+    # CPU niceness and I/O class
+    cores: tuple[int, ...] | None = None
+    nice: int | None = None
+    ionice: Literal["best-effort", "idle"] | None = None
 
 
 @dataclass
 class JobResult:
     """What the worker should report back to the webhook for a job."""
 
-    action: Literal["complete", "skip", "retry", "fail"]
+    action: Literal["complete", "skip", "retry", "fail", "split"]
     filename: str | None = None  # for "complete": the transcoded file's name
     reason: str | None = None  # for "retry"/"fail": a short human-readable reason
-    log_tail: str | None = None  # for "fail": the last line of ffmpeg output
+    log_tail: str | None = None  # for "fail": the last lines of ffmpeg output
+    # for "complete": how long moving the output into place took, and how it was done
+    finalize_seconds: float | None = None
+    finalize_method: Literal["rename", "copy"] | None = None
+    # for "split": (start, end) seconds of each segment; the last runs to the end
+    segments: list[tuple[float, float | None]] | None = None
+
+
+def _unskippable(result: JobResult) -> JobResult:
+    if result.action != "skip":
+        return result
+    return JobResult("fail", reason="segment could not be encoded, so its job can't be assembled")
+
+
+def worker_tmp_dir() -> Path:
+    """The worker's directory for in-progress transcodes and other worker state."""
+    return config.worker.tmp_dir or (Path(tempfile.gettempdir()) / "wi1-bot")
+
+
+def segment_path(segment_dir: Path, job_id: int, index: int) -> Path:
+    """Where segment ``index`` of split job ``job_id`` is encoded to."""
+    return segment_dir / str(job_id) / f"{index:05}.mkv"
+
+
+def write_concat_list(segment_dir: Path, segments: list[Path]) -> Path:
+    """An ffmpeg concat demuxer list of ``segments``, in ``segment_dir``."""
+    # relative to the list, so the segment directory's path needs no escaping
+    concat_list = segment_dir / "segments.txt"
+    concat_list.write_text("".join(f"file '{segment.name}'\n" for segment in segments))
+    return concat_list
 
 
 def sanitize_file_stem(stem: str) -> str:
@@ -69,73 +145,85 @@ def sanitize_file_stem(stem: str) -> str:
     return stem
 
 
-def build_ffmpeg_command(params: TranscodeParams, transcode_to: Path | str) -> list[str]:
-    command = [
-        "ffmpeg",
-        "-hide_banner",
-        "-y",
-    ]
+@dataclass(frozen=True)
+class OutputStream:
+    """One stream of the transcoded file: its source stream and how it's encoded."""
 
-    if params.hwaccel:
-        command.extend(["-hwaccel", params.hwaccel])
-        command.extend(["-hwaccel_output_format", params.hwaccel])
+    kind: Literal["v", "a", "s"]
+    source: str  # -map specifier of the source stream
+    params: str  # ffmpeg options without stream specifiers, e.g. "-c copy"
 
-    command.extend(["-probesize", "100M"])
-    command.extend(["-analyzeduration", "250M"])
 
-    command.extend(["-i", params.path])
+def _tag(tags: Mapping[str, object] | None, key: str) -> str | None:
+    # Matroska stores custom tags in upper case (PARAMS, WI1_BOT_VERSION)
+    for name, value in (tags or {}).items():
+        if name.lower() == key:
+            return str(value)
+    return None
 
-    command.extend(["-metadata", f"wi1_bot_version={__version__}"])
 
-    langs: list[str] = []
+def _bit_rate(stream: Stream) -> int | None:
+    # Matroska has no per-stream bit_rate, but mkvmerge/ffmpeg write a BPS tag
+    value = stream.get("bit_rate") or _tag(stream.get("tags"), "bps")
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
 
-    if params.languages:
-        langs = [lang.strip() for lang in params.languages.split(",")]
 
-    info = ffprobe(params.path)
-    streams = info["streams"]
+def meets_copy_rule(stream: Stream, rule: CopyRule | None) -> bool:
+    """Whether ``stream`` already meets the profile's target, so it can be copied.
 
-    command.extend(["-map", "0:v:0"])
+    A limit the stream doesn't report (e.g. no bit rate) counts as not met.
+    """
+    if rule is None or stream.get("codec_name") not in rule.codecs:
+        return False
 
-    if params.video_params:
-        parts = shlex.split(params.video_params)
+    limits = [
+        (rule.max_bit_rate, _bit_rate(stream)),
+        (rule.max_channels, stream.get("channels")),
+        (rule.max_height, stream.get("height")),
+    ]
+    return all(actual is not None and actual <= limit for limit, actual in limits if limit)
 
-        for param in parts:
-            if param.startswith("-"):
-                command.append(f"{param}:v:0")
-            else:
-                command.append(param)
 
-        command.extend(["-metadata:s:v:0", f"params={params.video_params}"])
-    else:
-        command.extend(["-c:v:0", "copy"])
-        command.extend(["-metadata:s:v:0", "params=-c copy"])
+def _language(stream: Stream) -> str | None:
+    return stream.get("tags", {}).get("language")
+
+
+def plan_streams(params: TranscodeParams, info: FfprobeResult) -> list[OutputStream]:
+    """The streams of the transcoded file, in output order."""
+    langs: set[str] = set()
+
+    if params.languages:
+        langs = {lang.strip() for lang in params.languages.split(",")}
+
+    streams = info["streams"]
+
+    main_video = next((s for s in streams if s["codec_type"] == "video"), None)
+    video_params = params.video_params or "-c copy"
+    if main_video is not None and meets_copy_rule(main_video, params.copy_video):
+        video_params = "-c copy"
 
-    vindex = 0
-    aindex = 0
-    sindex = 0
+    plan = [OutputStream("v", "0:v:0", video_params)]
 
     video_streams: list[Stream] = []
-    audio_streams: list[Stream] = []
+    # each with its language, looked up once
+    audio_streams: list[tuple[Stream, str | None]] = []
     subtitle_streams: list[Stream] = []
 
     for stream in streams:
         if stream["codec_type"] == "video":
             # already mapped main video stream above
-            if vindex == 0:
-                vindex += 1
+            if stream is main_video:
                 continue
 
             video_streams.append(stream)
         elif stream["codec_type"] == "audio":
-            audio_streams.append(stream)
+            audio_streams.append((stream, _language(stream)))
         elif stream["codec_type"] == "subtitle":
             # keep only streams that match specified languages
-            if langs and (
-                "tags" not in stream
-                or "language" not in stream["tags"]
-                or stream["tags"]["language"] not in langs
-            ):
+            if langs and _language(stream) not in langs:
                 continue
 
             # no codec specified, happens with some release groups
@@ -145,68 +233,248 @@ def build_ffmpeg_command(params: TranscodeParams, transcode_to: Path | str) -> l
             subtitle_streams.append(stream)
 
     for stream in video_streams:
-        command.extend(["-map", f"0:{stream['index']}"])
-        command.extend([f"-c:v:{vindex}", "copy"])
-
-        command.extend([f"-metadata:s:v:{vindex}", "params=-c copy"])
-        vindex += 1
+        plan.append(OutputStream("v", f"0:{stream['index']}", "-c copy"))
 
-    audio_streams.sort(
-        key=lambda s: (
-            0 if "tags" in s and "language" in s["tags"] and s["tags"]["language"] in langs else 1
-        )
-    )
+    # matching languages first; the sort is stable, so otherwise in source order
+    audio_streams.sort(key=lambda s: 0 if s[1] in langs else 1)
 
-    audio_has_matching_lang = any(
-        "tags" not in s or "language" not in s["tags"] or s["tags"]["language"] in langs
-        for s in audio_streams
-    )
+    audio_has_matching_lang = any(lang is None or lang in langs for _, lang in audio_streams)
 
-    for stream in audio_streams:
+    for stream, lang in audio_streams:
         # keep matching languages and streams with no language specified
-        if (
-            audio_has_matching_lang
-            and langs
-            and "tags" in stream
-            and "language" in stream["tags"]
-            and stream["tags"]["language"] not in langs
-        ):
+        if audio_has_matching_lang and langs and lang is not None and lang not in langs:
             continue
 
-        command.extend(["-map", f"0:{stream['index']}"])
+        audio_params = params.audio_params or "-c copy"
+        if meets_copy_rule(stream, params.copy_audio):
+            audio_params = "-c copy"
+
+        plan.append(OutputStream("a", f"0:{stream['index']}", audio_params))
+
+    for stream in subtitle_streams:
+        codec = "copy"
+        if "codec_name" in stream and stream["codec_name"] == "mov_text":
+            codec = "subrip"
+
+        plan.append(OutputStream("s", f"0:{stream['index']}", f"-c {codec}"))
+
+    return plan
+
+
+def nothing_to_transcode(params: TranscodeParams, info: FfprobeResult) -> bool:
+    """Whether transcoding would only remux ``info``'s streams into the same container.
+
+    That is, the source is already Matroska, every stream would be copied and none
+    would be dropped.
+    """
+    if "matroska" not in info.get("format", {}).get("format_name", "").split(","):
+        return False
+
+    plan = plan_streams(params, info)
+    kept_types = {"video", "audio", "subtitle"}
+    return all(out.params == "-c copy" for out in plan) and len(plan) == sum(
+        stream["codec_type"] in kept_types for stream in info["streams"]
+    )
 
-        if params.audio_params:
-            parts = shlex.split(params.audio_params)
 
-            for param in parts:
-                if param.startswith("-"):
-                    command.append(f"{param}:a:{aindex}")
-                else:
-                    command.append(param)
+def _source_size(params: TranscodeParams) -> int | None:
+    # a transcode that ends up larger than its source is thrown away anyway
+    try:
+        return Path(params.path).stat().st_size
+    except OSError:
+        return None
+
+
+def _launcher(params: TranscodeParams) -> list[str]:
+    # each execs the next, so ffmpeg keeps the pid the worker started (and signals)
+    command = []
+    if params.cores is not None:
+        command.extend(["taskset", "--cpu-list", core_list(params.cores)])
+    if params.nice is not None:
+        command.extend(["nice", "-n", str(params.nice)])
+    if params.ionice is not None:
+        command.extend(["ionice", "-c", _IONICE_CLASSES[params.ionice]])
+    return command
+
+
+def _threads(params: TranscodeParams) -> list[str]:
+    # without cores of its own, ffmpeg picks a thread count from all of the host's
+    return ["-threads", str(len(params.cores))] if params.cores is not None else []
+
+
+def _ffmpeg_input_options(params: TranscodeParams) -> list[str]:
+    command = [
+        *_launcher(params),
+        "ffmpeg",
+        "-hide_banner",
+        "-y",
+        # machine-readable progress on stdout instead of the human status line
+        "-nostats",
+        "-progress",
+        "pipe:1",
+        "-stats_period",
+        "5",
+    ]
+
+    if params.hwaccel:
+        command.extend(["-hwaccel", params.hwaccel])
+        command.extend(["-hwaccel_output_format", params.hwaccel])
+
+    command.extend(["-probesize", "100M"])
+    command.extend(["-analyzeduration", "250M"])
 
-            command.extend([f"-metadata:s:a:{aindex}", f"params={params.audio_params}"])
+    if params.cores is not None:
+        command.extend(["-filter_threads", str(len(params.cores))])
+    # as an input option: the decoders' threads
+    command.extend(_threads(params))
+
+    return command
+
+
+@functools.lru_cache(maxsize=64)
+def _split_params(params: str) -> tuple[str, ...]:
+    # a profile's few params strings repeat for every audio/subtitle stream
+    return tuple(shlex.split(params))
+
+
+def _stream_options(kind: str, index: int, params: str) -> list[str]:
+    return [
+        f"{param}:{kind}:{index}" if param.startswith("-") else param
+        for param in _split_params(params)
+    ]
+
+
+def build_ffmpeg_command(
+    params: TranscodeParams,
+    transcode_to: Path | str,
+    info: FfprobeResult | None = None,
+    *,
+    video_from: Path | None = None,
+) -> list[str]:
+    """The ffmpeg command transcoding ``params.path`` into ``transcode_to``.
+
+    With ``video_from`` (a concat list of a split job's encoded segments), the main
+    video is copied from the segments instead of encoded from the source.
+    """
+    command = _ffmpeg_input_options(params)
+
+    command.extend(["-i", params.path])
+
+    if video_from is not None:
+        command.extend(["-f", "concat", "-safe", "0", "-i", str(video_from)])
+
+    command.extend(["-metadata", f"wi1_bot_version={__version__}"])
+
+    if info is None:
+        info = ffprobe(params.path)
+
+    counts = {"v": 0, "a": 0, "s": 0}
+
+    for out in plan_streams(params, info):
+        index = counts[out.kind]
+        counts[out.kind] += 1
+
+        if video_from is not None and out.source == "0:v:0":
+            command.extend(["-map", "1:v:0"])
+            command.extend(_stream_options(out.kind, index, "-c copy"))
         else:
-            command.extend([f"-c:a:{aindex}", "copy"])
-            command.extend([f"-metadata:s:a:{aindex}", "params=-c copy"])
+            command.extend(["-map", out.source])
+            command.extend(_stream_options(out.kind, index, out.params))
 
-        aindex += 1
+        # tagged with the profile's params either way, for already_transcoded()
+        command.extend([f"-metadata:s:{out.kind}:{index}", f"params={out.params}"])
 
-    for stream in subtitle_streams:
-        command.extend(["-map", f"0:{stream['index']}"])
+    # as an output option: the encoders' threads
+    command.extend(_threads(params))
+
+    # the output may be staged under a name ffmpeg can't infer the format from
+    command.extend(["-f", "matroska", str(transcode_to)])
+
+    return command
+
+
+def build_sample_command(
+    params: TranscodeParams,
+    start: float,
+    duration: float,
+    transcode_to: Path | str,
+    info: FfprobeResult,
+) -> list[str]:
+    """The full transcode's command, limited to ``duration`` seconds from ``start``."""
+    command = build_ffmpeg_command(params, transcode_to, info)
+    # -ss as an input option seeks to the keyframe before start, then decodes up to it
+    at = command.index("-i")
+    command[at:at] = ["-ss", f"{start:.6f}"]
+    command[-3:-3] = ["-t", f"{duration:.6f}"]
+    return command
 
-        codec = "copy"
-        if "codec_name" in stream and stream["codec_name"] == "mov_text":
-            codec = "subrip"
-        command.extend([f"-c:s:{sindex}", codec])
 
-        command.extend([f"-metadata:s:s:{sindex}", f"params=-c {codec}"])
-        sindex += 1
+def build_segment_command(
+    params: TranscodeParams,
+    start: float,
+    end: float | None,
+    transcode_to: Path | str,
+) -> list[str]:
+    """The ffmpeg command encoding the main video of ``[start, end)`` of a split job.
+
+    ``start`` is a keyframe, so seeking the input to it is exact and consecutive
+    segments concatenate without gaps or repeated frames.
+    """
+    command = _ffmpeg_input_options(params)
+
+    if start:
+        command.extend(["-ss", f"{start:.6f}"])
+
+    command.extend(["-i", params.path])
+
+    if end is not None:
+        command.extend(["-t", f"{end - start:.6f}"])
+
+    command.extend(["-map", "0:v:0"])
+    command.extend(_stream_options("v", 0, params.video_params or "-c copy"))
+    command.extend(["-an", "-sn", "-dn"])
+    command.extend(_threads(params))
 
     command.extend([str(transcode_to)])
 
     return command
 
 
+def already_transcoded(info: FfprobeResult, *candidates: TranscodeParams) -> bool:
+    """Whether ``info`` describes a file wi1-bot produced with one of ``candidates``.
+
+    The file must carry a ``wi1_bot_version`` tag (from any version, so upgrading
+    doesn't re-encode the library), and its streams must be exactly the ones the
+    candidate's command would keep, each tagged with the params it would use. A
+    stream the copy rules would copy may also carry the profile's own params: our
+    output meets the rules it was encoded to, so it'd be copied if encoded again.
+    """
+    if _tag(info.get("format", {}).get("tags"), "wi1_bot_version") is None:
+        return False
+
+    stream_types = {"video": "v", "audio": "a", "subtitle": "s"}
+    actual = []
+    for stream in info["streams"]:
+        if stream["codec_type"] not in stream_types:
+            return False
+        kind = stream_types[stream["codec_type"]]
+        value = _tag(stream.get("tags"), "params")
+        if kind == "s" and value == "-c subrip" and stream.get("codec_name") == "subrip":
+            # a mov_text track we converted is subrip now, so the command would copy it
+            value = "-c copy"
+        actual.append((kind, value))
+
+    def matches(params: TranscodeParams) -> bool:
+        plan = plan_streams(params, info)
+        uncopied = plan_streams(dataclasses.replace(params, copy_video=None, copy_audio=None), info)
+        return len(plan) == len(actual) and all(
+            kind == out.kind and value in (out.params, encoded.params)
+            for (kind, value), out, encoded in zip(actual, plan, uncopied, strict=True)
+        )
+
+    return any(matches(params) for params in candidates)
+
+
 class Transcoder:
     """Runs a single transcode job and reports what the webhook should do with it.
 
@@ -214,15 +482,33 @@ class Transcoder:
     post-transcode rescan and failure notifications.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, failure_memory: FailureMemory | None = None) -> None:
         self.logger = structlog.get_logger(__name__)
-
-    def transcode(
+        # sources a profile's primary attempt is known to fail on
+        self.failure_memory = failure_memory
+        # running ffmpeg processes, so a worker shutting down can stop them
+        self._running: set[subprocess.Popen[bytes]] = set()
+        self._lock = threading.Lock()
+        self._stopping = False
+
+    def terminate(self) -> None:
+        """Stop running ffmpeg and don't start it again; their attempts end in RETRY."""
+        with self._lock:
+            self._stopping = True
+            for proc in self._running:
+                proc.terminate()
+
+    def _resolve(
         self,
         job_path: str,
         quality_profile: str,
         original_language: str | None,
-    ) -> JobResult:
+        cores: tuple[int, ...] | None = None,
+    ) -> tuple[Path, TranscodingProfile, TranscodeParams] | JobResult:
+        """Map a job to its local source and the profile's params, or why to skip it.
+
+        ``cores`` are the ones the worker set aside for the job, if it pins jobs.
+        """
         if quality_profile not in config.transcoding.profiles:
             self.logger.info(
                 "skipping transcode for unknown quality profile",
@@ -254,14 +540,6 @@ class Transcoder:
             # don't strip a foreign-language title's original audio/subtitle tracks
             languages = keep_original_language(languages, original_language)
 
-        tmp_folder = config.worker.tmp_dir or (Path(tempfile.gettempdir()) / "wi1-bot")
-        tmp_folder.mkdir(parents=True, exist_ok=True)
-
-        stem = sanitize_file_stem(path.stem)
-        transcode_to = tmp_folder / f"{stem}-TRANSCODED.mkv"
-
-        tmp_log_path = tmp_folder / "wi1_bot.transcoder.log"
-
         # hwaccel is per-profile/per-fallback; omitting it means no hardware
         # acceleration, so the fallback can decode in software to recover from a
         # hardware-decoding failure
@@ -271,60 +549,452 @@ class Transcoder:
             video_params=profile.video_params,
             audio_params=profile.audio_params,
             hwaccel=profile.hwaccel,
+            copy_video=profile.copy_video,
+            copy_audio=profile.copy_audio,
+            cores=cores,
+            nice=profile.nice,
+            ionice=profile.ionice,
         )
 
+        return path, profile, params
+
+    def transcode(
+        self,
+        job_path: str,
+        quality_profile: str,
+        original_language: str | None,
+        progress: FfmpegProgress | None = None,
+        on_estimate: Callable[[Estimate], None] | None = None,
+        source: Path | None = None,
+        cores: tuple[int, ...] | None = None,
+    ) -> JobResult:
+        """Transcode a job's source and move the result into place.
+
+        With a profile ``preflight``, its projection is passed to ``on_estimate``
+        before the transcode (or skip) goes ahead. ``source`` is a local copy of the
+        job's file (prefetched by the worker) for ffmpeg to read instead. ffmpeg runs
+        on ``cores``, if given.
+        """
+        resolved = self._resolve(job_path, quality_profile, original_language, cores)
+        if isinstance(resolved, JobResult):
+            return resolved
+        path, profile, params = resolved
+
+        if source is not None:
+            # probed at the job's path (cached while the job was reserved); only
+            # ffmpeg reads the copy, and the output still replaces the job's file
+            params = dataclasses.replace(params, path=str(source))
+
+        tmp_folder = worker_tmp_dir()
+        tmp_folder.mkdir(parents=True, exist_ok=True)
+
+        stem = sanitize_file_stem(path.stem)
+        transcode_to = self._output_path(path)
+
+        # per job, since a worker with several slots runs transcodes side by side
+        tmp_log_path = tmp_folder / f"{stem}.wi1_bot.transcoder.log"
+
+        fallback_params = None
+        if profile.fallback is not None:
+            fallback_params = dataclasses.replace(
+                params,
+                video_params=profile.fallback.video_params,
+                audio_params=profile.fallback.audio_params,
+                hwaccel=profile.fallback.hwaccel,
+            )
+
         try:
-            result, status, last_output = self._run_ffmpeg(params, transcode_to, tmp_log_path)
-            failure_log_path = None
-            if result in {TranscodeResult.FAILED, TranscodeResult.RETRY}:
-                failure_log_path = self._save_failure_log(
-                    path, tmp_folder, tmp_log_path, attempt="primary"
+            # probed once; the tags decide whether to run at all, and both attempts
+            # build their command from the same streams
+            info = ffprobe(path)
+
+            candidates = [params] if fallback_params is None else [params, fallback_params]
+            if already_transcoded(info, *candidates):
+                self.logger.info(
+                    "skipping transcode because file is already transcoded",
+                    filename=path.name,
                 )
+                return JobResult("skip")
 
-            if result is TranscodeResult.FAILED and profile.fallback is not None:
-                self.logger.warning(
-                    "transcode failed; retrying with fallback parameters",
+            if nothing_to_transcode(params, info):
+                self.logger.info(
+                    "skipping transcode because every stream already meets the profile",
+                    filename=path.name,
+                )
+                return JobResult("skip")
+
+            if profile.preflight is not None:
+                estimate = self._preflight(params, profile.preflight, info)
+                if estimate is not None:
+                    if on_estimate is not None:
+                        on_estimate(estimate)
+                    if estimate.savings < profile.preflight.min_savings:
+                        self.logger.info(
+                            "skipping transcode because projected savings are too small",
+                            filename=path.name,
+                            projected_savings=round(estimate.savings, 3),
+                        )
+                        return JobResult("skip")
+
+            if segments := self._plan_segments(params, info):
+                self.logger.info(
+                    "splitting transcode into segments",
                     filename=path.name,
+                    segments=len(segments),
                 )
+                return JobResult("split", segments=segments)
 
-                fallback = profile.fallback
+            signature = source_signature(quality_profile, info)
+            known_error = None
+            if fallback_params is not None and self.failure_memory and signature:
+                known_error = self.failure_memory.get(signature)
 
-                fallback_params = TranscodeParams(
-                    path=str(path),
-                    languages=languages,
-                    video_params=fallback.video_params,
-                    audio_params=fallback.audio_params,
-                    hwaccel=fallback.hwaccel,
+            failure_log_path = None
+            primary_error = None
+            if known_error is not None:
+                self.logger.info(
+                    "skipping primary attempt known to fail on this kind of source",
+                    filename=path.name,
+                    error=known_error,
                 )
+                result = TranscodeResult.FAILED
+            else:
+                result, status, last_output = self._run_ffmpeg(
+                    params, transcode_to, tmp_log_path, info=info, job_file=path, progress=progress
+                )
+                if result in {TranscodeResult.FAILED, TranscodeResult.RETRY}:
+                    failure_log_path = self._save_failure_log(
+                        path, tmp_folder, tmp_log_path, attempt="primary"
+                    )
+                if result is TranscodeResult.FAILED:
+                    primary_error = classify_error(last_output)
+
+            if result is TranscodeResult.FAILED and fallback_params is not None:
+                if known_error is None:
+                    self.logger.warning(
+                        "transcode failed; retrying with fallback parameters",
+                        filename=path.name,
+                    )
 
                 result, status, last_output = self._run_ffmpeg(
-                    fallback_params, transcode_to, tmp_log_path
+                    fallback_params,
+                    transcode_to,
+                    tmp_log_path,
+                    info=info,
+                    job_file=path,
+                    progress=progress,
                 )
                 if result in {TranscodeResult.FAILED, TranscodeResult.RETRY}:
                     failure_log_path = self._save_failure_log(
                         path, tmp_folder, tmp_log_path, attempt="fallback"
                     )
+                elif (
+                    result is TranscodeResult.SUCCESS
+                    and primary_error is not None
+                    and self.failure_memory
+                    and signature
+                ):
+                    # only the primary parameters failed, so the next source like this
+                    # one can skip them; a broken file fails both and isn't remembered
+                    self.failure_memory.put(signature, primary_error)
         except FfprobeException:
             self.logger.warning("ffprobe failed, will not retry", exc_info=True)
             return JobResult("fail", reason="ffprobe error")
 
-        if result is TranscodeResult.SKIP:
-            return JobResult("skip")
+        if result is not TranscodeResult.SUCCESS:
+            return self._failure(result, status, last_output, failure_log_path)
 
-        if result is TranscodeResult.RETRY:
-            return JobResult("retry", reason=last_output or "transcode interrupted")
+        return self._move_into_place(path, transcode_to)
+
+    def _preflight(
+        self,
+        params: TranscodeParams,
+        preflight: PreflightConfig,
+        info: FfprobeResult,
+    ) -> Estimate | None:
+        """Encode a few samples of the source to project the full transcode.
+
+        ``None`` if the source is too short to sample or a sample fails (the full
+        transcode then goes ahead and fails or not on its own). Samples track their
+        progress on their own, so the job's progress only ever reports the transcode.
+        """
+        path = Path(params.path)
+        duration = float(info.get("format", {}).get("duration") or 0)
+        starts = sample_starts(duration, preflight.samples, preflight.sample_duration)
+        if not starts:
+            return None
+
+        tmp_folder = worker_tmp_dir()
+        tmp_folder.mkdir(parents=True, exist_ok=True)
+        stem = sanitize_file_stem(path.stem)
+        tmp_log_path = tmp_folder / f"{stem}.preflight.wi1_bot.transcoder.log"
+
+        sizes: list[int] = []
+        seconds: list[float] = []
+        for index, start in enumerate(starts):
+            sample = tmp_folder / f"{stem}.sample{index}.mkv"
+            command = build_sample_command(params, start, preflight.sample_duration, sample, info)
+            started = time.monotonic()
+            result, _, _ = self._run_command(
+                command,
+                path,
+                sample,
+                tmp_log_path,
+                duration=preflight.sample_duration,
+            )
+            seconds.append(time.monotonic() - started)
+            try:
+                if result is not TranscodeResult.SUCCESS:
+                    self.logger.warning(
+                        "preflight sample failed; transcoding without an estimate",
+                        filename=path.name,
+                    )
+                    return None
+                sizes.append(sample.stat().st_size)
+            finally:
+                sample.unlink(missing_ok=True)
+
+        estimate = extrapolate(
+            sizes, seconds, preflight.sample_duration, duration, path.stat().st_size
+        )
+        self.logger.info(
+            "preflight estimate",
+            filename=path.name,
+            projected_size=estimate.projected_size,
+            projected_seconds=round(estimate.projected_seconds),
+            projected_savings=round(estimate.savings, 3),
+        )
+        return estimate
+
+    def _plan_segments(
+        self, params: TranscodeParams, info: FfprobeResult
+    ) -> list[tuple[float, float | None]] | None:
+        """Keyframe-aligned ``(start, end)`` segments to split a long encode into.
+
+        ``None`` unless splitting is configured and the source is long enough.
+        """
+        split = config.worker.split
+        duration = float(info.get("format", {}).get("duration") or 0)
+        if split is None or duration < split.min_duration:
+            return None
+
+        return self._keyframe_segments(params, info, split.segment_duration)
+
+    def _keyframe_segments(
+        self, params: TranscodeParams, info: FfprobeResult, segment_duration: float
+    ) -> list[tuple[float, float | None]] | None:
+        """The source's main video cut into ``segment_duration`` long segments.
+
+        Cut at the first keyframe past each multiple of the target. ``None`` if that
+        leaves a single segment, or the main video is copied (a copy gains nothing
+        from segmenting). Times are relative to the start of the file; the last
+        segment runs to the end.
+        """
+        if plan_streams(params, info)[0].params == "-c copy":
+            return None
+
+        duration = float(info.get("format", {}).get("duration") or 0)
+        start_time = float(info.get("format", {}).get("start_time") or 0)
+        # don't leave a short tail segment: the last one may run to 1.5x the target
+        count = max(round(duration / segment_duration), 1)
+        targets = [start_time + segment_duration * i for i in range(1, count)]
+        if not targets:
+            return None
+
+        try:
+            keyframes = keyframe_times(params.path, targets)
+        except FfprobeException:
+            self.logger.warning("could not find keyframes to split at", exc_info=True)
+            return None
+
+        bounds = [0.0]
+        for keyframe in keyframes:
+            if (start := round(keyframe - start_time, 6)) > bounds[-1]:
+                bounds.append(start)
+
+        if len(bounds) < 2:
+            return None
+
+        return list(zip(bounds, [*bounds[1:], None], strict=True))
+
+    def transcode_segment(
+        self,
+        job_path: str,
+        quality_profile: str,
+        parent_id: int,
+        index: int,
+        start: float,
+        end: float | None,
+        progress: FfmpegProgress | None = None,
+        cores: tuple[int, ...] | None = None,
+    ) -> JobResult:
+        """Encode the main video of ``[start, end)`` into the shared segment directory.
+
+        A segment is never skipped: its split job can't be assembled without it, so
+        what would skip a whole job fails the segment (and with it the split job).
+        """
+        if config.worker.split is None:
+            return JobResult("retry", reason="worker has no split.segment_dir for segments")
+
+        resolved = self._resolve(job_path, quality_profile, None, cores)
+        if isinstance(resolved, JobResult):
+            return _unskippable(resolved)
+        path, _, params = resolved
+
+        tmp_folder = worker_tmp_dir()
+        tmp_folder.mkdir(parents=True, exist_ok=True)
+        tmp_log_path = (
+            tmp_folder / f"{sanitize_file_stem(path.stem)}.{index:05}.wi1_bot.transcoder.log"
+        )
+
+        segment = segment_path(config.worker.split.segment_dir, parent_id, index)
+        segment.parent.mkdir(parents=True, exist_ok=True)
+        # written aside and renamed, so a segment is never assembled half-written
+        transcode_to = segment.with_suffix(".partial.mkv")
+
+        command = build_segment_command(params, start, end, transcode_to)
 
-        if result is TranscodeResult.FAILED:
-            assert failure_log_path is not None
+        duration = end - start if end is not None else None
 
-            self.logger.error("ffmpeg failed", status=status, last_output=last_output)
+        result, status, last_output = self._run_command(
+            command, path, transcode_to, tmp_log_path, duration=duration, progress=progress
+        )
+
+        if result is not TranscodeResult.SUCCESS:
+            failure_log_path = None
+            if result in {TranscodeResult.FAILED, TranscodeResult.RETRY}:
+                failure_log_path = self._save_failure_log(
+                    path, tmp_folder, tmp_log_path, attempt=f"segment-{index:05}"
+                )
+            return _unskippable(self._failure(result, status, last_output, failure_log_path))
+
+        if not transcode_to.exists():
+            # its split job failed for good meanwhile, and its segments were discarded
+            return JobResult("fail", reason="split job was dropped during the segment")
+
+        os.replace(transcode_to, segment)
+        self.logger.info("transcode segment completed", filename=path.name, segment=index)
 
+        return JobResult("complete", filename=segment.name)
+
+    def assemble(
+        self,
+        job_path: str,
+        quality_profile: str,
+        original_language: str | None,
+        job_id: int,
+        segment_count: int | None,
+        progress: FfmpegProgress | None = None,
+        cores: tuple[int, ...] | None = None,
+    ) -> JobResult:
+        """Mux a split job's encoded segments with the source's audio and subtitles.
+
+        Fails, leaving the source alone, unless every one of its ``segment_count``
+        segments was encoded.
+        """
+        if config.worker.split is None:
+            return JobResult("retry", reason="worker has no split.segment_dir to assemble from")
+
+        if not segment_count:
+            return JobResult("fail", reason="assemble job has no segment count")
+        segments = [
+            segment_path(config.worker.split.segment_dir, job_id, index)
+            for index in range(segment_count)
+        ]
+        segment_dir = segments[0].parent
+        missing = [segment.name for segment in segments if not segment.is_file()]
+        if missing:
             return JobResult(
                 "fail",
-                reason=f"ffmpeg failed (status {status}), log: {failure_log_path}",
-                log_tail=last_output,
+                reason=f"{len(missing)} of {segment_count} segments missing in {segment_dir}"
+                f" (first: {missing[0]})",
             )
 
+        resolved = self._resolve(job_path, quality_profile, original_language, cores)
+        if isinstance(resolved, JobResult):
+            return resolved
+        path, _, params = resolved
+
+        concat_list = write_concat_list(segment_dir, segments)
+
+        tmp_folder = worker_tmp_dir()
+        tmp_folder.mkdir(parents=True, exist_ok=True)
+
+        stem = sanitize_file_stem(path.stem)
+        transcode_to = self._output_path(path)
+        tmp_log_path = tmp_folder / f"{stem}.wi1_bot.transcoder.log"
+
+        try:
+            info = ffprobe(path)
+        except FfprobeException:
+            self.logger.warning("ffprobe failed, will not retry", exc_info=True)
+            return JobResult("fail", reason="ffprobe error")
+
+        # only the audio is decoded from the source, so there's nothing to accelerate
+        command = build_ffmpeg_command(
+            dataclasses.replace(params, hwaccel=None), transcode_to, info, video_from=concat_list
+        )
+        duration = info.get("format", {}).get("duration")
+
+        result, status, last_output = self._run_command(
+            command,
+            path,
+            transcode_to,
+            tmp_log_path,
+            duration=float(duration) if duration else None,
+            progress=progress,
+        )
+
+        if result is not TranscodeResult.SUCCESS:
+            failure_log_path = None
+            if result in {TranscodeResult.FAILED, TranscodeResult.RETRY}:
+                failure_log_path = self._save_failure_log(
+                    path, tmp_folder, tmp_log_path, attempt="assemble"
+                )
+            return self._failure(result, status, last_output, failure_log_path)
+
+        job_result = self._move_into_place(path, transcode_to)
+        shutil.rmtree(segment_dir, ignore_errors=True)
+        return job_result
+
+    def discard_segments(self, job_id: int) -> None:
+        """Remove the encoded segments of a split job that was dropped.
+
+        Nothing assembles them once the webhook drops the job (or one of its segments
+        fails for good), so they'd otherwise stay in the shared segment directory.
+        """
+        if config.worker.split is None:
+            return
+        segment_dir = segment_path(config.worker.split.segment_dir, job_id, 0).parent
+        if segment_dir.exists():
+            shutil.rmtree(segment_dir, ignore_errors=True)
+            self.logger.info("discarded segments of a failed split job", split_job_id=job_id)
+
+    def _failure(
+        self,
+        result: TranscodeResult,
+        status: int,
+        last_output: str,
+        failure_log_path: Path | None,
+    ) -> JobResult:
+        if result is TranscodeResult.SKIP:
+            return JobResult("skip")
+
+        if result is TranscodeResult.RETRY:
+            reason = last_output.splitlines()[-1] if last_output else "transcode interrupted"
+            return JobResult("retry", reason=reason)
+
+        assert failure_log_path is not None
+
+        self.logger.error("ffmpeg failed", status=status, last_output=last_output)
+
+        return JobResult(
+            "fail",
+            reason=f"ffmpeg failed (status {status}), log: {failure_log_path}",
+            log_tail=last_output,
+        )
+
+    def _move_into_place(self, path: Path, transcode_to: Path) -> JobResult:
         if not path.exists():
             self.logger.debug(
                 "source file disappeared; deleting transcoded file",
@@ -334,17 +1004,44 @@ class Transcoder:
             transcode_to.unlink(missing_ok=True)
             return JobResult("skip")
 
-        new_path = path.parent / transcode_to.name
-        shutil.move(transcode_to, new_path)
+        new_path = path.parent / f"{sanitize_file_stem(path.stem)}-TRANSCODED.mkv"
+        started = time.monotonic()
+        method = finalize_output(transcode_to, new_path)
+        finalize_seconds = time.monotonic() - started
         path.unlink()
 
         self.logger.info(
             "transcode completed",
             source_filename=path.name,
             destination_filename=new_path.name,
+            finalize_method=method,
+            finalize_seconds=round(finalize_seconds, 3),
         )
 
-        return JobResult("complete", filename=new_path.name)
+        return JobResult(
+            "complete",
+            filename=new_path.name,
+            finalize_seconds=finalize_seconds,
+            finalize_method=method,
+        )
+
+    def _output_path(self, path: Path) -> Path:
+        """Where the transcode of ``path`` is written while in progress.
+
+        Clears out the hidden partial outputs a worker stopped mid-write left next to
+        ``path`` (or in its staging directory), which startup recovery can't see.
+        """
+        stem = sanitize_file_stem(path.stem)
+        if config.worker.staging == "tmp_dir":
+            # a copy across filesystems is finished under a hidden name next to path
+            remove_orphaned_partials(path.parent)
+            return worker_tmp_dir() / f"{stem}-TRANSCODED.mkv"
+
+        # on the destination's filesystem, so finishing is a rename rather than a copy;
+        # hidden, with the suffix Radarr/Sonarr disk scans ignore
+        directory = staging_dir(path, config.general.remote_path_mappings) or path.parent
+        remove_orphaned_partials(directory, path.parent)
+        return directory / f".{stem}-TRANSCODED.mkv.partial~"
 
     def _save_failure_log(
         self,
@@ -352,11 +1049,11 @@ class Transcoder:
         tmp_folder: Path,
         tmp_log_path: Path,
         *,
-        attempt: Literal["primary", "fallback"],
+        attempt: str,
     ) -> Path:
         log_dir_str = os.getenv("WB_LOG_DIR")
         log_dir = Path(log_dir_str).resolve() if log_dir_str else tmp_folder.resolve()
-        suffix = "" if attempt == "primary" else "-fallback"
+        suffix = "" if attempt == "primary" else f"-{attempt}"
         failure_log_path = log_dir / "transcoder-errors" / f"{path.stem}{suffix}.log"
         failure_log_path.parent.mkdir(parents=True, exist_ok=True)
         shutil.copy(tmp_log_path, failure_log_path)
@@ -368,36 +1065,182 @@ class Transcoder:
         params: TranscodeParams,
         transcode_to: Path,
         tmp_log_path: Path,
+        *,
+        info: FfprobeResult,
+        job_file: Path,
+        progress: FfmpegProgress | None = None,
     ) -> tuple[TranscodeResult, int, str]:
         """Run ffmpeg for a single attempt and classify the outcome.
 
-        Writes the ffmpeg output to ``tmp_log_path`` (overwriting any previous
-        attempt's log) and returns the outcome, exit status and last output line.
+        Builds the command from the source's probe ``info`` and runs it with
+        :meth:`_run_command`, checkpointed if configured. Checkpoints are keyed by
+        ``job_file``, the job's own file, since ``params.path`` may be a prefetched
+        copy that's somewhere else next time.
+        """
+        checkpoint = config.worker.checkpoint
+        if checkpoint is not None:
+            directory = checkpoint_dir(
+                worker_tmp_dir() / "checkpoints",
+                job_file,
+                params.video_params,
+                params.hwaccel,
+            )
+            segments = load_plan(directory)
+            if segments is None:
+                segments = self._keyframe_segments(params, info, checkpoint.segment_duration)
+            if segments is not None:
+                save_plan(directory, job_file, segments)
+                return self._run_checkpointed(
+                    params, directory, segments, transcode_to, tmp_log_path, info, progress
+                )
+
+        command = build_ffmpeg_command(params, transcode_to, info)
+        duration = info.get("format", {}).get("duration")
+        return self._run_command(
+            command,
+            Path(params.path),
+            transcode_to,
+            tmp_log_path,
+            duration=float(duration) if duration else None,
+            progress=progress,
+            size_limit=_source_size(params),
+        )
+
+    def _run_checkpointed(
+        self,
+        params: TranscodeParams,
+        directory: Path,
+        segments: list[tuple[float, float | None]],
+        transcode_to: Path,
+        tmp_log_path: Path,
+        info: FfprobeResult,
+        progress: FfmpegProgress | None,
+    ) -> tuple[TranscodeResult, int, str]:
+        """Encode the main video segment by segment into ``directory``, then mux.
+
+        Segments already in ``directory`` (from an interrupted attempt, on this or
+        another worker sharing tmp_dir) are kept, so the encode resumes after the
+        last finished one. The checkpoint is removed unless the attempt is retried.
         """
         path = Path(params.path)
+        resumed = sum(checkpoint_segment(directory, i).exists() for i in range(len(segments)))
+        if resumed:
+            self.logger.info(
+                "resuming transcode from checkpoint",
+                filename=path.name,
+                encoded_segments=resumed,
+                segments=len(segments),
+            )
+
+        size_limit = _source_size(params)
+        result, status, last_output = TranscodeResult.SUCCESS, 0, ""
+        for index, (start, end) in enumerate(segments):
+            segment = checkpoint_segment(directory, index)
+            if segment.exists():
+                continue
+
+            # each segment may only use what the encoded ones left of the source's size
+            remaining = None
+            if size_limit is not None:
+                remaining = size_limit - sum(
+                    checkpoint_segment(directory, i).stat().st_size for i in range(index)
+                )
+
+            # written aside and renamed, so a resumed encode never muxes a torn segment
+            partial = segment.with_suffix(".partial.mkv")
+            result, status, last_output = self._run_command(
+                build_segment_command(params, start, end, partial),
+                path,
+                partial,
+                tmp_log_path,
+                duration=end - start if end is not None else None,
+                progress=progress,
+                size_limit=remaining,
+            )
+            if result is not TranscodeResult.SUCCESS:
+                break
+            os.replace(partial, segment)
+
+        if result is TranscodeResult.SUCCESS:
+            concat_list = write_concat_list(
+                directory, [checkpoint_segment(directory, i) for i in range(len(segments))]
+            )
+            # only the audio is decoded from the source, so there's nothing to accelerate
+            command = build_ffmpeg_command(
+                dataclasses.replace(params, hwaccel=None),
+                transcode_to,
+                info,
+                video_from=concat_list,
+            )
+            duration = info.get("format", {}).get("duration")
+            result, status, last_output = self._run_command(
+                command,
+                path,
+                transcode_to,
+                tmp_log_path,
+                duration=float(duration) if duration else None,
+                progress=progress,
+                size_limit=size_limit,
+            )
+
+        if result is not TranscodeResult.RETRY:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        return result, status, last_output
 
-        command = build_ffmpeg_command(params, transcode_to)
+    def _run_command(
+        self,
+        command: list[str],
+        path: Path,
+        transcode_to: Path,
+        tmp_log_path: Path,
+        *,
+        duration: float | None,
+        progress: FfmpegProgress | None = None,
+        size_limit: int | None = None,
+    ) -> tuple[TranscodeResult, int, str]:
+        """Run an ffmpeg ``command`` reading ``path`` and classify the outcome.
+
+        Writes the ffmpeg output to ``tmp_log_path`` (overwriting any previous
+        attempt's log), feeds its ``-progress`` output to ``progress`` (for an output
+        ``duration`` seconds long) and returns the outcome, exit status and the tail
+        of its (non-progress) output, one line per line. A :class:`Supervisor` kills
+        ffmpeg if it stalls, runs too long or its output would exceed ``size_limit``.
+        """
+        if progress is None:
+            progress = FfmpegProgress()
+
+        progress.reset(duration)
 
         self.logger.debug("running ffmpeg", command=shlex.join(command))
 
-        with subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-        ) as proc:
-            last_output = ""
-
-            with open(tmp_log_path, "w") as ffmpeg_log_file:
-                ffmpeg_log_file.write(f"ffmpeg command: {shlex.join(command)}\n")
+        with self._lock:
+            if self._stopping:
+                return TranscodeResult.RETRY, 0, _SHUTDOWN
+            proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            self._running.add(proc)
+
+        try:
+            with (
+                proc,
+                Supervisor(
+                    proc, progress, config.worker.supervisor, size_limit=size_limit
+                ) as supervisor,
+                open(tmp_log_path, "wb") as ffmpeg_log_file,
+            ):
+                ffmpeg_log_file.write(f"ffmpeg command: {shlex.join(command)}\n".encode())
                 assert proc.stdout is not None
-                for line in proc.stdout:
-                    ffmpeg_log_file.write(line)
-                    last_output = line.strip()
+                tail = capture_output(proc.stdout.fileno(), ffmpeg_log_file, progress)
 
             status = proc.wait()
+        finally:
+            with self._lock:
+                self._running.discard(proc)
+
+        # the cause of a failure is often a line or two above "Conversion failed!"
+        last_output = "\n".join(tail)
 
+        # a clean exit counts even if the supervisor gave up on ffmpeg at the very end
         if status == 0:
             return TranscodeResult.SUCCESS, status, last_output
 
@@ -406,6 +1249,20 @@ class Transcoder:
         except Exception:
             self.logger.debug("failed to delete transcoded file", path=str(transcode_to))
 
+        if supervisor.aborted is not None:
+            result, message = _ABORTS[supervisor.aborted]
+            self.logger.warning(
+                "supervisor killed ffmpeg",
+                path=str(path),
+                reason=supervisor.aborted,
+                result=result.name.lower(),
+            )
+            return result, status, f"{last_output}\n{message}".strip()
+
+        if self._stopping:
+            self.logger.info("transcode interrupted by worker shutdown; will retry", path=str(path))
+            return TranscodeResult.RETRY, status, f"{last_output}\n{_SHUTDOWN}".strip()
+
         if "Error opening input files" in last_output or "No such file or directory" in last_output:
             self.logger.info("skipping transcode because file does not exist", path=str(path))
             return TranscodeResult.SKIP, status, last_output
@@ -1,16 +1,37 @@
+import dataclasses
+import functools
+import signal
 import threading
 import time
+from collections.abc import Callable
+from pathlib import Path
 from typing import Any
 
 import requests
 import structlog
+from prometheus_client import start_http_server
 from structlog.contextvars import bound_contextvars
 
-from wi1_bot.transcoder.config import config
-from wi1_bot.transcoder.transcoder import JobResult, Transcoder
+from wi1_bot.transcoder.capabilities import Capabilities, detect_capabilities
+from wi1_bot.transcoder.checkpoints import recover_tmp_dir
+from wi1_bot.transcoder.client import CONNECT_TIMEOUT, READ_TIMEOUTS, Endpoint, WebhookClient
+from wi1_bot.transcoder.config import CheckpointConfig, config
+from wi1_bot.transcoder.cpu import CpuBudget, available_cores, core_list
+from wi1_bot.transcoder.failures import FailureMemory
+from wi1_bot.transcoder.ffprobe import FfprobeException, ProbeCache, ffprobe, get_cache, set_cache
+from wi1_bot.transcoder.metrics import ENCODE_SPEED
+from wi1_bot.transcoder.outbox import Outbox
+from wi1_bot.transcoder.paths import replace_remote_paths
+from wi1_bot.transcoder.prefetch import Prefetcher, discard
+from wi1_bot.transcoder.preflight import Estimate
+from wi1_bot.transcoder.progress import FfmpegProgress
+from wi1_bot.transcoder.transcoder import JobResult, Transcoder, worker_tmp_dir
 
 logger = structlog.get_logger(__name__)
 
+# the longest a job's outcome report can take
+_REPORT_TIMEOUT = CONNECT_TIMEOUT + max(READ_TIMEOUTS.values())
+
 
 class _Heartbeat:
     """Periodically extends a claimed job's lease while it is being transcoded.
@@ -18,24 +39,38 @@ class _Heartbeat:
     A transcode can outlive the webhook's lease; heartbeats keep the lease alive so
     the job isn't re-dispatched to another worker mid-transcode. If this worker
     crashes, heartbeats stop and the lease expires, letting the webhook reclaim it.
+    Each heartbeat also carries the latest ffmpeg progress, if any.
+
+    A job reserved ahead is renewed for ``lease`` seconds at a time (often enough
+    for that lease) until it starts, when ``lease`` is cleared.
     """
 
-    def __init__(self, base_url: str, job_id: int, worker_name: str, interval: float) -> None:
-        self._url = f"{base_url}/jobs/{job_id}/heartbeat"
+    def __init__(
+        self,
+        client: WebhookClient,
+        job_id: int,
+        worker_name: str,
+        interval: float,
+        progress: FfmpegProgress | None = None,
+        lease: float | None = None,
+    ) -> None:
+        self._client = client
+        self._path = f"/jobs/{job_id}/heartbeat"
         self._job_id = job_id
         self._worker_name = worker_name
-        self._payload = {"worker_id": worker_name}
+        self._progress = progress
         self._interval = interval
+        self.lease = lease
         self._stop = threading.Event()
         self._thread = threading.Thread(target=self._run, daemon=True)
 
     def _run(self) -> None:
         with bound_contextvars(job_id=self._job_id, worker_id=self._worker_name):
-            while not self._stop.wait(self._interval):
+            while not self._stop.wait(self._next_interval()):
                 logger.debug("sending heartbeat")
 
                 try:
-                    resp = requests.post(self._url, json=self._payload, timeout=30)
+                    resp = self._client.post("heartbeat", self._path, self._payload())
                 except requests.RequestException:
                     logger.warning(
                         "heartbeat failed to send",
@@ -55,44 +90,180 @@ class _Heartbeat:
                 else:
                     logger.debug("heartbeat accepted")
 
-    def __enter__(self) -> "_Heartbeat":
+    def _next_interval(self) -> float:
+        lease = self.lease
+        return self._interval if lease is None else min(self._interval, lease / 3)
+
+    def _payload(self) -> dict[str, Any]:
+        payload: dict[str, Any] = {"worker_id": self._worker_name}
+        if (lease := self.lease) is not None:
+            payload["lease"] = lease
+        if self._progress is not None and (snapshot := self._progress.latest) is not None:
+            payload["progress"] = dataclasses.asdict(snapshot)
+        return payload
+
+    def start(self) -> None:
         self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def __enter__(self) -> "_Heartbeat":
+        self.start()
         return self
 
     def __exit__(self, *_: object) -> None:
-        self._stop.set()
+        self.stop()
+
+
+class _Slots:
+    """The worker's transcode slots.
 
+    A job holds as many slots as its profile's weight, so a few heavy software encodes
+    or many light stream copies can run side by side without oversubscribing the CPU.
+    """
+
+    def __init__(self, total: int) -> None:
+        self.total = total
+        self._free = total
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def wait_for_free(self) -> bool:
+        """Wait until a slot is free; ``False`` if the slots were closed instead."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._free > 0 or self._closed)
+            return not self._closed
+
+    def try_acquire(self, n: int) -> bool:
+        """Take ``n`` slots if they're free now."""
+        with self._cond:
+            if self._closed or self._free < n:
+                return False
+            self._free -= n
+            return True
+
+    def acquire(self, n: int) -> bool:
+        """Take ``n`` slots once they're free; ``False`` if the slots were closed instead."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._free >= n or self._closed)
+            if self._closed:
+                return False
+            self._free -= n
+            return True
+
+    def release(self, n: int) -> None:
+        with self._cond:
+            self._free += n
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        """Stop handing out slots (the worker is draining); waiters give up."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout: float | None) -> bool:
+        """Wait up to ``timeout`` seconds for every running job to finish."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._free == self.total, timeout)
+
+
+class _Reservation:
+    """A job claimed ahead, waiting for slots while the running jobs finish.
+
+    Meanwhile its source is probed (warming the probe cache for the transcode) and,
+    with a ``prefetcher``, copied to local staging so its ffmpeg reads local disk.
+    """
 
-def _post(url: str, payload: dict[str, Any]) -> None:
+    def __init__(self, job: dict[str, Any], prefetcher: Prefetcher | None) -> None:
+        self._job = job
+        self._prefetcher = prefetcher
+        self._cancel = threading.Event()
+        self._source: Path | None = None
+        self._thread = threading.Thread(target=self._run, name=f"reserve-{job['id']}", daemon=True)
+
+    def _run(self) -> None:
+        with bound_contextvars(job_id=self._job["id"]):
+            path = replace_remote_paths(
+                Path(self._job["path"]), config.general.remote_path_mappings
+            )
+            if get_cache() is not None:
+                try:
+                    ffprobe(path)
+                except (FfprobeException, OSError):
+                    # the transcode runs into it again and reports it
+                    logger.debug("could not probe reserved job's source", exc_info=True)
+                    return
+
+            if self._prefetcher is not None:
+                self._source = self._prefetcher.fetch(self._job["id"], path, self._cancel)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def take(self) -> Path | None:
+        """Stop preparing the job; its prefetched source, if the copy finished."""
+        self._cancel.set()
+        self._thread.join()
+        return self._source
+
+
+def _reservable(job: dict[str, Any]) -> bool:
+    # segments and assembles read a slice or only the audio of the source
+    return (
+        job.get("kind", "transcode") == "transcode"
+        and job["quality_profile"] in config.transcoding.profiles
+    )
+
+
+def _job_slots(job: dict[str, Any], total: int) -> int:
+    profile = config.transcoding.profiles.get(job["quality_profile"])
+    # unknown profiles are skipped right away, so they only need one slot; a profile
+    # heavier than the whole worker still runs, it just runs alone
+    slots = profile.slots if profile is not None else 1
+    return min(slots, total)
+
+
+def _post(client: WebhookClient, endpoint: Endpoint, path: str, payload: dict[str, Any]) -> None:
+    # best effort, for what isn't worth keeping in the outbox
     try:
-        resp = requests.post(url, json=payload, timeout=30)
+        resp = client.post(endpoint, path, payload)
     except requests.RequestException:
-        # if the report doesn't land, the lease will expire and the job is re-dispatched
-        logger.warning(
-            "failed to report job outcome; lease will expire",
-            url=url,
-            exc_info=True,
-        )
+        logger.warning("failed to reach webhook", path=path, exc_info=True)
         return
 
     if not resp.ok:
         logger.warning(
             "webhook returned unsuccessful response",
-            url=url,
+            path=path,
             status_code=resp.status_code,
             response=resp.text,
         )
-    else:
-        logger.debug("job outcome reported", url=url, status_code=resp.status_code)
 
 
-def _claim(base_url: str, worker_name: str) -> dict[str, Any] | None:
-    """Ask the webhook for a job.
+def _claim(
+    client: WebhookClient,
+    worker_name: str,
+    capabilities: Capabilities | None = None,
+    wait: float = 0,
+    lease: float | None = None,
+) -> dict[str, Any] | None:
+    """Ask the webhook for a job, waiting up to ``wait`` seconds for one to be queued.
 
+    With ``capabilities``, the webhook only hands out jobs this worker can run. With
+    ``lease``, the job is held for that many seconds instead of the webhook's lease.
     Returns the job dict, or ``None`` if the queue is empty or the webhook returned an
     unexpected status. Raises ``requests.RequestException`` if the webhook is unreachable.
     """
-    resp = requests.post(f"{base_url}/jobs/claim", json={"worker_id": worker_name}, timeout=30)
+    payload: dict[str, Any] = {"worker_id": worker_name}
+    if capabilities is not None:
+        payload["capabilities"] = capabilities.payload()
+    if wait:
+        payload["wait"] = wait
+    if lease is not None:
+        payload["lease"] = lease
+    resp = client.post("claim", "/jobs/claim", payload, wait=wait)
 
     if resp.status_code == 204:
         return None
@@ -108,25 +279,44 @@ def _claim(base_url: str, worker_name: str) -> dict[str, Any] | None:
     return resp.json()
 
 
-def _report(base_url: str, job_id: int, worker_name: str, result: JobResult) -> None:
+def _report(
+    outbox: Outbox, job_id: int, worker_name: str, result: JobResult, release: bool = False
+) -> None:
+    """Report a job's outcome; with ``release``, a retry hands the job straight back.
+
+    Through the outbox, so an outcome the webhook doesn't acknowledge is retried
+    rather than lost (and the job transcoded again).
+    """
     logger.debug("reporting job outcome", action=result.action)
 
     if result.action == "complete":
-        _post(
-            f"{base_url}/jobs/{job_id}/complete",
-            {"worker_id": worker_name, "filename": result.filename},
-        )
+        payload: dict[str, Any] = {"worker_id": worker_name, "filename": result.filename}
+        if result.finalize_seconds is not None:
+            payload["finalize_seconds"] = result.finalize_seconds
+            payload["finalize_method"] = result.finalize_method
+        outbox.send("complete", f"/jobs/{job_id}/complete", payload)
     elif result.action == "skip":
         # a skip drops the job with no rescan/notification
-        _post(f"{base_url}/jobs/{job_id}/complete", {"worker_id": worker_name})
-    elif result.action == "retry":
-        _post(
-            f"{base_url}/jobs/{job_id}/fail",
-            {"worker_id": worker_name, "retry": True, "reason": result.reason},
+        outbox.send("complete", f"/jobs/{job_id}/complete", {"worker_id": worker_name})
+    elif result.action == "split":
+        # the webhook queues the segments for any worker and holds this job until
+        # they're all encoded, then hands it out again to assemble
+        assert result.segments is not None
+        outbox.send(
+            "split",
+            f"/jobs/{job_id}/split",
+            {"worker_id": worker_name, "segments": result.segments},
         )
+    elif result.action == "retry":
+        payload = {"worker_id": worker_name, "retry": True, "reason": result.reason}
+        if release:
+            # the job isn't at fault; don't spend one of its attempts
+            payload["release"] = True
+        outbox.send("fail", f"/jobs/{job_id}/fail", payload)
     else:  # fail
-        _post(
-            f"{base_url}/jobs/{job_id}/fail",
+        outbox.send(
+            "fail",
+            f"/jobs/{job_id}/fail",
             {
                 "worker_id": worker_name,
                 "retry": False,
@@ -136,55 +326,334 @@ def _report(base_url: str, job_id: int, worker_name: str, result: JobResult) ->
         )
 
 
+def _drops_split_job(job: dict[str, Any], result: JobResult, released: bool) -> bool:
+    # a segment or assemble job failing for good takes its split job with it
+    if job.get("kind") not in {"segment", "assemble"}:
+        return False
+    if result.action == "fail":
+        return True
+    return result.action == "retry" and not released and bool(job.get("final_attempt"))
+
+
+def _report_estimate(
+    client: WebhookClient, job_id: int, worker_name: str, estimate: Estimate
+) -> None:
+    # lets the webhook order requeued jobs by projected savings per encode hour
+    _post(
+        client,
+        "estimate",
+        f"/jobs/{job_id}/estimate",
+        {"worker_id": worker_name, **dataclasses.asdict(estimate)},
+    )
+
+
+def _transcode(
+    transcoder: Transcoder,
+    job: dict[str, Any],
+    progress: FfmpegProgress,
+    on_estimate: Callable[[Estimate], None] | None = None,
+    source: Path | None = None,
+    cores: tuple[int, ...] | None = None,
+) -> JobResult:
+    kind = job.get("kind", "transcode")
+
+    if kind == "segment":
+        return transcoder.transcode_segment(
+            job["path"],
+            job["quality_profile"],
+            job["parent_id"],
+            job["segment_index"],
+            job["segment_start"],
+            job["segment_end"],
+            progress=progress,
+            cores=cores,
+        )
+
+    if kind == "assemble":
+        return transcoder.assemble(
+            job["path"],
+            job["quality_profile"],
+            job.get("original_language"),
+            job["id"],
+            job.get("segment_count"),
+            progress=progress,
+            cores=cores,
+        )
+
+    return transcoder.transcode(
+        job["path"],
+        job["quality_profile"],
+        job.get("original_language"),
+        progress=progress,
+        on_estimate=on_estimate,
+        source=source,
+        cores=cores,
+    )
+
+
+def _run_job(
+    transcoder: Transcoder,
+    client: WebhookClient,
+    outbox: Outbox,
+    worker_name: str,
+    job: dict[str, Any],
+    heartbeat: _Heartbeat,
+    progress: FfmpegProgress,
+    slots: _Slots,
+    weight: int,
+    draining: threading.Event,
+    source: Path | None = None,
+    cpus: CpuBudget | None = None,
+) -> None:
+    job_id = job["id"]
+    cores: tuple[int, ...] | None = None
+
+    try:
+        with bound_contextvars(worker_id=worker_name, job_id=job_id):
+            started = time.monotonic()
+            try:
+                # in here, so the job is still reported and its slot, heartbeat and
+                # prefetched source let go if this fails
+                cores = cpus.acquire(weight) if cpus is not None else None
+                result = _transcode(
+                    transcoder,
+                    job,
+                    progress,
+                    on_estimate=functools.partial(_report_estimate, client, job_id, worker_name),
+                    source=source,
+                    cores=cores,
+                )
+            except Exception:
+                logger.warning("unhandled job error; will retry", exc_info=True)
+                result = JobResult("retry", reason="unhandled worker error")
+            finally:
+                heartbeat.stop()
+                discard(source)
+
+            elapsed = time.monotonic() - started
+            # ffmpeg's speed is the run's average so far, so its last is the run's own
+            speed = progress.latest.speed if progress.latest is not None else None
+            if result.action == "complete" and speed is not None:
+                ENCODE_SPEED.labels(
+                    quality_profile=job["quality_profile"],
+                    cores=str(len(cores)) if cores is not None else "all",
+                ).observe(speed)
+
+            probe_cache = get_cache()
+            logger.info(
+                "transcode job finished",
+                elapsed_seconds=round(elapsed, 1),
+                action=result.action,
+                reason=result.reason,
+                speed=speed,
+                cores=core_list(cores) if cores is not None else None,
+                probe_cache_hits=probe_cache.hits if probe_cache else None,
+                probe_cache_misses=probe_cache.misses if probe_cache else None,
+            )
+
+            # an attempt interrupted by the worker shutting down is handed back now,
+            # rather than when its lease expires
+            _report(outbox, job_id, worker_name, result, release=draining.is_set())
+            if _drops_split_job(job, result, released=draining.is_set()):
+                transcoder.discard_segments(job.get("parent_id") or job_id)
+    finally:
+        if cpus is not None and cores is not None:
+            cpus.release(cores)
+        slots.release(weight)
+
+
+def _drain(transcoder: Transcoder, slots: _Slots, grace: float) -> None:
+    """Let running jobs finish for up to ``grace`` seconds, then hand them back."""
+    logger.info("draining; no longer claiming jobs", grace_seconds=grace)
+
+    if not slots.wait_idle(grace):
+        logger.info("terminating running transcodes to hand their jobs back")
+        transcoder.terminate()
+        # each job reports before freeing its slots
+        if not slots.wait_idle(_REPORT_TIMEOUT):
+            logger.warning("jobs still running at exit; their leases will expire")
+
+    logger.info("worker drained")
+
+
 def run() -> None:
-    base_url = config.worker.webhook_url.rstrip("/")
     worker_name = config.worker.worker_name
     poll_interval = config.worker.poll_interval
+    claim_wait = config.worker.claim_wait
+
+    # a restarted worker cleans up after the transcodes it was killed in the middle of
+    checkpoint = config.worker.checkpoint or CheckpointConfig()
+    recover_tmp_dir(worker_tmp_dir(), checkpoint.max_age)
+
+    failure_memory = None
+    if config.worker.failure_memory_ttl > 0:
+        # per worker (or per replicas sharing tmp_dir): what fails depends on the
+        # machine's ffmpeg build, drivers and GPU
+        failure_memory = FailureMemory(
+            worker_tmp_dir() / "failure-signatures", config.worker.failure_memory_ttl
+        )
 
-    transcoder = Transcoder()
+    transcoder = Transcoder(failure_memory)
+    slots = _Slots(config.worker.concurrency)
+    # a heartbeat and a report per running job, plus the claim loop
+    client = WebhookClient(config.worker.webhook_url, pool_size=2 * slots.total + 1)
+
+    outbox = Outbox(worker_tmp_dir() / "outbox", client)
+    outbox.start()
+
+    if config.worker.metrics_port is not None:
+        start_http_server(config.worker.metrics_port)
+
+    if config.worker.probe_cache_size > 0:
+        # kept next to the in-progress transcodes so it survives worker restarts
+        set_cache(ProbeCache(worker_tmp_dir() / "ffprobe-cache", config.worker.probe_cache_size))
+
+    cpus = None
+    if config.worker.cpu is not None:
+        cpus = CpuBudget(config.worker.cpu.cores or available_cores(), slots.total)
+
+    claim_ahead = config.worker.claim_ahead
+    lease = claim_ahead.lease if claim_ahead is not None else None
+    prefetcher = None
+    if claim_ahead is not None and claim_ahead.prefetch is not None:
+        # per worker: copies are deleted once their job is done, or at the next start
+        prefetcher = Prefetcher(
+            worker_tmp_dir() / "prefetch" / worker_name,
+            claim_ahead.prefetch.max_bytes,
+            claim_ahead.prefetch.rate,
+        )
+        prefetcher.clear()
+
+    capabilities = detect_capabilities(
+        config.transcoding.profiles, config.general.remote_path_mappings
+    )
 
     with bound_contextvars(worker_id=worker_name):
-        logger.info("polling for transcode jobs", base_url=base_url)
+        logger.info(
+            "polling for transcode jobs",
+            base_url=client.base_url,
+            slots=slots.total,
+            cores=core_list(cpus.cores) if cpus is not None else None,
+            hwaccels=sorted(capabilities.hwaccels),
+            runnable_profiles=capabilities.runnable_profiles,
+            paths=capabilities.paths,
+        )
+        if unrunnable := set(capabilities.profiles) - set(capabilities.runnable_profiles):
+            logger.warning(
+                "missing encoders or hwaccel for some profiles; not claiming their jobs",
+                profiles=sorted(unrunnable),
+            )
+
+        # a stopped container gets SIGTERM: claim nothing more and hand running jobs
+        # back instead of leaving them to lease expiry. The drain runs on its own
+        # thread, so it needn't wait for a long-polling claim to return
+        draining = threading.Event()
+        drainer = threading.Thread(
+            target=_drain, args=(transcoder, slots, config.worker.drain_timeout), name="drain"
+        )
 
-        while True:
+        def start_draining(signum: int, frame: object) -> None:
+            if not draining.is_set():
+                draining.set()
+                slots.close()
+                drainer.start()
+
+        signal.signal(signal.SIGTERM, start_draining)
+
+        while not draining.is_set():
+            # claiming ahead, the next job is claimed as soon as the last one started,
+            # and waits (reserved) below for the slots it needs
+            if claim_ahead is None and not slots.wait_for_free():
+                break
+
+            started = time.monotonic()
             try:
-                job = _claim(base_url, worker_name)
+                job = _claim(client, worker_name, capabilities, claim_wait, lease)
             except requests.RequestException:
                 logger.warning(
                     "failed to reach webhook to claim a job, will retry",
                     exc_info=True,
                 )
-                time.sleep(poll_interval)
+                draining.wait(poll_interval)
                 continue
 
             if job is None:
-                time.sleep(poll_interval)
+                # a long-poll that ran its course can go straight into the next one;
+                # one that came back early (the webhook's waiting claims are full, or it
+                # doesn't long-poll) waits like a plain poll
+                if time.monotonic() - started < claim_wait / 2 or not claim_wait:
+                    draining.wait(poll_interval)
                 continue
 
             job_id = job["id"]
+            weight = _job_slots(job, slots.total)
 
             with bound_contextvars(job_id=job_id):
-                logger.info("transcode job claimed", path=job["path"])
-
-                started = time.monotonic()
-                try:
-                    # the webhook owns the cadence and tells us how often to heartbeat
-                    with _Heartbeat(base_url, job_id, worker_name, job["heartbeat"]):
-                        result = transcoder.transcode(
-                            job["path"], job["quality_profile"], job.get("original_language")
-                        )
-                except Exception:
-                    logger.warning("unhandled job error; will retry", exc_info=True)
-                    result = JobResult("retry", reason="unhandled worker error")
-
-                elapsed = time.monotonic() - started
                 logger.info(
-                    "transcode job finished",
-                    elapsed_seconds=round(elapsed, 1),
-                    action=result.action,
-                    reason=result.reason,
+                    "transcode job claimed",
+                    path=job["path"],
+                    kind=job.get("kind", "transcode"),
+                    slots=weight,
                 )
 
-                _report(base_url, job_id, worker_name, result)
-
-            time.sleep(poll_interval)
+            # the webhook owns the cadence and tells us how often to heartbeat; start
+            # before waiting for slots so the lease stays alive while heavier jobs finish
+            progress = FfmpegProgress()
+            heartbeat = _Heartbeat(
+                client, job_id, worker_name, job["heartbeat"], progress, lease=lease
+            )
+            heartbeat.start()
+
+            reservation = None
+            if lease is None:
+                acquired = slots.acquire(weight)
+            elif slots.try_acquire(weight):
+                acquired = True
+            else:
+                # reserved: get the job ready while the running ones finish
+                with bound_contextvars(job_id=job_id):
+                    logger.info("transcode job reserved until slots free up")
+                if _reservable(job):
+                    reservation = _Reservation(job, prefetcher)
+                    reservation.start()
+                acquired = slots.acquire(weight)
+
+            source = reservation.take() if reservation is not None else None
+            if not acquired:
+                # a reservation not started by shutdown goes straight back to the queue
+                heartbeat.stop()
+                discard(source)
+                with bound_contextvars(job_id=job_id):
+                    _report(
+                        outbox,
+                        job_id,
+                        worker_name,
+                        JobResult("retry", reason="worker shutting down"),
+                        release=True,
+                    )
+                break
+
+            # started: from here on the lease is renewed in full
+            heartbeat.lease = None
+
+            threading.Thread(
+                target=_run_job,
+                args=(
+                    transcoder,
+                    client,
+                    outbox,
+                    worker_name,
+                    job,
+                    heartbeat,
+                    progress,
+                    slots,
+                    weight,
+                    draining,
+                    source,
+                    cpus,
+                ),
+                name=f"job-{job_id}",
+                daemon=True,
+            ).start()
+
+        drainer.join()
@@ -0,0 +1,109 @@
+import subprocess
+from pathlib import Path
+from unittest.mock import patch
+
+import wi1_bot.transcoder.capabilities as cap_mod
+from wi1_bot.transcoder.capabilities import (
+    can_run,
+    detect_capabilities,
+    ffmpeg_encoders,
+    ffmpeg_hwaccels,
+    profile_encoders,
+    reachable_roots,
+)
+from wi1_bot.transcoder.config import RemotePathMapping, TranscodingProfile
+
+ENCODERS = """Encoders:
+ V..... = Video
+ A..... = Audio
+ ------
+ V....D libx265              libx265 H.265 / HEVC (codec hevc)
+ V....D hevc_nvenc           NVIDIA NVENC hevc encoder (codec hevc)
+ A....D aac                  AAC (Advanced Audio Coding)
+"""
+
+HWACCELS = """Hardware acceleration methods:
+cuda
+vaapi
+
+"""
+
+
+def _completed(args: list[str], stdout: str = "", returncode: int = 0) -> object:
+    return subprocess.CompletedProcess(args, returncode, stdout=stdout, stderr="")
+
+
+def test_ffmpeg_encoders_parses_listing() -> None:
+    with patch.object(cap_mod.subprocess, "run", return_value=_completed([], ENCODERS)):
+        assert ffmpeg_encoders() == {"libx265", "hevc_nvenc", "aac"}
+
+
+def test_ffmpeg_hwaccels_keeps_only_devices_that_initialize() -> None:
+    def run(args: list[str], **kwargs: object) -> object:
+        if "-hwaccels" in args:
+            return _completed(args, HWACCELS)
+        # no GPU: cuda is compiled in but its device doesn't initialize
+        return _completed(args, returncode=0 if "vaapi" in args else 1)
+
+    with patch.object(cap_mod.subprocess, "run", side_effect=run):
+        assert ffmpeg_hwaccels() == {"vaapi"}
+
+
+def test_missing_ffmpeg_detects_nothing() -> None:
+    with patch.object(cap_mod.subprocess, "run", side_effect=FileNotFoundError("ffmpeg")):
+        assert ffmpeg_encoders() == frozenset()
+        assert ffmpeg_hwaccels() == frozenset()
+
+
+def test_profile_encoders() -> None:
+    assert profile_encoders("-c hevc_nvenc -b 5000k") == {"hevc_nvenc"}
+    assert profile_encoders("-c:a aac -ac 2") == {"aac"}
+    assert profile_encoders("-c copy") == set()
+    assert profile_encoders(None) == set()
+
+
+def test_can_run_needs_encoders_and_hwaccel() -> None:
+    encoders = frozenset({"libx265", "hevc_nvenc", "aac"})
+    gpu = TranscodingProfile(
+        video_params="-c hevc_nvenc -b 5000k", audio_params="-c aac", hwaccel="cuda"
+    )
+    cpu = TranscodingProfile(video_params="-c libx265", audio_params="-c aac")
+    dts = TranscodingProfile(audio_params="-c dca")
+
+    assert can_run(gpu, encoders, frozenset({"cuda"}))
+    assert not can_run(gpu, encoders, frozenset())
+    assert can_run(cpu, encoders, frozenset())
+    assert not can_run(dts, encoders, frozenset())
+
+
+def test_reachable_roots(tmp_path: Path) -> None:
+    mounted = tmp_path / "movies"
+    mounted.mkdir()
+    mappings = [
+        RemotePathMapping(remote=Path("/data/movies"), local=mounted),
+        RemotePathMapping(remote=Path("/data/tv"), local=tmp_path / "tv"),
+    ]
+
+    assert reachable_roots(mappings) == ("/data/movies",)
+    assert reachable_roots([]) is None
+
+
+def test_detect_capabilities() -> None:
+    profiles = {
+        "good": TranscodingProfile(video_params="-c libx265"),
+        "great": TranscodingProfile(video_params="-c hevc_nvenc", hwaccel="cuda"),
+    }
+
+    with (
+        patch.object(cap_mod, "ffmpeg_encoders", return_value=frozenset({"libx265"})),
+        patch.object(cap_mod, "ffmpeg_hwaccels", return_value=frozenset()),
+    ):
+        capabilities = detect_capabilities(profiles, [])
+
+    assert capabilities.payload() == {
+        "encoders": ["libx265"],
+        "hwaccels": [],
+        "profiles": ["good", "great"],
+        "runnable_profiles": ["good"],
+        "paths": None,
+    }
@@ -0,0 +1,93 @@
+import io
+import os
+import threading
+
+import pytest
+
+import wi1_bot.transcoder.capture as capture_mod
+from wi1_bot.transcoder.capture import capture_output
+from wi1_bot.transcoder.progress import FfmpegProgress
+
+OUTPUT = (
+    "Input #0, matroska,webm, from 'café.mkv':\n"
+    "out_time_us=5000000\n"
+    "speed=1.00x\n"
+    "progress=continue\n"
+    "\n"
+    "[hevc_nvenc @ 0x55] OpenEncodeSessionEx failed: unsupported device (2)\n"
+    "Error while opening encoder - maybe incorrect parameters\n"
+    "Conversion failed!"
+).encode()
+
+
+def _capture(data: bytes, progress: FfmpegProgress, **kwargs: int) -> tuple[list[str], bytes]:
+    read_fd, write_fd = os.pipe()
+
+    def write() -> None:
+        with os.fdopen(write_fd, "wb") as pipe:
+            pipe.write(data)
+
+    # more than a pipe's buffer is written while it's read
+    writer = threading.Thread(target=write)
+    writer.start()
+
+    log_file = io.BytesIO()
+    try:
+        tail = capture_output(read_fd, log_file, progress, **kwargs)
+    finally:
+        writer.join()
+        os.close(read_fd)
+    return tail, log_file.getvalue()
+
+
+@pytest.mark.parametrize("chunk_size", [3, 64 * 1024])
+def test_logs_raw_output_and_keeps_tail(chunk_size: int, monkeypatch: pytest.MonkeyPatch) -> None:
+    # tiny chunks split lines (and the multibyte character) across reads
+    monkeypatch.setattr(capture_mod, "CHUNK_SIZE", chunk_size)
+    progress = FfmpegProgress()
+
+    tail, logged = _capture(OUTPUT, progress, tail_lines=3)
+
+    assert logged == OUTPUT
+    # progress and blank lines are not part of the tail
+    assert tail == [
+        "[hevc_nvenc @ 0x55] OpenEncodeSessionEx failed: unsupported device (2)",
+        "Error while opening encoder - maybe incorrect parameters",
+        "Conversion failed!",
+    ]
+    assert progress.latest is not None
+    assert progress.latest.out_time == 5.0
+
+
+def test_tail_decodes_multibyte_characters_split_across_reads(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(capture_mod, "CHUNK_SIZE", 1)
+
+    tail, _ = _capture(OUTPUT, FfmpegProgress(), tail_lines=10)
+
+    assert tail[0] == "Input #0, matroska,webm, from 'café.mkv':"
+
+
+def _block(t: int) -> str:
+    return f"frame={t * 24}\nout_time_us={t * 1_000_000}\nspeed=2.01x\nprogress=continue\n"
+
+
+@pytest.mark.parametrize("progress_after", [0, 10, 5000])
+def test_tail_is_found_however_far_back_it_is(progress_after: int) -> None:
+    # other lines before a few, or pages of, progress blocks in the same read
+    warnings = "".join(f"[hevc @ 0x55] Could not find ref with POC {n}\n" for n in range(500))
+    blocks = "".join(_block(t) for t in range(1, progress_after + 1))
+    progress = FfmpegProgress()
+
+    tail, _ = _capture(
+        f"{warnings}size=    1024kB time=00:00:04.00\r{blocks}".encode(), progress, tail_lines=2
+    )
+
+    assert tail == [
+        "[hevc @ 0x55] Could not find ref with POC 499",
+        "size=    1024kB time=00:00:04.00",
+    ]
+    if progress_after:
+        assert progress.latest is not None
+        assert progress.latest.out_time == progress_after
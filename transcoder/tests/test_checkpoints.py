@@ -0,0 +1,70 @@
+import os
+import time
+from pathlib import Path
+
+from wi1_bot.transcoder.checkpoints import (
+    ORPHAN_AGE,
+    checkpoint_dir,
+    load_plan,
+    recover_tmp_dir,
+    save_plan,
+)
+
+
+def _age(path: Path, seconds: float) -> None:
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_checkpoint_dir_changes_with_source_and_params(tmp_path: Path) -> None:
+    source = tmp_path / "movie.mkv"
+    source.write_text("data")
+    root = tmp_path / "checkpoints"
+
+    first = checkpoint_dir(root, source, "-c libx265", None)
+    assert checkpoint_dir(root, source, "-c libx265", None) == first
+    assert checkpoint_dir(root, source, "-c hevc_nvenc", "cuda") != first
+
+    source.write_text("replaced")
+    assert checkpoint_dir(root, source, "-c libx265", None) != first
+
+
+def test_plan_round_trip(tmp_path: Path) -> None:
+    assert load_plan(tmp_path) is None
+
+    save_plan(tmp_path, Path("/movies/movie.mkv"), [(0.0, 600.5), (600.5, None)])
+
+    assert load_plan(tmp_path) == [(0.0, 600.5), (600.5, None)]
+
+
+def test_recover_tmp_dir(tmp_path: Path) -> None:
+    orphan = tmp_path / "Old Movie-TRANSCODED.mkv"
+    orphan.write_text("half a movie")
+    _age(orphan, ORPHAN_AGE + 1)
+    # may be another worker's encode in progress
+    running = tmp_path / "New Movie-TRANSCODED.mkv"
+    running.write_text("still encoding")
+
+    resumable = tmp_path / "checkpoints" / "a"
+    save_plan(resumable, Path("/movies/a.mkv"), [(0.0, 600.0), (600.0, None)])
+    (resumable / "00000.mkv").write_text("segment")
+    torn = resumable / "00001.partial.mkv"
+    torn.write_text("half a segment")
+    _age(torn, ORPHAN_AGE + 1)
+
+    stale = tmp_path / "checkpoints" / "b"
+    save_plan(stale, Path("/movies/b.mkv"), [(0.0, 600.0), (600.0, None)])
+    for file in stale.iterdir():
+        _age(file, 3601)
+
+    recover_tmp_dir(tmp_path, max_age=3600)
+
+    assert not orphan.exists()
+    assert running.exists()
+    assert (resumable / "00000.mkv").exists()
+    assert not torn.exists()
+    assert not stale.exists()
+
+
+def test_recover_tmp_dir_without_checkpoints(tmp_path: Path) -> None:
+    recover_tmp_dir(tmp_path / "missing", max_age=3600)
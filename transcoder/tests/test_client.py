@@ -0,0 +1,52 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+from prometheus_client import REGISTRY
+
+from wi1_bot.transcoder.client import WebhookClient
+
+
+def _requests(endpoint: str, status_code: str) -> float:
+    return (
+        REGISTRY.get_sample_value(
+            "wi1_bot_transcoder_webhook_requests_total",
+            {"endpoint": endpoint, "status_code": status_code},
+        )
+        or 0
+    )
+
+
+def test_client_reuses_one_session() -> None:
+    client = WebhookClient("http://wh/")
+    adapter = client.session.get_adapter("http://wh/jobs/claim")
+
+    assert client.base_url == "http://wh"
+    assert adapter is client.session.get_adapter("https://wh/jobs/claim")
+
+
+def test_post_uses_endpoint_timeouts_and_counts_responses() -> None:
+    client = WebhookClient("http://wh")
+    before = _requests("claim", "204")
+
+    with patch.object(client.session, "post") as mock_post:
+        mock_post.return_value = MagicMock(status_code=204)
+        client.post("claim", "/jobs/claim", {"worker_id": "w1"}, wait=30)
+
+    mock_post.assert_called_once_with(
+        "http://wh/jobs/claim", json={"worker_id": "w1"}, timeout=(5, 60)
+    )
+    assert _requests("claim", "204") == before + 1
+
+
+def test_post_counts_errors() -> None:
+    client = WebhookClient("http://wh")
+    before = _requests("heartbeat", "error")
+
+    with (
+        patch.object(client.session, "post", side_effect=requests.ConnectionError("refused")),
+        pytest.raises(requests.ConnectionError),
+    ):
+        client.post("heartbeat", "/jobs/5/heartbeat", {"worker_id": "w1"})
+
+    assert _requests("heartbeat", "error") == before + 1
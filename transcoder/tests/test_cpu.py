@@ -0,0 +1,46 @@
+import pytest
+
+from wi1_bot.transcoder.cpu import CpuBudget, available_cores, core_list
+
+
+def test_core_list_collapses_runs() -> None:
+    assert core_list([3, 0, 1, 2, 8, 10, 11]) == "0-3,8,10-11"
+    assert core_list([5]) == "5"
+
+
+def test_available_cores_is_nonempty() -> None:
+    assert available_cores()
+
+
+def test_budget_gives_each_slot_its_share_of_the_cores() -> None:
+    budget = CpuBudget(range(8), slots=4)
+
+    light = budget.acquire(1)
+    heavy = budget.acquire(2)
+
+    assert light == (0, 1)
+    assert heavy == (2, 3, 4, 5)
+
+    budget.release(light)
+    # the freed cores go to the next job before any in use
+    assert budget.acquire(1) == (0, 1)
+    assert budget.acquire(1) == (6, 7)
+
+
+def test_budget_caps_a_job_at_every_core() -> None:
+    budget = CpuBudget([2, 3], slots=1)
+
+    assert budget.acquire(3) == (2, 3)
+
+
+def test_budget_shares_cores_when_there_are_more_slots() -> None:
+    budget = CpuBudget([0, 1], slots=4)
+
+    cores = [budget.acquire(1) for _ in range(4)]
+
+    assert sorted(cores) == [(0,), (0,), (1,), (1,)]
+
+
+def test_budget_needs_cores() -> None:
+    with pytest.raises(ValueError):
+        CpuBudget([], slots=1)
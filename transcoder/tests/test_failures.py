@@ -0,0 +1,69 @@
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+from wi1_bot.transcoder.failures import (
+    FailureMemory,
+    SourceSignature,
+    classify_error,
+    source_signature,
+)
+
+SIGNATURE = SourceSignature("good", "h264", "High 10", "yuv420p10le")
+
+
+def test_source_signature_uses_main_video_stream() -> None:
+    info: Any = {
+        "streams": [
+            {"index": 0, "codec_type": "audio", "codec_name": "aac"},
+            {
+                "index": 1,
+                "codec_type": "video",
+                "codec_name": "h264",
+                "profile": "High 10",
+                "pix_fmt": "yuv420p10le",
+            },
+        ]
+    }
+
+    audio_only: Any = {"streams": info["streams"][:1]}
+
+    assert source_signature("good", info) == SIGNATURE
+    assert source_signature("good", audio_only) is None
+
+
+def test_classify_error_ignores_what_varies_per_file() -> None:
+    first = (
+        "[h264 @ 0x55d0c8a0] No decoder surfaces left\n"
+        "[vist#0:0/h264 @ 0x7f01] Error while decoding stream #0:0: -12\n"
+        "Conversion failed!"
+    )
+    second = "[vist#0:0/h264 @ 0x5612] Error while decoding stream #0:0: -11\nConversion failed!"
+
+    assert classify_error(first) == "[vist#N:N/h264] Error while decoding stream #N:N: -N"
+    assert classify_error(first) == classify_error(second)
+    assert classify_error("Conversion failed!") == "unknown"
+
+
+def test_failure_memory_round_trip(tmp_path: Path) -> None:
+    memory = FailureMemory(tmp_path, ttl=60)
+
+    assert memory.get(SIGNATURE) is None
+    memory.put(SIGNATURE, "No decoder surfaces left")
+
+    assert memory.get(SIGNATURE) == "No decoder surfaces left"
+    # other profiles and sources are unaffected
+    assert memory.get(SourceSignature("great", "h264", "High 10", "yuv420p10le")) is None
+    assert memory.get(SourceSignature("good", "h264", "High", "yuv420p")) is None
+
+
+def test_failure_memory_entries_expire(tmp_path: Path) -> None:
+    memory = FailureMemory(tmp_path, ttl=60)
+    memory.put(SIGNATURE, "No decoder surfaces left")
+    entry = tmp_path / f"{SIGNATURE.key}.json"
+    recorded = time.time() - 61
+    os.utime(entry, (recorded, recorded))
+
+    assert memory.get(SIGNATURE) is None
+    assert not entry.exists()
@@ -0,0 +1,98 @@
+import json
+import os
+from collections.abc import Iterator
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import wi1_bot.transcoder.ffprobe as ffprobe_mod
+from wi1_bot.transcoder.ffprobe import ProbeCache, ffprobe, keyframe_times
+
+PROBE_OUTPUT = {"streams": [{"index": 0, "codec_type": "video"}], "format": {"duration": "60"}}
+
+
+@pytest.fixture
+def cache(tmp_path: Path) -> Iterator[ProbeCache]:
+    probe_cache = ProbeCache(tmp_path / "cache", max_entries=2)
+    ffprobe_mod.set_cache(probe_cache)
+    yield probe_cache
+    ffprobe_mod.set_cache(None)
+
+
+@pytest.fixture
+def mock_run() -> Iterator[MagicMock]:
+    with patch.object(ffprobe_mod.subprocess, "run") as run:
+        run.return_value.returncode = 0
+        run.return_value.stdout = json.dumps(PROBE_OUTPUT)
+        yield run
+
+
+def _media(tmp_path: Path, name: str) -> Path:
+    path = tmp_path / name
+    path.write_text("data")
+    return path
+
+
+def test_repeat_probe_hits_cache(tmp_path: Path, cache: ProbeCache, mock_run: MagicMock) -> None:
+    path = _media(tmp_path, "a.mkv")
+
+    assert ffprobe(path) == PROBE_OUTPUT
+    assert ffprobe(path) == PROBE_OUTPUT
+
+    mock_run.assert_called_once()
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_modified_file_misses_cache(tmp_path: Path, cache: ProbeCache, mock_run: MagicMock) -> None:
+    path = _media(tmp_path, "a.mkv")
+    ffprobe(path)
+
+    # a re-imported file has a new size/mtime, so the old streams must not be reused
+    path.write_text("different data")
+    os.utime(path, ns=(0, 0))
+    ffprobe(path)
+
+    assert mock_run.call_count == 2
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_evicts_least_recently_used(tmp_path: Path, cache: ProbeCache, mock_run: MagicMock) -> None:
+    a, b, c = (_media(tmp_path, name) for name in ("a.mkv", "b.mkv", "c.mkv"))
+
+    ffprobe(a)
+    ffprobe(b)
+    # a was used more recently than b, so b is evicted when c is added
+    os.utime(tmp_path / "cache" / f"{ProbeCache._key(a)}.json", ns=(2, 2))
+    os.utime(tmp_path / "cache" / f"{ProbeCache._key(b)}.json", ns=(1, 1))
+    ffprobe(c)
+
+    assert len(list((tmp_path / "cache").glob("*.json"))) == 2
+    mock_run.reset_mock()
+    ffprobe(a)
+    mock_run.assert_not_called()
+    ffprobe(b)
+    mock_run.assert_called_once()
+
+
+def test_failed_probe_is_not_cached(tmp_path: Path, cache: ProbeCache, mock_run: MagicMock) -> None:
+    path = _media(tmp_path, "a.mkv")
+    mock_run.return_value.returncode = 1
+    mock_run.return_value.stderr = "Invalid data found when processing input"
+
+    with pytest.raises(ffprobe_mod.FfprobeException):
+        ffprobe(path)
+
+    assert list((tmp_path / "cache").glob("*.json")) == []
+
+
+def test_keyframe_times_picks_first_keyframe_after_each_target(mock_run: MagicMock) -> None:
+    # seeking lands on the keyframe before each target, so those are read too
+    frames = [598.1, 601.3, 605.0, 1196.2, 1200.0]
+    mock_run.return_value.stdout = json.dumps(
+        {"frames": [{"best_effort_timestamp_time": str(t)} for t in frames] + [{}]}
+    )
+
+    assert keyframe_times("/movies/a.mkv", [600.0, 1200.0, 1800.0]) == [601.3, 1200.0]
+    command = mock_run.call_args.args[0]
+    assert command[command.index("-read_intervals") + 1] == "600.0%+30,1200.0%+30,1800.0%+30"
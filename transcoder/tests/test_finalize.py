@@ -0,0 +1,82 @@
+import errno
+import os
+from pathlib import Path
+
+import pytest
+
+import wi1_bot.transcoder.finalize as finalize_mod
+from wi1_bot.transcoder.finalize import copy_file, finalize_output
+
+DATA = os.urandom(3 * 1024 * 1024 + 17)
+
+
+@pytest.fixture
+def src(tmp_path: Path) -> Path:
+    path = tmp_path / "out.partial~"
+    path.write_bytes(DATA)
+    path.chmod(0o640)
+    return path
+
+
+def test_same_filesystem_is_a_rename(tmp_path: Path, src: Path) -> None:
+    dst = tmp_path / "movie-TRANSCODED.mkv"
+
+    assert finalize_output(src, dst) == "rename"
+    assert dst.read_bytes() == DATA
+    assert not src.exists()
+
+
+def test_cross_device_copies_then_renames(
+    tmp_path: Path, src: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    dst = tmp_path / "media" / "movie-TRANSCODED.mkv"
+    dst.parent.mkdir()
+    real_replace = os.replace
+
+    def replace(a: Path, b: Path) -> None:
+        if Path(a) == src:
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        real_replace(a, b)
+
+    monkeypatch.setattr(finalize_mod.os, "replace", replace)
+
+    assert finalize_output(src, dst) == "copy"
+    assert dst.read_bytes() == DATA
+    assert dst.stat().st_mode & 0o777 == 0o640
+    assert not src.exists()
+    # nothing left behind under the hidden staging name
+    assert sorted(p.name for p in dst.parent.iterdir()) == ["movie-TRANSCODED.mkv"]
+
+
+def test_copy_falls_back_when_copy_file_range_is_unsupported(
+    tmp_path: Path, src: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def unsupported(*args: object) -> int:
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(finalize_mod.os, "copy_file_range", unsupported)
+    dst = tmp_path / "copy.mkv"
+
+    copy_file(src, dst)
+
+    assert dst.read_bytes() == DATA
+
+
+def test_failed_copy_removes_partial_output(
+    tmp_path: Path, src: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def no_space(*args: object) -> int:
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    def cross_device(a: Path, b: Path) -> None:
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(finalize_mod.os, "replace", cross_device)
+    monkeypatch.setattr(finalize_mod.os, "copy_file_range", no_space)
+    dst = tmp_path / "movie-TRANSCODED.mkv"
+
+    with pytest.raises(OSError, match="No space left"):
+        finalize_output(src, dst)
+
+    assert src.exists()
+    assert not (tmp_path / ".movie-TRANSCODED.mkv.partial~").exists()
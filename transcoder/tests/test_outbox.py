@@ -0,0 +1,98 @@
+from pathlib import Path
+from typing import cast
+from unittest.mock import MagicMock
+
+import requests
+
+from wi1_bot.transcoder.client import WebhookClient
+from wi1_bot.transcoder.outbox import Outbox
+
+
+def _outbox(tmp_path: Path, *responses: object) -> tuple[Outbox, MagicMock]:
+    client = WebhookClient("http://wh")
+    client.session = session = MagicMock()
+    session.post.side_effect = [
+        r if isinstance(r, Exception) else MagicMock(status_code=r, ok=cast(int, r) < 400)
+        for r in responses
+    ]
+    return Outbox(tmp_path, client), session
+
+
+def test_acknowledged_report_is_removed(tmp_path: Path) -> None:
+    outbox, session = _outbox(tmp_path, 200)
+
+    assert outbox.send("complete", "/jobs/5/complete", {"worker_id": "w1"})
+
+    assert outbox.pending() == []
+    payload = session.post.call_args.kwargs["json"]
+    assert payload["worker_id"] == "w1"
+    assert payload["report_id"]
+
+
+def test_undelivered_reports_are_kept_and_replayed_in_order(tmp_path: Path) -> None:
+    outbox, session = _outbox(tmp_path, requests.ConnectionError("refused"), 503, 200, 200)
+
+    assert not outbox.send("complete", "/jobs/5/complete", {"worker_id": "w1"})
+    assert not outbox.send("fail", "/jobs/6/fail", {"worker_id": "w1"})
+    assert len(outbox.pending()) == 2
+
+    assert outbox.flush()
+
+    assert outbox.pending() == []
+    urls = [c.args[0] for c in session.post.call_args_list]
+    assert urls[2:] == ["http://wh/jobs/5/complete", "http://wh/jobs/6/fail"]
+    # a replay carries the id of the original report
+    payloads = [c.kwargs["json"] for c in session.post.call_args_list]
+    assert payloads[0]["report_id"] == payloads[2]["report_id"]
+
+
+def test_rejected_report_is_dropped(tmp_path: Path) -> None:
+    outbox, _ = _outbox(tmp_path, 409)
+
+    assert outbox.send("fail", "/jobs/5/fail", {"worker_id": "w1"})
+    assert outbox.pending() == []
+
+
+def test_reports_survive_a_restart(tmp_path: Path) -> None:
+    outbox, _ = _outbox(tmp_path, requests.ConnectionError("refused"))
+    outbox.send("complete", "/jobs/5/complete", {"worker_id": "w1"})
+
+    restarted, session = _outbox(tmp_path, 200)
+
+    assert restarted.flush()
+    assert session.post.call_args.args[0] == "http://wh/jobs/5/complete"
+    assert restarted.pending() == []
+
+
+def test_failing_report_backs_off_without_holding_up_the_rest(tmp_path: Path) -> None:
+    outbox, session = _outbox(tmp_path, requests.ConnectionError("refused"), 503, 503, 200)
+    outbox.send("complete", "/jobs/5/complete", {"worker_id": "w1"})
+    outbox.send("fail", "/jobs/6/fail", {"worker_id": "w1"})
+
+    # the older report fails again; the newer one still goes through
+    assert not outbox.flush()
+    (left,) = outbox.pending()
+    assert session.post.call_args.args[0] == "http://wh/jobs/6/fail"
+
+    # and it isn't retried until its backoff is up
+    assert not outbox.flush(due_only=True)
+    assert session.post.call_count == 4
+    assert outbox.pending() == [left]
+
+
+def test_reports_are_delivered_without_holding_the_lock(tmp_path: Path) -> None:
+    outbox, session = _outbox(tmp_path)
+    held: list[bool] = []
+
+    def post(*args: object, **kwargs: object) -> MagicMock:
+        held.append(outbox._lock.locked())
+        return MagicMock(status_code=200, ok=True)
+
+    session.post.side_effect = post
+    outbox.send("complete", "/jobs/5/complete", {"worker_id": "w1"})
+    (tmp_path / "00000000000000000001-old.json").write_text(
+        '{"endpoint": "fail", "path": "/jobs/6/fail", "payload": {}}'
+    )
+    outbox.flush()
+
+    assert held == [False, False]
@@ -1,7 +1,7 @@
 from pathlib import Path
 
 from wi1_bot.transcoder.config import RemotePathMapping
-from wi1_bot.transcoder.paths import replace_remote_paths
+from wi1_bot.transcoder.paths import replace_remote_paths, staging_dir
 
 
 class TestReplaceRemotePaths:
@@ -41,3 +41,26 @@ class TestReplaceRemotePaths:
         ]
 
         assert replace_remote_paths(path, mappings) == Path("/local2/The Matrix (1999)/movie.mkv")
+
+
+class TestStagingDir:
+    def test_no_staging_configured(self) -> None:
+        mappings = [RemotePathMapping(remote=Path("/data"), local=Path("/mnt/plex"))]
+
+        assert staging_dir(Path("/mnt/plex/movies/movie.mkv"), mappings) is None
+
+    def test_most_specific_mapping_with_staging(self) -> None:
+        mappings = [
+            RemotePathMapping(
+                remote=Path("/data"), local=Path("/mnt/plex"), staging=Path("/mnt/plex/.staging")
+            ),
+            RemotePathMapping(
+                remote=Path("/data/tv"), local=Path("/mnt/tv"), staging=Path("/mnt/tv/.staging")
+            ),
+        ]
+
+        assert staging_dir(Path("/mnt/tv/Show/episode.mkv"), mappings) == Path("/mnt/tv/.staging")
+        assert staging_dir(Path("/mnt/plex/movies/movie.mkv"), mappings) == Path(
+            "/mnt/plex/.staging"
+        )
+        assert staging_dir(Path("/elsewhere/movie.mkv"), mappings) is None
@@ -0,0 +1,77 @@
+import os
+import threading
+from pathlib import Path
+
+from wi1_bot.transcoder.prefetch import Prefetcher, discard
+
+
+def _source(tmp_path: Path, size: int) -> Path:
+    source = tmp_path / "media" / "The Movie.mkv"
+    source.parent.mkdir(exist_ok=True)
+    source.write_bytes(os.urandom(size))
+    os.utime(source, (1_000_000, 1_000_000))
+    return source
+
+
+def test_fetch_copies_the_source(tmp_path: Path) -> None:
+    source = _source(tmp_path, 3 * 1024 * 1024 + 5)
+    prefetcher = Prefetcher(tmp_path / "prefetch", max_bytes=10 * 1024 * 1024)
+
+    copy = prefetcher.fetch(5, source, threading.Event())
+
+    assert copy is not None
+    assert copy == tmp_path / "prefetch" / "5" / "The Movie.mkv"
+    assert copy.read_bytes() == source.read_bytes()
+    assert copy.stat().st_mtime == source.stat().st_mtime
+    assert prefetcher.used() == source.stat().st_size
+
+
+def test_fetch_respects_the_staging_budget(tmp_path: Path) -> None:
+    source = _source(tmp_path, 600)
+    prefetcher = Prefetcher(tmp_path / "prefetch", max_bytes=1000)
+
+    first = prefetcher.fetch(5, source, threading.Event())
+    # the first copy's job is still running
+    assert prefetcher.fetch(6, source, threading.Event()) is None
+
+    discard(first)
+    assert prefetcher.fetch(6, source, threading.Event()) is not None
+
+
+def test_cancelled_fetch_leaves_nothing_behind(tmp_path: Path) -> None:
+    source = _source(tmp_path, 3 * 1024 * 1024)
+    prefetcher = Prefetcher(tmp_path / "prefetch", max_bytes=10 * 1024 * 1024)
+    cancel = threading.Event()
+    cancel.set()
+
+    assert prefetcher.fetch(5, source, cancel) is None
+    assert not (tmp_path / "prefetch" / "5").exists()
+
+
+def test_throttled_fetch_is_cancelled_while_waiting(tmp_path: Path) -> None:
+    source = _source(tmp_path, 2 * 1024 * 1024)
+    # a chunk a minute: the copy waits after its first chunk
+    prefetcher = Prefetcher(
+        tmp_path / "prefetch", max_bytes=10 * 1024 * 1024, rate=1024 * 1024 / 60
+    )
+    cancel = threading.Event()
+    threading.Timer(0.1, cancel.set).start()
+
+    assert prefetcher.fetch(5, source, cancel) is None
+    assert prefetcher.used() == 0
+
+
+def test_missing_source_is_not_fetched(tmp_path: Path) -> None:
+    prefetcher = Prefetcher(tmp_path / "prefetch", max_bytes=1000)
+
+    assert prefetcher.fetch(5, tmp_path / "gone.mkv", threading.Event()) is None
+
+
+def test_clear_removes_leftover_copies(tmp_path: Path) -> None:
+    source = _source(tmp_path, 100)
+    prefetcher = Prefetcher(tmp_path / "prefetch", max_bytes=1000)
+    prefetcher.fetch(5, source, threading.Event())
+
+    prefetcher.clear()
+
+    assert prefetcher.used() == 0
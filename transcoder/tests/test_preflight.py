@@ -0,0 +1,23 @@
+import pytest
+
+from wi1_bot.transcoder.preflight import Estimate, extrapolate, sample_starts
+
+
+def test_sample_starts_are_centered_in_equal_parts() -> None:
+    assert sample_starts(3000, 3, 20) == [490.0, 1490.0, 2490.0]
+
+
+def test_short_source_is_not_sampled() -> None:
+    assert sample_starts(100, 3, 20) == []
+
+
+def test_extrapolate_scales_samples_to_the_full_duration() -> None:
+    estimate = extrapolate([1_000_000, 3_000_000], [4.0, 6.0], 20, 2000, 400_000_000)
+
+    # 4 MB and 10 s of encoding per 40 s of media, for 2000 s
+    assert estimate == Estimate(400_000_000, 200_000_000, 500.0)
+    assert estimate.savings == pytest.approx(0.5)
+
+
+def test_larger_output_has_negative_savings() -> None:
+    assert Estimate(100, 150, 1.0).savings == pytest.approx(-0.5)
@@ -0,0 +1,79 @@
+from wi1_bot.transcoder.progress import FfmpegProgress, ProgressSnapshot
+
+BLOCK = """frame=2400
+fps=48.00
+stream_0_0_q=28.0
+bitrate=2000.0kbits/s
+total_size=25000000
+out_time_us=100000000
+out_time_ms=100000000
+out_time=00:01:40.000000
+dup_frames=0
+drop_frames=0
+speed=2.01x
+"""
+
+
+def test_publishes_snapshot_when_block_completes() -> None:
+    progress = FfmpegProgress()
+    progress.reset(600.0)
+
+    for line in BLOCK.splitlines(keepends=True):
+        assert progress.feed(line)
+        # nothing is published until the block's terminating progress= line
+        assert progress.latest is None
+
+    assert progress.feed("progress=continue\n")
+    assert progress.latest == ProgressSnapshot(
+        out_time=100.0, fps=48.0, speed=2.01, total_size=25_000_000, duration=600.0
+    )
+
+
+def test_log_lines_are_not_progress() -> None:
+    progress = FfmpegProgress()
+
+    assert not progress.feed("Exiting normally, received signal 15.\n")
+    assert not progress.feed("[matroska @ 0x55] Starting new cluster at offset 0\n")
+    assert not progress.feed("\n")
+
+
+def test_unavailable_values_before_first_frame() -> None:
+    progress = FfmpegProgress()
+    progress.reset(None)
+
+    for line in ("out_time_us=N/A", "speed=N/A", "total_size=N/A", "progress=continue"):
+        progress.feed(line)
+
+    assert progress.latest == ProgressSnapshot(
+        out_time=0.0, fps=None, speed=None, total_size=None, duration=None
+    )
+
+
+def test_reset_clears_previous_attempt() -> None:
+    progress = FfmpegProgress()
+    progress.reset(60.0)
+    progress.feed("out_time_us=1000000")
+    progress.feed("progress=continue")
+
+    progress.reset(60.0)
+
+    assert progress.latest is None
+
+
+def test_feed_text_keeps_newest_block() -> None:
+    progress = FfmpegProgress()
+    progress.reset(600.0)
+    older = BLOCK.replace("out_time_us=100000000", "out_time_us=50000000")
+
+    progress.feed_text(
+        f"{older}progress=continue\nStream mapping:\n{BLOCK}progress=continue\n"
+        "frame=2500\nout_time_us=104000000\n"
+    )
+
+    assert progress.latest is not None
+    assert progress.latest.out_time == 100.0
+
+    # the block started at the end of the previous chunk completes in this one
+    progress.feed_text("speed=2.00x\nprogress=end\n")
+    assert progress.latest.out_time == 104.0
+    assert progress.latest.speed == 2.0
@@ -0,0 +1,195 @@
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import cast
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import wi1_bot.transcoder.supervisor as supervisor_mod
+import wi1_bot.transcoder.transcoder as t_mod
+from wi1_bot.transcoder.config import SupervisorConfig
+from wi1_bot.transcoder.progress import FfmpegProgress
+from wi1_bot.transcoder.supervisor import Supervisor
+from wi1_bot.transcoder.transcoder import Transcoder, TranscodeResult
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _progress(out_time: float, total_size: int | None = None) -> str:
+    size = total_size or "N/A"
+    return f"out_time_us={int(out_time * 1_000_000)}\ntotal_size={size}\nprogress=continue\n"
+
+
+def _supervisor(
+    duration: float | None = 3600, size_limit: int | None = None, **limits: float | None
+) -> tuple[Supervisor, FfmpegProgress, Clock]:
+    progress = FfmpegProgress()
+    progress.reset(duration)
+    clock = Clock()
+    supervisor = Supervisor(
+        MagicMock(),
+        progress,
+        SupervisorConfig.model_validate(limits),
+        size_limit=size_limit,
+        clock=clock,
+    )
+    return supervisor, progress, clock
+
+
+def test_progressing_attempt_is_left_alone() -> None:
+    supervisor, progress, clock = _supervisor(
+        stall_timeout=600, max_runtime_ratio=20, size_check_after=0.1
+    )
+
+    for minute in range(1, 30):
+        clock.now = minute * 60
+        progress.feed_text(_progress(minute * 120))
+        assert supervisor.check() is None
+
+
+def test_limits_are_off_by_default() -> None:
+    supervisor, _, clock = _supervisor(size_limit=1)
+
+    clock.now = 30 * 24 * 3600
+    assert supervisor.check() is None
+
+
+def test_stall_after_progress() -> None:
+    supervisor, progress, clock = _supervisor(stall_timeout=600)
+    clock.now = 60
+    progress.feed_text(_progress(120))
+    assert supervisor.check() is None
+
+    # still reporting, but out_time doesn't move
+    clock.now = 600
+    progress.feed_text(_progress(120))
+    assert supervisor.check() is None
+    clock.now = 661
+    assert supervisor.check() == "stalled"
+
+
+def test_stall_before_any_progress() -> None:
+    supervisor, _, clock = _supervisor(stall_timeout=600)
+    clock.now = 601
+    assert supervisor.check() == "stalled_at_start"
+
+
+def test_runtime_limit_scales_with_duration() -> None:
+    supervisor, progress, clock = _supervisor(duration=60, stall_timeout=600, max_runtime_ratio=20)
+
+    # slow but steady; the limit is never below stall_timeout
+    clock.now = 1199
+    progress.feed_text(_progress(59))
+    assert supervisor.check() is None
+    clock.now = 1201
+    assert supervisor.check() == "too_slow"
+
+
+def test_projected_size_over_limit() -> None:
+    supervisor, progress, clock = _supervisor(size_limit=1_000_000, size_check_after=0.1)
+
+    # 400 kB for 6 minutes: 4 MB for the hour, but too early to tell
+    clock.now = 60
+    progress.feed_text(_progress(300, 400_000))
+    assert supervisor.check() is None
+
+    clock.now = 120
+    progress.feed_text(_progress(360, 400_000))
+    assert supervisor.check() == "oversized"
+
+
+def test_disabled_limits() -> None:
+    supervisor, progress, clock = _supervisor(
+        size_limit=1, stall_timeout=None, max_runtime_ratio=None, size_check_after=None
+    )
+    progress.feed_text(_progress(1800, 1_000_000))
+    clock.now = 10**6
+    assert supervisor.check() is None
+
+
+@pytest.mark.parametrize(("exit_status", "killed"), [(None, True), (0, False)])
+def test_only_a_running_ffmpeg_is_killed(exit_status: int | None, killed: bool) -> None:
+    supervisor, _, clock = _supervisor(stall_timeout=600)
+    proc = cast(MagicMock, supervisor.proc)
+    # the limit is hit just as ffmpeg exits
+    proc.poll.return_value = exit_status
+    clock.now = 601
+
+    with patch.object(supervisor_mod, "CHECK_INTERVAL", 0.01), supervisor:
+        supervisor._thread.join(timeout=5)
+
+    assert supervisor.aborted == ("stalled_at_start" if killed else None)
+    assert proc.kill.called is killed
+
+
+@pytest.mark.parametrize(
+    ("stall_after", "expected"),
+    [(None, TranscodeResult.FAILED), (0.5, TranscodeResult.RETRY)],
+)
+def test_run_command_kills_a_stalled_ffmpeg(
+    tmp_path: Path, stall_after: float | None, expected: TranscodeResult
+) -> None:
+    # prints one progress block if asked, then hangs
+    script = "import sys, time\n"
+    if stall_after is not None:
+        script += f"print('out_time_us={int(stall_after * 1e6)}\\nprogress=continue', flush=True)\n"
+    script += "time.sleep(60)\n"
+
+    config = MagicMock()
+    config.worker.supervisor = SupervisorConfig(stall_timeout=0.3)
+    with (
+        patch.object(t_mod, "config", config),
+        patch.object(supervisor_mod, "CHECK_INTERVAL", 0.05),
+    ):
+        result, _, last_output = Transcoder()._run_command(
+            [sys.executable, "-c", script],
+            tmp_path / "a.mkv",
+            tmp_path / "a-TRANSCODED.mkv",
+            tmp_path / "a.log",
+            duration=3600,
+        )
+
+    assert result is expected
+    assert "progress" in last_output.splitlines()[-1]
+
+
+def test_terminate_stops_ffmpeg_and_retries(tmp_path: Path) -> None:
+    transcoder = Transcoder()
+    results: list[tuple[TranscodeResult, int, str]] = []
+
+    def run() -> None:
+        results.append(
+            transcoder._run_command(
+                [sys.executable, "-c", "import time; time.sleep(60)"],
+                tmp_path / "a.mkv",
+                tmp_path / "a-TRANSCODED.mkv",
+                tmp_path / "a.log",
+                duration=3600,
+            )
+        )
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    while not transcoder._running:
+        time.sleep(0.01)
+
+    transcoder.terminate()
+    thread.join(5)
+
+    ((result, _, last_output),) = results
+    assert result is TranscodeResult.RETRY
+    assert last_output.endswith("worker shutdown")
+
+    # nothing new starts once the worker is stopping
+    result, _, _ = transcoder._run_command(
+        ["false"], tmp_path / "a.mkv", tmp_path / "b.mkv", tmp_path / "a.log", duration=None
+    )
+    assert result is TranscodeResult.RETRY
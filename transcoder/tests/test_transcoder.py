@@ -1,3 +1,7 @@
+import dataclasses
+import os
+import time
+from collections.abc import Iterator
 from pathlib import Path
 from typing import Any
 from unittest.mock import MagicMock, patch
@@ -5,11 +9,21 @@ from unittest.mock import MagicMock, patch
 import pytest
 
 import wi1_bot.transcoder.transcoder as t_mod
+from wi1_bot.transcoder.checkpoints import ORPHAN_AGE
+from wi1_bot.transcoder.config import CheckpointConfig, CopyRule, PreflightConfig, SplitConfig
+from wi1_bot.transcoder.failures import FailureMemory, SourceSignature
+from wi1_bot.transcoder.preflight import Estimate
+from wi1_bot.transcoder.progress import FfmpegProgress
 from wi1_bot.transcoder.transcoder import (
     TranscodeParams,
     Transcoder,
     TranscodeResult,
+    already_transcoded,
     build_ffmpeg_command,
+    build_sample_command,
+    build_segment_command,
+    meets_copy_rule,
+    nothing_to_transcode,
     sanitize_file_stem,
 )
 
@@ -79,6 +93,31 @@ class TestBuildFfmpegCommand:
         assert "-c:v:0" in command
         assert "copy" in command
 
+    def test_command_runs_on_the_jobs_cores(
+        self, basic_item: TranscodeParams, mock_ffprobe_output: Any
+    ) -> None:
+        params = dataclasses.replace(basic_item, cores=(4, 5, 6, 7), nice=10, ionice="idle")
+
+        command = build_ffmpeg_command(params, "/tmp/output.mkv", mock_ffprobe_output)
+
+        ffmpeg = command.index("ffmpeg")
+        assert command[:ffmpeg] == [
+            "taskset", "--cpu-list", "4-7", "nice", "-n", "10", "ionice", "-c", "3",
+        ]  # fmt: skip
+        # decoders, filters and encoders each get as many threads as cores
+        assert command[command.index("-filter_threads") + 1] == "4"
+        assert command[command.index("-i") - 2 : command.index("-i")] == ["-threads", "4"]
+        assert command[-5:] == ["-threads", "4", "-f", "matroska", "/tmp/output.mkv"]
+
+    def test_command_without_cores_lets_ffmpeg_pick_threads(
+        self, basic_item: TranscodeParams, mock_ffprobe_output: Any
+    ) -> None:
+        command = build_ffmpeg_command(basic_item, "/tmp/output.mkv", mock_ffprobe_output)
+
+        assert command[0] == "ffmpeg"
+        assert "-threads" not in command
+        assert "-filter_threads" not in command
+
     @patch("wi1_bot.transcoder.transcoder.ffprobe")
     @patch("wi1_bot.transcoder.transcoder.config")
     def test_command_with_video_params(
@@ -391,6 +430,479 @@ class TestBuildFfmpegCommand:
             assert "2" in audio_maps[0]
 
 
+class TestAlreadyTranscoded:
+    PARAMS = TranscodeParams(
+        path="/movies/test.mkv", languages="eng", video_params="-c libx265", audio_params="-c aac"
+    )
+
+    def _info(self, *stream_params: tuple[str, str, str]) -> Any:
+        # what ffprobe reports for a Matroska file we wrote (tag keys upper-cased)
+        return {
+            "format": {"tags": {"WI1_BOT_VERSION": "0.1.0"}},
+            "streams": [
+                {
+                    "index": index,
+                    "codec_type": codec_type,
+                    "codec_name": codec_name,
+                    "tags": {"language": "eng", "PARAMS": params},
+                }
+                for index, (codec_type, codec_name, params) in enumerate(stream_params)
+            ],
+        }
+
+    def test_matching_tags(self) -> None:
+        info = self._info(
+            ("video", "hevc", "-c libx265"),
+            ("audio", "aac", "-c aac"),
+            ("subtitle", "subrip", "-c subrip"),
+        )
+
+        # the mov_text track converted to subrip last time would be copied now
+        assert already_transcoded(info, self.PARAMS)
+
+    def test_untagged_file(self) -> None:
+        info = self._info(("video", "h264", "-c libx265"), ("audio", "aac", "-c aac"))
+        del info["format"]["tags"]
+
+        assert not already_transcoded(info, self.PARAMS)
+
+    def test_profile_params_changed(self) -> None:
+        info = self._info(("video", "hevc", "-c libx265 -crf 20"), ("audio", "aac", "-c aac"))
+
+        assert not already_transcoded(info, self.PARAMS)
+
+    def test_matches_fallback_params(self) -> None:
+        info = self._info(("video", "hevc", "-c libx265"), ("audio", "aac", "-c copy"))
+        fallback = TranscodeParams(
+            path="/movies/test.mkv", languages="eng", video_params="-c libx265"
+        )
+
+        assert not already_transcoded(info, self.PARAMS)
+        assert already_transcoded(info, self.PARAMS, fallback)
+
+    def test_stream_the_profile_would_drop(self) -> None:
+        info = self._info(("video", "hevc", "-c libx265"), ("audio", "aac", "-c aac"))
+        info["streams"].append(
+            {"index": 2, "codec_type": "audio", "codec_name": "ac3", "tags": {"language": "ita"}}
+        )
+
+        assert not already_transcoded(info, self.PARAMS)
+
+    def test_own_output_under_copy_rules(self) -> None:
+        # the copy rules would now copy the HEVC and AAC streams we encoded last time
+        params = dataclasses.replace(
+            self.PARAMS,
+            copy_video=CopyRule(codecs=["hevc"]),
+            copy_audio=CopyRule(codecs=["aac"]),
+        )
+        info = self._info(("video", "hevc", "-c libx265"), ("audio", "aac", "-c aac"))
+        copied = self._info(("video", "hevc", "-c copy"), ("audio", "aac", "-c aac"))
+        reencoded = self._info(("video", "h264", "-c copy"), ("audio", "aac", "-c aac"))
+
+        assert already_transcoded(info, params)
+        assert already_transcoded(copied, params)
+        # the profile would have encoded an H.264 video, not copied it
+        assert not already_transcoded(reencoded, params)
+
+
+class TestCopyRules:
+    HEVC = CopyRule(codecs=["hevc"], max_bit_rate=6_000_000, max_height=1080)
+    STEREO_AAC = CopyRule(codecs=["aac"], max_channels=2)
+
+    def _info(self, video: dict[str, Any], *audio: dict[str, Any]) -> Any:
+        return {
+            "format": {"format_name": "matroska,webm"},
+            "streams": [
+                {"index": 0, "codec_type": "video", **video},
+                *(
+                    {"index": index, "codec_type": "audio", **stream}
+                    for index, stream in enumerate(audio, start=1)
+                ),
+            ],
+        }
+
+    def _params(self, **kwargs: Any) -> TranscodeParams:
+        return TranscodeParams(
+            path="/tv/episode.mkv",
+            video_params="-c libx265 -b 5000k",
+            audio_params="-c aac -ac 2",
+            copy_video=self.HEVC,
+            copy_audio=self.STEREO_AAC,
+            **kwargs,
+        )
+
+    @pytest.mark.parametrize(
+        ("stream", "expected"),
+        [
+            ({"codec_name": "hevc", "bit_rate": "4000000", "height": 1080}, True),
+            # Matroska reports the bit rate in the BPS statistics tag
+            ({"codec_name": "hevc", "height": 720, "tags": {"BPS": "4000000"}}, True),
+            ({"codec_name": "h264", "bit_rate": "4000000", "height": 1080}, False),
+            ({"codec_name": "hevc", "bit_rate": "9000000", "height": 1080}, False),
+            ({"codec_name": "hevc", "bit_rate": "4000000", "height": 2160}, False),
+            # a limit the source doesn't report can't be shown to be met
+            ({"codec_name": "hevc", "height": 1080}, False),
+        ],
+    )
+    def test_meets_copy_rule(self, stream: Any, expected: bool) -> None:
+        assert meets_copy_rule(stream, self.HEVC) is expected
+
+    def test_copies_streams_that_meet_the_target(self) -> None:
+        info = self._info(
+            {"codec_name": "hevc", "bit_rate": "4000000", "height": 1080},
+            {"codec_name": "aac", "channels": 2},
+            {"codec_name": "aac", "channels": 6},
+        )
+
+        command = build_ffmpeg_command(self._params(), "/tmp/out.mkv", info)
+
+        assert "-c:v:0" in command
+        assert command[command.index("-c:v:0") + 1] == "copy"
+        assert command[command.index("-c:a:0") + 1] == "copy"
+        # 5.1 audio still gets downmixed
+        assert command[command.index("-c:a:1") + 1] == "aac"
+        assert command[command.index("-ac:a:1") + 1] == "2"
+        assert not nothing_to_transcode(self._params(), info)
+
+    def test_nothing_to_transcode_when_everything_is_copied(self) -> None:
+        info = self._info(
+            {"codec_name": "hevc", "bit_rate": "4000000", "height": 1080},
+            {"codec_name": "aac", "channels": 2, "tags": {"language": "eng"}},
+            {"codec_name": "aac", "channels": 2, "tags": {"language": "fre"}},
+        )
+
+        assert nothing_to_transcode(self._params(), info)
+        # dropping the French track still needs a remux
+        assert not nothing_to_transcode(self._params(languages="eng"), info)
+        # as does changing the container
+        info["format"]["format_name"] = "mov,mp4,m4a,3gp,3g2,mj2"
+        assert not nothing_to_transcode(self._params(), info)
+
+
+class TestSplitEncoding:
+    PARAMS = TranscodeParams(
+        path="/movies/long.mkv", video_params="-c libx265 -crf 20", audio_params="-c aac"
+    )
+    INFO: Any = {
+        "format": {"duration": "7300", "start_time": "0.042"},
+        "streams": [
+            {"index": 0, "codec_type": "video", "codec_name": "h264"},
+            {"index": 1, "codec_type": "audio", "codec_name": "dts"},
+        ],
+    }
+
+    def test_segment_command_encodes_only_the_video_range(self) -> None:
+        command = build_segment_command(self.PARAMS, 600.5, 1201.0, "/seg/00001.mkv")
+
+        assert command[command.index("-ss") + 1] == "600.500000"
+        # -ss is an input option (exact at a keyframe), -t an output option
+        assert command.index("-ss") < command.index("-i") < command.index("-t")
+        assert command[command.index("-t") + 1] == "600.500000"
+        assert command[command.index("-map") + 1] == "0:v:0"
+        assert command[command.index("-c:v:0") + 1] == "libx265"
+        assert "-an" in command
+        assert command[-1] == "/seg/00001.mkv"
+
+    def test_last_segment_runs_to_the_end(self) -> None:
+        command = build_segment_command(self.PARAMS, 6600.0, None, "/seg/00011.mkv")
+
+        assert "-t" not in command
+
+    def test_assemble_copies_video_from_segments(self) -> None:
+        command = build_ffmpeg_command(
+            self.PARAMS, "/tmp/out.mkv", self.INFO, video_from=Path("/seg/5/segments.txt")
+        )
+
+        concat = command.index("/seg/5/segments.txt")
+        assert command[concat - 7 : concat] == [
+            "-i",
+            "/movies/long.mkv",
+            "-f",
+            "concat",
+            "-safe",
+            "0",
+            "-i",
+        ]
+        assert command[command.index("-c:v:0") - 2 : command.index("-c:v:0") + 2] == [
+            "-map",
+            "1:v:0",
+            "-c:v:0",
+            "copy",
+        ]
+        # audio still comes from (and is encoded from) the source
+        assert command[command.index("-c:a:0") + 1] == "aac"
+        # tagged with the profile's params, so the result isn't transcoded again
+        assert "params=-c libx265 -crf 20" in command
+
+    def test_plans_keyframe_aligned_segments(self) -> None:
+        config = MagicMock()
+        config.worker.split = SplitConfig(segment_dir=Path("/seg"), segment_duration=600)
+
+        with (
+            patch.object(t_mod, "config", config),
+            patch.object(t_mod, "keyframe_times", return_value=[600.542, 1201.042]) as keyframes,
+        ):
+            segments = Transcoder()._plan_segments(self.PARAMS, self.INFO)
+
+        # 7300s in ~600s segments: 12, the last absorbing the 100s remainder
+        assert keyframes.call_args.args[1] == [0.042 + 600 * i for i in range(1, 12)]
+        # relative to the file's start, as -ss expects
+        assert segments == [(0.0, 600.5), (600.5, 1201.0), (1201.0, None)]
+
+    def test_does_not_split_short_or_copied_video(self) -> None:
+        config = MagicMock()
+        config.worker.split = SplitConfig(segment_dir=Path("/seg"), min_duration=7200)
+
+        with (
+            patch.object(t_mod, "config", config),
+            patch.object(t_mod, "keyframe_times") as keyframes,
+        ):
+            copied = dataclasses.replace(self.PARAMS, video_params=None)
+            assert Transcoder()._plan_segments(copied, self.INFO) is None
+
+            short: Any = {**self.INFO, "format": {"duration": "3600"}}
+            assert Transcoder()._plan_segments(self.PARAMS, short) is None
+
+        keyframes.assert_not_called()
+
+    def test_assemble_muxes_segments_and_cleans_up(self, tmp_path: Path) -> None:
+        source = tmp_path / "Long Movie.mkv"
+        source.write_text("data")
+        segment_dir = tmp_path / "segments" / "5"
+        segment_dir.mkdir(parents=True)
+        for index in range(2):
+            (segment_dir / f"{index:05}.mkv").write_text("video")
+        (segment_dir / "00002.partial.mkv").write_text("stale")
+
+        profile = MagicMock(video_params="-c libx265", audio_params=None, languages=None)
+        profile.copy_video = profile.copy_audio = profile.nice = profile.ionice = None
+        config = MagicMock()
+        config.transcoding.profiles = {"good": profile}
+        config.general.remote_path_mappings = []
+        config.worker.tmp_dir = tmp_path / "tmp"
+        config.worker.split = SplitConfig(segment_dir=tmp_path / "segments")
+
+        def run_command(command: list[str], *args: Any, **kwargs: Any) -> Any:
+            concat_list = Path(command[command.index("concat") + 4])
+            assert concat_list.read_text() == "file '00000.mkv'\nfile '00001.mkv'\n"
+            Path(command[-1]).write_text("transcoded")
+            return TranscodeResult.SUCCESS, 0, ""
+
+        with (
+            patch.object(t_mod, "config", config),
+            patch.object(t_mod, "ffprobe", return_value=self.INFO),
+            patch.object(Transcoder, "_run_command", side_effect=run_command),
+        ):
+            result = Transcoder().assemble(str(source), "good", None, 5, 2)
+
+        assert result.action == "complete"
+        assert (tmp_path / "Long Movie-TRANSCODED.mkv").read_text() == "transcoded"
+        assert not source.exists()
+        assert not segment_dir.exists()
+
+    def test_assemble_fails_when_a_segment_is_missing(self, tmp_path: Path) -> None:
+        source = tmp_path / "Long Movie.mkv"
+        source.write_text("data")
+        segment_dir = tmp_path / "segments" / "5"
+        segment_dir.mkdir(parents=True)
+        for index in (0, 2):
+            (segment_dir / f"{index:05}.mkv").write_text("video")
+
+        config = MagicMock()
+        config.worker.split = SplitConfig(segment_dir=tmp_path / "segments")
+
+        with (
+            patch.object(t_mod, "config", config),
+            patch.object(Transcoder, "_run_command") as run_command,
+        ):
+            result = Transcoder().assemble(str(source), "good", None, 5, 3)
+            assert (segment_dir / "00000.mkv").exists()
+            # the worker discards them once it has reported the failure
+            Transcoder().discard_segments(5)
+
+        assert result.action == "fail"
+        assert result.reason is not None and "00001.mkv" in result.reason
+        run_command.assert_not_called()
+        assert source.read_text() == "data"
+        assert not segment_dir.exists()
+        assert (tmp_path / "segments").exists()
+
+
+class TestCheckpoints:
+    INFO: Any = TestSplitEncoding.INFO
+
+    @pytest.fixture
+    def source(self, tmp_path: Path) -> Path:
+        source = tmp_path / "long.mkv"
+        source.write_text("data")
+        return source
+
+    @pytest.fixture
+    def config(self, tmp_path: Path) -> Iterator[MagicMock]:
+        config = MagicMock()
+        config.worker.tmp_dir = tmp_path / "tmp"
+        config.worker.checkpoint = CheckpointConfig(segment_duration=3600)
+        with (
+            patch.object(t_mod, "config", config),
+            patch.object(t_mod, "keyframe_times", return_value=[3600.042]),
+        ):
+            yield config
+
+    def _params(self, source: Path) -> TranscodeParams:
+        return dataclasses.replace(TestSplitEncoding.PARAMS, path=str(source))
+
+    def _run(
+        self,
+        source: Path,
+        outcomes: list[TranscodeResult],
+        read_from: Path | None = None,
+        size_limits: list[int | None] | None = None,
+    ) -> tuple[Any, list[str]]:
+        outputs: list[str] = []
+
+        def run_command(command: list[str], *args: Any, **kwargs: Any) -> Any:
+            outputs.append(command[-1])
+            if size_limits is not None:
+                size_limits.append(kwargs.get("size_limit"))
+            result = outcomes.pop(0)
+            if result is TranscodeResult.SUCCESS:
+                Path(command[-1]).write_text("encoded")
+            return result, 0 if result is TranscodeResult.SUCCESS else 1, ""
+
+        with patch.object(Transcoder, "_run_command", side_effect=run_command):
+            result = Transcoder()._run_ffmpeg(
+                self._params(read_from or source),
+                source.parent / "out.mkv",
+                source.parent / "ffmpeg.log",
+                info=self.INFO,
+                job_file=source,
+            )
+        return result, outputs
+
+    def test_interrupted_encode_resumes_after_last_finished_segment(
+        self, source: Path, config: MagicMock
+    ) -> None:
+        checkpoints = config.worker.tmp_dir / "checkpoints"
+
+        # killed while encoding the second segment: the first one is kept
+        result, outputs = self._run(source, [TranscodeResult.SUCCESS, TranscodeResult.RETRY])
+        assert result[0] is TranscodeResult.RETRY
+        (directory,) = checkpoints.iterdir()
+        assert (directory / "00000.mkv").exists()
+        assert not (directory / "00001.mkv").exists()
+
+        result, outputs = self._run(source, [TranscodeResult.SUCCESS, TranscodeResult.SUCCESS])
+
+        assert result[0] is TranscodeResult.SUCCESS
+        # only the second segment is encoded again, then everything is muxed
+        assert outputs == [str(directory / "00001.partial.mkv"), str(source.parent / "out.mkv")]
+        assert not directory.exists()
+
+    def test_resumes_from_another_prefetched_copy(self, source: Path, config: MagicMock) -> None:
+        first_copy = source.parent / "prefetch" / "1" / source.name
+        second_copy = source.parent / "prefetch" / "2" / source.name
+        for copy in (first_copy, second_copy):
+            copy.parent.mkdir(parents=True)
+            copy.write_text("data")
+
+        self._run(source, [TranscodeResult.SUCCESS, TranscodeResult.RETRY], read_from=first_copy)
+        # reclaimed after a restart and prefetched again, to a different path
+        _, outputs = self._run(
+            source, [TranscodeResult.SUCCESS, TranscodeResult.SUCCESS], read_from=second_copy
+        )
+
+        assert len(outputs) == 2  # the second segment and the mux
+
+    def test_failed_encode_discards_its_checkpoint(self, source: Path, config: MagicMock) -> None:
+        result, _ = self._run(source, [TranscodeResult.SUCCESS, TranscodeResult.FAILED])
+
+        assert result[0] is TranscodeResult.FAILED
+        assert list((config.worker.tmp_dir / "checkpoints").iterdir()) == []
+
+    def test_segments_share_the_source_size_limit(self, source: Path, config: MagicMock) -> None:
+        source.write_text("x" * 100)
+        size_limits: list[int | None] = []
+
+        self._run(source, [TranscodeResult.SUCCESS] * 3, size_limits=size_limits)
+
+        # the second segment gets what the first ("encoded", 7 bytes) left over
+        assert size_limits == [100, 93, 100]
+
+    def test_short_video_is_encoded_in_one_go(self, source: Path, config: MagicMock) -> None:
+        config.worker.checkpoint = CheckpointConfig(segment_duration=7300)
+
+        result, outputs = self._run(source, [TranscodeResult.SUCCESS])
+
+        assert result[0] is TranscodeResult.SUCCESS
+        assert outputs == [str(source.parent / "out.mkv")]
+
+
+class TestPreflight:
+    INFO: Any = {
+        "format": {"duration": "3000"},
+        "streams": [
+            {"index": 0, "codec_type": "video", "codec_name": "h264"},
+            {"index": 1, "codec_type": "audio", "codec_name": "dts"},
+        ],
+    }
+
+    def test_sample_command_limits_the_full_command(self) -> None:
+        params = TranscodeParams(path="/movies/a.mkv", video_params="-c libx265")
+        command = build_sample_command(params, 490.0, 20, "/tmp/a.sample0.mkv", self.INFO)
+
+        assert command.index("-ss") < command.index("-i")
+        assert command[command.index("-ss") + 1] == "490.000000"
+        assert command[-5:] == ["-t", "20.000000", "-f", "matroska", "/tmp/a.sample0.mkv"]
+        assert "-c:a:0" in command
+
+    @pytest.mark.parametrize(("sample_size", "action"), [(9_000, "skip"), (2_000, "complete")])
+    def test_skips_when_projected_savings_are_too_small(
+        self, tmp_path: Path, sample_size: int, action: str
+    ) -> None:
+        source = tmp_path / "a.mkv"
+        # 3000 s from three 20 s samples: the output is 50x their total size
+        source.write_bytes(b"x" * 1_500_000)
+
+        profile = MagicMock(video_params="-c libx265", audio_params=None, languages=None)
+        profile.copy_video = profile.copy_audio = profile.fallback = None
+        profile.nice = profile.ionice = None
+        profile.preflight = PreflightConfig(samples=3, sample_duration=20, min_savings=0.2)
+        config = MagicMock()
+        config.transcoding.profiles = {"good": profile}
+        config.general.remote_path_mappings = []
+        config.worker.tmp_dir = tmp_path / "tmp"
+        config.worker.split = config.worker.checkpoint = None
+        config.worker.staging = "tmp_dir"
+
+        progress = FfmpegProgress()
+        job_progress: list[bool] = []
+
+        def run_command(command: list[str], *args: Any, **kwargs: Any) -> Any:
+            job_progress.append(kwargs.get("progress") is progress)
+            Path(command[-1]).write_bytes(b"x" * sample_size)
+            return TranscodeResult.SUCCESS, 0, ""
+
+        estimates: list[Estimate] = []
+        with (
+            patch.object(t_mod, "config", config),
+            patch.object(t_mod, "ffprobe", return_value=self.INFO),
+            patch.object(t_mod, "finalize_output", return_value="rename"),
+            patch.object(Transcoder, "_run_command", side_effect=run_command) as mock_run,
+        ):
+            result = Transcoder().transcode(
+                str(source), "good", None, on_estimate=estimates.append, progress=progress
+            )
+
+        assert result.action == action
+        # samples don't reset the progress the job's heartbeats report
+        assert job_progress == [False] * 3 + ([True] if action == "complete" else [])
+        (estimate,) = estimates
+        assert estimate.projected_size == sample_size * 3 * 50
+        # samples are cleaned up either way
+        assert list((tmp_path / "tmp").glob("*.sample*")) == []
+        assert mock_run.call_count == (3 if action == "skip" else 4)
+
+
 def test_file_stem_sanitization() -> None:
     assert (
         sanitize_file_stem(
@@ -418,6 +930,11 @@ class TestTranscodeFallback:
         profile.keep_original_language = keep_original_language
         profile.hwaccel = hwaccel
         profile.fallback = fallback
+        profile.copy_video = None
+        profile.copy_audio = None
+        profile.preflight = None
+        profile.nice = None
+        profile.ionice = None
         return profile
 
     def _config(self, profile: MagicMock) -> MagicMock:
@@ -426,12 +943,26 @@ class TestTranscodeFallback:
         # the transcoder maps its own paths / picks its own tmp dir
         config.general.remote_path_mappings = []
         config.worker.tmp_dir = None
+        config.worker.split = None
+        config.worker.checkpoint = None
+        config.worker.staging = "tmp_dir"
         return config
 
     @pytest.fixture
     def transcoder(self) -> Transcoder:
         return Transcoder()
 
+    @pytest.fixture(autouse=True)
+    def mock_finalize(self) -> Iterator[MagicMock]:
+        with patch.object(t_mod, "finalize_output", return_value="rename") as mock_finalize:
+            yield mock_finalize
+
+    @pytest.fixture(autouse=True)
+    def mock_ffprobe(self) -> Iterator[MagicMock]:
+        with patch.object(t_mod, "ffprobe") as mock_ffprobe:
+            mock_ffprobe.return_value = {"format": {}, "streams": []}
+            yield mock_ffprobe
+
     @pytest.fixture
     def source_file(self, tmp_path: Path) -> Path:
         src = tmp_path / "The Movie.mkv"
@@ -525,6 +1056,7 @@ class TestTranscodeFallback:
         source_file: Path,
         tmp_path: Path,
         monkeypatch: pytest.MonkeyPatch,
+        mock_finalize: MagicMock,
     ) -> None:
         log_dir = tmp_path / "logs"
         monkeypatch.setenv("WB_LOG_DIR", str(log_dir))
@@ -554,10 +1086,12 @@ class TestTranscodeFallback:
         assert result.filename is not None
         assert mock_run.call_count == 2
         mock_shutil.copy.assert_called_once_with(
-            tmp_path / "wi1_bot.transcoder.log",
+            tmp_path / "The Movie.wi1_bot.transcoder.log",
             log_dir / "transcoder-errors" / "The Movie.log",
         )
-        mock_shutil.move.assert_called_once()
+        mock_finalize.assert_called_once_with(
+            tmp_path / "The Movie-TRANSCODED.mkv", source_file.parent / "The Movie-TRANSCODED.mkv"
+        )
 
     def test_retry_preserves_failure_log(
         self,
@@ -584,7 +1118,7 @@ class TestTranscodeFallback:
 
         assert result.action == "retry"
         mock_shutil.copy.assert_called_once_with(
-            tmp_path / "wi1_bot.transcoder.log",
+            tmp_path / "The Movie.wi1_bot.transcoder.log",
             log_dir / "transcoder-errors" / "The Movie.log",
         )
 
@@ -637,3 +1171,206 @@ class TestTranscodeFallback:
         fallback_params = mock_run.call_args_list[1].args[0]
         assert primary_params.hwaccel == "videotoolbox"
         assert fallback_params.hwaccel is None
+
+    def test_prefetched_source_is_read_but_job_file_replaced(
+        self,
+        transcoder: Transcoder,
+        source_file: Path,
+        mock_ffprobe: MagicMock,
+        mock_finalize: MagicMock,
+        tmp_path: Path,
+    ) -> None:
+        copy = tmp_path / "prefetch" / "5" / source_file.name
+        copy.parent.mkdir(parents=True)
+        copy.write_text("data")
+        config = self._config(self._profile())
+
+        with (
+            patch.object(t_mod, "config", config),
+            patch.object(
+                Transcoder, "_run_ffmpeg", return_value=(TranscodeResult.SUCCESS, 0, "")
+            ) as mock_run,
+        ):
+            result = transcoder.transcode(str(source_file), "good", None, source=copy)
+
+        assert result.action == "complete"
+        assert mock_ffprobe.call_args.args[0] == source_file
+        assert mock_run.call_args.args[0].path == str(copy)
+        assert mock_finalize.call_args.args[1].parent == source_file.parent
+        assert not source_file.exists()
+
+    def test_already_transcoded_skips_without_running(
+        self, transcoder: Transcoder, source_file: Path, mock_ffprobe: MagicMock
+    ) -> None:
+        config = self._config(self._profile(audio_params="-c:a aac"))
+        mock_ffprobe.return_value = {
+            "format": {"tags": {"WI1_BOT_VERSION": "0.1.0"}},
+            "streams": [
+                {"index": 0, "codec_type": "video", "tags": {"PARAMS": "-c:v hw"}},
+                {"index": 1, "codec_type": "audio", "tags": {"PARAMS": "-c:a aac"}},
+            ],
+        }
+
+        with (
+            patch.object(t_mod, "config", config),
+            patch.object(Transcoder, "_run_ffmpeg") as mock_run,
+        ):
+            result = transcoder.transcode(str(source_file), "good", None)
+
+        assert result.action == "skip"
+        mock_run.assert_not_called()
+        mock_ffprobe.assert_called_once()
+
+    def test_nothing_to_transcode_skips_without_running(
+        self, transcoder: Transcoder, source_file: Path, mock_ffprobe: MagicMock
+    ) -> None:
+        profile = self._profile(audio_params="-c:a aac")
+        profile.copy_video = CopyRule(codecs=["hevc"])
+        profile.copy_audio = CopyRule(codecs=["aac"], max_channels=2)
+        config = self._config(profile)
+        mock_ffprobe.return_value = {
+            "format": {"format_name": "matroska,webm"},
+            "streams": [
+                {"index": 0, "codec_type": "video", "codec_name": "hevc"},
+                {"index": 1, "codec_type": "audio", "codec_name": "aac", "channels": 2},
+            ],
+        }
+
+        with (
+            patch.object(t_mod, "config", config),
+            patch.object(Transcoder, "_run_ffmpeg") as mock_run,
+        ):
+            result = transcoder.transcode(str(source_file), "good", None)
+
+        assert result.action == "skip"
+        mock_run.assert_not_called()
+
+    def test_destination_staging_writes_next_to_the_source(
+        self, transcoder: Transcoder, source_file: Path, mock_finalize: MagicMock
+    ) -> None:
+        config = self._config(self._profile())
+        config.worker.staging = "destination"
+
+        with (
+            patch.object(t_mod, "config", config),
+            patch.object(
+                Transcoder, "_run_ffmpeg", return_value=(TranscodeResult.SUCCESS, 0, "")
+            ) as mock_run,
+        ):
+            result = transcoder.transcode(str(source_file), "good", None)
+
+        # hidden and with the suffix Radarr/Sonarr scans ignore, so finishing is a rename
+        staged = source_file.parent / ".The Movie-TRANSCODED.mkv.partial~"
+        assert result.action == "complete"
+        assert mock_run.call_args.args[1] == staged
+        mock_finalize.assert_called_once_with(
+            staged, source_file.parent / "The Movie-TRANSCODED.mkv"
+        )
+
+    def test_destination_staging_removes_orphaned_partials(
+        self, transcoder: Transcoder, source_file: Path, mock_finalize: MagicMock
+    ) -> None:
+        config = self._config(self._profile())
+        config.worker.staging = "destination"
+        orphan = source_file.parent / ".Other Movie-TRANSCODED.mkv.partial~"
+        in_progress = source_file.parent / ".Third Movie-TRANSCODED.mkv.partial~"
+        for partial in (orphan, in_progress):
+            partial.write_text("partial")
+        stale = time.time() - ORPHAN_AGE - 60
+        os.utime(orphan, (stale, stale))
+
+        with (
+            patch.object(t_mod, "config", config),
+            patch.object(Transcoder, "_run_ffmpeg", return_value=(TranscodeResult.SUCCESS, 0, "")),
+        ):
+            transcoder.transcode(str(source_file), "good", None)
+
+        # another worker may still be writing the recent one
+        assert not orphan.exists()
+        assert in_progress.exists()
+
+    def _failure_memory_case(
+        self, tmp_path: Path, mock_ffprobe: MagicMock
+    ) -> tuple[MagicMock, FailureMemory, SourceSignature]:
+        fallback = MagicMock()
+        fallback.video_params = "-c:v libx265"
+        fallback.audio_params = "-c:a copy"
+        fallback.hwaccel = None
+        config = self._config(self._profile(hwaccel="cuda", fallback=fallback))
+        config.worker.tmp_dir = tmp_path
+        mock_ffprobe.return_value = {
+            "format": {},
+            "streams": [
+                {
+                    "index": 0,
+                    "codec_type": "video",
+                    "codec_name": "h264",
+                    "profile": "High 10",
+                    "pix_fmt": "yuv420p10le",
+                }
+            ],
+        }
+        signature = SourceSignature("good", "h264", "High 10", "yuv420p10le")
+        return config, FailureMemory(tmp_path / "failures", ttl=60), signature
+
+    def test_remembers_primary_failure_the_fallback_recovered_from(
+        self, source_file: Path, tmp_path: Path, mock_ffprobe: MagicMock
+    ) -> None:
+        config, memory, signature = self._failure_memory_case(tmp_path, mock_ffprobe)
+
+        with (
+            patch.object(t_mod, "config", config),
+            patch.object(
+                Transcoder,
+                "_run_ffmpeg",
+                side_effect=[
+                    (TranscodeResult.FAILED, 1, "[h264 @ 0x1] No decoder surfaces left"),
+                    (TranscodeResult.SUCCESS, 0, ""),
+                ],
+            ),
+            patch.object(t_mod, "shutil"),
+        ):
+            result = Transcoder(memory).transcode(str(source_file), "good", None)
+
+        assert result.action == "complete"
+        assert memory.get(signature) == "[h264] No decoder surfaces left"
+
+    def test_known_bad_source_goes_straight_to_fallback(
+        self, source_file: Path, tmp_path: Path, mock_ffprobe: MagicMock
+    ) -> None:
+        config, memory, signature = self._failure_memory_case(tmp_path, mock_ffprobe)
+        memory.put(signature, "[h264] No decoder surfaces left")
+
+        with (
+            patch.object(t_mod, "config", config),
+            patch.object(
+                Transcoder, "_run_ffmpeg", return_value=(TranscodeResult.SUCCESS, 0, "")
+            ) as mock_run,
+        ):
+            result = Transcoder(memory).transcode(str(source_file), "good", None)
+
+        assert result.action == "complete"
+        mock_run.assert_called_once()
+        assert mock_run.call_args.args[0].video_params == "-c:v libx265"
+
+    def test_does_not_remember_when_both_attempts_fail(
+        self, source_file: Path, tmp_path: Path, mock_ffprobe: MagicMock
+    ) -> None:
+        config, memory, signature = self._failure_memory_case(tmp_path, mock_ffprobe)
+
+        with (
+            patch.object(t_mod, "config", config),
+            patch.object(
+                Transcoder,
+                "_run_ffmpeg",
+                side_effect=[
+                    (TranscodeResult.FAILED, 1, "Invalid data found"),
+                    (TranscodeResult.FAILED, 1, "Invalid data found"),
+                ],
+            ),
+            patch.object(t_mod, "shutil"),
+        ):
+            result = Transcoder(memory).transcode(str(source_file), "good", None)
+
+        assert result.action == "fail"
+        assert memory.get(signature) is None
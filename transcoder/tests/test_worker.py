@@ -1,45 +1,130 @@
+import threading
+from pathlib import Path
+from typing import cast
 from unittest.mock import MagicMock, patch
 
+import pytest
+import requests
+
 import wi1_bot.transcoder.worker as worker_mod
+from wi1_bot.transcoder.capabilities import Capabilities
+from wi1_bot.transcoder.client import WebhookClient
+from wi1_bot.transcoder.outbox import Outbox
+from wi1_bot.transcoder.prefetch import Prefetcher, discard
+from wi1_bot.transcoder.preflight import Estimate
+from wi1_bot.transcoder.progress import FfmpegProgress
 from wi1_bot.transcoder.transcoder import JobResult
 
 
-def _posts(mock_requests: MagicMock) -> list[tuple[str, dict[str, object]]]:
-    return [(c.args[0], c.kwargs["json"]) for c in mock_requests.post.call_args_list]
+def _client() -> WebhookClient:
+    client = WebhookClient("http://wh")
+    client.session = MagicMock()
+    client.session.post.return_value = MagicMock(status_code=200)
+    return client
+
+
+def _posts(client: WebhookClient) -> list[tuple[str, dict[str, object]]]:
+    session = cast(MagicMock, client.session)
+    # outbox reports carry a random report_id
+    return [
+        (c.args[0], {k: v for k, v in c.kwargs["json"].items() if k != "report_id"})
+        for c in session.post.call_args_list
+    ]
+
+
+def test_claim_advertises_capabilities() -> None:
+    capabilities = Capabilities(
+        encoders=frozenset({"libx265"}),
+        hwaccels=frozenset(),
+        profiles=("good", "great"),
+        runnable_profiles=("good",),
+        paths=("/data/movies",),
+    )
+    client = _client()
+    cast(MagicMock, client.session).post.return_value.status_code = 204
+    assert worker_mod._claim(client, "w1", capabilities) is None
+
+    assert _posts(client) == [
+        (
+            "http://wh/jobs/claim",
+            {
+                "worker_id": "w1",
+                "capabilities": {
+                    "encoders": ["libx265"],
+                    "hwaccels": [],
+                    "profiles": ["good", "great"],
+                    "runnable_profiles": ["good"],
+                    "paths": ["/data/movies"],
+                },
+            },
+        ),
+    ]
+
+
+def test_claim_long_polls() -> None:
+    client = _client()
+    cast(MagicMock, client.session).post.return_value.status_code = 204
+    assert worker_mod._claim(client, "w1", wait=30) is None
+
+    assert _posts(client) == [("http://wh/jobs/claim", {"worker_id": "w1", "wait": 30})]
+    # the request outlives the wait
+    assert cast(MagicMock, client.session).post.call_args.kwargs["timeout"][1] > 30
 
 
-def test_report_complete_posts_filename() -> None:
-    with patch.object(worker_mod, "requests") as mock_requests:
-        worker_mod._report("http://wh", 5, "w1", JobResult("complete", filename="a-TRANSCODED.mkv"))
+def test_report_complete_posts_filename(tmp_path: Path) -> None:
+    client = _client()
+    worker_mod._report(
+        Outbox(tmp_path, client), 5, "w1", JobResult("complete", filename="a-TRANSCODED.mkv")
+    )
 
-    assert _posts(mock_requests) == [
+    assert _posts(client) == [
         ("http://wh/jobs/5/complete", {"worker_id": "w1", "filename": "a-TRANSCODED.mkv"}),
     ]
 
 
-def test_report_skip_completes_without_filename() -> None:
-    with patch.object(worker_mod, "requests") as mock_requests:
-        worker_mod._report("http://wh", 5, "w1", JobResult("skip"))
+def test_report_complete_includes_finalize_timing(tmp_path: Path) -> None:
+    result = JobResult(
+        "complete", filename="a-TRANSCODED.mkv", finalize_seconds=1.5, finalize_method="copy"
+    )
+    client = _client()
+    worker_mod._report(Outbox(tmp_path, client), 5, "w1", result)
+
+    assert _posts(client) == [
+        (
+            "http://wh/jobs/5/complete",
+            {
+                "worker_id": "w1",
+                "filename": "a-TRANSCODED.mkv",
+                "finalize_seconds": 1.5,
+                "finalize_method": "copy",
+            },
+        ),
+    ]
 
-    assert _posts(mock_requests) == [("http://wh/jobs/5/complete", {"worker_id": "w1"})]
 
+def test_report_skip_completes_without_filename(tmp_path: Path) -> None:
+    client = _client()
+    worker_mod._report(Outbox(tmp_path, client), 5, "w1", JobResult("skip"))
 
-def test_report_retry_fails_with_retry_true() -> None:
-    with patch.object(worker_mod, "requests") as mock_requests:
-        worker_mod._report("http://wh", 5, "w1", JobResult("retry", reason="interrupted"))
+    assert _posts(client) == [("http://wh/jobs/5/complete", {"worker_id": "w1"})]
 
-    assert _posts(mock_requests) == [
+
+def test_report_retry_fails_with_retry_true(tmp_path: Path) -> None:
+    client = _client()
+    worker_mod._report(Outbox(tmp_path, client), 5, "w1", JobResult("retry", reason="interrupted"))
+
+    assert _posts(client) == [
         ("http://wh/jobs/5/fail", {"worker_id": "w1", "retry": True, "reason": "interrupted"}),
     ]
 
 
-def test_report_fail_includes_log_tail() -> None:
-    with patch.object(worker_mod, "requests") as mock_requests:
-        worker_mod._report(
-            "http://wh", 5, "w1", JobResult("fail", reason="boom", log_tail="ffmpeg died")
-        )
+def test_report_fail_includes_log_tail(tmp_path: Path) -> None:
+    client = _client()
+    worker_mod._report(
+        Outbox(tmp_path, client), 5, "w1", JobResult("fail", reason="boom", log_tail="ffmpeg died")
+    )
 
-    assert _posts(mock_requests) == [
+    assert _posts(client) == [
         (
             "http://wh/jobs/5/fail",
             {"worker_id": "w1", "retry": False, "reason": "boom", "log_tail": "ffmpeg died"},
@@ -47,9 +132,335 @@ def test_report_fail_includes_log_tail() -> None:
     ]
 
 
-def test_report_swallows_network_errors() -> None:
-    with patch.object(worker_mod, "requests") as mock_requests:
-        mock_requests.RequestException = Exception
-        mock_requests.post.side_effect = Exception("connection refused")
-        # a failed report must not raise (the lease will expire and re-dispatch)
-        worker_mod._report("http://wh", 5, "w1", JobResult("complete", filename="a.mkv"))
+def test_report_split_posts_segments(tmp_path: Path) -> None:
+    client = _client()
+    worker_mod._report(
+        Outbox(tmp_path, client),
+        5,
+        "w1",
+        JobResult("split", segments=[(0.0, 600.2), (600.2, None)]),
+    )
+
+    assert _posts(client) == [
+        (
+            "http://wh/jobs/5/split",
+            {"worker_id": "w1", "segments": [[0.0, 600.2], [600.2, None]]},
+        ),
+    ]
+
+
+def test_report_estimate_posts_projection() -> None:
+    client = _client()
+    worker_mod._report_estimate(client, 5, "w1", Estimate(4_000, 1_000, 90.0))
+
+    assert _posts(client) == [
+        (
+            "http://wh/jobs/5/estimate",
+            {
+                "worker_id": "w1",
+                "source_size": 4_000,
+                "projected_size": 1_000,
+                "projected_seconds": 90.0,
+            },
+        ),
+    ]
+
+
+def test_transcode_dispatches_on_job_kind() -> None:
+    transcoder = MagicMock()
+    progress = FfmpegProgress()
+    segment = {
+        "id": 7,
+        "kind": "segment",
+        "path": "/movies/a.mkv",
+        "quality_profile": "good",
+        "parent_id": 5,
+        "segment_index": 1,
+        "segment_start": 600.2,
+        "segment_end": None,
+    }
+
+    worker_mod._transcode(transcoder, segment, progress, cores=(0, 1))
+    worker_mod._transcode(
+        transcoder,
+        {
+            "id": 5,
+            "kind": "assemble",
+            "path": "/movies/a.mkv",
+            "quality_profile": "good",
+            "segment_count": 2,
+        },
+        progress,
+    )
+
+    transcoder.transcode_segment.assert_called_once_with(
+        "/movies/a.mkv", "good", 5, 1, 600.2, None, progress=progress, cores=(0, 1)
+    )
+    transcoder.assemble.assert_called_once_with(
+        "/movies/a.mkv", "good", None, 5, 2, progress=progress, cores=None
+    )
+    transcoder.transcode.assert_not_called()
+
+
+def test_report_swallows_network_errors(tmp_path: Path) -> None:
+    client = _client()
+    with patch.object(client.session, "post", side_effect=requests.ConnectionError("refused")):
+        # a failed report must not raise; it stays in the outbox to be retried
+        outbox = Outbox(tmp_path, client)
+        worker_mod._report(outbox, 5, "w1", JobResult("complete", filename="a.mkv"))
+
+    assert len(outbox.pending()) == 1
+
+
+def test_job_slots_uses_profile_weight() -> None:
+    config = MagicMock()
+    config.transcoding.profiles = {"x265": MagicMock(slots=4), "copy": MagicMock(slots=1)}
+
+    with patch.object(worker_mod, "config", config):
+        assert worker_mod._job_slots({"quality_profile": "x265"}, 8) == 4
+        assert worker_mod._job_slots({"quality_profile": "copy"}, 8) == 1
+        # unknown profiles are skipped straight away
+        assert worker_mod._job_slots({"quality_profile": "missing"}, 8) == 1
+        # a profile heavier than the worker still runs, alone
+        assert worker_mod._job_slots({"quality_profile": "x265"}, 2) == 2
+
+
+def test_slots_block_until_enough_are_released() -> None:
+    slots = worker_mod._Slots(4)
+    slots.acquire(3)
+
+    acquired = threading.Event()
+
+    def acquire_heavy() -> None:
+        slots.acquire(2)
+        acquired.set()
+
+    thread = threading.Thread(target=acquire_heavy, daemon=True)
+    thread.start()
+
+    # only one slot is free, so the two-slot job waits
+    assert not acquired.wait(0.1)
+
+    slots.release(3)
+    assert acquired.wait(1)
+    thread.join(1)
+
+
+def test_closing_slots_wakes_waiters() -> None:
+    slots = worker_mod._Slots(2)
+    slots.acquire(2)
+
+    results: list[bool] = []
+    thread = threading.Thread(target=lambda: results.append(slots.acquire(1)), daemon=True)
+    thread.start()
+
+    slots.close()
+    thread.join(1)
+
+    assert results == [False]
+    assert slots.wait_for_free() is False
+
+
+def test_report_release_hands_the_job_back(tmp_path: Path) -> None:
+    client = _client()
+    worker_mod._report(
+        Outbox(tmp_path, client), 5, "w1", JobResult("retry", reason="shutting down"), release=True
+    )
+
+    assert _posts(client) == [
+        (
+            "http://wh/jobs/5/fail",
+            {"worker_id": "w1", "retry": True, "reason": "shutting down", "release": True},
+        ),
+    ]
+
+
+def test_drain_waits_for_running_jobs_within_grace() -> None:
+    slots = worker_mod._Slots(2)
+    slots.acquire(1)
+    transcoder = MagicMock()
+    threading.Timer(0.05, slots.release, args=(1,)).start()
+
+    worker_mod._drain(transcoder, slots, grace=5)
+
+    transcoder.terminate.assert_not_called()
+
+
+def test_drain_terminates_jobs_still_running_after_grace() -> None:
+    slots = worker_mod._Slots(2)
+    slots.acquire(1)
+    transcoder = MagicMock()
+    # the terminated job reports and frees its slot
+    transcoder.terminate.side_effect = lambda: slots.release(1)
+
+    worker_mod._drain(transcoder, slots, grace=0)
+
+    transcoder.terminate.assert_called_once()
+    assert slots.wait_idle(0)
+
+
+def test_heartbeat_payload_carries_latest_progress() -> None:
+    progress = FfmpegProgress()
+    heartbeat = worker_mod._Heartbeat(_client(), 5, "w1", 60, progress)
+
+    # no block yet: a plain lease renewal
+    assert heartbeat._payload() == {"worker_id": "w1"}
+
+    progress.reset(600.0)
+    for line in ("out_time_us=30000000", "fps=24", "speed=1.5x", "total_size=1000"):
+        progress.feed(line)
+    progress.feed("progress=continue")
+
+    assert heartbeat._payload() == {
+        "worker_id": "w1",
+        "progress": {
+            "out_time": 30.0,
+            "fps": 24.0,
+            "speed": 1.5,
+            "total_size": 1000,
+            "duration": 600.0,
+        },
+    }
+
+
+def test_reserved_heartbeat_renews_a_short_lease_until_started() -> None:
+    heartbeat = worker_mod._Heartbeat(_client(), 5, "w1", 60, lease=120)
+
+    assert heartbeat._payload() == {"worker_id": "w1", "lease": 120}
+    assert heartbeat._next_interval() == 40
+
+    heartbeat.lease = None
+
+    assert heartbeat._payload() == {"worker_id": "w1"}
+    assert heartbeat._next_interval() == 60
+
+
+def test_claim_sends_reservation_lease() -> None:
+    client = _client()
+    cast(MagicMock, client.session).post.return_value = MagicMock(status_code=204)
+
+    worker_mod._claim(client, "w1", lease=120)
+
+    assert _posts(client) == [("http://wh/jobs/claim", {"worker_id": "w1", "lease": 120})]
+
+
+def test_try_acquire_does_not_wait() -> None:
+    slots = worker_mod._Slots(2)
+
+    assert slots.try_acquire(2)
+    assert not slots.try_acquire(1)
+    slots.release(1)
+    assert slots.try_acquire(1)
+    slots.close()
+    slots.release(2)
+    assert not slots.try_acquire(1)
+
+
+def test_reservation_prefetches_source(tmp_path: Path) -> None:
+    source = tmp_path / "a.mkv"
+    source.write_bytes(b"x" * 100)
+    prefetcher = Prefetcher(tmp_path / "prefetch", max_bytes=1000)
+    job = {"id": 5, "path": str(source), "quality_profile": "good"}
+
+    with patch.object(worker_mod, "config") as config:
+        config.general.remote_path_mappings = []
+        reservation = worker_mod._Reservation(job, prefetcher)
+        reservation.start()
+        reservation._thread.join()
+        copy = reservation.take()
+
+    assert copy is not None
+    assert copy.read_bytes() == source.read_bytes()
+
+    discard(copy)
+    assert prefetcher.used() == 0
+
+
+def test_only_whole_transcodes_are_prepared_ahead() -> None:
+    with patch.object(worker_mod, "config") as config:
+        config.transcoding.profiles = {"good": MagicMock()}
+
+        assert worker_mod._reservable({"quality_profile": "good"})
+        assert not worker_mod._reservable({"quality_profile": "missing"})
+        assert not worker_mod._reservable({"kind": "segment", "quality_profile": "good"})
+
+
+def test_run_job_lets_go_of_its_slot_when_cores_cannot_be_acquired(tmp_path: Path) -> None:
+    client = _client()
+    slots = worker_mod._Slots(1)
+    assert slots.acquire(1)
+    heartbeat = MagicMock()
+    cpus = MagicMock()
+    cpus.acquire.side_effect = RuntimeError("no cores")
+    job = {"id": 5, "path": "/movies/a.mkv", "quality_profile": "good"}
+
+    worker_mod._run_job(
+        MagicMock(),
+        client,
+        Outbox(tmp_path, client),
+        "w1",
+        job,
+        heartbeat,
+        FfmpegProgress(),
+        slots,
+        1,
+        threading.Event(),
+        cpus=cpus,
+    )
+
+    heartbeat.stop.assert_called_once()
+    cpus.release.assert_not_called()
+    assert slots.try_acquire(1)
+    assert _posts(client) == [
+        (
+            "http://wh/jobs/5/fail",
+            {"worker_id": "w1", "retry": True, "reason": "unhandled worker error"},
+        ),
+    ]
+
+
+@pytest.mark.parametrize(
+    ("job", "result", "discarded"),
+    [
+        ({"kind": "segment", "parent_id": 4}, JobResult("fail"), 4),
+        ({"kind": "segment", "parent_id": 4, "final_attempt": True}, JobResult("retry"), 4),
+        ({"kind": "segment", "parent_id": 4, "final_attempt": False}, JobResult("retry"), None),
+        ({"kind": "assemble", "final_attempt": True}, JobResult("fail"), 5),
+        ({"kind": "assemble"}, JobResult("complete", filename="a.mkv"), None),
+        ({"final_attempt": True}, JobResult("fail"), None),
+    ],
+)
+def test_split_job_segments_are_discarded_once_it_fails_for_good(
+    tmp_path: Path, job: dict[str, object], result: JobResult, discarded: int | None
+) -> None:
+    client = _client()
+    transcoder = MagicMock()
+    transcoder.transcode_segment.return_value = transcoder.assemble.return_value = result
+    transcoder.transcode.return_value = result
+    job = {
+        "id": 5,
+        "path": "/movies/a.mkv",
+        "quality_profile": "good",
+        "segment_index": 0,
+        "segment_start": 0,
+        "segment_end": None,
+        **job,
+    }
+
+    worker_mod._run_job(
+        transcoder,
+        client,
+        Outbox(tmp_path, client),
+        "w1",
+        job,
+        MagicMock(),
+        FfmpegProgress(),
+        worker_mod._Slots(1),
+        1,
+        threading.Event(),
+    )
+
+    if discarded is None:
+        transcoder.discard_segments.assert_not_called()
+    else:
+        transcoder.discard_segments.assert_called_once_with(discarded)
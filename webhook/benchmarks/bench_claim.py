@@ -0,0 +1,148 @@
+"""Throughput of transcode job claims with concurrent claimers.
+
+Fills a fresh queue database with ``--jobs`` jobs, then drains it with 1, 4 and 16
+claimer processes at once (each like a webhook process serving claims, with its own
+connection), every claim advertising worker capabilities as real workers do. Reports
+the claims per second (best of ``--rounds``) and the mean latency of one claim, and
+fails if any job was handed out twice.
+
+``--save FILE`` writes the results as a baseline; ``--baseline FILE`` compares
+against one and exits non-zero if a case's throughput dropped more than
+``--tolerance`` allows.
+
+Run with ``uv run python webhook/benchmarks/bench_claim.py [--baseline FILE]``.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from multiprocessing.synchronize import Barrier
+from pathlib import Path
+
+# the webhook reads its config at import; nothing here depends on its values
+os.environ.setdefault("WB_CONFIG_PATH", str(Path(__file__).parents[1] / "config.yaml.template"))
+
+from sqlalchemy.orm import Session  # noqa: E402
+
+import wi1_bot.webhook.db as db_mod  # noqa: E402
+from wi1_bot.webhook.models import TranscodeItem  # noqa: E402
+from wi1_bot.webhook.transcode_queue import TranscodeQueue, WorkerCapabilities  # noqa: E402
+
+CLAIMERS = (1, 4, 16)
+PROFILES = ("good", "great")
+
+
+def _fill(jobs: int) -> None:
+    with Session(db_mod.get_engine()) as session:
+        session.add_all(
+            TranscodeItem(path=f"/media/movies/{i}.mkv", quality_profile=PROFILES[i % 2])
+            for i in range(jobs)
+        )
+        session.commit()
+
+
+def _claimer(index: int, barrier: Barrier, results: "multiprocessing.Queue[list[int]]") -> None:
+    db_mod.init_db()
+    queue = TranscodeQueue()
+    capabilities = WorkerCapabilities(profiles=PROFILES, runnable_profiles=PROFILES)
+    claimed = []
+    barrier.wait()
+    while (item := queue.claim(f"bench-{index}", capabilities=capabilities)) is not None:
+        claimed.append(item.id)
+    results.put(claimed)
+
+
+def _run(claimers: int, jobs: int) -> tuple[float, list[int]]:
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["WB_DB_PATH"] = str(Path(tmp) / "bench.db")
+        db_mod.init_db()
+        try:
+            _fill(jobs)
+
+            barrier = context.Barrier(claimers + 1)
+            results: multiprocessing.Queue[list[int]] = context.Queue()
+            processes = [
+                context.Process(target=_claimer, args=(i, barrier, results))
+                for i in range(claimers)
+            ]
+            for process in processes:
+                process.start()
+            barrier.wait()
+            started = time.perf_counter()
+            claimed = [job for _ in processes for job in results.get()]
+            elapsed = time.perf_counter() - started
+            for process in processes:
+                process.join()
+        finally:
+            db_mod.get_engine().dispose()
+            db_mod._engine = None
+    return elapsed, claimed
+
+
+def _measure(claimers: int, jobs: int, rounds: int) -> dict[str, float]:
+    best = float("inf")
+    for _ in range(rounds):
+        elapsed, claimed = _run(claimers, jobs)
+        if len(claimed) != jobs or len(set(claimed)) != jobs:
+            sys.exit(f"{claimers} claimers: {len(claimed)} claims of {len(set(claimed))} jobs")
+        best = min(best, elapsed)
+    return {
+        "claims_per_s": jobs / best,
+        # each claimer waits its turn for the database's single writer
+        "latency_ms": best / jobs * claimers * 1e3,
+    }
+
+
+def _regressions(
+    results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], tolerance: float
+) -> list[str]:
+    found = []
+    for case, metrics in results.items():
+        before = baseline.get(case, {}).get("claims_per_s")
+        value = metrics["claims_per_s"]
+        if before and value < before * (1 - tolerance):
+            found.append(f"{case} claims_per_s: {before:.0f} -> {value:.0f}")
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=2000, help="jobs to claim per run")
+    parser.add_argument("--rounds", type=int, default=3, help="runs per case (best of)")
+    parser.add_argument("--save", type=Path, help="write the results as a baseline")
+    parser.add_argument("--baseline", type=Path, help="compare against a saved baseline")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="allowed throughput drop vs the baseline"
+    )
+    args = parser.parse_args()
+
+    results: dict[str, dict[str, float]] = {}
+    print(f"{args.jobs} jobs (best of {args.rounds})")
+    for claimers in CLAIMERS:
+        case = f"claim[{claimers}]"
+        results[case] = metrics = _measure(claimers, args.jobs, args.rounds)
+        print(
+            f"  {case:<12} {metrics['claims_per_s']:9.0f} claims/s"
+            f"  {metrics['latency_ms']:8.2f} ms per claim"
+        )
+
+    if args.save is not None:
+        args.save.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+        print(f"baseline saved to {args.save}")
+
+    if args.baseline is not None:
+        regressions = _regressions(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no throughput drops beyond {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
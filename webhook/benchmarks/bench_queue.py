@@ -0,0 +1,188 @@
+"""Latency of transcode queue operations under contention.
+
+Runs 1, 4 and 16 threads (like the webhook's request threads) against one fresh
+queue database for ``--seconds`` each. Every thread loops through a job's life:
+enqueue, claim (advertising capabilities), three heartbeats with progress, and
+complete, while another thread collects the queue metrics as a Prometheus scrape
+would. Reports each operation's p50 and p99 latency, the operations per second, and
+how many failed with "database is locked".
+
+``--plain`` runs against a default ``create_engine`` (rollback journal, no busy
+timeout tuning) instead of the shared SQLite engine, to compare the two.
+``--save FILE`` writes the results as a baseline; ``--baseline FILE`` compares
+against one and exits non-zero if a case's p99 latency grew more than
+``--tolerance`` allows.
+
+Run with ``uv run python webhook/benchmarks/bench_queue.py [--plain] [--baseline FILE]``.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable
+from pathlib import Path
+
+# the webhook reads its config at import; nothing here depends on its values
+os.environ.setdefault("WB_CONFIG_PATH", str(Path(__file__).parents[1] / "config.yaml.template"))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+import wi1_bot.webhook.db as db_mod  # noqa: E402
+from wi1_bot.webhook.metrics import QueueMetricsCollector  # noqa: E402
+from wi1_bot.webhook.transcode_queue import (  # noqa: E402
+    JobProgress,
+    TranscodeItem,
+    TranscodeQueue,
+    WorkerCapabilities,
+)
+
+THREADS = (1, 4, 16)
+CAPABILITIES = WorkerCapabilities(profiles=("good",), runnable_profiles=("good",))
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.locked = 0
+        self._lock = threading.Lock()
+
+    def time(self, operation: str, call: Callable[[], object]) -> object:
+        started = time.perf_counter()
+        try:
+            result = call()
+        except OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            with self._lock:
+                self.locked += 1
+            return None
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.latencies[operation].append(elapsed)
+        return result
+
+
+def _job_loop(index: int, recorder: _Recorder, stop: threading.Event) -> None:
+    queue = TranscodeQueue()
+    worker = f"bench-{index}"
+    while not stop.is_set():
+        recorder.time("add", lambda: queue.add(f"/media/movies/{index}.mkv", "good"))
+        item = recorder.time("claim", lambda: queue.claim(worker, capabilities=CAPABILITIES))
+        if not isinstance(item, TranscodeItem):
+            continue
+        job_id = item.id
+        for second in range(3):
+            progress = JobProgress(out_time=second * 10.0, duration=3600.0, speed=2.0)
+            recorder.time("heartbeat", lambda: queue.heartbeat(job_id, worker, progress=progress))
+        recorder.time("complete", lambda: queue.complete(job_id, worker))
+
+
+def _scrape_loop(recorder: _Recorder, stop: threading.Event) -> None:
+    collector = QueueMetricsCollector()
+    while not stop.is_set():
+        recorder.time("scrape", lambda: list(collector.collect()))
+        stop.wait(0.05)
+
+
+def _run(threads: int, seconds: float, plain: bool) -> tuple[_Recorder, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        os.environ["WB_DB_PATH"] = str(path)
+        db_mod.init_db(pool_size=threads + 1)
+        if plain:
+            db_mod.get_engine().dispose()
+            db_mod._engine = create_engine(f"sqlite:///{path}")
+            with db_mod._engine.connect() as connection:
+                connection.exec_driver_sql("PRAGMA journal_mode=DELETE")
+
+        recorder = _Recorder()
+        stop = threading.Event()
+        workers = [
+            threading.Thread(target=_job_loop, args=(i, recorder, stop)) for i in range(threads)
+        ]
+        workers.append(threading.Thread(target=_scrape_loop, args=(recorder, stop)))
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        time.sleep(seconds)
+        stop.set()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        db_mod.get_engine().dispose()
+        db_mod._engine = None
+    return recorder, elapsed
+
+
+def _summary(recorder: _Recorder, elapsed: float) -> dict[str, float]:
+    summary: dict[str, float] = {
+        "ops_per_s": sum(len(v) for v in recorder.latencies.values()) / elapsed,
+        "locked": recorder.locked,
+    }
+    for operation, latencies in sorted(recorder.latencies.items()):
+        cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        summary[f"{operation}_p50_ms"] = cuts[49] * 1e3
+        summary[f"{operation}_p99_ms"] = cuts[98] * 1e3
+    return summary
+
+
+def _regressions(
+    results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], tolerance: float
+) -> list[str]:
+    found = []
+    for case, metrics in results.items():
+        for metric, value in metrics.items():
+            before = baseline.get(case, {}).get(metric)
+            if metric.endswith("_p99_ms") and before and value > before * (1 + tolerance):
+                found.append(f"{case} {metric}: {before:.2f} -> {value:.2f}")
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5, help="run time per case")
+    parser.add_argument("--plain", action="store_true", help="use a default SQLite engine")
+    parser.add_argument("--save", type=Path, help="write the results as a baseline")
+    parser.add_argument("--baseline", type=Path, help="compare against a saved baseline")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.5, help="allowed p99 growth vs the baseline"
+    )
+    args = parser.parse_args()
+
+    results: dict[str, dict[str, float]] = {}
+    engine = "default create_engine" if args.plain else "shared SQLite engine"
+    print(f"{engine}, {args.seconds:g}s per case")
+    for threads in THREADS:
+        case = f"queue[{threads}]"
+        results[case] = metrics = _summary(*_run(threads, args.seconds, args.plain))
+        print(f"  {case:<10} {metrics['ops_per_s']:8.0f} ops/s  {metrics['locked']:5.0f} locked")
+        for operation in ("add", "claim", "heartbeat", "complete", "scrape"):
+            if f"{operation}_p50_ms" in metrics:
+                print(
+                    f"    {operation:<10} p50 {metrics[f'{operation}_p50_ms']:8.2f} ms"
+                    f"  p99 {metrics[f'{operation}_p99_ms']:8.2f} ms"
+                )
+
+    if args.save is not None:
+        args.save.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+        print(f"baseline saved to {args.save}")
+
+    if args.baseline is not None:
+        regressions = _regressions(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
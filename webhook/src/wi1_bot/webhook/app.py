@@ -1,6 +1,7 @@
+import threading
 from pathlib import Path
 from time import perf_counter
-from typing import Any
+from typing import Any, TypeGuard, cast, get_args
 
 import structlog
 from flask import Flask, Response, g, request
@@ -12,15 +13,26 @@ from wi1_bot.common import push
 from wi1_bot.webhook.autobrr import ArrTarget
 from wi1_bot.webhook.autobrr import blueprint as autobrr_blueprint
 from wi1_bot.webhook.autobrr import configure_targets as configure_autobrr_targets
-from wi1_bot.webhook.config import config
+from wi1_bot.webhook.config import JobSource, config
+from wi1_bot.webhook.free_space import FreeSpaceMonitor
 from wi1_bot.webhook.metrics import (
     EVENTS,
     HTTP_REQUEST_DURATION,
     HTTP_REQUESTS,
     HTTP_REQUESTS_IN_PROGRESS,
+    JOB_FINALIZE_DURATION,
+    metrics_registry,
 )
 from wi1_bot.webhook.rescan import rescan_content
-from wi1_bot.webhook.transcode_queue import queue
+from wi1_bot.webhook.transcode_queue import (
+    MAX_ATTEMPTS,
+    JobEstimate,
+    JobProgress,
+    NewJob,
+    WorkerCapabilities,
+    default_priority,
+    queue,
+)
 
 app = Flask(__name__)
 
@@ -52,6 +64,14 @@ if config.sonarr4k is not None:
 configure_autobrr_targets(autobrr_targets)
 app.register_blueprint(autobrr_blueprint)
 
+free_space: FreeSpaceMonitor | None = None
+if config.webhook.scheduling.space_pressure is not None:
+    free_space = FreeSpaceMonitor(
+        autobrr_targets,
+        config.webhook.scheduling.space_pressure.min_free_bytes,
+        config.webhook.scheduling.space_pressure.check_interval,
+    )
+
 _KNOWN_HTTP_METHODS = frozenset({"DELETE", "GET", "HEAD", "OPTIONS", "PATCH", "POST", "PUT"})
 _EVENT_TYPES = {
     "Test": "test",
@@ -147,6 +167,7 @@ def on_download(req: dict[str, Any]) -> None:
 
         movie_folder = req["movie"]["folderPath"]
         relative_path = req["movieFile"]["relativePath"]
+        source_size = req["movieFile"].get("size")
 
         path = Path(movie_folder) / relative_path
 
@@ -162,6 +183,7 @@ def on_download(req: dict[str, Any]) -> None:
 
         series_folder = req["series"]["path"]
         relative_path = req["episodeFile"]["relativePath"]
+        source_size = req["episodeFile"].get("size")
 
         path = Path(series_folder) / relative_path
 
@@ -170,16 +192,23 @@ def on_download(req: dict[str, Any]) -> None:
 
     # enqueue every completed download as an Arr-native path; the worker maps it to
     # its own filesystem and resolves the quality profile (dropping ones it can't transcode)
+    # one of the configured instances, since one matched the request's instance name
+    source = cast(JobSource, _event_source(req))
+    priority = default_priority(quality_profile, source)
     job_id = queue.add(
         path=str(path),
         quality_profile=quality_profile,
         original_language=original_language,
+        priority=priority,
+        source_size=source_size if isinstance(source_size, int) and source_size > 0 else None,
+        source=source,
     )
     with bound_contextvars(job_id=job_id):
         logger.info(
             "transcode job enqueued",
             path=str(path),
             quality_profile=quality_profile,
+            priority=priority,
             queue_size=queue.size,
         )
 
@@ -239,7 +268,104 @@ def health() -> Any:
 
 @app.route("/metrics", methods=["GET"])
 def metrics() -> Response:
-    return Response(generate_latest(), content_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(metrics_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+# jobs one /jobs/batch request may enqueue
+MAX_BATCH_JOBS = 10_000
+
+
+def _new_jobs(body: dict[str, Any]) -> list[NewJob] | None:
+    jobs = body.get("jobs")
+    if not isinstance(jobs, list) or not jobs or len(jobs) > MAX_BATCH_JOBS:
+        return None
+    parsed = []
+    for job in jobs:
+        if not isinstance(job, dict):
+            return None
+        path = job.get("path")
+        quality_profile = job.get("quality_profile")
+        original_language = job.get("original_language")
+        size = job.get("size")
+        source = job.get("source", "manual")
+        if not isinstance(path, str) or not path:
+            return None
+        if not isinstance(quality_profile, str) or not quality_profile:
+            return None
+        if original_language is not None and not isinstance(original_language, str):
+            return None
+        if size is not None and (not _is_int(size) or size <= 0):
+            return None
+        if source not in get_args(JobSource):
+            return None
+        priority = job.get("priority", default_priority(quality_profile, source))
+        if not _is_int(priority):
+            return None
+        parsed.append(NewJob(path, quality_profile, original_language, priority, size, source))
+    return parsed
+
+
+def _is_int(value: Any) -> TypeGuard[int]:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+@app.route("/jobs/batch", methods=["POST"])
+def job_batch() -> Any:
+    body = request.get_json(silent=True)
+    jobs = _new_jobs(body) if isinstance(body, dict) else None
+    if jobs is None:
+        logger.warning("batch enqueue rejected because jobs are malformed")
+        return "", 400
+
+    job_ids = queue.add_many(jobs)
+    logger.info("transcode jobs enqueued", jobs=len(job_ids), queue_size=queue.size)
+    return {"ids": job_ids}, 201
+
+
+def _names(value: Any) -> tuple[str, ...] | None:
+    if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+        return None
+    return tuple(value)
+
+
+def _capabilities(body: dict[str, Any]) -> WorkerCapabilities | None:
+    capabilities = body.get("capabilities")
+    if not isinstance(capabilities, dict):
+        return None
+
+    profiles = _names(capabilities.get("profiles", []))
+    runnable_profiles = _names(capabilities.get("runnable_profiles", []))
+    encoders = _names(capabilities.get("encoders", []))
+    hwaccels = _names(capabilities.get("hwaccels", []))
+    if profiles is None or runnable_profiles is None or encoders is None or hwaccels is None:
+        return None
+
+    # null: the worker can reach any path
+    paths = capabilities.get("paths")
+    if paths is not None and (paths := _names(paths)) is None:
+        return None
+
+    return WorkerCapabilities(
+        profiles=profiles,
+        runnable_profiles=runnable_profiles,
+        paths=paths,
+        encoders=encoders,
+        hwaccels=hwaccels,
+    )
+
+
+def _lease(body: dict[str, Any]) -> float | None:
+    # a worker claiming a job ahead reserves it for less than the configured lease
+    # (so it's back in the queue soon if the worker dies), never for longer
+    lease = _number(body.get("lease", config.webhook.lease_secs))
+    if lease is None or lease <= 0:
+        return None
+    return min(lease, config.webhook.lease_secs)
+
+
+# each long-polling claim holds a server thread; leave the rest for Arr webhooks and
+# job reports
+_claim_waiters = threading.BoundedSemaphore(max(config.webhook.threads // 2, 1))
 
 
 @app.route("/jobs/claim", methods=["POST"])
@@ -247,7 +373,35 @@ def job_claim() -> Any:
     body: dict[str, Any] = request.get_json(silent=True) or {}
     worker_id = body.get("worker_id") or "unknown"
 
-    item = queue.claim(worker_id)
+    # workers that don't advertise capabilities (older ones) may claim any job
+    capabilities = _capabilities(body)
+    if capabilities is None and "capabilities" in body:
+        return "", 400
+
+    wait = _number(body.get("wait", 0))
+    if wait is None or wait < 0:
+        return "", 400
+    wait = min(wait, config.webhook.claim_wait_max)
+
+    lease = _lease(body)
+    if lease is None:
+        return "", 400
+
+    favor_savings = free_space is not None and free_space.under_pressure()
+    if wait and _claim_waiters.acquire(blocking=False):
+        try:
+            item = queue.claim(
+                worker_id,
+                lease,
+                capabilities=capabilities,
+                wait=wait,
+                favor_savings=favor_savings,
+            )
+        finally:
+            _claim_waiters.release()
+    else:
+        # without a free waiter slot, answer now; the worker falls back to polling
+        item = queue.claim(worker_id, lease, capabilities=capabilities, favor_savings=favor_savings)
 
     if item is None:
         return "", 204
@@ -256,27 +410,109 @@ def job_claim() -> Any:
         logger.info(
             "transcode job dispatched",
             filename=Path(item.path).name,
+            kind=item.kind,
             attempt=item.attempts,
         )
 
-    return {
+    job: dict[str, Any] = {
         "id": item.id,
+        "kind": item.kind,
         "path": item.path,
         "quality_profile": item.quality_profile,
         "original_language": item.original_language,
         "heartbeat": config.webhook.heartbeat,
-    }, 200
+        # a failure of this attempt drops the job, retried or not
+        "final_attempt": item.attempts >= MAX_ATTEMPTS,
+    }
+    if item.kind == "segment":
+        job.update(
+            parent_id=item.parent_id,
+            segment_index=item.segment_index,
+            segment_start=item.segment_start,
+            segment_end=item.segment_end,
+        )
+    elif item.kind == "assemble":
+        job["segment_count"] = item.segment_count
+    return job, 200
+
+
+def _segments(body: dict[str, Any]) -> list[tuple[float, float | None]] | None:
+    segments = body.get("segments")
+    if not isinstance(segments, list) or not segments:
+        return None
+
+    parsed: list[tuple[float, float | None]] = []
+    for segment in segments:
+        if not isinstance(segment, list | tuple) or len(segment) != 2:
+            return None
+        start, end = _number(segment[0]), _number(segment[1])
+        if start is None or (end is None and segment[1] is not None):
+            return None
+        parsed.append((start, end))
+    return parsed
+
+
+@app.route("/jobs/<int:item_id>/split", methods=["POST"])
+def job_split(item_id: int) -> Any:
+    body: dict[str, Any] = request.get_json(silent=True) or {}
+    worker_id = body.get("worker_id") or "unknown"
+    segments = _segments(body)
+
+    with bound_contextvars(job_id=item_id, worker_id=worker_id):
+        if segments is None:
+            logger.warning("split rejected because segments are malformed")
+            return "", 400
+
+        segment_ids = queue.split(item_id, worker_id, segments)
+        if segment_ids is None:
+            logger.warning("split rejected because lease was lost")
+            return "", 409
+
+        logger.info("transcode job split into segments", segments=len(segment_ids))
+        return {"segments": segment_ids}, 200
+
+
+def _number(value: Any) -> float | None:
+    # bool is an int subclass, but never a meaningful progress value
+    if isinstance(value, bool) or not isinstance(value, int | float):
+        return None
+    return float(value)
+
+
+def _job_progress(body: dict[str, Any]) -> JobProgress | None:
+    progress = body.get("progress")
+    if not isinstance(progress, dict):
+        return None
+
+    out_time = _number(progress.get("out_time"))
+    if out_time is None:
+        return None
+
+    total_size = _number(progress.get("total_size"))
+    return JobProgress(
+        out_time=out_time,
+        duration=_number(progress.get("duration")),
+        speed=_number(progress.get("speed")),
+        fps=_number(progress.get("fps")),
+        total_size=int(total_size) if total_size is not None else None,
+    )
 
 
 @app.route("/jobs/<int:item_id>/heartbeat", methods=["POST"])
 def job_heartbeat(item_id: int) -> Any:
     body: dict[str, Any] = request.get_json(silent=True) or {}
     worker_id = body.get("worker_id") or "unknown"
+    progress = _job_progress(body)
+    lease = _lease(body)
 
     with bound_contextvars(job_id=item_id, worker_id=worker_id):
-        logger.debug("heartbeat received")
+        logger.debug("heartbeat received", progress=progress)
 
-        if queue.heartbeat(item_id, worker_id):
+        if lease is None:
+            logger.warning("heartbeat rejected because lease is malformed")
+            return "", 400
+
+        if queue.heartbeat(item_id, worker_id, lease, progress=progress):
             return "", 200
 
         # the lease was lost (reclaimed/expired/finished) or belongs to another worker
@@ -284,21 +520,123 @@ def job_heartbeat(item_id: int) -> Any:
         return "", 409
 
 
+def _job_estimate(body: dict[str, Any]) -> JobEstimate | None:
+    source_size = _number(body.get("source_size"))
+    projected_size = _number(body.get("projected_size"))
+    projected_seconds = _number(body.get("projected_seconds"))
+    if source_size is None or projected_size is None or projected_seconds is None:
+        return None
+    if source_size <= 0 or projected_size < 0 or projected_seconds < 0:
+        return None
+    return JobEstimate(int(source_size), int(projected_size), projected_seconds)
+
+
+@app.route("/jobs/<int:item_id>/estimate", methods=["POST"])
+def job_estimate(item_id: int) -> Any:
+    body: dict[str, Any] = request.get_json(silent=True) or {}
+    worker_id = body.get("worker_id") or "unknown"
+    estimate = _job_estimate(body)
+
+    with bound_contextvars(job_id=item_id, worker_id=worker_id):
+        if estimate is None:
+            logger.warning("estimate rejected because it is malformed")
+            return "", 400
+
+        if not queue.estimate(item_id, worker_id, estimate):
+            logger.warning("estimate rejected because lease was lost")
+            return "", 409
+
+        logger.info(
+            "transcode job estimated",
+            projected_savings=round(estimate.savings, 3),
+            projected_seconds=round(estimate.projected_seconds),
+        )
+        return "", 200
+
+
+@app.route("/jobs/<int:item_id>/priority", methods=["POST"])
+def job_priority(item_id: int) -> Any:
+    body: dict[str, Any] = request.get_json(silent=True) or {}
+    priority = body.get("priority")
+
+    with bound_contextvars(job_id=item_id):
+        if not _is_int(priority):
+            logger.warning("priority change rejected because it is malformed")
+            return "", 400
+
+        if not queue.prioritize(item_id, priority):
+            return "", 404
+
+        logger.info("transcode job priority changed", priority=priority)
+        return "", 200
+
+
+def _report_id(body: dict[str, Any]) -> str | None:
+    # set by workers that may replay a report (see the transcoder's outbox); a
+    # repeated id is acknowledged without applying the outcome again
+    report_id = body.get("report_id")
+    return report_id if isinstance(report_id, str) and report_id else None
+
+
 @app.route("/jobs/<int:item_id>/complete", methods=["POST"])
 def job_complete(item_id: int) -> Any:
     body: dict[str, Any] = request.get_json(silent=True) or {}
     worker_id = body.get("worker_id") or "unknown"
     filename = body.get("filename")
+    report_id = _report_id(body)
 
     with bound_contextvars(job_id=item_id, worker_id=worker_id):
-        path = queue.complete(item_id, outcome="completed" if filename else "skipped")
+        if report_id is not None and queue.reported(report_id):
+            logger.info("duplicate job report ignored", report_id=report_id)
+            return "", 200
 
-        if path is None:
-            logger.warning("completion received for unknown or expired job")
+        item = queue.get(item_id)
+        if item is None:
+            logger.warning("completion received for unknown job")
             return "", 404
 
+        if item.kind == "segment":
+            if not filename:
+                # assembling without this segment would leave a gap in the video
+                if queue.fail(item_id, worker_id, retry=False, report_id=report_id) is None:
+                    logger.warning("completion rejected because lease was lost")
+                    return "", 409
+                logger.error("transcode segment skipped, split job dropped")
+                push.send(
+                    config.pushover,
+                    f"{Path(item.path).name} failed to transcode: a segment was skipped",
+                    title="transcoding error",
+                )
+                return "", 200
+            # nothing to rescan yet; the last segment queues its parent to assemble
+            if queue.complete(item_id, worker_id, report_id=report_id) is None:
+                logger.warning("completion rejected because lease was lost")
+                return "", 409
+            logger.info("transcode segment completed", segment=item.segment_index)
+            return "", 200
+
+        path = queue.complete(
+            item_id,
+            worker_id,
+            outcome="completed" if filename else "skipped",
+            report_id=report_id,
+        )
+
+        if path is None:
+            # the lease expired and the job may be another worker's now
+            logger.warning("completion rejected because lease was lost")
+            return "", 409
+
         if filename:
-            logger.info("transcode job completed", filename=filename)
+            finalize_seconds = _number(body.get("finalize_seconds"))
+            if finalize_seconds is not None:
+                # rename (same filesystem) or copy; anything else is a client bug
+                method = body.get("finalize_method")
+                method = method if method in {"rename", "copy"} else "unknown"
+                JOB_FINALIZE_DURATION.labels(method=method).observe(finalize_seconds)
+            logger.info(
+                "transcode job completed", filename=filename, finalize_seconds=finalize_seconds
+            )
             try:
                 new_path = Path(path).parent / filename
                 rescan_content(
@@ -328,18 +666,36 @@ def job_fail(item_id: int) -> Any:
     reason = body.get("reason", "unknown error")
     retry = bool(body.get("retry", False))
     log_tail = body.get("log_tail")
+    report_id = _report_id(body)
 
     with bound_contextvars(job_id=item_id, worker_id=worker_id):
-        path = queue.fail(item_id, retry=retry)
+        if report_id is not None and queue.reported(report_id):
+            logger.info("duplicate job report ignored", report_id=report_id)
+            return "", 200
+
+        if body.get("release"):
+            # a worker shutting down hands the job straight back, attempt unspent
+            if not queue.release(item_id, worker_id, report_id=report_id):
+                logger.warning("release rejected because lease was lost")
+                return "", 409
+            logger.info("transcode job released", reason=reason)
+            return "", 200
+
+        failed = queue.fail(item_id, worker_id, retry=retry, report_id=report_id)
+
+        if failed is None:
+            logger.warning("failure rejected because lease was lost")
+            return "", 409
 
-        if path is not None:
+        if failed.dropped:
             # terminal failure (not requeued) -> notify
-            msg = f"{Path(path).name} failed to transcode: {reason}"
+            filename = Path(failed.path).name
+            msg = f"{filename} failed to transcode: {reason}"
             if log_tail:
                 msg = f"{msg}\n{log_tail}"
             logger.error(
                 "transcode job failed",
-                filename=Path(path).name,
+                filename=filename,
                 reason=reason,
                 log_tail=log_tail,
             )
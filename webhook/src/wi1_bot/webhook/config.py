@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import Annotated, Literal
 
 from pydantic import BaseModel, Field
 
@@ -6,6 +6,10 @@ from wi1_bot.arr import ArrConfig
 from wi1_bot.common import PushoverConfig
 from wi1_bot.common.config import BaseServiceConfig
 
+# where a transcode job came from: the Arr instance whose download queued it, or
+# manual (the CLI and batch API without one)
+JobSource = Literal["radarr", "radarr4k", "sonarr", "sonarr4k", "manual"]
+
 
 class GeneralConfig(BaseModel):
     log_format: Literal["logfmt", "json"] = Field(
@@ -25,6 +29,64 @@ class QueueCleanupConfig(BaseModel):
     )
 
 
+class SpacePressureConfig(BaseModel):
+    min_free_bytes: int = Field(
+        gt=0,
+        description=(
+            "Free bytes below which an Arr root folder is short on space; while one is,"
+            " jobs are claimed by expected bytes saved, largest first"
+        ),
+    )
+    assumed_savings: float = Field(
+        default=0.4,
+        gt=0,
+        lt=1,
+        description=(
+            "Fraction of a job's source size it's expected to save before a preflight"
+            " has projected it"
+        ),
+    )
+    check_interval: float = Field(
+        default=300, gt=0, description="Seconds between checks of the root folders' free space"
+    )
+
+
+class SchedulingConfig(BaseModel):
+    profile_priority: dict[str, int] = Field(
+        default_factory=dict,
+        description="Priority class of jobs by quality profile; higher is claimed first",
+    )
+    instance_priority: dict[Literal["radarr", "radarr4k", "sonarr", "sonarr4k"], int] = Field(
+        default_factory=dict,
+        description="Priority class added by the Arr instance a download came from",
+    )
+    order: Literal["fifo", "smallest_first"] = Field(
+        default="fifo",
+        description=(
+            "Order within a priority class: fifo (jobs a preflight projected to be worth"
+            " the most, then oldest first) or smallest_first (by source size)"
+        ),
+    )
+    aging: float | None = Field(
+        default=3600,
+        gt=0,
+        description=(
+            "Seconds the oldest job of a priority class waits for the whole class to move up"
+            " one, so none starves; null disables aging"
+        ),
+    )
+    space_pressure: SpacePressureConfig | None = Field(
+        default=None, description="Favor the largest savings while the media is short on space"
+    )
+    source_weights: dict[JobSource, Annotated[float, Field(gt=0)]] = Field(
+        default_factory=dict,
+        description=(
+            "Share of claims each job source gets while several have jobs queued in a"
+            " priority class; unlisted sources weigh 1"
+        ),
+    )
+
+
 class WebhookConfig(BaseModel):
     port: int = Field(default=9000, gt=0, description="Port for the webhook/job API")
     heartbeat: float = Field(
@@ -43,7 +105,33 @@ class WebhookConfig(BaseModel):
             " reclaim it; the lease is heartbeat * (missed_heartbeats + 0.5) seconds"
         ),
     )
+    worker_ttl: float = Field(
+        default=86400,
+        gt=0,
+        description=(
+            "Seconds a worker's advertised capabilities count after its last claim; jobs"
+            " for a profile no worker seen within that has configured go to any worker"
+        ),
+    )
+    threads: int = Field(default=16, gt=0, description="Threads serving the webhook/job API")
+    processes: int = Field(
+        default=1,
+        gt=0,
+        description=(
+            "Processes serving the webhook/job API (each with its own threads), sharing"
+            " the port and the queue database"
+        ),
+    )
+    claim_wait_max: float = Field(
+        default=30,
+        ge=0,
+        description=(
+            "Longest a worker's job claim may wait for a job to be queued; up to half"
+            " the threads serve waiting claims"
+        ),
+    )
     queue_cleanup: QueueCleanupConfig = Field(default_factory=QueueCleanupConfig)
+    scheduling: SchedulingConfig = Field(default_factory=SchedulingConfig)
 
     @property
     def lease_secs(self) -> float:
@@ -3,7 +3,9 @@ from pathlib import Path
 
 from alembic import command
 from alembic.config import Config
-from sqlalchemy import Engine, create_engine
+from sqlalchemy import Engine
+
+from wi1_bot.common.sqlite import create_sqlite_engine
 
 _engine: Engine | None = None
 
@@ -38,10 +40,11 @@ def get_db_path() -> str:
     return db_path
 
 
-def init_db() -> Engine:
+def init_db(pool_size: int = 5) -> Engine:
     """Initialize the database engine and run migrations.
 
-    This should be called once during application startup.
+    This should be called once during application startup, with ``pool_size`` the
+    number of threads that use the database at once.
 
     Returns:
         Engine: The SQLAlchemy engine instance
@@ -52,7 +55,7 @@ def init_db() -> Engine:
         return _engine
 
     db_path = get_db_path()
-    _engine = create_engine(f"sqlite:///{db_path}")
+    _engine = create_sqlite_engine(db_path, "webhook", pool_size=pool_size)
 
     wi1_bot_dir = Path(__file__).resolve().parent
     alembic_ini = wi1_bot_dir / "alembic.ini"
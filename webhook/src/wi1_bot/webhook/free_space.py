@@ -0,0 +1,72 @@
+import threading
+import time
+from collections.abc import Iterable
+
+import structlog
+
+from wi1_bot.webhook.autobrr import ArrTarget
+
+logger = structlog.get_logger(__name__)
+
+
+class FreeSpaceMonitor:
+    """Whether the media is short on space, going by the Arr instances' root folders.
+
+    The webhook doesn't mount the media, so it asks Arr, which reports each root
+    folder's free space. The check runs in the background at most every ``interval``
+    seconds; :meth:`under_pressure` returns the latest result without waiting on Arr.
+    """
+
+    def __init__(self, targets: Iterable[ArrTarget], min_free_bytes: int, interval: float) -> None:
+        self._targets = tuple(targets)
+        self._min_free_bytes = min_free_bytes
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._checked_at: float | None = None
+        self._checking = False
+        self._pressure = False
+
+    def under_pressure(self) -> bool:
+        with self._lock:
+            due = self._checked_at is None or time.monotonic() - self._checked_at >= self._interval
+            if due and not self._checking:
+                self._checking = True
+                threading.Thread(target=self.check, name="free-space-check", daemon=True).start()
+            return self._pressure
+
+    def check(self) -> None:
+        free_bytes = self._min_free_space()
+        with self._lock:
+            self._checked_at = time.monotonic()
+            self._checking = False
+            if free_bytes is None:
+                return
+            pressure = free_bytes < self._min_free_bytes
+            if pressure != self._pressure:
+                logger.info(
+                    "media free space pressure changed",
+                    under_pressure=pressure,
+                    free_bytes=free_bytes,
+                )
+            self._pressure = pressure
+
+    def _min_free_space(self) -> int | None:
+        # the tightest root folder; None if no instance could be asked
+        free: list[int] = []
+        for target in self._targets:
+            try:
+                root_folders = target.client.get_root_folders()
+            except Exception as exc:
+                logger.warning(
+                    "free space check failed",
+                    target=target.name,
+                    error_type=type(exc).__name__,
+                    exc_info=True,
+                )
+                continue
+            free.extend(
+                folder["freeSpace"]
+                for folder in root_folders
+                if isinstance(folder, dict) and isinstance(folder.get("freeSpace"), int)
+            )
+        return min(free, default=None)
@@ -1,13 +1,18 @@
 import logging
+import os
 from collections.abc import Iterable
 from datetime import datetime, timezone
+from pathlib import Path
+from typing import get_args
 
-from prometheus_client import REGISTRY, Counter, Gauge, Histogram, Info
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, Info
 from prometheus_client.core import GaugeMetricFamily, Metric
+from prometheus_client.multiprocess import MultiProcessCollector
 from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
 from wi1_bot.webhook import __version__
+from wi1_bot.webhook.config import JobSource
 from wi1_bot.webhook.db import get_engine
 from wi1_bot.webhook.models import TranscodeItem
 
@@ -27,6 +32,7 @@ HTTP_REQUESTS_IN_PROGRESS = Gauge(
     "wi1_bot_webhook_http_requests_in_progress",
     "Webhook HTTP requests currently being handled.",
     ["method", "route"],
+    multiprocess_mode="livesum",
 )
 
 EVENTS = Counter(
@@ -49,7 +55,7 @@ QUEUE_CLEANUP_ITEMS = Counter(
 JOB_CLAIMS = Counter(
     "wi1_bot_webhook_job_claims_total",
     "Transcode jobs claimed by workers.",
-    ["kind"],
+    ["kind", "source"],
 )
 JOB_HEARTBEATS = Counter(
     "wi1_bot_webhook_job_heartbeats_total",
@@ -67,7 +73,7 @@ _JOB_DURATION_BUCKETS = (1, 5, 15, 30, 60, 300, 900, 3600, 21600, 86400)
 JOB_QUEUE_WAIT_DURATION = Histogram(
     "wi1_bot_webhook_job_queue_wait_duration_seconds",
     "Time a new or retried transcode job waits to be claimed.",
-    ["kind"],
+    ["kind", "source"],
     buckets=_JOB_DURATION_BUCKETS,
 )
 JOB_ATTEMPT_DURATION = Histogram(
@@ -77,6 +83,27 @@ JOB_ATTEMPT_DURATION = Histogram(
     buckets=_JOB_DURATION_BUCKETS,
 )
 
+JOB_ENCODE_SPEED = Histogram(
+    "wi1_bot_webhook_job_encode_speed_ratio",
+    "ffmpeg encode speed (multiple of realtime) reported with transcode job heartbeats.",
+    ["quality_profile", "worker_id"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64),
+)
+
+JOB_PROJECTED_SAVINGS = Histogram(
+    "wi1_bot_webhook_job_projected_savings_ratio",
+    "Fraction of the source's size a transcode is projected to save by its preflight.",
+    ["quality_profile"],
+    buckets=(-0.5, 0, 0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9),
+)
+
+JOB_FINALIZE_DURATION = Histogram(
+    "wi1_bot_webhook_job_finalize_duration_seconds",
+    "Time a worker spent moving a transcoded file into place, reported on completion.",
+    ["method"],
+    buckets=(0.01, 0.1, 0.5, 1, 5, 15, 60, 300, 900),
+)
+
 RESCAN_OPERATIONS = Counter(
     "wi1_bot_webhook_rescan_operations_total",
     "Radarr and Sonarr post-transcode rescans.",
@@ -95,6 +122,13 @@ def elapsed_seconds(start: datetime, end: datetime) -> float:
     return max((end - start).total_seconds(), 0.0)
 
 
+def eta_seconds(out_time: float, duration: float | None, speed: float | None) -> float | None:
+    """Seconds until an encode finishes at its current speed, if it can be estimated."""
+    if duration is None or not speed or speed <= 0:
+        return None
+    return max(duration - out_time, 0.0) / speed
+
+
 class QueueMetricsCollector:
     @staticmethod
     def _metric_families() -> tuple[
@@ -102,6 +136,11 @@ class QueueMetricsCollector:
         GaugeMetricFamily,
         GaugeMetricFamily,
         GaugeMetricFamily,
+        GaugeMetricFamily,
+        GaugeMetricFamily,
+        GaugeMetricFamily,
+        GaugeMetricFamily,
+        GaugeMetricFamily,
     ]:
         return (
             GaugeMetricFamily(
@@ -114,6 +153,16 @@ class QueueMetricsCollector:
                 "Age of the oldest transcode job in its current status.",
                 labels=["status"],
             ),
+            GaugeMetricFamily(
+                "wi1_bot_webhook_queue_source_jobs",
+                "Queued transcode jobs by the source (Arr instance or manual) that queued them.",
+                labels=["source"],
+            ),
+            GaugeMetricFamily(
+                "wi1_bot_webhook_queue_source_oldest_job_age_seconds",
+                "How long the oldest queued transcode job from a source has waited.",
+                labels=["source"],
+            ),
             GaugeMetricFamily(
                 "wi1_bot_webhook_queue_expired_leases",
                 "Transcode jobs with an expired lease.",
@@ -122,17 +171,44 @@ class QueueMetricsCollector:
                 "wi1_bot_webhook_database_up",
                 "Whether the SQLite transcode queue can be queried.",
             ),
+            GaugeMetricFamily(
+                "wi1_bot_webhook_job_progress_ratio",
+                "Fraction of the source an in-progress transcode job has encoded.",
+                labels=["job_id", "quality_profile", "worker_id"],
+            ),
+            GaugeMetricFamily(
+                "wi1_bot_webhook_job_eta_seconds",
+                "Estimated seconds until an in-progress transcode job finishes.",
+                labels=["job_id", "quality_profile", "worker_id"],
+            ),
+            GaugeMetricFamily(
+                "wi1_bot_webhook_job_speed_ratio",
+                "Latest encode speed (multiple of realtime) of an in-progress transcode job.",
+                labels=["job_id", "quality_profile", "worker_id"],
+            ),
         )
 
     def describe(self) -> Iterable[Metric]:
         yield from self._metric_families()
 
     def collect(self) -> Iterable[Metric]:
-        jobs, oldest_age, expired_leases, database_up = self._metric_families()
+        (
+            jobs,
+            oldest_age,
+            source_jobs,
+            source_oldest_age,
+            expired_leases,
+            database_up,
+            job_progress,
+            job_eta,
+            job_speed,
+        ) = self._metric_families()
 
         now = datetime.now(timezone.utc).replace(tzinfo=None)
-        counts = {"queued": 0, "in_progress": 0}
-        oldest = {"queued": 0.0, "in_progress": 0.0}
+        counts = {"queued": 0, "in_progress": 0, "waiting": 0}
+        oldest = {"queued": 0.0, "in_progress": 0.0, "waiting": 0.0}
+        source_counts = dict.fromkeys(get_args(JobSource), 0)
+        source_oldest = dict.fromkeys(get_args(JobSource), 0.0)
         expired = 0
 
         try:
@@ -144,6 +220,15 @@ class QueueMetricsCollector:
                         func.min(TranscodeItem.status_changed_at),
                     ).group_by(TranscodeItem.status)
                 ).all()
+                source_rows = session.execute(
+                    select(
+                        TranscodeItem.source,
+                        func.count(TranscodeItem.id),
+                        func.min(TranscodeItem.status_changed_at),
+                    )
+                    .where(TranscodeItem.status == "queued")
+                    .group_by(TranscodeItem.source)
+                ).all()
                 expired = (
                     session.scalar(
                         select(func.count(TranscodeItem.id)).where(
@@ -153,6 +238,28 @@ class QueueMetricsCollector:
                     )
                     or 0
                 )
+                progress_rows = session.execute(
+                    select(
+                        TranscodeItem.id,
+                        TranscodeItem.quality_profile,
+                        TranscodeItem.worker_id,
+                        TranscodeItem.progress_out_time,
+                        TranscodeItem.progress_duration,
+                        TranscodeItem.progress_speed,
+                    ).where(
+                        TranscodeItem.status == "in_progress",
+                        TranscodeItem.progress_out_time.is_not(None),
+                    )
+                ).all()
+
+            for job_id, quality_profile, worker_id, out_time, duration, speed in progress_rows:
+                labels = [str(job_id), quality_profile, worker_id or "unknown"]
+                if duration:
+                    job_progress.add_metric(labels, min(out_time / duration, 1.0))
+                if (eta := eta_seconds(out_time, duration, speed)) is not None:
+                    job_eta.add_metric(labels, eta)
+                if speed is not None:
+                    job_speed.add_metric(labels, speed)
 
             for status, count, oldest_timestamp in status_rows:
                 if status not in counts:
@@ -160,21 +267,70 @@ class QueueMetricsCollector:
                 counts[status] = count
                 if oldest_timestamp is not None:
                     oldest[status] = elapsed_seconds(oldest_timestamp, now)
+            for source, count, oldest_timestamp in source_rows:
+                source_counts[source] = count
+                source_oldest[source] = elapsed_seconds(oldest_timestamp, now)
             database_up.add_metric([], 1)
         except Exception:
             logger.warning("could not collect webhook queue metrics", exc_info=True)
             database_up.add_metric([], 0)
 
-        for status in ("queued", "in_progress"):
+        for status in counts:
             jobs.add_metric([status], counts[status])
             oldest_age.add_metric([status], oldest[status])
+        for source in source_counts:
+            source_jobs.add_metric([source], source_counts[source])
+            source_oldest_age.add_metric([source], source_oldest[source])
         expired_leases.add_metric([], expired)
 
         yield jobs
         yield oldest_age
+        yield source_jobs
+        yield source_oldest_age
         yield expired_leases
         yield database_up
+        yield job_progress
+        yield job_eta
+        yield job_speed
 
 
 QUEUE_METRICS_COLLECTOR = QueueMetricsCollector()
 REGISTRY.register(QUEUE_METRICS_COLLECTOR)
+
+
+def multiprocess() -> bool:
+    """Whether metrics are shared between webhook processes (``PROMETHEUS_MULTIPROC_DIR``).
+
+    prometheus_client reads the variable at import, so it must be set before the
+    webhook starts; each process then writes its samples to files in that directory.
+    """
+    return "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+
+def clear_stale_metrics() -> None:
+    """Remove other processes' sample files from ``PROMETHEUS_MULTIPROC_DIR``.
+
+    They're left behind by a previous run, whose counters would otherwise be added to
+    this one's. Run in the parent before it forks; its own files are open already, so
+    they're kept.
+    """
+    own = f"_{os.getpid()}.db"
+    for path in Path(os.environ["PROMETHEUS_MULTIPROC_DIR"]).glob("*.db"):
+        if not path.name.endswith(own):
+            path.unlink(missing_ok=True)
+
+
+def metrics_registry() -> CollectorRegistry:
+    """The registry ``/metrics`` serves: every webhook process's samples, summed.
+
+    Outside multiprocess mode, that's just this process's. In it, the samples
+    are read back from every process's files; the queue gauges (which query the
+    shared database) and build info are collected once, from this process.
+    """
+    if not multiprocess():
+        return REGISTRY
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry)
+    registry.register(QUEUE_METRICS_COLLECTOR)
+    registry.register(BUILD)
+    return registry
@@ -0,0 +1,76 @@
+"""Add transcode_queue_counts table
+
+Jobs per status, maintained by triggers on transcode_queue, so the queue's size is
+read without a COUNT(*) over the table (which the webhook ran on every enqueue).
+
+A batch migration that rebuilds transcode_queue drops these triggers; it must create
+them again (see create_triggers below).
+
+Revision ID: a3b4c5d6e7f8
+Revises: f2a3b4c5d6e7
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a3b4c5d6e7f8"
+down_revision: Union[str, Sequence[str], None] = "f2a3b4c5d6e7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_TRIGGERS = {
+    "transcode_queue_count_insert": """
+        CREATE TRIGGER transcode_queue_count_insert AFTER INSERT ON transcode_queue
+        BEGIN
+            INSERT INTO transcode_queue_counts (status, jobs) VALUES (NEW.status, 1)
+            ON CONFLICT (status) DO UPDATE SET jobs = jobs + 1;
+        END
+    """,
+    "transcode_queue_count_delete": """
+        CREATE TRIGGER transcode_queue_count_delete AFTER DELETE ON transcode_queue
+        BEGIN
+            UPDATE transcode_queue_counts SET jobs = jobs - 1 WHERE status = OLD.status;
+        END
+    """,
+    "transcode_queue_count_update": """
+        CREATE TRIGGER transcode_queue_count_update AFTER UPDATE OF status ON transcode_queue
+        WHEN OLD.status IS NOT NEW.status
+        BEGIN
+            UPDATE transcode_queue_counts SET jobs = jobs - 1 WHERE status = OLD.status;
+            INSERT INTO transcode_queue_counts (status, jobs) VALUES (NEW.status, 1)
+            ON CONFLICT (status) DO UPDATE SET jobs = jobs + 1;
+        END
+    """,
+}
+
+
+def create_triggers() -> None:
+    for ddl in _TRIGGERS.values():
+        op.execute(ddl)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "transcode_queue_counts",
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("jobs", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("status"),
+    )
+    op.execute(
+        "INSERT INTO transcode_queue_counts (status, jobs)"
+        " SELECT status, COUNT(*) FROM transcode_queue GROUP BY status"
+    )
+    create_triggers()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in _TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    op.drop_table("transcode_queue_counts")
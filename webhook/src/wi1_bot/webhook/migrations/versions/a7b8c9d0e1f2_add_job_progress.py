@@ -0,0 +1,50 @@
+"""Store the latest ffmpeg progress on in-progress jobs
+
+Workers send ffmpeg's progress (encoded media time, fps, speed, output size and
+the source duration) with each heartbeat; the webhook keeps the latest values to
+export per-job ETA and encode speed metrics.
+
+Revision ID: a7b8c9d0e1f2
+Revises: e4f5a6b7c8d9
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a7b8c9d0e1f2"
+down_revision: Union[str, Sequence[str], None] = "e4f5a6b7c8d9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table(
+        "transcode_queue",
+        table_kwargs={"sqlite_autoincrement": True},
+    ) as batch_op:
+        batch_op.add_column(sa.Column("progress_out_time", sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column("progress_duration", sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column("progress_speed", sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column("progress_fps", sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column("progress_total_size", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("progress_updated_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table(
+        "transcode_queue",
+        table_kwargs={"sqlite_autoincrement": True},
+    ) as batch_op:
+        batch_op.drop_column("progress_updated_at")
+        batch_op.drop_column("progress_total_size")
+        batch_op.drop_column("progress_fps")
+        batch_op.drop_column("progress_speed")
+        batch_op.drop_column("progress_duration")
+        batch_op.drop_column("progress_out_time")
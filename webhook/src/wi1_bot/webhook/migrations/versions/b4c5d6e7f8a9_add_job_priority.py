@@ -0,0 +1,40 @@
+"""Add job priority and source size columns
+
+Jobs are claimed by priority class (from their profile and Arr instance, or set over
+the API), then by source size or expected savings as scheduling is configured.
+
+Plain ADD COLUMNs rather than a batch rebuild, which would drop the queue count
+triggers.
+
+Revision ID: b4c5d6e7f8a9
+Revises: a3b4c5d6e7f8
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b4c5d6e7f8a9"
+down_revision: Union[str, Sequence[str], None] = "a3b4c5d6e7f8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "transcode_queue",
+        sa.Column("priority", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.add_column("transcode_queue", sa.Column("source_size", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # SQLite (3.35+) drops a column in place, keeping the count triggers
+    op.drop_column("transcode_queue", "source_size")
+    op.drop_column("transcode_queue", "priority")
@@ -0,0 +1,50 @@
+"""Add split-encode job columns
+
+A long title can be split into keyframe-aligned segment jobs (kind/parent_id/
+segment_*) that any worker may claim; the parent waits until every segment is
+encoded and is then queued again as an assemble job.
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b8c9d0e1f2a3"
+down_revision: Union[str, Sequence[str], None] = "a7b8c9d0e1f2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table(
+        "transcode_queue",
+        table_kwargs={"sqlite_autoincrement": True},
+    ) as batch_op:
+        batch_op.add_column(
+            sa.Column("kind", sa.String(), nullable=False, server_default="transcode")
+        )
+        batch_op.add_column(sa.Column("parent_id", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("segment_index", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("segment_start", sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column("segment_end", sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table(
+        "transcode_queue",
+        table_kwargs={"sqlite_autoincrement": True},
+    ) as batch_op:
+        batch_op.drop_column("segment_end")
+        batch_op.drop_column("segment_start")
+        batch_op.drop_column("segment_index")
+        batch_op.drop_column("parent_id")
+        batch_op.drop_column("kind")
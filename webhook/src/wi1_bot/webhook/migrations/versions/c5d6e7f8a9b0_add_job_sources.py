@@ -0,0 +1,48 @@
+"""Add job source column and transcode_source_shares table
+
+Jobs record the Arr instance that queued them (manual for the CLI and batch API), and
+claims are shared between sources by weight; transcode_source_shares holds each
+source's weighted claims served.
+
+A plain ADD COLUMN rather than a batch rebuild, which would drop the queue count
+triggers.
+
+Revision ID: c5d6e7f8a9b0
+Revises: b4c5d6e7f8a9
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c5d6e7f8a9b0"
+down_revision: Union[str, Sequence[str], None] = "b4c5d6e7f8a9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "transcode_queue",
+        sa.Column("source", sa.String(), server_default="manual", nullable=False),
+    )
+    op.create_index("ix_transcode_queue_source", "transcode_queue", ["status", "source"])
+    op.create_table(
+        "transcode_source_shares",
+        sa.Column("source", sa.String(), nullable=False),
+        sa.Column("served", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("source"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("transcode_source_shares")
+    op.drop_index("ix_transcode_queue_source", table_name="transcode_queue")
+    # SQLite (3.35+) drops a column in place, keeping the count triggers
+    op.drop_column("transcode_queue", "source")
@@ -0,0 +1,42 @@
+"""Add transcode_workers table
+
+Workers advertise their capabilities (encoders, hwaccels, configured and runnable
+profiles, reachable path roots) with every claim; the latest is kept per worker so
+claims only hand out jobs the worker can run.
+
+Revision ID: c9d0e1f2a3b4
+Revises: b8c9d0e1f2a3
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c9d0e1f2a3b4"
+down_revision: Union[str, Sequence[str], None] = "b8c9d0e1f2a3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "transcode_workers",
+        sa.Column("worker_id", sa.String(), nullable=False),
+        sa.Column("encoders", sa.JSON(), nullable=False),
+        sa.Column("hwaccels", sa.JSON(), nullable=False),
+        sa.Column("profiles", sa.JSON(), nullable=False),
+        sa.Column("runnable_profiles", sa.JSON(), nullable=False),
+        sa.Column("paths", sa.JSON(), nullable=True),
+        sa.Column("last_seen_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("worker_id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("transcode_workers")
@@ -0,0 +1,46 @@
+"""Add job estimate columns
+
+A worker's preflight sample encodes project a transcode's output size and encode
+time; the projection is stored on the job, and requeued jobs are handed out by
+projected bytes saved per encode hour (estimate_value).
+
+Revision ID: d0e1f2a3b4c5
+Revises: c9d0e1f2a3b4
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d0e1f2a3b4c5"
+down_revision: Union[str, Sequence[str], None] = "c9d0e1f2a3b4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table(
+        "transcode_queue",
+        table_kwargs={"sqlite_autoincrement": True},
+    ) as batch_op:
+        batch_op.add_column(sa.Column("estimate_source_size", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("estimate_projected_size", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("estimate_seconds", sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column("estimate_value", sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table(
+        "transcode_queue",
+        table_kwargs={"sqlite_autoincrement": True},
+    ) as batch_op:
+        batch_op.drop_column("estimate_value")
+        batch_op.drop_column("estimate_seconds")
+        batch_op.drop_column("estimate_projected_size")
+        batch_op.drop_column("estimate_source_size")
@@ -0,0 +1,35 @@
+"""Add segment_count column
+
+A split job records how many segments it was split into, so assembling it can check
+every one was encoded.
+
+A plain ADD COLUMN rather than a batch rebuild, which would drop the queue count
+triggers.
+
+Revision ID: d6e7f8a9b0c1
+Revises: c5d6e7f8a9b0
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d6e7f8a9b0c1"
+down_revision: Union[str, Sequence[str], None] = "c5d6e7f8a9b0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("transcode_queue", sa.Column("segment_count", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # SQLite (3.35+) drops a column in place, keeping the count triggers
+    op.drop_column("transcode_queue", "segment_count")
@@ -0,0 +1,42 @@
+"""Add job_reports table
+
+Workers keep job outcome reports on disk until the webhook acknowledges them, and
+replay them after a restart; the ids of applied reports are kept for a while so a
+replay is only applied once.
+
+Revision ID: e1f2a3b4c5d6
+Revises: d0e1f2a3b4c5
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e1f2a3b4c5d6"
+down_revision: Union[str, Sequence[str], None] = "d0e1f2a3b4c5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "job_reports",
+        sa.Column("report_id", sa.String(), nullable=False),
+        sa.Column("job_id", sa.Integer(), nullable=False),
+        sa.Column("received_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("report_id"),
+    )
+    op.create_index(
+        op.f("ix_job_reports_received_at"), "job_reports", ["received_at"], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_job_reports_received_at"), table_name="job_reports")
+    op.drop_table("job_reports")
@@ -0,0 +1,49 @@
+"""Add atomic claim columns and index
+
+A job is claimed with a single UPDATE ... RETURNING, so several webhook processes can
+share the queue; the claim records the status it took the job out of (RETURNING only
+sees new values), and an index on (status, lease_expires_at, id) covers its filter.
+
+Revision ID: f2a3b4c5d6e7
+Revises: e1f2a3b4c5d6
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f2a3b4c5d6e7"
+down_revision: Union[str, Sequence[str], None] = "e1f2a3b4c5d6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table(
+        "transcode_queue",
+        table_kwargs={"sqlite_autoincrement": True},
+    ) as batch_op:
+        batch_op.add_column(sa.Column("previous_status", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("previous_status_changed_at", sa.DateTime(), nullable=True))
+    op.create_index(
+        "ix_transcode_queue_claim",
+        "transcode_queue",
+        ["status", "lease_expires_at", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_transcode_queue_claim", table_name="transcode_queue")
+    with op.batch_alter_table(
+        "transcode_queue",
+        table_kwargs={"sqlite_autoincrement": True},
+    ) as batch_op:
+        batch_op.drop_column("previous_status_changed_at")
+        batch_op.drop_column("previous_status")
@@ -1,5 +1,6 @@
 from datetime import datetime, timezone
 
+from sqlalchemy import JSON, Index
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -13,8 +14,14 @@ class Base(DeclarativeBase):
 
 class TranscodeItem(Base):
     __tablename__ = "transcode_queue"
-    # AUTOINCREMENT so job ids never get reused once the queue empties
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (
+        # covers the claim's filter, so finding a claimable job doesn't scan the queue
+        Index("ix_transcode_queue_claim", "status", "lease_expires_at", "id"),
+        # queued jobs per source, for fair sharing and the per-source metrics
+        Index("ix_transcode_queue_source", "status", "source"),
+        # AUTOINCREMENT so job ids never get reused once the queue empties
+        {"sqlite_autoincrement": True},
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     path: Mapped[str]
@@ -22,17 +29,124 @@ class TranscodeItem(Base):
     original_language: Mapped[str | None]
     # leasing state: the webhook dispatches jobs to workers over HTTP; a claimed
     # job is leased so a crashed worker's job is reclaimed once the lease expires
-    status: Mapped[str] = mapped_column(default="queued")  # queued | in_progress
+    # queued | in_progress | waiting (a split job, until its segments are encoded)
+    status: Mapped[str] = mapped_column(default="queued")
     worker_id: Mapped[str | None] = mapped_column(default=None)
     lease_expires_at: Mapped[datetime | None] = mapped_column(default=None)
     attempts: Mapped[int] = mapped_column(default=0)
     status_changed_at: Mapped[datetime] = mapped_column(default=_utcnow)
+    # scheduling: higher priority classes are claimed first (a class moves up one per
+    # scheduling.aging seconds its oldest job has been queued); the source's size in
+    # bytes, if known, orders jobs smallest first or by expected savings
+    priority: Mapped[int] = mapped_column(default=0, server_default="0")
+    source_size: Mapped[int | None] = mapped_column(default=None)
+    # the Arr instance whose download queued the job, or manual; claims are shared
+    # fairly between sources (see TranscodeSourceShare)
+    source: Mapped[str] = mapped_column(default="manual", server_default="manual")
+    # the status the latest claim, split or requeue took the job out of, and since
+    # when: each is a single UPDATE, whose RETURNING only sees the new values
+    previous_status: Mapped[str | None] = mapped_column(default=None)
+    previous_status_changed_at: Mapped[datetime | None] = mapped_column(default=None)
+    # latest ffmpeg progress a worker sent with its heartbeat, for the current attempt
+    progress_out_time: Mapped[float | None] = mapped_column(default=None)
+    progress_duration: Mapped[float | None] = mapped_column(default=None)
+    progress_speed: Mapped[float | None] = mapped_column(default=None)
+    progress_fps: Mapped[float | None] = mapped_column(default=None)
+    progress_total_size: Mapped[int | None] = mapped_column(default=None)
+    progress_updated_at: Mapped[datetime | None] = mapped_column(default=None)
+    # split encoding: a long title's video is encoded as segment jobs any worker can
+    # claim; once they're all done, the parent job is queued again to assemble them
+    kind: Mapped[str] = mapped_column(default="transcode")  # transcode | segment | assemble
+    parent_id: Mapped[int | None] = mapped_column(default=None)  # for a segment
+    segment_index: Mapped[int | None] = mapped_column(default=None)
+    segment_start: Mapped[float | None] = mapped_column(default=None)  # seconds
+    segment_end: Mapped[float | None] = mapped_column(default=None)  # None: to the end
+    # for a split job: how many segments it was split into, so assembling checks
+    # they're all there
+    segment_count: Mapped[int | None] = mapped_column(default=None)
+    # a worker's preflight projection (bytes, wall-clock seconds); kept across retries
+    # so requeued jobs are handed out by projected bytes saved per encode hour
+    estimate_source_size: Mapped[int | None] = mapped_column(default=None)
+    estimate_projected_size: Mapped[int | None] = mapped_column(default=None)
+    estimate_seconds: Mapped[float | None] = mapped_column(default=None)
+    estimate_value: Mapped[float | None] = mapped_column(default=None)
 
     def __repr__(self) -> str:
         return (
             f"TranscodeItem(id={self.id}, path={self.path!r}, "
             f"quality_profile={self.quality_profile!r}, "
             f"original_language={self.original_language!r}, "
-            f"status={self.status!r}, worker_id={self.worker_id!r}, attempts={self.attempts}, "
+            f"status={self.status!r}, kind={self.kind!r}, source={self.source!r}, "
+            f"worker_id={self.worker_id!r}, attempts={self.attempts}, "
             f"status_changed_at={self.status_changed_at!r})"
         )
+
+
+class TranscodeQueueCount(Base):
+    """How many jobs have a status, kept up to date by triggers on transcode_queue.
+
+    So the queue's size is read without counting its rows. A batch migration that
+    rebuilds transcode_queue drops the triggers, and must create them again.
+    """
+
+    __tablename__ = "transcode_queue_counts"
+
+    status: Mapped[str] = mapped_column(primary_key=True)
+    jobs: Mapped[int] = mapped_column(default=0)
+
+    def __repr__(self) -> str:
+        return f"TranscodeQueueCount(status={self.status!r}, jobs={self.jobs})"
+
+
+class TranscodeSourceShare(Base):
+    """The claims a job source has been served, each divided by the source's weight.
+
+    Among jobs of equal priority, the next claim goes to the source served least
+    (stride scheduling), so each gets claims in proportion to its weight. A source
+    that queues a job after having nothing queued is moved up level with the waiting
+    ones, so it doesn't make up for the time it was idle.
+    """
+
+    __tablename__ = "transcode_source_shares"
+
+    source: Mapped[str] = mapped_column(primary_key=True)
+    served: Mapped[float] = mapped_column(default=0.0)
+
+    def __repr__(self) -> str:
+        return f"TranscodeSourceShare(source={self.source!r}, served={self.served})"
+
+
+class TranscodeWorker(Base):
+    """A worker and the capabilities it advertised with its latest claim."""
+
+    __tablename__ = "transcode_workers"
+
+    worker_id: Mapped[str] = mapped_column(primary_key=True)
+    encoders: Mapped[list[str]] = mapped_column(JSON, default=list)
+    hwaccels: Mapped[list[str]] = mapped_column(JSON, default=list)
+    # quality profiles it has configured, and those it has the encoders/hwaccel for
+    profiles: Mapped[list[str]] = mapped_column(JSON, default=list)
+    runnable_profiles: Mapped[list[str]] = mapped_column(JSON, default=list)
+    # Arr-native path roots it can reach; None: any path
+    paths: Mapped[list[str] | None] = mapped_column(JSON, default=None)
+    last_seen_at: Mapped[datetime] = mapped_column(default=_utcnow)
+
+    def __repr__(self) -> str:
+        return (
+            f"TranscodeWorker(worker_id={self.worker_id!r}, "
+            f"runnable_profiles={self.runnable_profiles!r}, paths={self.paths!r}, "
+            f"last_seen_at={self.last_seen_at!r})"
+        )
+
+
+class JobReport(Base):
+    """A job outcome report a worker sent, so a replayed report is only applied once."""
+
+    __tablename__ = "job_reports"
+
+    report_id: Mapped[str] = mapped_column(primary_key=True)
+    job_id: Mapped[int]
+    received_at: Mapped[datetime] = mapped_column(default=_utcnow, index=True)
+
+    def __repr__(self) -> str:
+        return f"JobReport(report_id={self.report_id!r}, job_id={self.job_id!r})"
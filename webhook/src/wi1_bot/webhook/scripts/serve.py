@@ -1,26 +1,103 @@
+import os
+import signal
+import socket
+from types import FrameType
+
 import structlog
+from prometheus_client import multiprocess as prometheus_multiprocess
 from waitress import serve
 
 from wi1_bot.common import setup_logging
 from wi1_bot.webhook import __version__
 from wi1_bot.webhook.app import app, autobrr_targets
 from wi1_bot.webhook.config import config
-from wi1_bot.webhook.db import get_db_path, init_db
+from wi1_bot.webhook.db import get_db_path, get_engine, init_db
+from wi1_bot.webhook.metrics import clear_stale_metrics, multiprocess
 from wi1_bot.webhook.queue_cleanup import ArrQueueCleanupWorker
 
+logger = structlog.get_logger(__name__)
+
+
+def _fork_servers(sock: socket.socket, processes: int) -> list[int]:
+    children = []
+    for _ in range(processes):
+        pid = os.fork()
+        if pid == 0:
+            # the parent's pooled connections must not be shared across the fork
+            get_engine().dispose(close=False)
+            status = 0
+            try:
+                serve(app, sockets=[sock], threads=config.webhook.threads)
+            except BaseException:
+                logger.exception("webhook process failed")
+                status = 1
+            os._exit(status)
+        children.append(pid)
+    return children
+
+
+def _start_processes(processes: int) -> list[int]:
+    """Fork ``processes`` waitress processes sharing one listening socket.
+
+    Migrations run once, in this process, before the fork; the kernel spreads
+    connections between the processes, and claims stay safe because each one is a
+    single atomic statement against the shared database. Run before starting any
+    threads here.
+    """
+    if multiprocess():
+        clear_stale_metrics()
+    else:
+        logger.warning(
+            "PROMETHEUS_MULTIPROC_DIR is not set; /metrics only reports the process serving it"
+        )
+
+    sock = socket.create_server(("0.0.0.0", config.webhook.port))
+    children = _fork_servers(sock, processes)
+    sock.close()
+    return children
+
+
+def _wait_for_processes(children: list[int]) -> None:
+    def stop(_signum: int, _frame: FrameType | None) -> None:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    remaining = set(children)
+    while remaining:
+        pid, status = os.wait()
+        remaining.discard(pid)
+        if multiprocess():
+            prometheus_multiprocess.mark_process_dead(pid)
+        logger.info("webhook process exited", pid=pid, exit_code=os.waitstatus_to_exitcode(status))
+
 
 def main() -> None:
     setup_logging(config.general.log_format, name="wi1-bot-webhook")
 
-    logger = structlog.get_logger(__name__)
-
     logger.info("starting wi1-bot-webhook", version=__version__)
 
     db_path = get_db_path()
     logger.info("running database migrations", database_path=str(db_path))
-    init_db()
+    # a connection per request thread, plus the queue cleanup's
+    init_db(pool_size=config.webhook.threads + 1)
     logger.info("database initialized and migrations complete")
 
+    children: list[int] = []
+    if config.webhook.processes > 1:
+        logger.info(
+            "starting webhook and job API",
+            port=config.webhook.port,
+            processes=config.webhook.processes,
+        )
+        children = _start_processes(config.webhook.processes)
+
+    # the cleanup runs once, in this process, however many serve requests
     cleanup_worker: ArrQueueCleanupWorker | None = None
     if config.webhook.queue_cleanup.enabled:
         cleanup_worker = ArrQueueCleanupWorker(
@@ -34,8 +111,11 @@ def main() -> None:
         )
 
     try:
-        logger.info("starting webhook and job API", port=config.webhook.port)
-        serve(app, host="0.0.0.0", port=config.webhook.port)
+        if children:
+            _wait_for_processes(children)
+        else:
+            logger.info("starting webhook and job API", port=config.webhook.port)
+            serve(app, host="0.0.0.0", port=config.webhook.port, threads=config.webhook.threads)
     finally:
         if cleanup_worker is not None:
             cleanup_worker.stop()
@@ -7,7 +7,7 @@ from typing import Any, Literal
 from wi1_bot.arr import Radarr, Sonarr
 from wi1_bot.webhook.config import config
 from wi1_bot.webhook.db import init_db
-from wi1_bot.webhook.transcode_queue import queue
+from wi1_bot.webhook.transcode_queue import NewJob, default_priority, queue
 
 TargetName = Literal["radarr", "radarr4k", "sonarr", "sonarr4k"]
 TargetKind = Literal["radarr", "sonarr"]
@@ -129,7 +129,7 @@ def resolve_metadata(path: Path, targets: list[MetadataTarget]) -> TranscodeMeta
 
 
 def main() -> None:
-    parser = argparse.ArgumentParser(description="manually add an item to the transcode queue")
+    parser = argparse.ArgumentParser(description="manually add items to the transcode queue")
 
     parser.add_argument("path", nargs="+", help="file path to transcode (Arr-native path)")
     parser.add_argument(
@@ -138,12 +138,18 @@ def main() -> None:
         required=True,
         help="fallback quality profile when the file cannot be resolved through Arr",
     )
+    parser.add_argument(
+        "--priority",
+        type=int,
+        help="priority class of the jobs (default: the scheduling config's for the profile)",
+    )
 
     args = parser.parse_args()
 
     init_db()
     targets = _targets_from_config()
 
+    jobs = []
     for path in args.path:
         path = Path(path).resolve()
         metadata = resolve_metadata(path, targets)
@@ -159,12 +165,24 @@ def main() -> None:
                 file=sys.stderr,
             )
 
-        queue.add(
-            path=str(path),
-            quality_profile=metadata.quality_profile,
-            original_language=metadata.original_language,
+        priority = args.priority
+        if priority is None:
+            priority = default_priority(metadata.quality_profile)
+        # the size, when the file is visible here, lets smallest_first order it
+        source_size = path.stat().st_size if path.is_file() else None
+
+        jobs.append(
+            NewJob(
+                str(path),
+                metadata.quality_profile,
+                metadata.original_language,
+                priority,
+                source_size,
+            )
         )
 
+    # one transaction for the lot, however many files
+    queue.add_many(jobs)
     print("queue size:", queue.size)
 
 
@@ -1,25 +1,64 @@
 import threading
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Literal
+from typing import Any, Literal
 
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import (
+    ColumnElement,
+    UnaryExpression,
+    case,
+    delete,
+    false,
+    func,
+    insert,
+    or_,
+    select,
+    true,
+    update,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import InstrumentedAttribute, Session
 
-from wi1_bot.webhook.config import config
+from wi1_bot.webhook.config import JobSource, config
 from wi1_bot.webhook.db import get_engine
 from wi1_bot.webhook.metrics import (
     JOB_ATTEMPT_DURATION,
     JOB_ATTEMPTS,
     JOB_CLAIMS,
+    JOB_ENCODE_SPEED,
     JOB_HEARTBEATS,
+    JOB_PROJECTED_SAVINGS,
     JOB_QUEUE_WAIT_DURATION,
     elapsed_seconds,
 )
-from wi1_bot.webhook.models import TranscodeItem
+from wi1_bot.webhook.models import (
+    JobReport,
+    TranscodeItem,
+    TranscodeQueueCount,
+    TranscodeSourceShare,
+    TranscodeWorker,
+)
 
-__all__ = ["TranscodeItem", "TranscodeQueue", "queue"]
+__all__ = [
+    "JobEstimate",
+    "JobProgress",
+    "NewJob",
+    "TranscodeItem",
+    "TranscodeQueue",
+    "WorkerCapabilities",
+    "default_priority",
+    "queue",
+]
 
 MAX_ATTEMPTS = 3
+# how long applied report ids are remembered; workers replay within minutes of the
+# webhook coming back
+REPORT_TTL = timedelta(days=7)
+# seconds between a waiting claim's looks at the queue; a job queued by another webhook
+# process can't wake it
+RECHECK_INTERVAL = 1.0
 
 
 def _utcnow() -> datetime:
@@ -27,159 +66,760 @@ def _utcnow() -> datetime:
     return datetime.now(timezone.utc).replace(tzinfo=None)
 
 
+def default_priority(quality_profile: str, source: str | None = None) -> int:
+    """A new job's priority class: its profile's plus its Arr instance's, if configured."""
+    scheduling = config.webhook.scheduling
+    priority = scheduling.profile_priority.get(quality_profile, 0)
+    if source is not None:
+        priority += scheduling.instance_priority.get(source, 0)
+    return priority
+
+
+@dataclass(frozen=True)
+class NewJob:
+    """A job to enqueue with :meth:`TranscodeQueue.add_many`."""
+
+    path: str
+    quality_profile: str
+    original_language: str | None = None
+    priority: int = 0
+    source_size: int | None = None  # bytes
+    source: JobSource = "manual"
+
+
+@dataclass(frozen=True)
+class JobProgress:
+    """The ffmpeg progress a worker reports with a heartbeat."""
+
+    out_time: float  # seconds of media encoded so far
+    duration: float | None = None  # the source's duration
+    speed: float | None = None  # multiple of realtime
+    fps: float | None = None
+    total_size: int | None = None  # bytes written so far
+
+
+@dataclass(frozen=True)
+class JobEstimate:
+    """A transcode's outcome as projected by a worker's preflight sample encodes."""
+
+    source_size: int  # bytes
+    projected_size: int  # bytes
+    projected_seconds: float  # wall-clock time of the full encode
+
+    @property
+    def savings(self) -> float:
+        return 1 - self.projected_size / self.source_size if self.source_size else 0.0
+
+    @property
+    def value(self) -> float:
+        """Projected bytes saved per hour of encoding."""
+        saved = self.source_size - self.projected_size
+        return saved / max(self.projected_seconds / 3600, 1 / 3600)
+
+
+@dataclass(frozen=True)
+class FailedJob:
+    """What :meth:`TranscodeQueue.fail` did with a failed job."""
+
+    path: str
+    dropped: bool  # for good; otherwise requeued
+
+
+@dataclass(frozen=True)
+class WorkerCapabilities:
+    """What a worker advertises with its claims, so it's only handed jobs it can run."""
+
+    profiles: tuple[str, ...] = ()  # quality profiles it has configured
+    runnable_profiles: tuple[str, ...] = ()  # ...whose encoders and hwaccel it has
+    paths: tuple[str, ...] | None = None  # Arr-native roots it can reach; None: any
+    encoders: tuple[str, ...] = ()
+    hwaccels: tuple[str, ...] = ()
+
+
+_NO_PROGRESS = {
+    "progress_out_time": None,
+    "progress_duration": None,
+    "progress_speed": None,
+    "progress_fps": None,
+    "progress_total_size": None,
+    "progress_updated_at": None,
+}
+
+
+def _held_by(item_id: int, worker_id: str) -> ColumnElement[bool]:
+    # a worker's report applies only while it still holds the job; checked in the
+    # statement that applies it, so a reclaim can't land between check and write
+    return (
+        (TranscodeItem.id == item_id)
+        & (TranscodeItem.status == "in_progress")
+        & (TranscodeItem.worker_id == worker_id)
+    )
+
+
+def _handed_back(now: datetime) -> dict[str, object]:
+    # an UPDATE putting a held job back in the queue; RETURNING only sees the new
+    # values, so when the attempt started goes in previous_status_changed_at
+    return {
+        "previous_status": TranscodeItem.status,
+        "previous_status_changed_at": TranscodeItem.status_changed_at,
+        "status": "queued",
+        "worker_id": None,
+        "lease_expires_at": None,
+        "status_changed_at": now,
+        **_NO_PROGRESS,
+    }
+
+
+def _claim_order(
+    favor_savings: bool, served: dict[str, float], aged: dict[int, int]
+) -> list[UnaryExpression[Any]]:
+    scheduling = config.webhook.scheduling
+    by_priority = TranscodeItem.priority.desc()
+    if aged:
+        # every job of a class moves up together, so the sources sharing the class
+        # still take turns however long ago each queued its jobs
+        by_priority = case(aged, value=TranscodeItem.priority, else_=TranscodeItem.priority).desc()
+
+    if favor_savings and scheduling.space_pressure is not None:
+        # bytes a preflight projected it to save, or a guess from the source size
+        savings = func.coalesce(
+            TranscodeItem.estimate_source_size - TranscodeItem.estimate_projected_size,
+            TranscodeItem.source_size * scheduling.space_pressure.assumed_savings,
+        )
+        within_class = savings.desc().nulls_last()
+    elif scheduling.order == "smallest_first":
+        within_class = TranscodeItem.source_size.asc().nulls_last()
+    else:
+        # jobs a preflight projected to be worth the most (only requeued ones have a
+        # projection), then oldest first
+        within_class = TranscodeItem.estimate_value.desc().nulls_last()
+
+    if not served:
+        return [by_priority, within_class, TranscodeItem.id.asc()]
+    # within a class, the source served least for its weight first, so none
+    # monopolizes it; a CASE over the few sources, as a join costs a lookup per row
+    by_share = case(served, value=TranscodeItem.source, else_=0.0).asc()
+    return [by_priority, by_share, within_class, TranscodeItem.id.asc()]
+
+
 class TranscodeQueue:
     """The webhook-owned transcode queue.
 
     Workers pull jobs over HTTP via :meth:`claim` and report the outcome via
-    :meth:`complete` / :meth:`fail`. The webhook runs as a single process (waitress
-    with a thread pool), so a process-level lock serializes claims — that plus the
-    lease is enough to keep replicated workers from double-processing a job.
+    :meth:`complete` / :meth:`fail`. A claim is a single ``UPDATE ... RETURNING``, so
+    no two claims get the same job even from different webhook processes sharing
+    the database — that plus the lease is enough to keep replicated workers from
+    double-processing a job.
+
+    Claims can wait for a job: anything that queues one in this process bumps a
+    generation counter and wakes the waiters, so an idle worker's long-poll returns
+    as soon as there's work rather than on its next poll; jobs queued by other
+    processes are found within :data:`RECHECK_INTERVAL`.
     """
 
     def __init__(self) -> None:
-        self._claim_lock = threading.Lock()
+        self._available = threading.Condition()
+        self._generation = 0
+
+    def _notify_available(self) -> None:
+        with self._available:
+            self._generation += 1
+            self._available.notify_all()
 
     def add(
         self,
         path: str,
         quality_profile: str,
         original_language: str | None = None,
+        priority: int = 0,
+        source_size: int | None = None,
+        source: JobSource = "manual",
     ) -> int:
         """Enqueue a job; returns the new job's id (for log correlation)."""
+        job = NewJob(path, quality_profile, original_language, priority, source_size, source)
+        return self.add_many([job])[0]
+
+    def add_many(self, jobs: Sequence[NewJob]) -> list[int]:
+        """Enqueue jobs in one transaction; returns their ids, in order.
+
+        A season or back-catalog is queued with one commit instead of one per file.
+        """
+        if not jobs:
+            return []
         with Session(get_engine()) as session:
-            item = TranscodeItem(
-                path=path,
-                quality_profile=quality_profile,
-                original_language=original_language,
+            self._rejoin_sources(session, {job.source for job in jobs})
+            item_ids = list(
+                session.scalars(
+                    insert(TranscodeItem).returning(TranscodeItem.id, sort_by_parameter_order=True),
+                    [
+                        {
+                            "path": job.path,
+                            "quality_profile": job.quality_profile,
+                            "original_language": job.original_language,
+                            "priority": job.priority,
+                            "source_size": job.source_size,
+                            "source": job.source,
+                        }
+                        for job in jobs
+                    ],
+                )
             )
-            session.add(item)
             session.commit()
-            return item.id
 
-    def claim(self, worker_id: str, lease_secs: float | None = None) -> TranscodeItem | None:
-        """Atomically hand the oldest available job to a worker.
+        self._notify_available()
+        return item_ids
+
+    def claim(
+        self,
+        worker_id: str,
+        lease_secs: float | None = None,
+        capabilities: WorkerCapabilities | None = None,
+        wait: float = 0,
+        favor_savings: bool = False,
+    ) -> TranscodeItem | None:
+        """Atomically hand the next available job to a worker.
 
-        Picks the oldest ``queued`` row, or an ``in_progress`` row whose lease has
-        expired (crashed worker), marks it in_progress with a fresh lease, bumps the
-        attempt counter, and returns a detached copy.
+        Picks a ``queued`` row, or an ``in_progress`` row whose lease has expired
+        (crashed worker), marks it in_progress with a fresh lease, bumps the attempt
+        counter, and returns a detached copy. Jobs are taken highest priority class
+        first (counting aging), shared between sources by weight, then in the
+        configured scheduling order; with ``favor_savings`` (the media is short on
+        space), by expected bytes saved.
+
+        With ``capabilities`` (recorded for the worker), only jobs it can run are
+        considered; others wait for a worker that can. If there's no job, waits up to
+        ``wait`` seconds for one to be queued.
         """
         if lease_secs is None:
             lease_secs = config.webhook.lease_secs
-        now = _utcnow()
-        with self._claim_lock, Session(get_engine()) as session:
-            item = session.execute(
-                select(TranscodeItem)
-                .where(
-                    (TranscodeItem.status == "queued")
-                    | (
-                        (TranscodeItem.status == "in_progress")
-                        & (TranscodeItem.lease_expires_at < now)
-                    )
+        if capabilities is not None:
+            with Session(get_engine()) as session:
+                self._register(session, worker_id, capabilities, _utcnow())
+                session.commit()
+
+        deadline = time.monotonic() + wait
+        while True:
+            # read before looking, so a job queued in between still wakes the wait
+            with self._available:
+                generation = self._generation
+
+            item = self._claim_now(worker_id, lease_secs, capabilities, favor_savings)
+            remaining = deadline - time.monotonic()
+            if item is not None or remaining <= 0:
+                return item
+
+            # jobs queued by another webhook process don't wake this one's waiters
+            with self._available:
+                self._available.wait_for(
+                    lambda: self._generation != generation, min(remaining, RECHECK_INTERVAL)
                 )
-                .order_by(TranscodeItem.id)
-                .limit(1)
-            ).scalar_one_or_none()
 
+    def _claim_now(
+        self,
+        worker_id: str,
+        lease_secs: float,
+        capabilities: WorkerCapabilities | None,
+        favor_savings: bool,
+    ) -> TranscodeItem | None:
+        now = _utcnow()
+        with Session(get_engine(), expire_on_commit=False) as session:
+            runnable = true()
+            if capabilities is not None:
+                runnable = self._runnable_by(session, capabilities, now)
+            # read before the claim takes the write lock, so a concurrent claim may
+            # order by a share that's one behind; that only shifts whose turn it is
+            served = dict(
+                session.execute(select(TranscodeSourceShare.source, TranscodeSourceShare.served))
+                .tuples()
+                .all()
+            )
+
+            aged = self._aged_classes(session, now)
+
+            claimable = (TranscodeItem.status == "queued") | (
+                (TranscodeItem.status == "in_progress") & (TranscodeItem.lease_expires_at < now)
+            )
+            candidate = (
+                select(TranscodeItem.id)
+                .where(claimable)
+                .where(runnable)
+                .order_by(*_claim_order(favor_savings, served, aged))
+                .limit(1)
+                .scalar_subquery()
+            )
+            # one statement, so concurrent claims (from any process) can't both take
+            # the same job; SET sees the row's values from before the update
+            item = session.scalars(
+                update(TranscodeItem)
+                .where(TranscodeItem.id == candidate, claimable)
+                .values(
+                    previous_status=TranscodeItem.status,
+                    previous_status_changed_at=TranscodeItem.status_changed_at,
+                    status="in_progress",
+                    worker_id=worker_id,
+                    lease_expires_at=now + timedelta(seconds=lease_secs),
+                    attempts=TranscodeItem.attempts + 1,
+                    status_changed_at=now,
+                    **_NO_PROGRESS,
+                )
+                .returning(TranscodeItem),
+                execution_options={"synchronize_session": False},
+            ).one_or_none()
             if item is None:
+                session.commit()
                 return None
-
-            previous_status = item.status
-            previous_status_changed_at = item.status_changed_at
-            if previous_status == "queued":
-                claim_kind = "initial" if item.attempts == 0 else "retry"
-            else:
-                claim_kind = "expired_lease"
-
-            item.status = "in_progress"
-            item.worker_id = worker_id
-            item.lease_expires_at = now + timedelta(seconds=lease_secs)
-            item.attempts += 1
-            item.status_changed_at = now
+            # in the claim's transaction, which holds the database's write lock
+            self._serve_source(session, item.source)
             session.commit()
-            session.refresh(item)
             session.expunge(item)
 
-            JOB_CLAIMS.labels(kind=claim_kind).inc()
-            if claim_kind in {"initial", "retry"}:
-                JOB_QUEUE_WAIT_DURATION.labels(kind=claim_kind).observe(
-                    elapsed_seconds(previous_status_changed_at, now)
+        previous_status_changed_at = item.previous_status_changed_at or now
+        if item.previous_status == "queued":
+            claim_kind = "initial" if item.attempts == 1 else "retry"
+        else:
+            claim_kind = "expired_lease"
+
+        JOB_CLAIMS.labels(kind=claim_kind, source=item.source).inc()
+        if claim_kind in {"initial", "retry"}:
+            JOB_QUEUE_WAIT_DURATION.labels(kind=claim_kind, source=item.source).observe(
+                elapsed_seconds(previous_status_changed_at, now)
+            )
+        else:
+            JOB_ATTEMPTS.labels(outcome="lease_expired").inc()
+            JOB_ATTEMPT_DURATION.labels(outcome="lease_expired").observe(
+                elapsed_seconds(previous_status_changed_at, now)
+            )
+        return item
+
+    @staticmethod
+    def _aged_classes(session: Session, now: datetime) -> dict[int, int]:
+        # each priority class with queued jobs, raised one class per aging seconds
+        # its oldest job has waited; only the raised ones
+        aging = config.webhook.scheduling.aging
+        if aging is None:
+            return {}
+        oldest = session.execute(
+            select(TranscodeItem.priority, func.min(TranscodeItem.status_changed_at))
+            .where(TranscodeItem.status == "queued")
+            .group_by(TranscodeItem.priority)
+        ).tuples()
+        aged = {
+            priority: priority + int(elapsed_seconds(queued_at, now) // aging)
+            for priority, queued_at in oldest
+        }
+        return {priority: raised for priority, raised in aged.items() if raised != priority}
+
+    @staticmethod
+    def _serve_source(session: Session, source: str) -> None:
+        stride = 1 / config.webhook.scheduling.source_weights.get(source, 1.0)
+        session.execute(
+            sqlite_insert(TranscodeSourceShare)
+            .values(source=source, served=stride)
+            .on_conflict_do_update(
+                index_elements=[TranscodeSourceShare.source],
+                set_={"served": TranscodeSourceShare.served + stride},
+            )
+        )
+
+    @staticmethod
+    def _rejoin_sources(session: Session, sources: set[str]) -> None:
+        # a source with nothing queued (idle, or new) joins level with the least served
+        # of the waiting ones (or, with none waiting, the most served), rather than
+        # taking every claim until it has caught up
+        def waiting(source: InstrumentedAttribute[str] | str) -> ColumnElement[bool]:
+            return (
+                select(TranscodeItem.id)
+                .where(TranscodeItem.status == "queued", TranscodeItem.source == source)
+                .exists()
+            )
+
+        level = session.scalar(
+            select(func.min(TranscodeSourceShare.served)).where(
+                waiting(TranscodeSourceShare.source)
+            )
+        )
+        if level is None:
+            level = session.scalar(select(func.max(TranscodeSourceShare.served)))
+        if level is None:
+            return
+
+        for source in sources:
+            if session.scalar(select(waiting(source))):
+                continue
+            share = session.get(TranscodeSourceShare, source)
+            if share is None:
+                session.add(TranscodeSourceShare(source=source, served=level))
+            elif share.served < level:
+                share.served = level
+
+    @staticmethod
+    def _register(
+        session: Session, worker_id: str, capabilities: WorkerCapabilities, now: datetime
+    ) -> None:
+        worker = session.get(TranscodeWorker, worker_id) or TranscodeWorker(worker_id=worker_id)
+        worker.encoders = list(capabilities.encoders)
+        worker.hwaccels = list(capabilities.hwaccels)
+        worker.profiles = list(capabilities.profiles)
+        worker.runnable_profiles = list(capabilities.runnable_profiles)
+        worker.paths = list(capabilities.paths) if capabilities.paths is not None else None
+        worker.last_seen_at = now
+        session.add(worker)
+        session.flush()
+
+    @staticmethod
+    def _runnable_by(
+        session: Session, capabilities: WorkerCapabilities, now: datetime
+    ) -> ColumnElement[bool]:
+        # every download is enqueued, including ones for profiles nobody transcodes;
+        # those still go to any worker, which drops them
+        seen_since = now - timedelta(seconds=config.webhook.worker_ttl)
+        configured = {
+            profile
+            for profiles in session.scalars(
+                select(TranscodeWorker.profiles).where(TranscodeWorker.last_seen_at >= seen_since)
+            )
+            for profile in profiles
+        }
+        runnable = TranscodeItem.quality_profile.in_(
+            capabilities.runnable_profiles
+        ) | TranscodeItem.quality_profile.not_in(configured)
+
+        if capabilities.paths is None:
+            return runnable
+        reachable = or_(
+            false(),
+            *(
+                TranscodeItem.path.startswith(f"{root.rstrip('/')}/", autoescape=True)
+                for root in capabilities.paths
+            ),
+        )
+        return runnable & reachable
+
+    def get(self, item_id: int) -> TranscodeItem | None:
+        """A detached copy of a job, or ``None`` if it's gone."""
+        with Session(get_engine()) as session:
+            item = session.get(TranscodeItem, item_id)
+            if item is not None:
+                session.expunge(item)
+            return item
+
+    def split(
+        self,
+        item_id: int,
+        worker_id: str,
+        segments: Sequence[tuple[float, float | None]],
+    ) -> list[int] | None:
+        """Split a claimed job into segment jobs, one per ``(start, end)`` of its video.
+
+        The segments are queued for any worker; the job itself waits (no lease) until
+        the last one completes, then is queued again to assemble them. Only the
+        owning worker may split a job. Returns the segments' ids.
+        """
+        now = _utcnow()
+        with Session(get_engine()) as session:
+            item = session.scalars(
+                update(TranscodeItem)
+                .where(_held_by(item_id, worker_id), TranscodeItem.kind == "transcode")
+                .values(
+                    previous_status=TranscodeItem.status,
+                    previous_status_changed_at=TranscodeItem.status_changed_at,
+                    status="waiting",
+                    segment_count=len(segments),
+                    worker_id=None,
+                    lease_expires_at=None,
+                    status_changed_at=now,
+                    **_NO_PROGRESS,
                 )
-            else:
-                JOB_ATTEMPTS.labels(outcome="lease_expired").inc()
-                JOB_ATTEMPT_DURATION.labels(outcome="lease_expired").observe(
-                    elapsed_seconds(previous_status_changed_at, now)
+                .returning(TranscodeItem),
+                execution_options={"synchronize_session": False},
+            ).one_or_none()
+            if item is None:
+                return None
+
+            attempt_started_at = item.previous_status_changed_at or now
+            children = [
+                TranscodeItem(
+                    path=item.path,
+                    quality_profile=item.quality_profile,
+                    original_language=item.original_language,
+                    priority=item.priority,
+                    source=item.source,
+                    kind="segment",
+                    parent_id=item.id,
+                    segment_index=index,
+                    segment_start=start,
+                    segment_end=end,
+                    status_changed_at=now,
                 )
-            return item
+                for index, (start, end) in enumerate(segments)
+            ]
+            session.add_all(children)
+            session.commit()
+
+            JOB_ATTEMPTS.labels(outcome="split").inc()
+            JOB_ATTEMPT_DURATION.labels(outcome="split").observe(
+                elapsed_seconds(attempt_started_at, now)
+            )
+            child_ids = [child.id for child in children]
+
+        self._notify_available()
+        return child_ids
+
+    def heartbeat(
+        self,
+        item_id: int,
+        worker_id: str,
+        lease_secs: float | None = None,
+        progress: JobProgress | None = None,
+    ) -> bool:
+        """Extend a claimed job's lease. Only the owning worker may renew it.
 
-    def heartbeat(self, item_id: int, worker_id: str, lease_secs: float | None = None) -> bool:
-        """Extend a claimed job's lease. Only the owning worker may renew it."""
+        Stores the worker's latest ffmpeg ``progress``, if it sent any.
+        """
         if lease_secs is None:
             lease_secs = config.webhook.lease_secs
+        now = _utcnow()
+        values: dict[str, object] = {"lease_expires_at": now + timedelta(seconds=lease_secs)}
+        if progress is not None:
+            values.update(
+                progress_out_time=progress.out_time,
+                progress_duration=progress.duration,
+                progress_speed=progress.speed,
+                progress_fps=progress.fps,
+                progress_total_size=progress.total_size,
+                progress_updated_at=now,
+            )
         with Session(get_engine()) as session:
-            item = session.get(TranscodeItem, item_id)
-            if item is None or item.status != "in_progress" or item.worker_id != worker_id:
-                JOB_HEARTBEATS.labels(outcome="rejected").inc()
-                return False
-            item.lease_expires_at = _utcnow() + timedelta(seconds=lease_secs)
+            # checked and renewed in one statement, so a lease can't be renewed for a
+            # worker whose job was reclaimed in between
+            quality_profile = session.scalar(
+                update(TranscodeItem)
+                .where(
+                    TranscodeItem.id == item_id,
+                    TranscodeItem.status == "in_progress",
+                    TranscodeItem.worker_id == worker_id,
+                )
+                .values(values)
+                .returning(TranscodeItem.quality_profile),
+                execution_options={"synchronize_session": False},
+            )
             session.commit()
-            JOB_HEARTBEATS.labels(outcome="accepted").inc()
-            return True
+
+        if quality_profile is None:
+            JOB_HEARTBEATS.labels(outcome="rejected").inc()
+            return False
+        JOB_HEARTBEATS.labels(outcome="accepted").inc()
+        if progress is not None and progress.speed is not None:
+            JOB_ENCODE_SPEED.labels(quality_profile=quality_profile, worker_id=worker_id).observe(
+                progress.speed
+            )
+        return True
+
+    def estimate(self, item_id: int, worker_id: str, estimate: JobEstimate) -> bool:
+        """Record a claimed job's preflight projection. Only the owning worker may."""
+        with Session(get_engine()) as session:
+            quality_profile = session.scalar(
+                update(TranscodeItem)
+                .where(_held_by(item_id, worker_id))
+                .values(
+                    estimate_source_size=estimate.source_size,
+                    estimate_projected_size=estimate.projected_size,
+                    estimate_seconds=estimate.projected_seconds,
+                    estimate_value=estimate.value,
+                    source_size=func.coalesce(TranscodeItem.source_size, estimate.source_size),
+                )
+                .returning(TranscodeItem.quality_profile),
+                execution_options={"synchronize_session": False},
+            )
+            session.commit()
+
+        if quality_profile is None:
+            return False
+        JOB_PROJECTED_SAVINGS.labels(quality_profile=quality_profile).observe(estimate.savings)
+        return True
+
+    def prioritize(self, item_id: int, priority: int) -> bool:
+        """Set a job's priority class, and its segments' if it's split.
+
+        Returns whether the job exists.
+        """
+        with Session(get_engine()) as session:
+            updated = session.scalars(
+                update(TranscodeItem)
+                .where((TranscodeItem.id == item_id) | (TranscodeItem.parent_id == item_id))
+                .values(priority=priority)
+                .returning(TranscodeItem.id),
+                execution_options={"synchronize_session": False},
+            ).all()
+            session.commit()
+
+        return item_id in updated
 
     def complete(
-        self, item_id: int, outcome: Literal["completed", "skipped"] = "completed"
+        self,
+        item_id: int,
+        worker_id: str,
+        outcome: Literal["completed", "skipped"] = "completed",
+        report_id: str | None = None,
     ) -> str | None:
-        """Remove a finished job; returns its path (for a post-transcode rescan)."""
+        """Remove a finished job; returns its path (for a post-transcode rescan).
+
+        Only the worker holding the job may complete it: a report replayed after its
+        lease expired returns ``None`` and leaves the job to whoever claimed it since.
+        """
         with Session(get_engine()) as session:
-            item = session.get(TranscodeItem, item_id)
-            if item is None:
+            row = session.execute(
+                delete(TranscodeItem)
+                .where(_held_by(item_id, worker_id))
+                .returning(
+                    TranscodeItem.path,
+                    TranscodeItem.kind,
+                    TranscodeItem.parent_id,
+                    TranscodeItem.status_changed_at,
+                ),
+                execution_options={"synchronize_session": False},
+            ).one_or_none()
+            if row is None:
                 return None
-            path = item.path
-            attempt_started_at = item.status_changed_at if item.status == "in_progress" else None
-            session.delete(item)
+            path, kind, parent_id, attempt_started_at = row
+            self._record_report(session, report_id, item_id)
+            if parent_id is not None:
+                self._assemble_when_encoded(session, parent_id)
             session.commit()
 
-            if attempt_started_at is not None:
-                JOB_ATTEMPTS.labels(outcome=outcome).inc()
-                JOB_ATTEMPT_DURATION.labels(outcome=outcome).observe(
-                    elapsed_seconds(attempt_started_at, _utcnow())
+            JOB_ATTEMPTS.labels(outcome=outcome).inc()
+            JOB_ATTEMPT_DURATION.labels(outcome=outcome).observe(
+                elapsed_seconds(attempt_started_at, _utcnow())
+            )
+
+        if kind == "segment":
+            # the last segment queues its parent's assemble job
+            self._notify_available()
+        return path
+
+    @staticmethod
+    def _assemble_when_encoded(session: Session, parent_id: int) -> None:
+        # called with a segment deleted; SQLite serializes writers, so exactly one
+        # of two segments finishing together sees no siblings left
+        remaining = session.scalar(
+            select(func.count(TranscodeItem.id)).where(TranscodeItem.parent_id == parent_id)
+        )
+        parent = session.get(TranscodeItem, parent_id)
+        if remaining or parent is None:
+            return
+
+        parent.kind = "assemble"
+        parent.status = "queued"
+        # a fresh job as far as retries go: the split attempt succeeded
+        parent.attempts = 0
+        parent.status_changed_at = _utcnow()
+
+    def reported(self, report_id: str) -> bool:
+        """Whether a worker's outcome report with this id was already applied."""
+        with Session(get_engine()) as session:
+            return session.get(JobReport, report_id) is not None
+
+    @staticmethod
+    def _record_report(session: Session, report_id: str | None, item_id: int) -> None:
+        # committed with the outcome it reports, so a replay sees one or neither
+        if report_id is None:
+            return
+        now = _utcnow()
+        session.add(JobReport(report_id=report_id, job_id=item_id, received_at=now))
+        session.query(JobReport).where(JobReport.received_at < now - REPORT_TTL).delete()
+
+    def release(self, item_id: int, worker_id: str, report_id: str | None = None) -> bool:
+        """Hand a claimed job back to the queue without using up an attempt.
+
+        For a worker shutting down mid-job, so the job is dispatched again right away
+        instead of when its lease expires. Only the owning worker may release a job.
+        """
+        now = _utcnow()
+        with Session(get_engine()) as session:
+            attempt_started_at = session.scalar(
+                update(TranscodeItem)
+                .where(_held_by(item_id, worker_id))
+                .values(
+                    attempts=func.max(TranscodeItem.attempts - 1, 0),
+                    **_handed_back(now),
                 )
-            return path
+                .returning(TranscodeItem.previous_status_changed_at),
+                execution_options={"synchronize_session": False},
+            )
+            if attempt_started_at is None:
+                return False
+            self._record_report(session, report_id, item_id)
+            session.commit()
+
+        JOB_ATTEMPTS.labels(outcome="released").inc()
+        JOB_ATTEMPT_DURATION.labels(outcome="released").observe(
+            elapsed_seconds(attempt_started_at, now)
+        )
+        self._notify_available()
+        return True
 
-    def fail(self, item_id: int, retry: bool, max_attempts: int = MAX_ATTEMPTS) -> str | None:
+    def fail(
+        self,
+        item_id: int,
+        worker_id: str,
+        retry: bool,
+        max_attempts: int = MAX_ATTEMPTS,
+        report_id: str | None = None,
+    ) -> FailedJob | None:
         """Handle a failed job.
 
-        Requeues it if ``retry`` and attempts remain (returns ``None``); otherwise
-        drops it and returns its path so the caller can send a failure notification.
+        Requeues it if ``retry`` and attempts remain; otherwise drops it, so the
+        caller can send a failure notification. A segment that fails for good takes
+        its parent and sibling segments with it. Like :meth:`complete`, only the
+        worker holding the job may fail it; returns ``None`` for anyone else.
         """
+        now = _utcnow()
         with Session(get_engine()) as session:
-            item = session.get(TranscodeItem, item_id)
-            if item is None:
-                return None
-            path = item.path
-            attempt_started_at = item.status_changed_at if item.status == "in_progress" else None
-            if retry and item.attempts < max_attempts:
-                now = _utcnow()
-                item.status = "queued"
-                item.worker_id = None
-                item.lease_expires_at = None
-                item.status_changed_at = now
-                session.commit()
+            if retry:
+                requeued = session.execute(
+                    update(TranscodeItem)
+                    .where(_held_by(item_id, worker_id), TranscodeItem.attempts < max_attempts)
+                    .values(_handed_back(now))
+                    .returning(TranscodeItem.path, TranscodeItem.previous_status_changed_at),
+                    execution_options={"synchronize_session": False},
+                ).one_or_none()
+                if requeued is not None:
+                    path, attempt_started_at = requeued
+                    self._record_report(session, report_id, item_id)
+                    session.commit()
 
-                if attempt_started_at is not None:
                     JOB_ATTEMPTS.labels(outcome="requeued").inc()
                     JOB_ATTEMPT_DURATION.labels(outcome="requeued").observe(
                         elapsed_seconds(attempt_started_at, now)
                     )
+                    self._notify_available()
+                    return FailedJob(path, dropped=False)
+
+            dropped = session.execute(
+                delete(TranscodeItem)
+                .where(_held_by(item_id, worker_id))
+                .returning(
+                    TranscodeItem.path, TranscodeItem.parent_id, TranscodeItem.status_changed_at
+                ),
+                execution_options={"synchronize_session": False},
+            ).one_or_none()
+            if dropped is None:
                 return None
-            session.delete(item)
+            path, parent_id, attempt_started_at = dropped
+            self._record_report(session, report_id, item_id)
+            if parent_id is not None:
+                session.execute(
+                    delete(TranscodeItem).where(
+                        (TranscodeItem.parent_id == parent_id) | (TranscodeItem.id == parent_id)
+                    )
+                )
             session.commit()
 
-            if attempt_started_at is not None:
-                JOB_ATTEMPTS.labels(outcome="terminal_failure").inc()
-                JOB_ATTEMPT_DURATION.labels(outcome="terminal_failure").observe(
-                    elapsed_seconds(attempt_started_at, _utcnow())
-                )
-            return path
+            JOB_ATTEMPTS.labels(outcome="terminal_failure").inc()
+            JOB_ATTEMPT_DURATION.labels(outcome="terminal_failure").observe(
+                elapsed_seconds(attempt_started_at, _utcnow())
+            )
+            return FailedJob(path, dropped=True)
 
     def clear(self) -> None:
         with Session(get_engine()) as session:
@@ -188,8 +828,9 @@ class TranscodeQueue:
 
     @property
     def size(self) -> int:
+        """How many jobs are in the queue, from the per-status counts (no table scan)."""
         with Session(get_engine()) as session:
-            return session.query(TranscodeItem).count()
+            return session.scalar(select(func.sum(TranscodeQueueCount.jobs))) or 0
 
 
 queue = TranscodeQueue()
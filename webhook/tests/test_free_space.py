@@ -0,0 +1,58 @@
+from typing import cast
+from unittest.mock import MagicMock, patch
+
+from wi1_bot.arr import Radarr, Sonarr
+from wi1_bot.webhook.autobrr import ArrTarget, TargetName
+from wi1_bot.webhook.free_space import FreeSpaceMonitor
+
+
+def _target(name: str, *free_space: int) -> tuple[ArrTarget, MagicMock]:
+    client = MagicMock()
+    client.get_root_folders.return_value = [
+        {"path": f"/{name}/{i}", "freeSpace": free} for i, free in enumerate(free_space)
+    ]
+    target = ArrTarget(
+        cast(TargetName, name),
+        "radarr" if name.startswith("radarr") else "sonarr",
+        cast(Radarr | Sonarr, client),
+    )
+    return target, client
+
+
+def test_pressure_follows_the_tightest_root_folder() -> None:
+    radarr, radarr_client = _target("radarr", 500, 50)
+    sonarr, _ = _target("sonarr", 400)
+    monitor = FreeSpaceMonitor([radarr, sonarr], min_free_bytes=100, interval=60)
+
+    monitor.check()
+    assert monitor.under_pressure() is True
+
+    radarr_client.get_root_folders.return_value = [{"path": "/radarr/0", "freeSpace": 500}]
+    monitor.check()
+    assert monitor.under_pressure() is False
+
+
+def test_failed_checks_keep_the_last_result() -> None:
+    radarr, client = _target("radarr", 50)
+    monitor = FreeSpaceMonitor([radarr], min_free_bytes=100, interval=60)
+    monitor.check()
+
+    client.get_root_folders.side_effect = ConnectionError
+    monitor.check()
+
+    assert monitor.under_pressure() is True
+
+
+def test_checks_run_in_the_background_once_per_interval() -> None:
+    radarr, _ = _target("radarr", 50)
+    monitor = FreeSpaceMonitor([radarr], min_free_bytes=100, interval=60)
+
+    with patch("wi1_bot.webhook.free_space.threading.Thread") as thread:
+        # no result yet: not under pressure until the first check finishes
+        assert monitor.under_pressure() is False
+        assert monitor.under_pressure() is False
+        thread.assert_called_once()
+
+        thread.call_args.kwargs["target"]()
+        assert monitor.under_pressure() is True
+        thread.assert_called_once()
@@ -1,31 +1,33 @@
 """End-to-end interaction tests between the transcoder worker and the webhook.
 
-These wire the worker's HTTP client (``wi1_bot.transcoder.worker.requests``) straight
-into the webhook's Flask test client, so a claim/heartbeat/complete/fail issued by real
+These wire the worker's HTTP client (the session of a ``WebhookClient``) straight into
+the webhook's Flask test client, so a claim/heartbeat/complete/fail issued by real
 worker code drives the real webhook endpoints, queue, and SQLite database.
 """
 
 from collections.abc import Iterator
 from datetime import timedelta
+from pathlib import Path
 from typing import Any
 from unittest.mock import patch
 from urllib.parse import urlsplit
 
 import pytest
-import requests
 from flask.testing import FlaskClient
 from sqlalchemy.orm import Session
 from werkzeug.test import TestResponse
 
 import wi1_bot.transcoder.worker as worker_mod
 import wi1_bot.webhook.app as app_mod
+from wi1_bot.transcoder.client import WebhookClient
+from wi1_bot.transcoder.outbox import Outbox
 from wi1_bot.transcoder.transcoder import JobResult
 from wi1_bot.webhook.config import config
 from wi1_bot.webhook.db import get_engine
 from wi1_bot.webhook.models import TranscodeItem
 from wi1_bot.webhook.transcode_queue import _utcnow, queue
 
-BASE = "http://webhook"
+CLIENT = WebhookClient("http://webhook")
 
 
 class _ClientResponse:
@@ -44,10 +46,8 @@ class _ClientResponse:
         return self._tr.get_json()
 
 
-class _ClientRequests:
-    """Stands in for the ``requests`` module inside the worker, routing posts to a test client."""
-
-    RequestException = requests.RequestException
+class _ClientSession:
+    """Stands in for the worker's ``requests.Session``, routing posts to a test client."""
 
     def __init__(self, client: FlaskClient) -> None:
         self._client = client
@@ -61,7 +61,7 @@ def wired(db: None) -> Iterator[FlaskClient]:
     """Webhook test client with the transcoder worker's HTTP calls routed into it."""
     queue.clear()
     client = app_mod.app.test_client()
-    with patch.object(worker_mod, "requests", _ClientRequests(client)):
+    with patch.object(CLIENT, "session", _ClientSession(client)):
         yield client
 
 
@@ -83,14 +83,20 @@ def _expire_lease(job_id: int) -> None:
 # --- enqueue -> claim ------------------------------------------------------------------
 
 
+@pytest.fixture
+def outbox(tmp_path: Path) -> Outbox:
+    """The worker's report outbox, delivering through the wired client."""
+    return Outbox(tmp_path / "outbox", CLIENT)
+
+
 def test_claim_returns_none_when_queue_empty(wired: FlaskClient) -> None:
-    assert worker_mod._claim(BASE, "w1") is None
+    assert worker_mod._claim(CLIENT, "w1") is None
 
 
 def test_enqueue_then_claim_hands_off_full_job(wired: FlaskClient) -> None:
     job_id = queue.add("/movies/a.mkv", "good", "English")
 
-    job = worker_mod._claim(BASE, "w1")
+    job = worker_mod._claim(CLIENT, "w1")
 
     assert job is not None
     assert job["id"] == job_id
@@ -106,75 +112,79 @@ def test_claim_is_fifo_across_workers(wired: FlaskClient) -> None:
     queue.add("/movies/a.mkv", "good")
     queue.add("/movies/b.mkv", "good")
 
-    first = worker_mod._claim(BASE, "w1")
-    second = worker_mod._claim(BASE, "w2")
+    first = worker_mod._claim(CLIENT, "w1")
+    second = worker_mod._claim(CLIENT, "w2")
 
     assert first is not None and second is not None
     assert first["path"] == "/movies/a.mkv"
     assert second["path"] == "/movies/b.mkv"
-    assert worker_mod._claim(BASE, "w3") is None
+    assert worker_mod._claim(CLIENT, "w3") is None
 
 
 # --- claim -> complete / skip / fail / retry -------------------------------------------
 
 
-def test_complete_lifecycle_triggers_rescan_and_drains_queue(wired: FlaskClient) -> None:
+def test_complete_lifecycle_triggers_rescan_and_drains_queue(
+    wired: FlaskClient, outbox: Outbox
+) -> None:
     job_id = queue.add("/movies/a.mkv", "good", "English")
-    assert worker_mod._claim(BASE, "w1") is not None
+    assert worker_mod._claim(CLIENT, "w1") is not None
 
     with patch.object(app_mod, "rescan_content") as mock_rescan:
-        worker_mod._report(BASE, job_id, "w1", JobResult("complete", filename="a-TRANSCODED.mkv"))
+        worker_mod._report(outbox, job_id, "w1", JobResult("complete", filename="a-TRANSCODED.mkv"))
 
     mock_rescan.assert_called_once()
     assert queue.size == 0
 
 
-def test_skip_completes_without_rescan(wired: FlaskClient) -> None:
+def test_skip_completes_without_rescan(wired: FlaskClient, outbox: Outbox) -> None:
     job_id = queue.add("/movies/a.mkv", "good")
-    assert worker_mod._claim(BASE, "w1") is not None
+    assert worker_mod._claim(CLIENT, "w1") is not None
 
     with patch.object(app_mod, "rescan_content") as mock_rescan:
-        worker_mod._report(BASE, job_id, "w1", JobResult("skip"))
+        worker_mod._report(outbox, job_id, "w1", JobResult("skip"))
 
     mock_rescan.assert_not_called()
     assert queue.size == 0
 
 
-def test_terminal_fail_notifies_and_drops(wired: FlaskClient) -> None:
+def test_terminal_fail_notifies_and_drops(wired: FlaskClient, outbox: Outbox) -> None:
     job_id = queue.add("/movies/a.mkv", "good")
-    assert worker_mod._claim(BASE, "w1") is not None
+    assert worker_mod._claim(CLIENT, "w1") is not None
 
     with patch.object(app_mod, "push") as mock_push:
         worker_mod._report(
-            BASE, job_id, "w1", JobResult("fail", reason="boom", log_tail="ffmpeg died")
+            outbox, job_id, "w1", JobResult("fail", reason="boom", log_tail="ffmpeg died")
         )
 
     mock_push.send.assert_called_once()
     assert queue.size == 0
 
 
-def test_retry_requeues_and_is_reclaimed_by_another_worker(wired: FlaskClient) -> None:
+def test_retry_requeues_and_is_reclaimed_by_another_worker(
+    wired: FlaskClient, outbox: Outbox
+) -> None:
     job_id = queue.add("/movies/a.mkv", "good")
-    assert worker_mod._claim(BASE, "w1") is not None
+    assert worker_mod._claim(CLIENT, "w1") is not None
 
     with patch.object(app_mod, "push") as mock_push:
-        worker_mod._report(BASE, job_id, "w1", JobResult("retry", reason="interrupted"))
+        worker_mod._report(outbox, job_id, "w1", JobResult("retry", reason="interrupted"))
 
     # a retry requeues (no notification) rather than dropping the job
     mock_push.send.assert_not_called()
     assert queue.size == 1
 
-    reclaimed = worker_mod._claim(BASE, "w2")
+    reclaimed = worker_mod._claim(CLIENT, "w2")
     assert reclaimed is not None
     assert reclaimed["id"] == job_id
     assert _db_item(job_id).worker_id == "w2"
     assert _db_item(job_id).attempts == 2
 
 
-def test_complete_for_unknown_job_is_a_noop(wired: FlaskClient) -> None:
+def test_complete_for_unknown_job_is_a_noop(wired: FlaskClient, outbox: Outbox) -> None:
     # nothing enqueued: a completion for a stale/expired id must not raise or rescan
     with patch.object(app_mod, "rescan_content") as mock_rescan:
-        worker_mod._report(BASE, 999, "w1", JobResult("complete", filename="x.mkv"))
+        worker_mod._report(outbox, 999, "w1", JobResult("complete", filename="x.mkv"))
 
     mock_rescan.assert_not_called()
     assert queue.size == 0
@@ -185,10 +195,10 @@ def test_complete_for_unknown_job_is_a_noop(wired: FlaskClient) -> None:
 
 def test_heartbeat_from_owner_renews_lease(wired: FlaskClient) -> None:
     job_id = queue.add("/movies/a.mkv", "good")
-    assert worker_mod._claim(BASE, "w1") is not None
+    assert worker_mod._claim(CLIENT, "w1") is not None
     _expire_lease(job_id)
 
-    resp = worker_mod.requests.post(f"{BASE}/jobs/{job_id}/heartbeat", json={"worker_id": "w1"})
+    resp = CLIENT.post("heartbeat", f"/jobs/{job_id}/heartbeat", {"worker_id": "w1"})
 
     assert resp.status_code == 200
     # the lease was pushed back into the future
@@ -199,23 +209,23 @@ def test_heartbeat_from_owner_renews_lease(wired: FlaskClient) -> None:
 
 def test_heartbeat_from_wrong_worker_is_rejected(wired: FlaskClient) -> None:
     job_id = queue.add("/movies/a.mkv", "good")
-    assert worker_mod._claim(BASE, "w1") is not None
+    assert worker_mod._claim(CLIENT, "w1") is not None
 
-    resp = worker_mod.requests.post(f"{BASE}/jobs/{job_id}/heartbeat", json={"worker_id": "w2"})
+    resp = CLIENT.post("heartbeat", f"/jobs/{job_id}/heartbeat", {"worker_id": "w2"})
 
     assert resp.status_code == 409
 
 
 def test_heartbeat_rejected_after_lease_reclaimed(wired: FlaskClient) -> None:
     job_id = queue.add("/movies/a.mkv", "good")
-    assert worker_mod._claim(BASE, "w1") is not None
+    assert worker_mod._claim(CLIENT, "w1") is not None
 
     # w1 stalls, its lease expires, and w2 reclaims the job
     _expire_lease(job_id)
-    assert worker_mod._claim(BASE, "w2") is not None
+    assert worker_mod._claim(CLIENT, "w2") is not None
 
     # w1's now-stale heartbeat must be rejected (it no longer owns the lease)
-    resp = worker_mod.requests.post(f"{BASE}/jobs/{job_id}/heartbeat", json={"worker_id": "w1"})
+    resp = CLIENT.post("heartbeat", f"/jobs/{job_id}/heartbeat", {"worker_id": "w1"})
     assert resp.status_code == 409
 
 
@@ -229,7 +239,7 @@ def test_claim_uses_configured_lease(wired: FlaskClient, monkeypatch: pytest.Mon
 
     job_id = queue.add("/movies/a.mkv", "good")
     before = _utcnow()
-    assert worker_mod._claim(BASE, "w1") is not None
+    assert worker_mod._claim(CLIENT, "w1") is not None
 
     lease = _db_item(job_id).lease_expires_at
     assert lease is not None
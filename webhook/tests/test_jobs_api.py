@@ -1,12 +1,16 @@
 from collections.abc import Iterator
-from unittest.mock import patch
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
 
 import pytest
 from flask.testing import FlaskClient
+from sqlalchemy.orm import Session
 
 import wi1_bot.webhook.app as app_mod
 from wi1_bot.webhook.config import config
-from wi1_bot.webhook.transcode_queue import queue
+from wi1_bot.webhook.db import get_engine
+from wi1_bot.webhook.models import TranscodeItem
+from wi1_bot.webhook.transcode_queue import _utcnow, queue
 
 
 @pytest.fixture
@@ -19,10 +23,152 @@ def test_health(client: FlaskClient) -> None:
     assert client.get("/health").status_code == 200
 
 
+def test_batch_enqueues_every_job(client: FlaskClient) -> None:
+    jobs = [
+        {"path": "/tv/Show/S01E01.mkv", "quality_profile": "good", "original_language": "Korean"},
+        {"path": "/tv/Show/S01E02.mkv", "quality_profile": "good"},
+    ]
+
+    resp = client.post("/jobs/batch", json={"jobs": jobs})
+
+    assert resp.status_code == 201
+    first, second = resp.get_json()["ids"]
+    assert queue.size == 2
+    item = queue.get(first)
+    assert item is not None
+    assert (item.path, item.original_language) == ("/tv/Show/S01E01.mkv", "Korean")
+    item = queue.get(second)
+    assert item is not None
+    assert (item.path, item.original_language) == ("/tv/Show/S01E02.mkv", None)
+
+
+def test_batch_jobs_may_carry_priority_size_and_source(client: FlaskClient) -> None:
+    jobs = [
+        {"path": "/tv/Show/S01E01.mkv", "quality_profile": "good", "size": 1_000},
+        {"path": "/tv/Show/S01E02.mkv", "quality_profile": "good", "priority": 2},
+        {"path": "/tv/Show/S01E03.mkv", "quality_profile": "good", "source": "sonarr"},
+    ]
+
+    first, second, third = client.post("/jobs/batch", json={"jobs": jobs}).get_json()["ids"]
+
+    item = queue.get(first)
+    assert item is not None
+    assert (item.priority, item.source_size, item.source) == (0, 1_000, "manual")
+    item = queue.get(second)
+    assert item is not None
+    assert (item.priority, item.source_size) == (2, None)
+    item = queue.get(third)
+    assert item is not None
+    assert item.source == "sonarr"
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {},
+        {"jobs": []},
+        {"jobs": "/tv/a.mkv"},
+        {"jobs": [{"path": "/tv/a.mkv"}]},
+        {"jobs": [{"path": "", "quality_profile": "good"}]},
+        {"jobs": [{"path": "/tv/a.mkv", "quality_profile": "good", "original_language": 3}]},
+        {"jobs": [{"path": "/tv/a.mkv", "quality_profile": "good"}, "/tv/b.mkv"]},
+        {"jobs": [{"path": "/tv/a.mkv", "quality_profile": "good", "priority": "1"}]},
+        {"jobs": [{"path": "/tv/a.mkv", "quality_profile": "good", "size": 0}]},
+        {"jobs": [{"path": "/tv/a.mkv", "quality_profile": "good", "source": "lidarr"}]},
+        ["/tv/a.mkv"],
+    ],
+)
+def test_batch_rejects_malformed_jobs_without_enqueueing(client: FlaskClient, body: object) -> None:
+    assert client.post("/jobs/batch", json=body).status_code == 400
+    assert queue.size == 0
+
+
 def test_claim_empty_returns_204(client: FlaskClient) -> None:
     assert client.post("/jobs/claim", json={"worker_id": "w"}).status_code == 204
 
 
+def test_claim_passes_advertised_capabilities(client: FlaskClient) -> None:
+    queue.add("/tv/a.mkv", "good")
+    capabilities = {
+        "encoders": ["libx265"],
+        "hwaccels": [],
+        "profiles": ["good"],
+        "runnable_profiles": ["good"],
+        "paths": ["/movies"],
+    }
+
+    resp = client.post("/jobs/claim", json={"worker_id": "w", "capabilities": capabilities})
+    assert resp.status_code == 204
+
+    capabilities["paths"] = None
+    resp = client.post("/jobs/claim", json={"worker_id": "w", "capabilities": capabilities})
+    assert resp.status_code == 200
+
+
+@pytest.mark.parametrize(
+    "capabilities",
+    ["good", {"profiles": "good"}, {"runnable_profiles": [1]}, {"paths": "/movies"}],
+)
+def test_claim_rejects_malformed_capabilities(client: FlaskClient, capabilities: object) -> None:
+    queue.add("/movies/a.mkv", "good")
+
+    resp = client.post("/jobs/claim", json={"worker_id": "w", "capabilities": capabilities})
+
+    assert resp.status_code == 400
+    assert queue.size == 1
+
+
+def test_priority_can_be_changed(client: FlaskClient) -> None:
+    queue.add("/movies/a.mkv", "good")
+    job_id = queue.add("/movies/b.mkv", "good")
+
+    assert client.post(f"/jobs/{job_id}/priority", json={"priority": 3}).status_code == 200
+
+    resp = client.post("/jobs/claim", json={"worker_id": "w"})
+    assert resp.get_json()["path"] == "/movies/b.mkv"
+
+
+@pytest.mark.parametrize("body", [{}, {"priority": "3"}, {"priority": 1.5}, {"priority": True}])
+def test_priority_rejects_malformed_values(client: FlaskClient, body: object) -> None:
+    job_id = queue.add("/movies/a.mkv", "good")
+
+    assert client.post(f"/jobs/{job_id}/priority", json=body).status_code == 400
+
+
+def test_priority_of_unknown_job_returns_404(client: FlaskClient) -> None:
+    assert client.post("/jobs/9999/priority", json={"priority": 1}).status_code == 404
+
+
+def test_claim_favors_savings_while_space_is_short(client: FlaskClient) -> None:
+    monitor = MagicMock()
+    monitor.under_pressure.return_value = True
+
+    with (
+        patch.object(app_mod, "free_space", monitor),
+        patch.object(queue, "claim", wraps=queue.claim) as mock_claim,
+    ):
+        client.post("/jobs/claim", json={"worker_id": "w"})
+
+    assert mock_claim.call_args.kwargs["favor_savings"] is True
+
+
+def test_claim_waits_up_to_the_configured_max(client: FlaskClient) -> None:
+    with (
+        patch.object(config.webhook, "claim_wait_max", 0.1),
+        patch.object(queue, "claim", wraps=queue.claim) as mock_claim,
+    ):
+        resp = client.post("/jobs/claim", json={"worker_id": "w", "wait": 3600})
+
+    assert resp.status_code == 204
+    assert mock_claim.call_args.kwargs["wait"] == 0.1
+
+
+@pytest.mark.parametrize("wait", ["30", -1, True])
+def test_claim_rejects_malformed_wait(client: FlaskClient, wait: object) -> None:
+    resp = client.post("/jobs/claim", json={"worker_id": "w", "wait": wait})
+    assert resp.status_code == 400
+
+
 def test_full_success_lifecycle(client: FlaskClient) -> None:
     queue.add("/movies/a.mkv", "good", "English")
 
@@ -35,7 +181,9 @@ def test_full_success_lifecycle(client: FlaskClient) -> None:
     assert job["heartbeat"] == config.webhook.heartbeat
 
     with patch.object(app_mod, "rescan_content") as mock_rescan:
-        resp = client.post(f"/jobs/{job['id']}/complete", json={"filename": "a-TRANSCODED.mkv"})
+        resp = client.post(
+            f"/jobs/{job['id']}/complete", json={"worker_id": "w", "filename": "a-TRANSCODED.mkv"}
+        )
 
     assert resp.status_code == 200
     mock_rescan.assert_called_once()
@@ -48,7 +196,7 @@ def test_skip_drops_without_rescan(client: FlaskClient) -> None:
 
     with patch.object(app_mod, "rescan_content") as mock_rescan:
         # no filename -> the worker skipped the job
-        resp = client.post(f"/jobs/{job['id']}/complete", json={})
+        resp = client.post(f"/jobs/{job['id']}/complete", json={"worker_id": "w"})
 
     assert resp.status_code == 200
     mock_rescan.assert_not_called()
@@ -60,7 +208,9 @@ def test_fail_terminal_notifies_and_drops(client: FlaskClient) -> None:
     job = client.post("/jobs/claim", json={"worker_id": "w"}).get_json()
 
     with patch.object(app_mod, "push") as mock_push:
-        resp = client.post(f"/jobs/{job['id']}/fail", json={"retry": False, "reason": "boom"})
+        resp = client.post(
+            f"/jobs/{job['id']}/fail", json={"worker_id": "w", "retry": False, "reason": "boom"}
+        )
 
     assert resp.status_code == 200
     mock_push.send.assert_called_once()
@@ -72,13 +222,87 @@ def test_fail_retry_requeues_without_notifying(client: FlaskClient) -> None:
     job = client.post("/jobs/claim", json={"worker_id": "w"}).get_json()
 
     with patch.object(app_mod, "push") as mock_push:
-        resp = client.post(f"/jobs/{job['id']}/fail", json={"retry": True, "reason": "retry"})
+        resp = client.post(
+            f"/jobs/{job['id']}/fail", json={"worker_id": "w", "retry": True, "reason": "retry"}
+        )
 
     assert resp.status_code == 200
     mock_push.send.assert_not_called()
     assert queue.size == 1
 
 
+def test_fail_release_hands_job_back_for_owner_only(client: FlaskClient) -> None:
+    queue.add("/movies/a.mkv", "good")
+    job = client.post("/jobs/claim", json={"worker_id": "w"}).get_json()
+    body = {"retry": True, "release": True, "reason": "worker shutting down"}
+
+    other = client.post(f"/jobs/{job['id']}/fail", json={"worker_id": "other", **body})
+    owner = client.post(f"/jobs/{job['id']}/fail", json={"worker_id": "w", **body})
+
+    assert other.status_code == 409
+    assert owner.status_code == 200
+    again = queue.claim("w2")
+    assert again is not None
+    assert again.id == job["id"]
+    assert again.attempts == 1
+
+
+def test_replayed_reports_are_applied_once(client: FlaskClient) -> None:
+    queue.add("/movies/a.mkv", "good")
+    job = client.post("/jobs/claim", json={"worker_id": "w"}).get_json()
+    body = {"worker_id": "w", "retry": True, "reason": "retry", "report_id": "r1"}
+
+    first = client.post(f"/jobs/{job['id']}/fail", json=body)
+    # the worker reclaims the requeued job before its first report's answer came back
+    assert queue.claim("w") is not None
+    replay = client.post(f"/jobs/{job['id']}/fail", json=body)
+
+    assert first.status_code == replay.status_code == 200
+    item = queue.claim("w2")
+    assert item is None  # still held by the second claim, not requeued again
+
+    with patch.object(app_mod, "rescan_content") as mock_rescan:
+        complete = {"worker_id": "w", "filename": "a.mkv", "report_id": "r2"}
+        assert client.post(f"/jobs/{job['id']}/complete", json=complete).status_code == 200
+        assert client.post(f"/jobs/{job['id']}/complete", json=complete).status_code == 200
+
+    mock_rescan.assert_called_once()
+
+
+def test_report_replayed_after_reclaim_returns_409(client: FlaskClient) -> None:
+    queue.add("/movies/a.mkv", "good")
+    job = client.post("/jobs/claim", json={"worker_id": "w"}).get_json()
+    # w's lease runs out and w2 takes the job over before w's outbox replays
+    with Session(get_engine()) as session:
+        item = session.get(TranscodeItem, job["id"])
+        assert item is not None
+        item.lease_expires_at = _utcnow() - timedelta(seconds=1)
+        session.commit()
+    assert client.post("/jobs/claim", json={"worker_id": "w2"}).get_json()["id"] == job["id"]
+
+    with (
+        patch.object(app_mod, "rescan_content") as mock_rescan,
+        patch.object(app_mod, "push") as mock_push,
+    ):
+        complete = client.post(
+            f"/jobs/{job['id']}/complete",
+            json={"worker_id": "w", "filename": "a.mkv", "report_id": "r1"},
+        )
+        fail = client.post(
+            f"/jobs/{job['id']}/fail",
+            json={"worker_id": "w", "retry": False, "reason": "boom", "report_id": "r2"},
+        )
+
+    assert complete.status_code == fail.status_code == 409
+    mock_rescan.assert_not_called()
+    mock_push.send.assert_not_called()
+    item = queue.get(job["id"])
+    assert item is not None
+    assert (item.status, item.worker_id) == ("in_progress", "w2")
+    # a rejected report isn't recorded, so the new owner's own report isn't mistaken for it
+    assert not queue.reported("r1")
+
+
 def test_complete_unknown_job_returns_404(client: FlaskClient) -> None:
     resp = client.post("/jobs/999/complete", json={"worker_id": "w", "filename": "a.mkv"})
     assert resp.status_code == 404
@@ -92,3 +316,189 @@ def test_heartbeat(client: FlaskClient) -> None:
     assert (
         client.post(f"/jobs/{job['id']}/heartbeat", json={"worker_id": "other"}).status_code == 409
     )
+
+
+def test_reservation_lease_is_capped_and_renewed(client: FlaskClient) -> None:
+    queue.add("/movies/a.mkv", "good")
+    queue.add("/movies/b.mkv", "good")
+
+    def lease_left(item_id: int) -> float:
+        item = queue.get(item_id)
+        assert item is not None and item.lease_expires_at is not None
+        return (item.lease_expires_at - _utcnow()).total_seconds()
+
+    reserved = client.post("/jobs/claim", json={"worker_id": "w", "lease": 60}).get_json()
+    assert 55 < lease_left(reserved["id"]) <= 60
+
+    capped = client.post("/jobs/claim", json={"worker_id": "w", "lease": 10**6}).get_json()
+    assert lease_left(capped["id"]) <= config.webhook.lease_secs
+
+    # promoted: heartbeats without a lease renew it in full
+    resp = client.post(f"/jobs/{reserved['id']}/heartbeat", json={"worker_id": "w"})
+    assert resp.status_code == 200
+    assert lease_left(reserved["id"]) > config.webhook.lease_secs - 5
+
+    resp = client.post(f"/jobs/{reserved['id']}/heartbeat", json={"worker_id": "w", "lease": 30})
+    assert resp.status_code == 200
+    assert lease_left(reserved["id"]) <= 30
+
+
+@pytest.mark.parametrize("lease", [0, -5, "60", None])
+def test_malformed_lease_is_rejected(client: FlaskClient, lease: object) -> None:
+    queue.add("/movies/a.mkv", "good")
+
+    assert client.post("/jobs/claim", json={"worker_id": "w", "lease": lease}).status_code == 400
+    assert queue.size == 1
+
+
+def test_heartbeat_stores_progress(client: FlaskClient) -> None:
+    queue.add("/movies/a.mkv", "good")
+    job = client.post("/jobs/claim", json={"worker_id": "w"}).get_json()
+
+    progress = {"out_time": 300.0, "duration": 1200.0, "speed": 2.0, "fps": 48.0, "total_size": 10}
+    resp = client.post(
+        f"/jobs/{job['id']}/heartbeat", json={"worker_id": "w", "progress": progress}
+    )
+    assert resp.status_code == 200
+
+    with Session(get_engine()) as session:
+        item = session.get(TranscodeItem, job["id"])
+        assert item is not None
+        assert item.progress_out_time == 300.0
+        assert item.progress_duration == 1200.0
+        assert item.progress_speed == 2.0
+        assert item.progress_total_size == 10
+        assert item.progress_updated_at is not None
+
+
+def test_heartbeat_ignores_malformed_progress(client: FlaskClient) -> None:
+    queue.add("/movies/a.mkv", "good")
+    job = client.post("/jobs/claim", json={"worker_id": "w"}).get_json()
+
+    resp = client.post(
+        f"/jobs/{job['id']}/heartbeat",
+        json={"worker_id": "w", "progress": {"out_time": "soon", "speed": True}},
+    )
+
+    # the lease is still renewed; only the progress is dropped
+    assert resp.status_code == 200
+    with Session(get_engine()) as session:
+        item = session.get(TranscodeItem, job["id"])
+        assert item is not None
+        assert item.progress_out_time is None
+
+
+def test_split_lifecycle(client: FlaskClient) -> None:
+    queue.add("/movies/long.mkv", "good")
+    job = client.post("/jobs/claim", json={"worker_id": "w"}).get_json()
+    assert job["kind"] == "transcode"
+
+    resp = client.post(
+        f"/jobs/{job['id']}/split",
+        json={"worker_id": "w", "segments": [[0, 600.5], [600.5, None]]},
+    )
+    assert resp.status_code == 200
+    assert len(resp.get_json()["segments"]) == 2
+
+    with patch.object(app_mod, "rescan_content") as mock_rescan:
+        for index in range(2):
+            segment = client.post("/jobs/claim", json={"worker_id": "w"}).get_json()
+            assert segment["kind"] == "segment"
+            assert segment["parent_id"] == job["id"]
+            assert segment["segment_index"] == index
+            resp = client.post(
+                f"/jobs/{segment['id']}/complete",
+                json={"worker_id": "w", "filename": f"{index:05}.mkv"},
+            )
+            assert resp.status_code == 200
+
+        mock_rescan.assert_not_called()
+
+        assemble = client.post("/jobs/claim", json={"worker_id": "w"}).get_json()
+        assert (assemble["id"], assemble["kind"]) == (job["id"], "assemble")
+        assert "segment_index" not in assemble
+        assert assemble["segment_count"] == 2
+
+        client.post(
+            f"/jobs/{assemble['id']}/complete",
+            json={"worker_id": "w", "filename": "long-TRANSCODED.mkv"},
+        )
+
+    mock_rescan.assert_called_once()
+    assert queue.size == 0
+
+
+def test_claim_says_when_a_failure_would_drop_the_job(client: FlaskClient) -> None:
+    queue.add("/movies/a.mkv", "good")
+
+    final = []
+    for _ in range(3):
+        job = client.post("/jobs/claim", json={"worker_id": "w"}).get_json()
+        final.append(job["final_attempt"])
+        client.post(f"/jobs/{job['id']}/fail", json={"worker_id": "w", "retry": True})
+
+    # the worker cleans up after a split job's segments only once it's dropped
+    assert final == [False, False, True]
+    assert queue.size == 0
+
+
+def test_skipped_segment_drops_split_job(client: FlaskClient) -> None:
+    queue.add("/movies/long.mkv", "good")
+    job = client.post("/jobs/claim", json={"worker_id": "w"}).get_json()
+    client.post(
+        f"/jobs/{job['id']}/split",
+        json={"worker_id": "w", "segments": [[0, 600.5], [600.5, None]]},
+    )
+    segment = client.post("/jobs/claim", json={"worker_id": "w"}).get_json()
+
+    with (
+        patch.object(app_mod, "rescan_content") as mock_rescan,
+        patch.object(app_mod, "push") as mock_push,
+    ):
+        resp = client.post(f"/jobs/{segment['id']}/complete", json={"worker_id": "w"})
+
+    assert resp.status_code == 200
+    mock_rescan.assert_not_called()
+    mock_push.send.assert_called_once()
+    assert queue.size == 0
+
+
+@pytest.mark.parametrize("segments", [None, [], [[0]], [["0", 600]], [[0, "end"]]])
+def test_split_rejects_malformed_segments(client: FlaskClient, segments: object) -> None:
+    queue.add("/movies/long.mkv", "good")
+    job = client.post("/jobs/claim", json={"worker_id": "w"}).get_json()
+
+    resp = client.post(f"/jobs/{job['id']}/split", json={"worker_id": "w", "segments": segments})
+
+    assert resp.status_code == 400
+
+
+def test_split_by_other_worker_returns_409(client: FlaskClient) -> None:
+    queue.add("/movies/long.mkv", "good")
+    job = client.post("/jobs/claim", json={"worker_id": "w"}).get_json()
+
+    resp = client.post(
+        f"/jobs/{job['id']}/split", json={"worker_id": "other", "segments": [[0, None]]}
+    )
+
+    assert resp.status_code == 409
+
+
+def test_estimate(client: FlaskClient) -> None:
+    queue.add("/movies/a.mkv", "good")
+    job = client.post("/jobs/claim", json={"worker_id": "w"}).get_json()
+    estimate = {"source_size": 4_000, "projected_size": 1_000, "projected_seconds": 90.0}
+
+    ok = client.post(f"/jobs/{job['id']}/estimate", json={"worker_id": "w", **estimate})
+    other = client.post(f"/jobs/{job['id']}/estimate", json={"worker_id": "other", **estimate})
+    malformed = client.post(
+        f"/jobs/{job['id']}/estimate", json={"worker_id": "w", "source_size": "big"}
+    )
+
+    assert ok.status_code == 200
+    assert other.status_code == 409
+    assert malformed.status_code == 400
+    with Session(get_engine()) as session:
+        item = session.get(TranscodeItem, job["id"])
+        assert item is not None
+        assert item.estimate_projected_size == 1_000
@@ -1,10 +1,11 @@
 from collections.abc import Iterator
 from datetime import timedelta
+from pathlib import Path
 from unittest.mock import MagicMock, patch
 
 import pytest
 from flask.testing import FlaskClient
-from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, values
 from sqlalchemy.orm import Session
 
 import wi1_bot.webhook.app as app_mod
@@ -145,10 +146,29 @@ def test_queue_gauges_report_status_age_and_expired_leases(client: FlaskClient)
     assert _sample("wi1_bot_webhook_queue_expired_leases", {}) == 1
 
 
+def test_queue_metrics_report_queued_jobs_by_source(client: FlaskClient) -> None:
+    queue.add("/movies/a.mkv", "good", source="radarr")
+    old_id = queue.add("/tv/a.mkv", "good", source="sonarr")
+    queue.add("/tv/b.mkv", "good", source="sonarr")
+    with Session(get_engine()) as session:
+        item = session.get(TranscodeItem, old_id)
+        assert item is not None
+        item.status_changed_at = _utcnow() - timedelta(seconds=60)
+        session.commit()
+
+    assert client.get("/metrics").status_code == 200
+    assert _sample("wi1_bot_webhook_queue_source_jobs", {"source": "radarr"}) == 1
+    assert _sample("wi1_bot_webhook_queue_source_jobs", {"source": "sonarr"}) == 2
+    assert _sample("wi1_bot_webhook_queue_source_jobs", {"source": "radarr4k"}) == 0
+    assert (
+        _sample("wi1_bot_webhook_queue_source_oldest_job_age_seconds", {"source": "sonarr"}) >= 60
+    )
+
+
 def test_job_lifecycle_metrics_cover_claim_retry_expiry_and_skip(client: FlaskClient) -> None:
-    claim_initial = {"kind": "initial"}
-    claim_retry = {"kind": "retry"}
-    claim_expired = {"kind": "expired_lease"}
+    claim_initial = {"kind": "initial", "source": "manual"}
+    claim_retry = {"kind": "retry", "source": "manual"}
+    claim_expired = {"kind": "expired_lease", "source": "manual"}
     initial_before = _sample("wi1_bot_webhook_job_claims_total", claim_initial)
     retry_before = _sample("wi1_bot_webhook_job_claims_total", claim_retry)
     expired_before = _sample("wi1_bot_webhook_job_claims_total", claim_expired)
@@ -161,7 +181,10 @@ def test_job_lifecycle_metrics_cover_claim_retry_expiry_and_skip(client: FlaskCl
     job_id = queue.add("/movies/a.mkv", "good")
     first_claim = client.post("/jobs/claim", json={"worker_id": "one"}).get_json()
     assert first_claim["id"] == job_id
-    assert client.post(f"/jobs/{job_id}/fail", json={"retry": True}).status_code == 200
+    assert (
+        client.post(f"/jobs/{job_id}/fail", json={"worker_id": "one", "retry": True}).status_code
+        == 200
+    )
     assert client.post("/jobs/claim", json={"worker_id": "two"}).status_code == 200
 
     with Session(get_engine()) as session:
@@ -171,7 +194,7 @@ def test_job_lifecycle_metrics_cover_claim_retry_expiry_and_skip(client: FlaskCl
         session.commit()
 
     assert client.post("/jobs/claim", json={"worker_id": "three"}).status_code == 200
-    assert client.post(f"/jobs/{job_id}/complete", json={}).status_code == 200
+    assert client.post(f"/jobs/{job_id}/complete", json={"worker_id": "three"}).status_code == 200
 
     assert _sample("wi1_bot_webhook_job_claims_total", claim_initial) == initial_before + 1
     assert _sample("wi1_bot_webhook_job_claims_total", claim_retry) == retry_before + 1
@@ -190,7 +213,7 @@ def test_job_lifecycle_metrics_cover_claim_retry_expiry_and_skip(client: FlaskCl
     assert (
         _sample(
             "wi1_bot_webhook_job_queue_wait_duration_seconds_count",
-            {"kind": "initial"},
+            {"kind": "initial", "source": "manual"},
         )
         >= 1
     )
@@ -310,3 +333,78 @@ def test_database_metric_reports_query_failure(client: FlaskClient) -> None:
         body = client.get("/metrics").get_data(as_text=True)
 
     assert "wi1_bot_webhook_database_up 0.0" in body
+
+
+def test_progress_heartbeats_export_eta_and_speed(client: FlaskClient) -> None:
+    job_id = queue.add("/movies/a.mkv", "good")
+    assert client.post("/jobs/claim", json={"worker_id": "one"}).status_code == 200
+    speed_before = _sample(
+        "wi1_bot_webhook_job_encode_speed_ratio_count",
+        {"quality_profile": "good", "worker_id": "one"},
+    )
+
+    progress = {"out_time": 600.0, "duration": 1800.0, "speed": 4.0, "fps": 96.0}
+    assert (
+        client.post(
+            f"/jobs/{job_id}/heartbeat", json={"worker_id": "one", "progress": progress}
+        ).status_code
+        == 200
+    )
+
+    assert client.get("/metrics").status_code == 200
+    labels = {"job_id": str(job_id), "quality_profile": "good", "worker_id": "one"}
+    assert _sample("wi1_bot_webhook_job_progress_ratio", labels) == pytest.approx(1 / 3)
+    # 1200s of media left at 4x realtime
+    assert _sample("wi1_bot_webhook_job_eta_seconds", labels) == 300
+    assert _sample("wi1_bot_webhook_job_speed_ratio", labels) == 4
+    assert (
+        _sample(
+            "wi1_bot_webhook_job_encode_speed_ratio_count",
+            {"quality_profile": "good", "worker_id": "one"},
+        )
+        == speed_before + 1
+    )
+
+
+def test_completion_reports_finalize_duration(client: FlaskClient) -> None:
+    job_id = queue.add("/movies/a.mkv", "good")
+    client.post("/jobs/claim", json={"worker_id": "one"})
+    labels = {"method": "copy"}
+    count_before = _sample("wi1_bot_webhook_job_finalize_duration_seconds_count", labels)
+    sum_before = _sample("wi1_bot_webhook_job_finalize_duration_seconds_sum", labels)
+
+    with patch.object(app_mod, "rescan_content"):
+        client.post(
+            f"/jobs/{job_id}/complete",
+            json={
+                "worker_id": "one",
+                "filename": "a-TRANSCODED.mkv",
+                "finalize_seconds": 42.5,
+                "finalize_method": "copy",
+            },
+        )
+
+    assert (
+        _sample("wi1_bot_webhook_job_finalize_duration_seconds_count", labels) == count_before + 1
+    )
+    assert _sample("wi1_bot_webhook_job_finalize_duration_seconds_sum", labels) == sum_before + 42.5
+
+
+def test_metrics_endpoint_adds_up_every_process_in_multiprocess_mode(
+    client: FlaskClient, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    multiproc_dir = tmp_path / "metrics"
+    multiproc_dir.mkdir()
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(multiproc_dir))
+    # two webhook processes' samples, as they write them to the shared directory
+    for pid in (101, 102):
+        monkeypatch.setattr(values, "ValueClass", values.MultiProcessValue(lambda pid=pid: pid))
+        Counter("wi1_bot_webhook_test_claims", "Test counter.", registry=None).inc()
+
+    body = client.get("/metrics").get_data(as_text=True)
+
+    assert "wi1_bot_webhook_test_claims_total 2.0" in body
+    # collected once, from the scraped process
+    assert body.count("# TYPE wi1_bot_webhook_queue_jobs gauge") == 1
+    assert "wi1_bot_webhook_database_up 1.0" in body
+    assert "wi1_bot_webhook_build_info" in body
@@ -1,12 +1,28 @@
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
 from datetime import timedelta
+from typing import Any
 
 import pytest
+from sqlalchemy import event, select, update
 from sqlalchemy.orm import Session
 
-from wi1_bot.webhook.config import config
+from wi1_bot.webhook.config import SchedulingConfig, SpacePressureConfig, config
 from wi1_bot.webhook.db import get_engine
-from wi1_bot.webhook.models import TranscodeItem
-from wi1_bot.webhook.transcode_queue import TranscodeQueue, _utcnow
+from wi1_bot.webhook.models import JobReport, TranscodeItem, TranscodeQueueCount, TranscodeWorker
+from wi1_bot.webhook.transcode_queue import (
+    RECHECK_INTERVAL,
+    REPORT_TTL,
+    FailedJob,
+    JobEstimate,
+    NewJob,
+    TranscodeQueue,
+    WorkerCapabilities,
+    _utcnow,
+    default_priority,
+)
 
 
 @pytest.fixture
@@ -32,6 +48,49 @@ def test_job_id_not_reused_after_queue_empties(queue: TranscodeQueue) -> None:
     assert second > first
 
 
+def test_add_many_enqueues_in_order(queue: TranscodeQueue) -> None:
+    job_ids = queue.add_many(
+        [NewJob(f"/tv/Show/S01E0{i}.mkv", "good", "Japanese") for i in range(1, 4)]
+    )
+
+    assert len(job_ids) == 3
+    assert job_ids == sorted(job_ids)
+    assert queue.size == 3
+    for job_id, episode in zip(job_ids, range(1, 4), strict=True):
+        item = queue.claim("w")
+        assert item is not None
+        assert (item.id, item.path, item.original_language) == (
+            job_id,
+            f"/tv/Show/S01E0{episode}.mkv",
+            "Japanese",
+        )
+    assert queue.add_many([]) == []
+
+
+def test_size_follows_every_status_change(queue: TranscodeQueue) -> None:
+    first, second, third = queue.add_many([NewJob(f"/movies/{i}.mkv", "good") for i in range(3)])
+    assert queue.size == 3
+
+    item = queue.claim("w")
+    assert item is not None
+    assert queue.split(item.id, "w", [(0, 60), (60, None)]) is not None
+    assert queue.size == 5
+
+    for job_id in (second, third):
+        claimed = queue.claim("w")
+        assert claimed is not None and claimed.id == job_id
+    queue.complete(second, "w")
+    queue.fail(third, "w", retry=False)
+    assert queue.size == 3
+
+    with Session(get_engine()) as session:
+        counts = {row.status: row.jobs for row in session.scalars(select(TranscodeQueueCount))}
+    assert counts == {"queued": 2, "in_progress": 0, "waiting": 1}
+
+    queue.clear()
+    assert queue.size == 0
+
+
 def test_add_and_claim(queue: TranscodeQueue) -> None:
     queue.add("/movies/a.mkv", "good", "English")
     assert queue.size == 1
@@ -63,12 +122,89 @@ def test_claim_is_fifo(queue: TranscodeQueue) -> None:
     assert second.path == "/movies/b.mkv"
 
 
+def test_claim_waits_for_a_job_to_be_queued(queue: TranscodeQueue) -> None:
+    threading.Timer(0.1, queue.add, args=("/movies/a.mkv", "good")).start()
+
+    started = time.monotonic()
+    item = queue.claim("w", wait=10)
+
+    assert item is not None
+    assert item.path == "/movies/a.mkv"
+    assert time.monotonic() - started < 5
+
+
+def test_claim_wait_times_out(queue: TranscodeQueue) -> None:
+    started = time.monotonic()
+    assert queue.claim("w", wait=0.2) is None
+    assert time.monotonic() - started >= 0.2
+
+
+def test_requeue_wakes_waiting_claim(queue: TranscodeQueue) -> None:
+    queue.add("/movies/a.mkv", "good")
+    item = queue.claim("w1")
+    assert item is not None
+
+    threading.Timer(0.1, queue.fail, args=(item.id, "w1"), kwargs={"retry": True}).start()
+
+    again = queue.claim("w2", wait=10)
+    assert again is not None
+    assert again.id == item.id
+
+
+def test_waiting_claim_finds_job_queued_by_another_process(queue: TranscodeQueue) -> None:
+    # another webhook process's queue shares the database but can't wake this one
+    other = TranscodeQueue()
+    threading.Timer(0.1, other.add, args=("/movies/a.mkv", "good")).start()
+
+    started = time.monotonic()
+    item = queue.claim("w", wait=10)
+
+    assert item is not None
+    assert time.monotonic() - started < RECHECK_INTERVAL + 2
+
+
+def test_concurrent_claims_never_share_a_job(queue: TranscodeQueue) -> None:
+    job_ids = {queue.add(f"/movies/{i}.mkv", "good") for i in range(40)}
+    claimed: list[int] = []
+    lock = threading.Lock()
+
+    def claimer(worker: int) -> None:
+        # a queue per claimer, like separate webhook processes
+        own = TranscodeQueue()
+        capabilities = WorkerCapabilities(profiles=("good",), runnable_profiles=("good",))
+        while (item := own.claim(f"w{worker}", capabilities=capabilities)) is not None:
+            with lock:
+                claimed.append(item.id)
+
+    threads = [threading.Thread(target=claimer, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == sorted(job_ids)
+
+
+def test_claim_filter_is_covered_by_an_index(queue: TranscodeQueue) -> None:
+    with get_engine().connect() as connection:
+        plan = connection.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT id FROM transcode_queue"
+            " WHERE status = 'queued'"
+            " OR (status = 'in_progress' AND lease_expires_at < '2026-01-01')"
+        ).all()
+
+    details = " ".join(row[-1] for row in plan)
+    assert "ix_transcode_queue_claim" in details
+    assert "SCAN transcode_queue" not in details
+
+
 def test_complete_removes_and_returns_path(queue: TranscodeQueue) -> None:
     queue.add("/movies/a.mkv", "good")
     item = queue.claim("w")
     assert item is not None
 
-    assert queue.complete(item.id) == "/movies/a.mkv"
+    assert queue.complete(item.id, "other") is None
+    assert queue.complete(item.id, "w") == "/movies/a.mkv"
     assert queue.size == 0
 
 
@@ -77,7 +213,7 @@ def test_fail_retry_requeues(queue: TranscodeQueue) -> None:
     item = queue.claim("w")
     assert item is not None
 
-    assert queue.fail(item.id, retry=True) is None
+    assert queue.fail(item.id, "w", retry=True) == FailedJob("/movies/a.mkv", dropped=False)
     assert queue.size == 1
 
     # requeued -> claimable again
@@ -91,21 +227,22 @@ def test_fail_no_retry_drops_and_returns_path(queue: TranscodeQueue) -> None:
     item = queue.claim("w")
     assert item is not None
 
-    assert queue.fail(item.id, retry=False) == "/movies/a.mkv"
+    assert queue.fail(item.id, "other", retry=False) is None
+    assert queue.fail(item.id, "w", retry=False) == FailedJob("/movies/a.mkv", dropped=True)
     assert queue.size == 0
 
 
 def test_fail_retry_drops_after_max_attempts(queue: TranscodeQueue) -> None:
     queue.add("/movies/a.mkv", "good")
 
-    result: str | None = None
+    result: FailedJob | None = None
     for _ in range(3):
         item = queue.claim("w")
         assert item is not None
-        result = queue.fail(item.id, retry=True)
+        result = queue.fail(item.id, "w", retry=True)
 
     # each claim bumps attempts; after MAX_ATTEMPTS the retry drops the job
-    assert result == "/movies/a.mkv"
+    assert result == FailedJob("/movies/a.mkv", dropped=True)
     assert queue.size == 0
 
 
@@ -137,6 +274,270 @@ def test_heartbeat_extends_only_for_owner(queue: TranscodeQueue) -> None:
     assert queue.heartbeat(item.id, "worker-2") is False
 
 
+def test_estimate_is_recorded_only_for_owner(queue: TranscodeQueue) -> None:
+    queue.add("/movies/a.mkv", "good")
+    item = queue.claim("worker-1")
+    assert item is not None
+
+    estimate = JobEstimate(source_size=4_000, projected_size=1_000, projected_seconds=1800)
+    assert queue.estimate(item.id, "worker-2", estimate) is False
+    assert queue.estimate(item.id, "worker-1", estimate) is True
+
+    with Session(get_engine()) as session:
+        db_item = session.get(TranscodeItem, item.id)
+        assert db_item is not None
+        assert db_item.estimate_value == pytest.approx(6_000)
+
+
+def test_requeued_jobs_are_claimed_by_projected_value(queue: TranscodeQueue) -> None:
+    for path in ("/movies/a.mkv", "/movies/b.mkv", "/movies/c.mkv"):
+        queue.add(path, "good")
+
+    # a and b are estimated and then requeued; b saves more per encode hour
+    a, b = queue.claim("w"), queue.claim("w")
+    assert a is not None and b is not None
+    queue.estimate(a.id, "w", JobEstimate(4_000, 3_000, 3600))
+    queue.estimate(b.id, "w", JobEstimate(4_000, 1_000, 3600))
+    queue.fail(a.id, "w", retry=True)
+    queue.fail(b.id, "w", retry=True)
+
+    claimed = [queue.claim("w") for _ in range(3)]
+    assert [item.path for item in claimed if item is not None] == [
+        "/movies/b.mkv",
+        "/movies/a.mkv",
+        "/movies/c.mkv",
+    ]
+
+
+def _claimed_paths(queue: TranscodeQueue, claims: int, favor_savings: bool = False) -> list[str]:
+    claimed = [queue.claim("w", favor_savings=favor_savings) for _ in range(claims)]
+    return [item.path for item in claimed if item is not None]
+
+
+def test_default_priority_adds_profile_and_instance_classes(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    scheduling = SchedulingConfig(profile_priority={"great": 2}, instance_priority={"sonarr": 1})
+    monkeypatch.setattr(config.webhook, "scheduling", scheduling)
+
+    assert default_priority("great", "sonarr") == 3
+    assert default_priority("great", "radarr") == 2
+    assert default_priority("good", "sonarr") == 1
+    assert default_priority("good") == 0
+
+
+def test_claim_takes_higher_priority_classes_first(queue: TranscodeQueue) -> None:
+    queue.add("/movies/a.mkv", "good")
+    queue.add("/movies/b.mkv", "good", priority=2)
+    queue.add("/movies/c.mkv", "good", priority=1)
+
+    assert _claimed_paths(queue, 3) == ["/movies/b.mkv", "/movies/c.mkv", "/movies/a.mkv"]
+
+
+def test_waiting_jobs_age_into_higher_classes(
+    queue: TranscodeQueue, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(config.webhook, "scheduling", SchedulingConfig(aging=600))
+    old = queue.add("/movies/old.mkv", "good")
+    queue.add("/movies/new.mkv", "good", priority=1)
+
+    # queued 25 minutes ago: two classes gained, overtaking the newer priority 1 job
+    with Session(get_engine()) as session:
+        item = session.get(TranscodeItem, old)
+        assert item is not None
+        item.status_changed_at = _utcnow() - timedelta(minutes=25)
+        session.commit()
+
+    assert _claimed_paths(queue, 2) == ["/movies/old.mkv", "/movies/new.mkv"]
+
+
+def test_aging_can_be_disabled(queue: TranscodeQueue, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config.webhook, "scheduling", SchedulingConfig(aging=None))
+    old = queue.add("/movies/old.mkv", "good")
+    queue.add("/movies/new.mkv", "good", priority=1)
+
+    with Session(get_engine()) as session:
+        item = session.get(TranscodeItem, old)
+        assert item is not None
+        item.status_changed_at = _utcnow() - timedelta(days=30)
+        session.commit()
+
+    assert _claimed_paths(queue, 2) == ["/movies/new.mkv", "/movies/old.mkv"]
+
+
+def test_smallest_first_orders_a_class_by_source_size(
+    queue: TranscodeQueue, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(config.webhook, "scheduling", SchedulingConfig(order="smallest_first"))
+    queue.add_many(
+        [
+            NewJob("/movies/unknown.mkv", "good"),
+            NewJob("/movies/large.mkv", "good", source_size=8_000),
+            NewJob("/movies/small.mkv", "good", source_size=1_000),
+            NewJob("/movies/urgent.mkv", "good", priority=1, source_size=9_000),
+        ]
+    )
+
+    assert _claimed_paths(queue, 4) == [
+        "/movies/urgent.mkv",
+        "/movies/small.mkv",
+        "/movies/large.mkv",
+        "/movies/unknown.mkv",
+    ]
+
+
+def test_space_pressure_claims_the_largest_expected_savings_first(
+    queue: TranscodeQueue, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    scheduling = SchedulingConfig(
+        order="smallest_first",
+        space_pressure=SpacePressureConfig(min_free_bytes=1, assumed_savings=0.5),
+    )
+    monkeypatch.setattr(config.webhook, "scheduling", scheduling)
+    queue.add("/movies/projected.mkv", "good", source_size=4_000)
+    # projected to save 3_000, more than large's assumed 2_500
+    projected = queue.claim("w")
+    assert projected is not None
+    queue.estimate(projected.id, "w", JobEstimate(4_000, 1_000, 3600))
+    queue.fail(projected.id, "w", retry=True)
+    queue.add("/movies/large.mkv", "good", source_size=5_000)
+    queue.add("/movies/small.mkv", "good", source_size=1_000)
+
+    assert _claimed_paths(queue, 3, favor_savings=True) == [
+        "/movies/projected.mkv",
+        "/movies/large.mkv",
+        "/movies/small.mkv",
+    ]
+
+
+def test_sources_share_claims_by_weight(
+    queue: TranscodeQueue, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(
+        config.webhook, "scheduling", SchedulingConfig(source_weights={"radarr": 2})
+    )
+    queue.add_many([NewJob(f"/tv/{i}.mkv", "good", source="sonarr") for i in range(6)])
+    queue.add_many([NewJob(f"/movies/{i}.mkv", "good", source="radarr") for i in range(6)])
+
+    claimed = [queue.claim("w") for _ in range(6)]
+
+    sources = [item.source for item in claimed if item is not None]
+    assert sources == ["sonarr", "radarr", "radarr", "sonarr", "radarr", "radarr"]
+
+
+def test_idle_source_rejoins_level_with_waiting_ones(queue: TranscodeQueue) -> None:
+    queue.add_many([NewJob(f"/tv/{i}.mkv", "good", source="sonarr") for i in range(5)])
+    for _ in range(3):
+        queue.claim("w")
+
+    # radarr had nothing queued while sonarr was served three times; it doesn't get
+    # the next three claims to make up for it
+    queue.add_many([NewJob(f"/movies/{i}.mkv", "good", source="radarr") for i in range(2)])
+
+    claimed = [queue.claim("w") for _ in range(4)]
+    sources = [item.source for item in claimed if item is not None]
+    assert sources == ["sonarr", "radarr", "sonarr", "radarr"]
+
+
+def test_aging_keeps_sources_of_a_class_taking_turns(
+    queue: TranscodeQueue, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(config.webhook, "scheduling", SchedulingConfig(aging=600))
+    backfill = queue.add_many([NewJob(f"/tv/{i}.mkv", "good", source="sonarr") for i in range(4)])
+    # the season backfill was queued well over aging seconds before the new movies
+    with Session(get_engine()) as session:
+        for item_id in backfill:
+            item = session.get(TranscodeItem, item_id)
+            assert item is not None
+            item.status_changed_at = _utcnow() - timedelta(hours=2)
+        session.commit()
+    queue.add_many([NewJob(f"/movies/{i}.mkv", "good", source="radarr") for i in range(2)])
+
+    claimed = [queue.claim("w") for _ in range(4)]
+
+    sources = [item.source for item in claimed if item is not None]
+    assert sources == ["sonarr", "radarr", "sonarr", "radarr"]
+
+
+def test_priority_classes_come_before_source_shares(queue: TranscodeQueue) -> None:
+    queue.add("/tv/a.mkv", "good", source="sonarr")
+    queue.claim("w")
+    queue.add_many(
+        [
+            NewJob("/movies/a.mkv", "good", source="radarr"),
+            NewJob("/tv/b.mkv", "good", priority=1, source="sonarr"),
+        ]
+    )
+
+    assert _claimed_paths(queue, 2) == ["/tv/b.mkv", "/movies/a.mkv"]
+
+
+def test_estimate_fills_in_an_unknown_source_size(queue: TranscodeQueue) -> None:
+    queue.add("/movies/a.mkv", "good")
+    item = queue.claim("w")
+    assert item is not None
+
+    queue.estimate(item.id, "w", JobEstimate(4_000, 1_000, 3600))
+
+    stored = queue.get(item.id)
+    assert stored is not None
+    assert stored.source_size == 4_000
+
+
+def test_prioritize_changes_a_job_and_its_segments(queue: TranscodeQueue) -> None:
+    job_id = queue.add("/movies/long.mkv", "good")
+    queue.add("/movies/other.mkv", "good")
+    item = queue.claim("w")
+    assert item is not None and item.id == job_id
+    segment_ids = queue.split(job_id, "w", [(0, 600), (600, None)])
+    assert segment_ids is not None
+
+    assert queue.prioritize(job_id, 5) is True
+    assert queue.prioritize(9_999, 5) is False
+
+    for item_id in (job_id, *segment_ids):
+        stored = queue.get(item_id)
+        assert stored is not None
+        assert stored.priority == 5
+    assert _claimed_paths(queue, 1) == ["/movies/long.mkv"]
+
+
+def test_release_requeues_without_spending_an_attempt(queue: TranscodeQueue) -> None:
+    queue.add("/movies/a.mkv", "good")
+    item = queue.claim("worker-1")
+    assert item is not None
+
+    assert queue.release(item.id, "worker-2") is False
+    assert queue.release(item.id, "worker-1") is True
+
+    again = queue.claim("worker-2")
+    assert again is not None
+    assert again.id == item.id
+    assert again.attempts == 1
+
+
+def test_outcome_reports_are_recorded_and_pruned(queue: TranscodeQueue) -> None:
+    queue.add("/movies/a.mkv", "good")
+    queue.add("/movies/b.mkv", "good")
+    first = queue.claim("w")
+    second = queue.claim("w")
+    assert first is not None and second is not None
+
+    queue.fail(first.id, "w", retry=True, report_id="r1")
+    assert queue.reported("r1")
+    assert not queue.reported("r2")
+
+    with Session(get_engine()) as session:
+        report = session.get(JobReport, "r1")
+        assert report is not None
+        report.received_at -= REPORT_TTL + timedelta(minutes=1)
+        session.commit()
+
+    queue.complete(second.id, "w", report_id="r2")
+    assert queue.reported("r2")
+    assert not queue.reported("r1")
+
+
 def test_claim_lease_secs_can_be_overridden(queue: TranscodeQueue) -> None:
     queue.add("/movies/a.mkv", "good")
 
@@ -160,3 +561,146 @@ def test_claim_lease_defaults_to_configured_value(
     assert item is not None
     assert item.lease_expires_at is not None
     assert timedelta(seconds=41) <= item.lease_expires_at - before <= timedelta(seconds=43)
+
+
+def test_split_job_assembles_after_every_segment(queue: TranscodeQueue) -> None:
+    job_id = queue.add("/movies/long.mkv", "good", "English")
+    assert queue.claim("w1") is not None
+
+    # only the owner may split its job
+    assert queue.split(job_id, "w2", [(0.0, 600.0), (600.0, None)]) is None
+    segment_ids = queue.split(job_id, "w1", [(0.0, 600.0), (600.0, None)])
+    assert segment_ids is not None and len(segment_ids) == 2
+
+    # the parent waits; the segments go to any worker
+    first = queue.claim("w1")
+    second = queue.claim("w2")
+    assert first is not None and second is not None
+    assert (first.kind, first.parent_id, first.segment_index) == ("segment", job_id, 0)
+    assert (second.segment_start, second.segment_end) == (600.0, None)
+    assert second.original_language == "English"
+    assert queue.claim("w3") is None
+
+    queue.complete(first.id, "w1")
+    assert queue.claim("w3") is None
+    queue.complete(second.id, "w2")
+
+    assemble = queue.claim("w3")
+    assert assemble is not None
+    assert (assemble.id, assemble.kind) == (job_id, "assemble")
+    # the split attempt doesn't count against the assemble job's retries
+    assert assemble.attempts == 1
+
+
+def test_segment_terminal_failure_drops_split_job(queue: TranscodeQueue) -> None:
+    job_id = queue.add("/movies/long.mkv", "good")
+    queue.claim("w")
+    queue.split(job_id, "w", [(0.0, 600.0), (600.0, None)])
+    segment = queue.claim("w")
+    assert segment is not None
+
+    assert queue.fail(segment.id, "w", retry=False) == FailedJob("/movies/long.mkv", dropped=True)
+    assert queue.size == 0
+
+
+GPU = WorkerCapabilities(
+    profiles=("good", "great"), runnable_profiles=("good", "great"), paths=("/movies",)
+)
+CPU = WorkerCapabilities(profiles=("good", "great"), runnable_profiles=("good",), paths=None)
+
+
+def test_claim_only_hands_out_jobs_the_worker_can_run(queue: TranscodeQueue) -> None:
+    queue.claim("gpu", capabilities=GPU)
+    great = queue.add("/movies/a.mkv", "great")
+    tv = queue.add("/tv/b.mkv", "good")
+
+    # the CPU worker lacks the encoder for "great"; the GPU worker can't reach /tv
+    item = queue.claim("cpu", capabilities=CPU)
+    assert item is not None and item.id == tv
+    assert queue.claim("cpu", capabilities=CPU) is None
+
+    item = queue.claim("gpu", capabilities=GPU)
+    assert item is not None and item.id == great
+
+
+def test_claim_hands_out_profiles_no_worker_has_configured(queue: TranscodeQueue) -> None:
+    queue.add("/movies/a.mkv", "Any")
+
+    # nobody transcodes "Any", so any worker takes it (and drops it)
+    item = queue.claim("cpu", capabilities=CPU)
+    assert item is not None
+
+
+def test_claim_forgets_workers_not_seen_within_ttl(queue: TranscodeQueue) -> None:
+    only_cpu = WorkerCapabilities(profiles=("good",), runnable_profiles=("good",))
+    queue.claim("gpu", capabilities=GPU)
+    queue.add("/movies/a.mkv", "great")
+    assert queue.claim("cpu", capabilities=only_cpu) is None
+
+    with Session(get_engine()) as session:
+        worker = session.get(TranscodeWorker, "gpu")
+        assert worker is not None
+        assert worker.runnable_profiles == ["good", "great"]
+        worker.last_seen_at = _utcnow() - timedelta(seconds=config.webhook.worker_ttl + 1)
+        session.commit()
+
+    assert queue.claim("cpu", capabilities=only_cpu) is not None
+
+
+def test_claim_without_capabilities_takes_any_job(queue: TranscodeQueue) -> None:
+    queue.claim("gpu", capabilities=GPU)
+    queue.add("/tv/a.mkv", "great")
+
+    assert queue.claim("old-worker") is not None
+
+
+@contextmanager
+def _reclaimed_before_write(item_id: int, worker_id: str) -> Iterator[None]:
+    # another webhook process reclaims the job just before this one's first write
+    engine = get_engine()
+    reclaimed = False
+
+    def reclaim(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        nonlocal reclaimed
+        if reclaimed or not statement.startswith(("UPDATE transcode_queue", "DELETE FROM")):
+            return
+        reclaimed = True
+        with engine.begin() as other:
+            other.execute(
+                update(TranscodeItem).where(TranscodeItem.id == item_id).values(worker_id=worker_id)
+            )
+
+    event.listen(engine, "before_cursor_execute", reclaim)
+    try:
+        yield
+    finally:
+        event.remove(engine, "before_cursor_execute", reclaim)
+    assert reclaimed
+
+
+@pytest.mark.parametrize(
+    "report",
+    [
+        lambda q, job_id: q.complete(job_id, "w1"),
+        lambda q, job_id: q.fail(job_id, "w1", retry=True),
+        lambda q, job_id: q.fail(job_id, "w1", retry=False),
+        lambda q, job_id: q.release(job_id, "w1"),
+        lambda q, job_id: q.estimate(job_id, "w1", JobEstimate(4_000, 1_000, 3600)),
+        lambda q, job_id: q.split(job_id, "w1", [(0.0, 600.0), (600.0, None)]),
+    ],
+    ids=["complete", "requeue", "drop", "release", "estimate", "split"],
+)
+def test_report_is_rejected_when_reclaimed_before_it_applies(
+    queue: TranscodeQueue, report: Callable[[TranscodeQueue, int], object]
+) -> None:
+    job_id = queue.add("/movies/a.mkv", "good")
+    assert queue.claim("w1") is not None
+
+    with _reclaimed_before_write(job_id, "w2"):
+        result = report(queue, job_id)
+
+    assert result in (None, False)
+    item = queue.get(job_id)
+    assert item is not None
+    assert (item.status, item.worker_id, item.estimate_value) == ("in_progress", "w2", None)
+    assert queue.size == 1
@@ -1,3 +1,5 @@
+import os
+from pathlib import Path
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -27,3 +29,60 @@ def test_cleanup_worker_lifecycle_follows_configuration(enabled: bool) -> None:
         worker.stop.assert_called_once_with()
     else:
         worker_cls.assert_not_called()
+
+
+def test_multiple_processes_share_one_socket_and_cleanup_runs_once() -> None:
+    cleanup = QueueCleanupConfig(enabled=True, poll_interval=5)
+    worker = MagicMock()
+    sock = MagicMock()
+
+    with (
+        patch.object(serve_mod.config.webhook, "queue_cleanup", cleanup),
+        patch.object(serve_mod.config.webhook, "processes", 3),
+        patch.object(serve_mod, "setup_logging"),
+        patch.object(serve_mod, "get_db_path"),
+        patch.object(serve_mod, "init_db"),
+        patch.object(serve_mod, "ArrQueueCleanupWorker", return_value=worker),
+        patch.object(serve_mod, "serve") as serve,
+        patch.object(serve_mod.socket, "create_server", return_value=sock),
+        patch.object(serve_mod.os, "fork", side_effect=[101, 102, 103]) as fork,
+        patch.object(serve_mod.os, "wait", side_effect=[(102, 0), (101, 0), (103, 0)]),
+        patch.object(serve_mod.signal, "signal"),
+    ):
+        serve_mod.main()
+
+    assert fork.call_count == 3
+    # the parent only forks and waits; its copy of the socket is closed
+    serve.assert_not_called()
+    sock.close.assert_called_once_with()
+    worker.start.assert_called_once_with()
+    worker.stop.assert_called_once_with()
+
+
+def test_stale_metrics_are_cleared_before_forking(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    stale = tmp_path / "counter_99999999.db"
+    own = tmp_path / f"counter_{os.getpid()}.db"
+    for path in (stale, own):
+        path.write_bytes(b"")
+    forked: list[bool] = []
+
+    def fork() -> int:
+        forked.append(stale.exists())
+        return 101
+
+    with (
+        patch.object(serve_mod.socket, "create_server"),
+        patch.object(serve_mod.os, "fork", side_effect=fork),
+        patch.object(serve_mod.os, "wait", return_value=(101, 0)),
+        patch.object(serve_mod.signal, "signal"),
+        patch.object(serve_mod.prometheus_multiprocess, "mark_process_dead") as mark_dead,
+    ):
+        serve_mod._wait_for_processes(serve_mod._start_processes(1))
+
+    # a previous run's samples aren't added to this one's, and this process's are kept
+    assert forked == [False]
+    assert own.exists()
+    mark_dead.assert_called_once_with(101)
@@ -5,6 +5,7 @@ import pytest
 
 from wi1_bot.arr import Radarr, Sonarr
 from wi1_bot.webhook.scripts import transcode_item
+from wi1_bot.webhook.transcode_queue import NewJob
 
 
 def test_resolves_radarr_profile_and_original_language() -> None:
@@ -113,20 +114,31 @@ def test_main_uses_resolved_metadata_and_warns_for_each_fallback(
         transcode_item.main()
 
     targets.assert_called_once_with()
-    assert queue.add.call_args_list == [
-        call(
-            path=str(Path("resolved.mkv").resolve()),
-            quality_profile="WEB-2160p",
-            original_language="Korean",
-        ),
-        call(
-            path=str(Path("missing.mkv").resolve()),
-            quality_profile="good",
-            original_language=None,
-        ),
-    ]
+    queue.add_many.assert_called_once_with(
+        [
+            NewJob(str(Path("resolved.mkv").resolve()), "WEB-2160p", "Korean"),
+            NewJob(str(Path("missing.mkv").resolve()), "good", None),
+        ]
+    )
     captured = capsys.readouterr()
     assert captured.err == (
         f"warning: {Path('missing.mkv').resolve()} not found; using fallback profile 'good' "
         "and no original language\n"
     )
+
+
+def test_main_sets_priority_and_size_of_local_files(tmp_path: Path) -> None:
+    path = tmp_path / "local.mkv"
+    path.write_bytes(b"x" * 1_000)
+    resolved = transcode_item.TranscodeMetadata("good", None)
+
+    with (
+        patch("sys.argv", ["transcode-item", str(path), "-p", "good", "--priority", "4"]),
+        patch.object(transcode_item, "init_db"),
+        patch.object(transcode_item, "_targets_from_config", return_value=[]),
+        patch.object(transcode_item, "resolve_metadata", return_value=resolved),
+        patch.object(transcode_item, "queue") as queue,
+    ):
+        transcode_item.main()
+
+    queue.add_many.assert_called_once_with([NewJob(str(path.resolve()), "good", None, 4, 1_000)])
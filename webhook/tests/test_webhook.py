@@ -4,6 +4,7 @@ from unittest.mock import MagicMock, patch
 import pytest
 
 import wi1_bot.webhook.app as app_mod
+from wi1_bot.webhook.config import SchedulingConfig
 
 
 class TestOnDownload:
@@ -73,6 +74,9 @@ class TestOnDownload:
             path="/movies/The Matrix (1999)/The Matrix (1999).mkv",
             quality_profile="good",
             original_language="English",
+            priority=0,
+            source_size=None,
+            source="radarr",
         )
         mock_radarr_cls.from_config.assert_called_once_with(radarr_instance)
 
@@ -96,6 +100,30 @@ class TestOnDownload:
 
         assert mock_queue.add.call_args.kwargs["original_language"] == "Japanese"
 
+    def test_movie_is_enqueued_with_its_priority_class_and_size(
+        self,
+        radarr_instance: MagicMock,
+        movie_download_request: dict[str, Any],
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        scheduling = SchedulingConfig(profile_priority={"good": 1}, instance_priority={"radarr": 2})
+        monkeypatch.setattr(app_mod.config.webhook, "scheduling", scheduling)
+        movie_download_request["movieFile"]["size"] = 4_000_000_000
+        mock_radarr = MagicMock()
+        mock_radarr.get_movie_by_id.return_value = {"qualityProfileId": 1}
+        mock_radarr.get_quality_profile_name.return_value = "good"
+
+        with (
+            patch.object(app_mod, "instances", [radarr_instance]),
+            patch.object(app_mod, "queue") as mock_queue,
+            patch.object(app_mod, "Radarr") as mock_radarr_cls,
+        ):
+            mock_radarr_cls.from_config.return_value = mock_radarr
+            app_mod.on_download(movie_download_request)
+
+        assert mock_queue.add.call_args.kwargs["priority"] == 3
+        assert mock_queue.add.call_args.kwargs["source_size"] == 4_000_000_000
+
     def test_series_enqueues(
         self, sonarr_instance: MagicMock, series_download_request: dict[str, Any]
     ) -> None:
@@ -115,6 +143,9 @@ class TestOnDownload:
             path="/tv/Game of Thrones/Season 01/S01E01.mkv",
             quality_profile="good",
             original_language=None,
+            priority=0,
+            source_size=None,
+            source="sonarr",
         )
         mock_sonarr_cls.from_config.assert_called_once_with(sonarr_instance)
 